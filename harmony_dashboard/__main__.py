@@ -1,15 +1,18 @@
 from argparse import ArgumentParser
 from datetime import datetime
+from functools import partial
 import os
 from pathlib import Path
 
-from .app import App
-from .physical_mic_integration import PhysicalMicIntegration
-from .file_playback_integration import FilePlaybackIntegration
-from .real_time_basic_pitch import PitchDetectingAudioStreamer
-from .harmony import HarmonyModule
-from .ui import TkinterAdapter
-from .harmony_state_logging import LoggingHarmonyPresenterDecorator
+# Only what parsing the arguments needs is imported up front, so that --help (or a
+# typo) doesn't wait on the audio, UI and model libraries.  The rest is imported in
+# main().
+from .app import I_HarmonyPresenter, I_PitchStreamer, I_PlaybackControls
+from .audio_ring_buffer import OverrunPolicy
+from .pitch_detection.inference_backends import (
+    InferenceBackend,
+    InferenceThreadConfig,
+)
 
 
 def create_log_path(log_dir: str) -> str:
@@ -20,29 +23,210 @@ def create_log_path(log_dir: str) -> str:
     return log_path
 
 
-def main(playback_input_path: str | None, log_dir: str | None):
-    audio_streamer = (
-        PhysicalMicIntegration()
-        if playback_input_path is None
-        else FilePlaybackIntegration(args.playback_input)
+def create_presenter(
+    log_dir: str | None, playback_controls: I_PlaybackControls | None = None
+) -> I_HarmonyPresenter:
+    from .ui import TkinterAdapter
+    from .harmony_state_logging import LoggingHarmonyPresenterDecorator
+
+    gui_presenter = TkinterAdapter(playback_controls=playback_controls)
+    if log_dir is None:
+        return gui_presenter
+    return LoggingHarmonyPresenterDecorator(
+        underlying_presenter=gui_presenter, log_path=create_log_path(log_dir)
     )
-    pitch_detecting_audio_streamer = PitchDetectingAudioStreamer(
-        audio_streamer=audio_streamer
+
+
+def main(
+    playback_input_path: str | None,
+    mic_device: int | str | None,
+    mic_blocksize: int,
+    mic_latency: str | float,
+    mic_dtype: str,
+    mic_inputs: list[tuple[int | str | None, int]] | None,
+    bass_input: int | None,
+    audio_cache_dir: str | None,
+    audio_cache_max_mb: float,
+    log_dir: str | None,
+    analysis_window_sec: float | None,
+    hop_sec: float,
+    overrun_policy: OverrunPolicy,
+    latency_budget_sec: float | None,
+    silence_threshold_dbfs: float | None,
+    silence_hangover_sec: float,
+    reuse_tolerance: float | None,
+    max_reuse_sec: float,
+    inference_in_process: bool,
+    inference_backend: InferenceBackend | None,
+    pitch_detector: str,
+    inference_thread_config: InferenceThreadConfig,
+    inference_cpu_cores: list[int] | None,
+    remote_inference_workers: list[tuple[str, int]] | None,
+    remote_inference_timeout_sec: float,
+    pitch_result_cache_path: str | None,
+    pitch_result_cache_max_entries: int,
+    precompute_timeline: bool,
+    loop_start_sec: float | None,
+    loop_end_sec: float | None,
+):
+    from .app import App
+    from .physical_mic_integration import (
+        MultiChannelMicCapture,
+        PhysicalMicIntegration,
     )
-    harmony_analyzer = HarmonyModule()
-    gui_presenter = TkinterAdapter()
-    presenter = (
-        gui_presenter
-        if log_dir is None
-        else LoggingHarmonyPresenterDecorator(
-            underlying_presenter=gui_presenter, log_path=create_log_path(log_dir)
+    from .combined_pitch_streamer import CombinedPitchStreamer
+    from .file_playback_integration import FilePlaybackIntegration
+    from .real_time_basic_pitch import PitchDetectingAudioStreamer
+    from .real_time_chroma import ChromaPitchStreamer
+    from .harmony import HarmonyModule
+    from .note_tracking import NoteTrackingHarmonyAnalyzerDecorator
+    from .pitch_detection.remote.worker_pool import RemotePitchWorkerPool
+
+    from .resampled_audio_cache import ResampledAudioCache, default_cache_dir
+    from .pitch_detection.pitch_result_cache import PitchResultCache
+
+    audio_cache = (
+        None
+        if audio_cache_max_mb <= 0
+        else ResampledAudioCache(
+            cache_dir=audio_cache_dir or default_cache_dir(),
+            max_size_bytes=int(audio_cache_max_mb * 1024**2),
         )
     )
+    if precompute_timeline:
+        from .analyze_file import analyze_file
+        from .timeline_playback import TimelinePlayback
+
+        timeline_playback = TimelinePlayback(
+            playback_input_path,
+            analyze=partial(
+                analyze_file,
+                playback_input_path,
+                # Leaves a core to the audio and the UI
+                n_workers=max((os.cpu_count() or 1) - 1, 1),
+                inference_backend=inference_backend,
+                hop_sec=hop_sec,
+                analysis_window_sec=analysis_window_sec,
+                pitch_result_cache_path=pitch_result_cache_path,
+            ),
+            sample_rate=PitchDetectingAudioStreamer.SAMPLE_RATE,
+            audio_cache=audio_cache,
+            loop_start_sec=loop_start_sec,
+            loop_end_sec=loop_end_sec,
+        )
+        timeline_playback.run(
+            create_presenter(log_dir, playback_controls=timeline_playback)
+        )
+        return
+
+    remote_worker_pool = (
+        None
+        if remote_inference_workers is None
+        else RemotePitchWorkerPool(
+            worker_addresses=remote_inference_workers,
+            timeout_sec=remote_inference_timeout_sec,
+        )
+    )
+    pitch_result_cache = (
+        None
+        if pitch_result_cache_path is None
+        else PitchResultCache(
+            pitch_result_cache_path, max_entries=pitch_result_cache_max_entries
+        )
+    )
+
+    def create_pitch_streamer(
+        audio_streamer, shared_inference_service=None
+    ) -> I_PitchStreamer:
+        if pitch_detector == "chroma":
+            return ChromaPitchStreamer(
+                audio_streamer=audio_streamer,
+                hop_sec=hop_sec,
+                overrun_policy=overrun_policy,
+                latency_budget_sec=latency_budget_sec,
+                silence_threshold_dbfs=silence_threshold_dbfs,
+                silence_hangover_sec=silence_hangover_sec,
+            )
+        return PitchDetectingAudioStreamer(
+            audio_streamer=audio_streamer,
+            analysis_window_sec=analysis_window_sec,
+            hop_sec=hop_sec,
+            overrun_policy=overrun_policy,
+            latency_budget_sec=latency_budget_sec,
+            silence_threshold_dbfs=silence_threshold_dbfs,
+            silence_hangover_sec=silence_hangover_sec,
+            reuse_tolerance=reuse_tolerance,
+            max_reuse_sec=max_reuse_sec,
+            inference_in_process=inference_in_process,
+            inference_backend=inference_backend,
+            shared_inference_service=shared_inference_service,
+            inference_thread_config=inference_thread_config,
+            inference_cpu_cores=inference_cpu_cores,
+            remote_worker_pool=remote_worker_pool,
+            pitch_result_cache=pitch_result_cache,
+        )
+
+    if mic_inputs is not None:
+        captures = {}
+        for device, _ in mic_inputs:
+            if device not in captures:
+                captures[device] = MultiChannelMicCapture(
+                    n_channels=1
+                    + max(
+                        channel_idx
+                        for input_device, channel_idx in mic_inputs
+                        if input_device == device
+                    ),
+                    device=device,
+                    blocksize=mic_blocksize,
+                    latency=mic_latency,
+                    dtype=mic_dtype,
+                )
+        shared_inference_service = None
+        if (
+            pitch_detector != "chroma"
+            and remote_worker_pool is None
+            and not inference_in_process
+        ):
+            from .pitch_detection.basic_pitch_detector import load_basic_pitch_model
+            from .pitch_detection.batched_inference import BatchedInferenceService
+
+            # Loaded on the first streamer's detection thread, like a single stream's
+            # model, so the UI shows itself while it loads
+            shared_inference_service = BatchedInferenceService(
+                load_inference_backend=partial(
+                    load_basic_pitch_model, inference_backend, inference_thread_config
+                )
+            )
+        pitch_streamer = CombinedPitchStreamer(
+            pitch_streamers=[
+                create_pitch_streamer(
+                    captures[device].channel(channel_idx),
+                    shared_inference_service=shared_inference_service,
+                )
+                for device, channel_idx in mic_inputs
+            ],
+            bass_stream_idx=bass_input,
+        )
+    else:
+        pitch_streamer = create_pitch_streamer(
+            PhysicalMicIntegration(
+                device=mic_device,
+                blocksize=mic_blocksize,
+                latency=mic_latency,
+                dtype=mic_dtype,
+            )
+            if playback_input_path is None
+            else FilePlaybackIntegration(playback_input_path, audio_cache=audio_cache)
+        )
+    harmony_analyzer = NoteTrackingHarmonyAnalyzerDecorator(
+        underlying_analyzer=HarmonyModule()
+    )
 
     app = App(
-        pitch_streamer=pitch_detecting_audio_streamer,
+        pitch_streamer=pitch_streamer,
         harmony_analyzer=harmony_analyzer,
-        presenter=presenter,
+        presenter=create_presenter(log_dir),
     )
 
     app.run()
@@ -57,6 +241,62 @@ def parse_args():
         required=False,
         default=None,
     )
+    parser.add_argument(
+        "--mic_device",
+        help="Which input device to capture from, by index or (part of its) name, as listed by 'python -m sounddevice'.  Defaults to the system's default input",
+        required=False,
+        type=parse_device,
+        default=None,
+    )
+    parser.add_argument(
+        "--mic_blocksize",
+        help="How many frames the mic hands over at a time.  0 lets the audio driver pick, which usually gives the lowest latency it can manage",
+        required=False,
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--mic_latency",
+        help="Input latency to ask the audio driver for: 'low', 'high' (safer against overflows), or a number of seconds.  The latency actually measured is printed on exit",
+        required=False,
+        type=parse_latency,
+        default="high",
+    )
+    parser.add_argument(
+        "--mic_dtype",
+        help="Sample format to capture in.  int16 suits cards that don't capture float natively",
+        required=False,
+        choices=["float32", "int16"],
+        default="float32",
+    )
+    parser.add_argument(
+        "--mic_inputs",
+        help="Capture several channels (e.g. of a multitrack interface) or devices at once, each given as CHANNEL or DEVICE:CHANNEL (DEVICE defaulting to --mic_device, CHANNEL counting from 0).  Pitches are detected in each on its own thread, sharing one loaded model, and analyzed together.  With --inference_in_process, each gets its own model process instead, spreading detection over more cores",
+        required=False,
+        nargs="+",
+        type=parse_mic_input,
+        default=None,
+    )
+    parser.add_argument(
+        "--bass_input",
+        help="Which of --mic_inputs (counting from 0) carries the bass.  Its pitches are placed below the others', so it decides the chord's root",
+        required=False,
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--audio_cache_dir",
+        help="Where the playback cache (see --audio_cache_max_mb) keeps its files.  Defaults to harmony_dashboard/resampled_audio in $XDG_CACHE_HOME, or in ~/.cache if that isn't set",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--audio_cache_max_mb",
+        help="If above 0, played back files are kept already resampled in --audio_cache_dir, so that playing them again starts straight away, until the cache grows past this many MB and the least recently played are removed.  Off by default",
+        required=False,
+        type=float,
+        default=0,
+    )
     parser.add_argument(
         "-l",
         "--log_dir",
@@ -64,9 +304,224 @@ def parse_args():
         required=False,
         default=None,
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "-w",
+        "--analysis_window_sec",
+        help="If provided, pitches are detected over overlapping windows of this many seconds (advancing by --hop_sec each time) rather than over only the audio received since the last detection",
+        required=False,
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--hop_sec",
+        help="How much new audio, in seconds, to wait for before each pitch detection.  May be adapted at runtime to keep up with the audio",
+        required=False,
+        type=float,
+        default=0.2,
+    )
+    parser.add_argument(
+        "--overrun_policy",
+        help="What to do with audio when pitch detection can't keep up: drop the oldest audio, only analyze the latest window, or make the audio source wait (only sensible for playback)",
+        required=False,
+        choices=[policy.name.lower() for policy in OverrunPolicy],
+        default=OverrunPolicy.DROP_OLDEST.name.lower(),
+    )
+    parser.add_argument(
+        "--latency_budget_sec",
+        help="Longest acceptable delay, in seconds, between hearing a sound and reporting its pitches.  Defaults to twice --hop_sec",
+        required=False,
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--silence_threshold_dbfs",
+        help="If provided, audio quieter than this level (in dBFS, e.g. -50) without any sudden onsets is treated as silence and skips pitch detection",
+        required=False,
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--silence_hangover_sec",
+        help="How long, in seconds, to keep detecting pitches after the audio falls silent, so that decaying notes are not cut off",
+        required=False,
+        type=float,
+        default=0.5,
+    )
+    parser.add_argument(
+        "--reuse_tolerance",
+        help="If provided, a window whose coarse chroma is within this tolerance (e.g. 0.05) of the window pitches were last detected in reuses those pitches instead of running the model.  Hit rates are printed on exit",
+        required=False,
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--max_reuse_sec",
+        help="Longest stretch of audio, in seconds, to reuse detected pitches for before detecting again",
+        required=False,
+        type=float,
+        default=1.0,
+    )
+    parser.add_argument(
+        "--inference_in_process",
+        help="If set, the pitch detection model runs in a separate process so that inference cannot stall the audio or the UI",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--inference_backend",
+        help="Which serialization of the pitch detection model to run.  tflite_int8 needs TensorFlow the first time, to quantize the model.  Defaults to whichever runtime basic pitch finds installed",
+        required=False,
+        choices=[backend.name.lower() for backend in InferenceBackend],
+        default=None,
+    )
+    parser.add_argument(
+        "--pitch_detector",
+        help="How to detect pitches: with basic pitch's neural network, or with a much cheaper (but less accurate) chroma analysis that doesn't need TensorFlow.  The window, reuse, process, backend and pitch result cache options only apply to basic pitch",
+        required=False,
+        choices=["basic_pitch", "chroma"],
+        default="basic_pitch",
+    )
+    parser.add_argument(
+        "--intra_op_threads",
+        help="How many threads the model may use within one operation.  Defaults to the model runtime's choice (usually one per core)",
+        required=False,
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--inter_op_threads",
+        help="How many independent model operations may run at once.  Defaults to the model runtime's choice",
+        required=False,
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--inference_cpu_cores",
+        help="If provided, pitch detection is pinned to these CPU cores (Linux only), e.g. '--inference_cpu_cores 2 3' to leave cores 0 and 1 to the audio and the UI",
+        required=False,
+        type=int,
+        nargs="+",
+        default=None,
+    )
+    parser.add_argument(
+        "--remote_inference_workers",
+        help="If provided, pitch detection is spread over these remote pitch workers (see harmony_dashboard.pitch_detection.remote), each given as host:port",
+        required=False,
+        type=parse_worker_address,
+        nargs="+",
+        default=None,
+    )
+    parser.add_argument(
+        "--remote_inference_timeout_sec",
+        help="How long to wait for a remote pitch worker before trying another",
+        required=False,
+        type=float,
+        default=1.0,
+    )
+    parser.add_argument(
+        "--pitch_result_cache",
+        help="If a file path is provided, pitches detected in each window are stored in that database (created if need be) and looked up before running the model, so that audio heard before (e.g. a file played back again) skips inference.  Hit rates are printed on exit",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--pitch_result_cache_max_entries",
+        help="How many windows' pitches the pitch result cache may hold before the least recently used are removed",
+        required=False,
+        type=int,
+        default=1_000_000,
+    )
+    parser.add_argument(
+        "--precompute_timeline",
+        help="If set (with --playback_input), the whole file is analyzed alongside playback, as fast as the CPUs allow, and the display follows what is being heard rather than live pitch detection.  The space bar pauses and the arrow keys seek.  Only the window, hop, backend and pitch result cache options apply",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--loop_start_sec",
+        help="If provided (with --precompute_timeline), playback loops back here once it reaches --loop_end_sec",
+        required=False,
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--loop_end_sec",
+        help="If provided (with --precompute_timeline), playback loops back to --loop_start_sec (or the start) once it gets here.  Defaults to the end of the file when only --loop_start_sec is given",
+        required=False,
+        type=float,
+        default=None,
+    )
+    args = parser.parse_args()
+    if args.precompute_timeline and args.playback_input is None:
+        parser.error("--precompute_timeline needs a --playback_input file")
+    if args.mic_inputs is not None and args.playback_input is not None:
+        parser.error("--mic_inputs can't be combined with --playback_input")
+    if args.bass_input is not None and not (
+        args.mic_inputs is not None and 0 <= args.bass_input < len(args.mic_inputs)
+    ):
+        parser.error("--bass_input must pick one of --mic_inputs")
+    if args.mic_inputs is not None:
+        args.mic_inputs = [
+            (args.mic_device if device is None else device, channel_idx)
+            for device, channel_idx in args.mic_inputs
+        ]
+    return args
+
+
+def parse_device(device: str) -> int | str:
+    return int(device) if device.isdigit() else device
+
+
+def parse_latency(latency: str) -> str | float:
+    return latency if latency in ("low", "high") else float(latency)
+
+
+def parse_mic_input(mic_input: str) -> tuple[int | str | None, int]:
+    device, _, channel_idx = mic_input.rpartition(":")
+    return (parse_device(device) if device else None), int(channel_idx)
+
+
+def parse_worker_address(address: str) -> tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host, int(port)
 
 
 if __name__ == "__main__":
     args = parse_args()
-    main(playback_input_path=args.playback_input, log_dir=args.log_dir)
+    main(
+        playback_input_path=args.playback_input,
+        mic_device=args.mic_device,
+        mic_blocksize=args.mic_blocksize,
+        mic_latency=args.mic_latency,
+        mic_dtype=args.mic_dtype,
+        mic_inputs=args.mic_inputs,
+        bass_input=args.bass_input,
+        audio_cache_dir=args.audio_cache_dir,
+        audio_cache_max_mb=args.audio_cache_max_mb,
+        log_dir=args.log_dir,
+        analysis_window_sec=args.analysis_window_sec,
+        hop_sec=args.hop_sec,
+        overrun_policy=OverrunPolicy[args.overrun_policy.upper()],
+        latency_budget_sec=args.latency_budget_sec,
+        silence_threshold_dbfs=args.silence_threshold_dbfs,
+        silence_hangover_sec=args.silence_hangover_sec,
+        reuse_tolerance=args.reuse_tolerance,
+        max_reuse_sec=args.max_reuse_sec,
+        inference_in_process=args.inference_in_process,
+        inference_backend=(
+            None
+            if args.inference_backend is None
+            else InferenceBackend[args.inference_backend.upper()]
+        ),
+        pitch_detector=args.pitch_detector,
+        inference_thread_config=InferenceThreadConfig(
+            intra_op_threads=args.intra_op_threads,
+            inter_op_threads=args.inter_op_threads,
+        ),
+        inference_cpu_cores=args.inference_cpu_cores,
+        remote_inference_workers=args.remote_inference_workers,
+        remote_inference_timeout_sec=args.remote_inference_timeout_sec,
+        pitch_result_cache_path=args.pitch_result_cache,
+        pitch_result_cache_max_entries=args.pitch_result_cache_max_entries,
+        precompute_timeline=args.precompute_timeline,
+        loop_start_sec=args.loop_start_sec,
+        loop_end_sec=args.loop_end_sec,
+    )
@@ -0,0 +1,179 @@
+from bisect import bisect_right
+from collections import deque
+import threading
+from typing import Iterable
+
+import numpy as np
+
+from .offline_analysis import AnalyzedHop
+
+
+class AnalysisTimeline:
+    """
+    A file's analysis (see AnalyzedHop), hop by hop, looked up by position in the
+    audio.  Filled in from the start of the file onwards, possibly while it is
+    being read from another thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hop_end_secs: list[float] = []
+        self.hops: list[AnalyzedHop] = []
+        self.is_complete = False
+        # Why analysis stopped early, if it did
+        self.error: Exception | None = None
+
+    def extend(self, analyzed_hops: Iterable[AnalyzedHop], stop_event: threading.Event):
+        """
+        Adds hops as they are analyzed, until they run out or stop_event is set
+        """
+        try:
+            for analyzed_hop in analyzed_hops:
+                with self.lock:
+                    self.hop_end_secs.append(analyzed_hop.end_sec)
+                    self.hops.append(analyzed_hop)
+                if stop_event.is_set():
+                    return
+        except Exception as e:
+            self.error = e
+            return
+        self.is_complete = True
+
+    def hop_at(self, position_sec: float) -> AnalyzedHop | None:
+        """
+        Returns the hop the audio at position_sec is in, or None if it hasn't been
+        analyzed (yet)
+        """
+        with self.lock:
+            hop_idx = bisect_right(self.hop_end_secs, position_sec)
+            if hop_idx < len(self.hops):
+                return self.hops[hop_idx]
+            if self.is_complete and self.hops:
+                # The very end of the file
+                return self.hops[-1]
+            return None
+
+    def analyzed_until_sec(self) -> float:
+        with self.lock:
+            return self.hop_end_secs[-1] if self.hop_end_secs else 0.0
+
+
+class Playhead:
+    """
+    Plays back samples held in memory from an audio callback, while other threads
+    pause, move (seek) and loop playback.
+
+    Also remembers, for the last few stretches of samples played, when they will
+    be heard, so heard_position_sec can tell what is being heard right now rather
+    than what was last handed to the audio device.
+    """
+
+    def __init__(
+        self,
+        samples: np.ndarray,
+        sample_rate: int,
+        loop_start_sec: float | None = None,
+        loop_end_sec: float | None = None,
+    ):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.lock = threading.Lock()
+        # Index of the next sample to play
+        self.position = 0
+        self.is_paused = False
+        self.loop_range: tuple[int, int] | None = None
+        if loop_start_sec is not None or loop_end_sec is not None:
+            self.set_loop(loop_start_sec or 0.0, loop_end_sec)
+        # When each stretch of samples will be heard, its first sample's index and its
+        # length, oldest first
+        self.played_stretches: deque[tuple[float, int, int]] = deque(maxlen=64)
+
+    def read_into(self, out: np.ndarray, output_time: float):
+        """
+        Fills out (1-D) with the next samples to play, or silence while paused or
+        past the end
+
+        output_time: when out[0] will be heard, by the clock heard_position_sec is
+            given
+        """
+        with self.lock:
+            n_written = 0
+            while n_written < out.shape[0] and not self.is_paused:
+                if self.loop_range is not None and self.position == self.loop_range[1]:
+                    self.position = self.loop_range[0]
+                play_until = (
+                    self.loop_range[1]
+                    if self.loop_range is not None
+                    and self.position < self.loop_range[1]
+                    else self.samples.shape[0]
+                )
+                n_copied = min(out.shape[0] - n_written, play_until - self.position)
+                if n_copied <= 0:
+                    break
+                out[n_written : n_written + n_copied] = self.samples[
+                    self.position : self.position + n_copied
+                ]
+                self.played_stretches.append(
+                    (
+                        output_time + n_written / self.sample_rate,
+                        self.position,
+                        n_copied,
+                    )
+                )
+                self.position += n_copied
+                n_written += n_copied
+            if n_written == 0:
+                # Nothing moves while paused (or after the end)
+                self.played_stretches.append((output_time, self.position, 0))
+            out[n_written:] = 0
+
+    def heard_position_sec(self, now: float) -> float | None:
+        """
+        Returns the position in the audio of what is being heard at now, or None if
+        nothing has been heard yet
+        """
+        with self.lock:
+            for output_time, start_position, n_samples in reversed(
+                self.played_stretches
+            ):
+                if output_time <= now:
+                    return (
+                        start_position
+                        + min((now - output_time) * self.sample_rate, n_samples)
+                    ) / self.sample_rate
+        return None
+
+    def toggle_pause(self):
+        with self.lock:
+            self.is_paused = not self.is_paused
+
+    def seek(self, position_sec: float):
+        with self.lock:
+            self.position = int(
+                np.clip(position_sec * self.sample_rate, 0, self.samples.shape[0])
+            )
+
+    def seek_by(self, offset_sec: float):
+        with self.lock:
+            position_sec = self.position / self.sample_rate
+        self.seek(position_sec + offset_sec)
+
+    def set_loop(self, start_sec: float, end_sec: float | None):
+        """
+        Plays from start_sec to end_sec (or the end of the audio) over and over, once
+        playback reaches end_sec
+        """
+        start = int(np.clip(start_sec * self.sample_rate, 0, self.samples.shape[0]))
+        end = (
+            self.samples.shape[0]
+            if end_sec is None
+            else int(np.clip(end_sec * self.sample_rate, 0, self.samples.shape[0]))
+        )
+        if end <= start:
+            raise ValueError("A loop must end after it starts")
+        with self.lock:
+            self.loop_range = (start, end)
+
+    def clear_loop(self):
+        with self.lock:
+            self.loop_range = None
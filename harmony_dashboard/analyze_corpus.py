@@ -0,0 +1,316 @@
+"""
+Writes a harmony log for every recording under a directory, as analyze_file would.
+
+    python -m harmony_dashboard.analyze_corpus takes/ -o logs/
+
+Files are spread over a pool of worker processes, each loading the model once and
+analyzing whole files.  Each log goes to the same relative path under the output
+directory, with .csv appended (so take.wav and take.flac don't clash).
+
+Finished files are recorded in a manifest in the output directory, so a run that was
+interrupted carries on where it stopped when started again.  Files that changed
+since they were analyzed, that failed, or that were analyzed with other settings
+(backend, hop or window) are analyzed again.
+
+With --pitch_result_cache, the workers share a cache of detected pitches (see
+PitchResultCache), so recordings that repeat audio already analyzed, or a corpus
+analyzed again with the same settings, mostly skip inference.
+"""
+
+from argparse import ArgumentParser
+from dataclasses import asdict, dataclass
+import csv
+from functools import partial
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+import time
+
+from .analyze_file import (
+    analyze_file_in_worker,
+    init_worker,
+    shared_cores_thread_config,
+)
+from .offline_analysis import (
+    add_analysis_arguments,
+    harmony_log_rows,
+    parse_inference_backend,
+)
+from .pitch_detection.inference_backends import InferenceBackend
+from .pitch_detection.pitch_result_cache import (
+    PitchResultCache,
+    describe_pitch_result_cache_stats,
+)
+
+AUDIO_FILE_SUFFIXES = {".wav", ".flac", ".ogg", ".mp3", ".aif", ".aiff"}
+MANIFEST_FILE_NAME = "manifest.jsonl"
+
+
+@dataclass
+class CorpusFileResult:
+    # Relative to the corpus directory
+    path: str
+    size: int
+    mtime_ns: int
+    audio_sec: float
+    elapsed_sec: float
+    error: str | None = None
+    # See corpus_analysis_settings.  None in manifests from before it was recorded.
+    settings: str | None = None
+
+
+def corpus_analysis_settings(
+    inference_backend: InferenceBackend | None,
+    hop_sec: float,
+    analysis_window_sec: float | None,
+) -> str:
+    """
+    Describes the settings a file's harmony log depends on, so that a run with other
+    settings doesn't count files analyzed with these as done
+    """
+    backend_name = (
+        "default" if inference_backend is None else inference_backend.name.lower()
+    )
+    return f"{backend_name}-hop-{hop_sec}-window-{analysis_window_sec}"
+
+
+class CorpusManifest:
+    """
+    One line of JSON per file analyzed (see CorpusFileResult), appended and flushed to
+    disk as each file finishes, so an interrupted run loses at most the files that
+    were in progress.  A line cut short by the interruption is ignored.
+    """
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self.results: dict[str, CorpusFileResult] = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                for line in f:
+                    try:
+                        result = CorpusFileResult(**json.loads(line))
+                    except (ValueError, TypeError):
+                        continue
+                    # Later lines supersede earlier ones
+                    self.results[result.path] = result
+
+    def is_done(self, path: str, size: int, mtime_ns: int, settings: str) -> bool:
+        result = self.results.get(path)
+        return (
+            result is not None
+            and result.error is None
+            and result.size == size
+            and result.mtime_ns == mtime_ns
+            and result.settings == settings
+        )
+
+    def record(self, result: CorpusFileResult):
+        self.results[result.path] = result
+        with open(self.manifest_path, "a") as f:
+            f.write(json.dumps(asdict(result)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def find_pending_files(
+    corpus_dir: str, output_dir: str, manifest: CorpusManifest, settings: str
+) -> list[str]:
+    """
+    Returns the relative paths of the recordings under corpus_dir not yet analyzed,
+    largest first, so that one long file isn't left running on its own at the end
+    """
+    pending_files = []
+    for dir_path, _, file_names in os.walk(corpus_dir):
+        for file_name in file_names:
+            if Path(file_name).suffix.lower() not in AUDIO_FILE_SUFFIXES:
+                continue
+            full_path = os.path.join(dir_path, file_name)
+            path = os.path.relpath(full_path, corpus_dir)
+            stat = os.stat(full_path)
+            if manifest.is_done(path, stat.st_size, stat.st_mtime_ns, settings) and (
+                os.path.exists(log_path_for(output_dir, path))
+            ):
+                continue
+            pending_files.append((stat.st_size, path))
+    return [path for _, path in sorted(pending_files, reverse=True)]
+
+
+def log_path_for(output_dir: str, path: str) -> str:
+    return os.path.join(output_dir, path + ".csv")
+
+
+def analyze_corpus_file(
+    corpus_dir: str,
+    output_dir: str,
+    path: str,
+    hop_sec: float,
+    analysis_window_sec: float | None,
+    settings: str,
+) -> CorpusFileResult:
+    """
+    Analyzes one file with the detector init_worker built in this process, writing
+    its log all at once so that an interrupted file leaves no partial log behind
+    """
+    full_path = os.path.join(corpus_dir, path)
+    stat = os.stat(full_path)
+    log_path = log_path_for(output_dir, path)
+    Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+    partial_log_path = log_path + ".partial"
+    start_time = time.perf_counter()
+    audio_sec = 0.0
+
+    def analyzed_hops():
+        nonlocal audio_sec
+        for analyzed_hop in analyze_file_in_worker(
+            full_path, hop_sec, analysis_window_sec
+        ):
+            audio_sec = analyzed_hop.end_sec
+            yield analyzed_hop
+
+    error = None
+    try:
+        with open(partial_log_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            for row in harmony_log_rows(analyzed_hops()):
+                writer.writerow(row)
+        os.replace(partial_log_path, log_path)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if os.path.exists(partial_log_path):
+            os.unlink(partial_log_path)
+    return CorpusFileResult(
+        path=path,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        audio_sec=audio_sec,
+        elapsed_sec=time.perf_counter() - start_time,
+        error=error,
+        settings=settings,
+    )
+
+
+def main(
+    corpus_dir: str,
+    output_dir: str,
+    n_workers: int,
+    inference_backend: InferenceBackend | None,
+    hop_sec: float,
+    analysis_window_sec: float | None,
+    pitch_result_cache_path: str | None,
+):
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    manifest = CorpusManifest(os.path.join(output_dir, MANIFEST_FILE_NAME))
+    settings = corpus_analysis_settings(inference_backend, hop_sec, analysis_window_sec)
+    pending_files = find_pending_files(corpus_dir, output_dir, manifest, settings)
+    n_done = sum(
+        result.error is None and result.settings == settings
+        for result in manifest.results.values()
+    )
+    print(
+        f"{len(pending_files)} files to analyze "
+        f"({n_done} already done according to the manifest)"
+    )
+    if not pending_files:
+        return
+    start_time = time.perf_counter()
+    total_audio_sec = 0.0
+    n_failed = 0
+    # The workers' lookups are only counted in the database they share
+    pitch_result_cache = (
+        None
+        if pitch_result_cache_path is None
+        else PitchResultCache(pitch_result_cache_path)
+    )
+    stored_cache_stats = (
+        None if pitch_result_cache is None else pitch_result_cache.get_stored_stats()
+    )
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(
+        processes=n_workers,
+        initializer=init_worker,
+        initargs=(
+            analysis_window_sec is not None,
+            inference_backend,
+            shared_cores_thread_config(n_workers),
+            pitch_result_cache_path,
+        ),
+    ) as pool:
+        results = pool.imap_unordered(
+            partial(
+                analyze_corpus_file,
+                corpus_dir,
+                output_dir,
+                hop_sec=hop_sec,
+                analysis_window_sec=analysis_window_sec,
+                settings=settings,
+            ),
+            pending_files,
+        )
+        for file_idx, result in enumerate(results):
+            manifest.record(result)
+            progress = f"[{file_idx + 1}/{len(pending_files)}] {result.path}"
+            if result.error is not None:
+                n_failed += 1
+                print(f"{progress}: failed: {result.error}", file=sys.stderr)
+                continue
+            total_audio_sec += result.audio_sec
+            print(
+                f"{progress}: {result.audio_sec:.1f}s of audio in "
+                f"{result.elapsed_sec:.1f}s "
+                f"({result.audio_sec / max(result.elapsed_sec, 1e-9):.1f}x real time)"
+            )
+    elapsed_sec = time.perf_counter() - start_time
+    print(
+        f"Analyzed {total_audio_sec:.1f}s of audio in {elapsed_sec:.1f}s "
+        f"({total_audio_sec / elapsed_sec:.1f}x real time) with {n_workers} workers"
+        + (f", {n_failed} failed" if n_failed else "")
+    )
+    if pitch_result_cache is not None:
+        print(
+            describe_pitch_result_cache_stats(
+                pitch_result_cache.get_stored_stats() - stored_cache_stats
+            )
+        )
+        pitch_result_cache.close()
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument("corpus_dir", help="Directory of recordings to analyze")
+    parser.add_argument(
+        "-o",
+        "--output_dir",
+        help="Where to write the harmony logs and the manifest",
+        required=True,
+    )
+    parser.add_argument(
+        "-j",
+        "--n_workers",
+        help="How many files to analyze at once.  Defaults to one per CPU core",
+        required=False,
+        type=int,
+        default=os.cpu_count() or 1,
+    )
+    add_analysis_arguments(parser)
+    parser.add_argument(
+        "--pitch_result_cache",
+        help="If a file path is provided, pitches detected in each window are stored in that database (created if need be) and looked up before running the model, so that analyzing the same audio again skips inference",
+        required=False,
+        default=None,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(
+        corpus_dir=args.corpus_dir,
+        output_dir=args.output_dir,
+        n_workers=args.n_workers,
+        inference_backend=parse_inference_backend(args.inference_backend),
+        hop_sec=args.hop_sec,
+        analysis_window_sec=args.analysis_window_sec,
+        pitch_result_cache_path=args.pitch_result_cache,
+    )
@@ -0,0 +1,426 @@
+"""
+Analyzes an audio file as fast as the CPUs allow, without playing it, and writes the
+harmony log the app would have written had the file been played back.
+
+    python -m harmony_dashboard.analyze_file song.wav -o song.csv
+
+Pitch detection, the slow part, runs on a pool of worker processes, each detecting
+the hops of one chunk of the file at a time.  Chunks come back in order, and are fed
+through harmony analysis (which depends on what came before) in the main process.
+The file is decoded and resampled a block at a time, and only a few chunks are in
+flight at once, so memory use doesn't grow with the length of the file.
+
+With --pitch_result_cache, every worker looks windows up in the same cache (see
+PitchResultCache) before running the model, so analyzing a file again, with the same
+settings, mostly skips inference.
+"""
+
+from argparse import ArgumentParser
+from collections import deque
+import csv
+import multiprocessing
+import multiprocessing.pool
+import os
+import sys
+import time
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from .app import I_HarmonyStateListener
+from .chunked_audio_reader import ChunkedAudioReader
+from .harmony_domain import HarmonyState
+from .offline_analysis import (
+    AnalyzedHop,
+    add_analysis_arguments,
+    harmony_log_rows,
+    parse_inference_backend,
+)
+from .pitch_detection import I_PitchDetector
+from .pitch_detection.inference_backends import (
+    InferenceBackend,
+    InferenceThreadConfig,
+)
+from .pitch_detection.pitch_result_cache import (
+    CachingPitchDetector,
+    PitchResultCache,
+    basic_pitch_result_settings,
+    describe_pitch_result_cache_stats,
+)
+from .real_time_basic_pitch import PitchDetectingAudioStreamer
+
+SAMPLE_RATE = PitchDetectingAudioStreamer.SAMPLE_RATE
+
+# The worker process's detector, built once by init_worker
+_pitch_detector: I_PitchDetector | None = None
+
+
+def shared_cores_thread_config(n_workers: int) -> InferenceThreadConfig:
+    """
+    Splits the cores between the workers, rather than each starting a thread per core
+    """
+    return InferenceThreadConfig(
+        intra_op_threads=max((os.cpu_count() or 1) // n_workers, 1),
+        inter_op_threads=1,
+    )
+
+
+def init_worker(
+    sliding_window: bool,
+    inference_backend: InferenceBackend | None,
+    thread_config: InferenceThreadConfig | None,
+    pitch_result_cache_path: str | None = None,
+):
+    """
+    Builds the detector the rest of the functions here detect pitches with, in this
+    process.  Meant as a process pool's initializer, so the model loads once per
+    worker.
+    """
+    from .pitch_detection.basic_pitch_detector import (
+        FFT_HOP,
+        create_basic_pitch_detector,
+    )
+
+    global _pitch_detector
+    _pitch_detector = create_basic_pitch_detector(
+        sliding_window=sliding_window,
+        min_freq_hz=PitchDetectingAudioStreamer.MIN_FREQ_HZ,
+        max_freq_hz=PitchDetectingAudioStreamer.MAX_FREQ_HZ,
+        inference_backend=inference_backend,
+        thread_config=thread_config,
+    )
+    _pitch_detector.warm_up()
+    if pitch_result_cache_path is not None:
+        _pitch_detector = CachingPitchDetector(
+            underlying_detector=_pitch_detector,
+            cache=PitchResultCache(pitch_result_cache_path),
+            settings=basic_pitch_result_settings(
+                sliding_window,
+                inference_backend,
+                PitchDetectingAudioStreamer.MIN_FREQ_HZ,
+                PitchDetectingAudioStreamer.MAX_FREQ_HZ,
+            ),
+            stream_frame_len=FFT_HOP if sliding_window else None,
+        )
+
+
+def detect_chunk_pitches(
+    audio: np.ndarray,
+    n_context_samples: int,
+    chunk_start_position: int,
+    is_last_chunk: bool,
+    hop_len: int,
+    window_len: int | None,
+) -> list[tuple[int, list[int]]]:
+    """
+    audio: the chunk's hops, preceded by n_context_samples of the audio before them
+        that their windows reach back into
+    chunk_start_position: stream position of the start of audio
+    returns the stream position of the end of each hop, and the pitches detected
+        in it, as OfflineHarmonyAnalysis would have detected them
+    """
+    hop_ends = list(range(n_context_samples + hop_len, audio.shape[0] + 1, hop_len))
+    if (
+        is_last_chunk
+        and (hop_ends[-1] if hop_ends else n_context_samples) < audio.shape[0]
+    ):
+        # The final, partial hop
+        hop_ends.append(audio.shape[0])
+    if window_len is not None:
+        # A sliding detector only reports what is new since the window before, and
+        # a pool worker's previous chunk is usually not the one before this.  So
+        # every chunk starts from the same state, lined up with the window ending
+        # where the chunk's hops begin, whichever worker gets it.
+        _pitch_detector.reset()
+        if n_context_samples > 0:
+            _pitch_detector.skip_window(
+                audio[max(n_context_samples - window_len, 0) : n_context_samples],
+                stream_position=chunk_start_position + n_context_samples,
+            )
+    detected_pitches = []
+    previous_hop_end = n_context_samples
+    for hop_end in hop_ends:
+        window_start = (
+            previous_hop_end if window_len is None else max(hop_end - window_len, 0)
+        )
+        pitches = _pitch_detector.detect_pitches(
+            audio[window_start:hop_end],
+            stream_position=chunk_start_position + hop_end,
+        )
+        detected_pitches.append((chunk_start_position + hop_end, list(pitches)))
+        previous_hop_end = hop_end
+    return detected_pitches
+
+
+def read_chunks(
+    audio_reader: ChunkedAudioReader, chunk_len: int, context_len: int
+) -> Iterator[tuple[np.ndarray, int, int, bool]]:
+    """
+    Yields each chunk of chunk_len new samples (the last may be shorter) preceded by
+    up to context_len samples of the audio before it, with the number of context
+    samples, the chunk's start position and whether it is the last chunk
+    """
+    context = np.zeros(shape=(0,), dtype=np.float32)
+    context_start = 0
+    chunk = np.zeros(shape=(chunk_len,), dtype=np.float32)
+    is_last_chunk = False
+    while not is_last_chunk:
+        n_read = 0
+        while n_read < chunk_len and not audio_reader.is_finished:
+            n_read += audio_reader.read_into(chunk[n_read:])
+            if n_read < chunk_len and not audio_reader.is_finished:
+                # Decoding fell behind
+                time.sleep(0.001)
+        if n_read == 0:
+            # The file ended exactly at the end of the previous chunk
+            return
+        is_last_chunk = audio_reader.is_finished
+        audio = np.concatenate([context, chunk[:n_read]])
+        yield audio, context.shape[0], context_start, is_last_chunk
+        context = audio[max(audio.shape[0] - context_len, 0) :]
+        context_start += audio.shape[0] - context.shape[0]
+
+
+def read_file_chunks(
+    path: str, hop_len: int, window_len: int | None, chunk_sec: float
+) -> Iterator[tuple[np.ndarray, int, int, bool]]:
+    """
+    Decodes the file a block at a time and yields it in chunks (see read_chunks) of
+    whole hops, so that hops don't straddle chunks
+    """
+    chunk_len = max(round(chunk_sec * SAMPLE_RATE / hop_len), 1) * hop_len
+    audio_reader = ChunkedAudioReader(path, SAMPLE_RATE)
+    audio_reader.start()
+    try:
+        audio_reader.wait_until_ready()
+        if audio_reader.error is not None:
+            raise audio_reader.error
+        # Enough context for even a final, partial hop's window
+        yield from read_chunks(audio_reader, chunk_len, context_len=window_len or 0)
+        if audio_reader.error is not None:
+            raise audio_reader.error
+    finally:
+        audio_reader.stop()
+
+
+class _LatestHarmonyState(I_HarmonyStateListener):
+    def __init__(self):
+        self.state = None
+
+    def update_harmony_state(self, state: HarmonyState):
+        self.state = state
+
+
+def analyze_harmony(
+    detected_chunk_pitches: Iterable[list[tuple[int, list[int]]]],
+) -> Iterator[AnalyzedHop]:
+    """
+    Runs the pitches detected in each chunk (see detect_chunk_pitches), in order,
+    through harmony analysis
+    """
+    from .harmony import HarmonyModule
+    from .note_tracking import NoteTrackingHarmonyAnalyzerDecorator
+
+    harmony_analyzer = NoteTrackingHarmonyAnalyzerDecorator(
+        underlying_analyzer=HarmonyModule()
+    )
+    latest_harmony_state = _LatestHarmonyState()
+    harmony_analyzer.register_listener(latest_harmony_state)
+    for detected_pitches in detected_chunk_pitches:
+        for hop_end, pitches in detected_pitches:
+            harmony_analyzer.new_pitches_detected(pitches)
+            yield AnalyzedHop(
+                end_sec=hop_end / SAMPLE_RATE,
+                pitches=pitches,
+                harmony_state=latest_harmony_state.state,
+            )
+
+
+def analyze_file_in_worker(
+    path: str,
+    hop_sec: float = 0.2,
+    analysis_window_sec: float | None = None,
+    chunk_sec: float = 30.0,
+) -> Iterator[AnalyzedHop]:
+    """
+    Analyzes the whole file in this process, with the detector init_worker built
+    """
+    hop_len, window_len = _hop_and_window_len(hop_sec, analysis_window_sec)
+    return analyze_harmony(
+        detect_chunk_pitches(*chunk, hop_len, window_len)
+        for chunk in read_file_chunks(path, hop_len, window_len, chunk_sec)
+    )
+
+
+def analyze_file(
+    path: str,
+    n_workers: int,
+    inference_backend: InferenceBackend | None = None,
+    hop_sec: float = 0.2,
+    analysis_window_sec: float | None = None,
+    chunk_sec: float = 30.0,
+    pitch_result_cache_path: str | None = None,
+) -> Iterator[AnalyzedHop]:
+    """
+    Yields every hop of the file, in order, analyzed as OfflineHarmonyAnalysis would
+    """
+    worker_args = (
+        analysis_window_sec is not None,
+        inference_backend,
+        shared_cores_thread_config(n_workers),
+        pitch_result_cache_path,
+    )
+    if n_workers == 1:
+        init_worker(*worker_args)
+        yield from analyze_file_in_worker(path, hop_sec, analysis_window_sec, chunk_sec)
+        return
+    hop_len, window_len = _hop_and_window_len(hop_sec, analysis_window_sec)
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(
+        processes=n_workers, initializer=init_worker, initargs=worker_args
+    ) as pool:
+        yield from analyze_harmony(
+            _detect_in_order(
+                pool,
+                n_workers,
+                read_file_chunks(path, hop_len, window_len, chunk_sec),
+                hop_len,
+                window_len,
+            )
+        )
+
+
+def _detect_in_order(
+    pool: multiprocessing.pool.Pool,
+    n_workers: int,
+    chunks: Iterable[tuple[np.ndarray, int, int, bool]],
+    hop_len: int,
+    window_len: int | None,
+) -> Iterator[list[tuple[int, list[int]]]]:
+    # Enough to keep every worker busy, without reading far ahead
+    pending_chunks = deque()
+    for chunk in chunks:
+        pending_chunks.append(
+            pool.apply_async(detect_chunk_pitches, (*chunk, hop_len, window_len))
+        )
+        if len(pending_chunks) >= 2 * n_workers:
+            yield pending_chunks.popleft().get()
+    while pending_chunks:
+        yield pending_chunks.popleft().get()
+
+
+def _hop_and_window_len(
+    hop_sec: float, analysis_window_sec: float | None
+) -> tuple[int, int | None]:
+    return int(hop_sec * SAMPLE_RATE), (
+        None if analysis_window_sec is None else int(analysis_window_sec * SAMPLE_RATE)
+    )
+
+
+def main(
+    path: str,
+    output_path: str | None,
+    n_workers: int,
+    inference_backend: InferenceBackend | None,
+    hop_sec: float,
+    analysis_window_sec: float | None,
+    chunk_sec: float,
+    pitch_result_cache_path: str | None,
+):
+    start_time = time.perf_counter()
+    audio_sec = 0.0
+    # The workers' lookups are only counted in the database they share
+    pitch_result_cache = (
+        None
+        if pitch_result_cache_path is None
+        else PitchResultCache(pitch_result_cache_path)
+    )
+    stored_cache_stats = (
+        None if pitch_result_cache is None else pitch_result_cache.get_stored_stats()
+    )
+    with (
+        open(output_path, "w", newline="")
+        if output_path is not None
+        else open(sys.stdout.fileno(), "w", newline="", closefd=False)
+    ) as f:
+        writer = csv.writer(f)
+
+        def analyzed_hops() -> Iterator[AnalyzedHop]:
+            nonlocal audio_sec
+            for analyzed_hop in analyze_file(
+                path,
+                n_workers,
+                inference_backend=inference_backend,
+                hop_sec=hop_sec,
+                analysis_window_sec=analysis_window_sec,
+                chunk_sec=chunk_sec,
+                pitch_result_cache_path=pitch_result_cache_path,
+            ):
+                audio_sec = analyzed_hop.end_sec
+                yield analyzed_hop
+
+        for row in harmony_log_rows(analyzed_hops()):
+            writer.writerow(row)
+    elapsed_sec = time.perf_counter() - start_time
+    print(
+        f"Analyzed {audio_sec:.1f}s of audio in {elapsed_sec:.1f}s "
+        f"({audio_sec / elapsed_sec:.1f}x real time)",
+        file=sys.stderr,
+    )
+    if pitch_result_cache is not None:
+        print(
+            describe_pitch_result_cache_stats(
+                pitch_result_cache.get_stored_stats() - stored_cache_stats
+            ),
+            file=sys.stderr,
+        )
+        pitch_result_cache.close()
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument("path", help="Audio file to analyze")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Where to write the harmony log.  Defaults to stdout",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "-j",
+        "--n_workers",
+        help="How many processes to detect pitches with.  Defaults to one per CPU core",
+        required=False,
+        type=int,
+        default=os.cpu_count() or 1,
+    )
+    add_analysis_arguments(parser)
+    parser.add_argument(
+        "--chunk_sec",
+        help="How much audio, in seconds, to hand a worker at a time",
+        required=False,
+        type=float,
+        default=30.0,
+    )
+    parser.add_argument(
+        "--pitch_result_cache",
+        help="If a file path is provided, pitches detected in each window are stored in that database (created if need be) and looked up before running the model, so that analyzing the same audio again skips inference",
+        required=False,
+        default=None,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(
+        path=args.path,
+        output_path=args.output,
+        n_workers=args.n_workers,
+        inference_backend=parse_inference_backend(args.inference_backend),
+        hop_sec=args.hop_sec,
+        analysis_window_sec=args.analysis_window_sec,
+        chunk_sec=args.chunk_sec,
+        pitch_result_cache_path=args.pitch_result_cache,
+    )
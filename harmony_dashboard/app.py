@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Callable
 
 from .harmony_domain import HarmonyState
 
@@ -29,7 +30,17 @@ class I_PitchStreamer(ABC):
         pass
 
     @abstractmethod
-    def start_streaming(self):
+    def start_streaming(
+        self,
+        on_ready: Callable[[], None] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+    ):
+        """
+        Should return promptly, doing any slow setup (e.g. loading a model) in the
+        background.  on_ready is called, from whichever thread did the setup, once
+        pitches are being detected, or on_error if the setup failed (in which case
+        no pitches will ever be detected).
+        """
         pass
 
     @abstractmethod
@@ -67,6 +78,42 @@ class I_HarmonyPresenter(I_HarmonyStateListener):
     def run_ui_until_stopped_by_user(self):
         pass
 
+    def pitch_detection_loading(self):
+        """
+        Called before the UI runs if pitch detection isn't ready yet
+        """
+        pass
+
+    def pitch_detection_ready(self):
+        """
+        Called, possibly from another thread, once pitches are being detected
+        """
+        pass
+
+    def pitch_detection_failed(self, error: Exception):
+        """
+        Called, possibly from another thread, if pitch detection couldn't start.
+        The UI should stop, so that the app exits.
+        """
+        pass
+
+
+class I_PlaybackControls(ABC):
+    """
+    Lets the user move around in audio being played back
+    """
+
+    @abstractmethod
+    def toggle_pause(self):
+        pass
+
+    @abstractmethod
+    def seek_by(self, offset_sec: float):
+        """
+        Moves playback forwards (or backwards, if negative) by offset_sec
+        """
+        pass
+
 
 class App:
     def __init__(
@@ -83,6 +130,10 @@ class App:
         self.harmony_analyzer.register_listener(self.presenter)
 
     def run(self):
-        self.pitch_streamer.start_streaming()
+        self.presenter.pitch_detection_loading()
+        self.pitch_streamer.start_streaming(
+            on_ready=self.presenter.pitch_detection_ready,
+            on_error=self.presenter.pitch_detection_failed,
+        )
         self.presenter.run_ui_until_stopped_by_user()
         self.pitch_streamer.stop_streaming()
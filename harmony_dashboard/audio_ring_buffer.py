@@ -0,0 +1,223 @@
+from dataclasses import dataclass
+from enum import Enum, auto
+import threading
+
+import numpy as np
+
+
+class OverrunPolicy(Enum):
+    """
+    What to do when audio arrives faster than the consumer reads it.
+    """
+
+    # The producer overwrites the oldest unread audio
+    DROP_OLDEST = auto()
+    # The consumer only ever reads the newest window of unread audio, discarding the rest
+    KEEP_LATEST_WINDOW = auto()
+    # The producer waits for the consumer to make room.  Only sensible when the producer
+    # can afford to wait (e.g. file playback); a mic will overflow instead.
+    BLOCK = auto()
+
+
+@dataclass
+class AudioBufferStats:
+    # Number of times the producer got ahead of the consumer by more than the buffer
+    overrun_count: int
+    # Number of samples that were never read because of overruns
+    dropped_samples: int
+
+
+class AudioRingBuffer:
+    """
+    Preallocated single-producer/single-consumer ring buffer of mono samples.  The
+    producer is the real-time audio callback, the consumer is the pitch detection
+    thread.
+
+    Samples are addressed by absolute stream index.  The producer only ever advances
+    write_index and the consumer only ever advances read_index; both are plain ints,
+    which the GIL updates atomically, so neither side takes a lock (the BLOCK policy
+    aside).  The consumer can sleep until enough audio has arrived via
+    wait_for_unread_samples; the producer only touches the wakeup event once the
+    threshold is crossed.
+
+    Every sample is stored twice, 'capacity' samples apart, so that any run of up to
+    'capacity' consecutive samples is contiguous in memory and can be handed to the
+    consumer as a view instead of a copy.  A view stays valid until the producer
+    laps it, i.e. until another 'capacity' samples have been written.
+
+    window_len is the number of samples the consumer looks at per read: the newest
+    window kept by KEEP_LATEST_WINDOW, and the history behind read_index that BLOCK
+    will not overwrite.  So under BLOCK, a view of unread samples (and up to
+    window_len before them) is never overwritten, as long as the consumer only
+    advances read_index once it is done with the view.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        dtype=np.float32,
+        overrun_policy: OverrunPolicy = OverrunPolicy.DROP_OLDEST,
+        window_len: int = 0,
+        block_timeout_sec: float = 1.0,
+    ):
+        assert capacity > 0, "Ring buffer capacity must be positive"
+        assert window_len <= capacity, "Window must fit in the ring buffer"
+        self.capacity = capacity
+        self.buffer = np.zeros(shape=(2 * capacity,), dtype=dtype)
+        self.write_index = 0
+        self.read_index = 0
+        self.overrun_policy = overrun_policy
+        self.window_len = window_len
+        self.block_timeout_sec = block_timeout_sec
+        self.space_available_event = threading.Event()
+        self.data_available_event = threading.Event()
+        self.wakeup_threshold = 1
+        # Each counter is only ever incremented by one side
+        self.producer_overrun_count = 0
+        self.consumer_overrun_count = 0
+        self.dropped_samples = 0
+
+    def get_stats(self) -> AudioBufferStats:
+        return AudioBufferStats(
+            overrun_count=self.producer_overrun_count + self.consumer_overrun_count,
+            dropped_samples=self.dropped_samples,
+        )
+
+    # Producer side
+
+    def write(self, samples: np.ndarray):
+        """
+        Copies a block of samples, shape (n,) or (n, n_channels), into the buffer.
+        Only the first channel is kept.  Integer samples (e.g. int16 from a sound
+        card) are scaled to [-1, 1) as they are copied.  Does not allocate, so it is
+        safe to call from the audio callback.
+        """
+        mono_samples = samples[:, 0] if samples.ndim == 2 else samples
+        n_samples = mono_samples.shape[0]
+        if self.overrun_policy == OverrunPolicy.BLOCK:
+            self._wait_for_space(n_samples)
+        if n_samples > self.capacity:
+            # Only the newest samples could survive anyways
+            self.write_index += n_samples - self.capacity
+            mono_samples = mono_samples[-self.capacity :]
+            n_samples = self.capacity
+        start = self.write_index % self.capacity
+        n_before_wrap = min(n_samples, self.capacity - start)
+        n_after_wrap = n_samples - n_before_wrap
+        self._write_mirrored(start, mono_samples[:n_before_wrap])
+        if n_after_wrap > 0:
+            self._write_mirrored(0, mono_samples[n_before_wrap:])
+        self.write_index += n_samples
+        if (
+            self.write_index - self.read_index >= self.wakeup_threshold
+            and not self.data_available_event.is_set()
+        ):
+            self.data_available_event.set()
+
+    # Consumer side
+
+    def wait_for_unread_samples(self, n_samples: int, timeout_sec: float) -> bool:
+        """
+        Sleeps until at least n_samples are unread, or the timeout expires, or
+        wake_consumer is called.  Returns whether the samples are available.
+        """
+        self.wakeup_threshold = n_samples
+        self.data_available_event.clear()
+        # Check after clearing in case the producer crossed the threshold just before
+        if self.write_index - self.read_index < n_samples:
+            self.data_available_event.wait(timeout_sec)
+        return self.write_index - self.read_index >= n_samples
+
+    def wake_consumer(self):
+        self.data_available_event.set()
+
+    def next_read_range(self, apply_overrun_policy: bool = True) -> tuple[int, int]:
+        """
+        Absolute [start, end) range of unread samples that the consumer should read
+        next, after applying the overrun policy (unless the consumer deliberately let
+        the audio pile up, e.g. while idle).  Samples skipped over are counted as
+        dropped.
+        """
+        end_index = self.write_index
+        start_index = self.read_index
+        oldest_available_index = end_index - self.capacity
+        if start_index < oldest_available_index:
+            # The producer lapped us
+            self._count_dropped_samples(oldest_available_index - start_index)
+            start_index = oldest_available_index
+        if (
+            apply_overrun_policy
+            and self.overrun_policy == OverrunPolicy.KEEP_LATEST_WINDOW
+            and end_index - start_index > self.window_len
+        ):
+            self._count_dropped_samples(end_index - self.window_len - start_index)
+            start_index = end_index - self.window_len
+        return start_index, end_index
+
+    def view(self, start_index: int, end_index: int) -> np.ndarray:
+        """
+        Zero-copy view of the samples at absolute indices [start_index, end_index).
+        Indices before the start of the stream read as silence.
+        """
+        n_samples = end_index - start_index
+        assert 0 <= n_samples <= self.capacity, "View must fit in the ring buffer"
+        assert end_index <= self.write_index, "Cannot view samples not yet written"
+        assert (
+            start_index >= self.write_index - self.capacity
+        ), "Samples have already been overwritten"
+        start = start_index % self.capacity
+        return self.buffer[start : start + n_samples]
+
+    def advance_read_index(self, new_read_index: int):
+        self.read_index = max(self.read_index, new_read_index)
+        if self.overrun_policy == OverrunPolicy.BLOCK:
+            self.space_available_event.set()
+
+    def count_skipped_samples(self, n_samples: int):
+        """
+        Counts samples that the consumer read past without analyzing (e.g. as stale)
+        as dropped
+        """
+        if n_samples > 0:
+            self._count_dropped_samples(n_samples)
+
+    def _count_dropped_samples(self, n_samples: int):
+        self.consumer_overrun_count += 1
+        self.dropped_samples += n_samples
+
+    def _wait_for_space(self, n_samples: int):
+        """
+        Waits until writing n_samples would not overwrite anything the consumer still
+        needs.  Gives up after block_timeout_sec so that a consumer that has stopped
+        reading can never hang the producer.
+        """
+        if not self._would_overwrite_needed_samples(n_samples):
+            return
+        self.producer_overrun_count += 1
+        while self._would_overwrite_needed_samples(n_samples):
+            self.space_available_event.clear()
+            # Check again in case the consumer advanced just before the clear
+            if not self._would_overwrite_needed_samples(n_samples):
+                return
+            if not self.space_available_event.wait(self.block_timeout_sec):
+                return
+
+    def _would_overwrite_needed_samples(self, n_samples: int) -> bool:
+        oldest_needed_index = self.read_index - self.window_len
+        return self.write_index + n_samples - self.capacity > oldest_needed_index
+
+    def _write_mirrored(self, start: int, samples: np.ndarray):
+        end = start + samples.shape[0]
+        if np.issubdtype(samples.dtype, np.integer):
+            # Converted straight into the buffer, without an intermediate array
+            np.multiply(
+                samples,
+                1.0 / (np.iinfo(samples.dtype).max + 1),
+                out=self.buffer[start:end],
+                casting="unsafe",
+            )
+        else:
+            self.buffer[start:end] = samples
+        self.buffer[start + self.capacity : end + self.capacity] = self.buffer[
+            start:end
+        ]
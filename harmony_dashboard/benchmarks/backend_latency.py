@@ -0,0 +1,106 @@
+"""
+Measures how long each inference backend takes to run the model over one window.
+
+    python -m harmony_dashboard.benchmarks.backend_latency
+"""
+
+from argparse import ArgumentParser
+import time
+
+import numpy as np
+
+from ..pitch_detection.basic_pitch_detector import AUDIO_N_SAMPLES
+from ..pitch_detection.inference_backends import (
+    I_InferenceBackend,
+    InferenceBackend,
+    load_inference_backend,
+)
+
+WINDOW_LEN = AUDIO_N_SAMPLES
+
+
+def measure_backend_latency(
+    backend: InferenceBackend, n_windows: int, n_warmup_windows: int
+) -> tuple[float, np.ndarray]:
+    """
+    Returns the load time and the latency of each window, in seconds
+    """
+    load_start_time = time.perf_counter()
+    inference_backend = load_inference_backend(backend)
+    load_sec = time.perf_counter() - load_start_time
+    return load_sec, time_model_windows(inference_backend, n_windows, n_warmup_windows)
+
+
+def time_model_windows(
+    inference_backend: I_InferenceBackend, n_windows: int, n_warmup_windows: int
+) -> np.ndarray:
+    """
+    Runs the model over n_warmup_windows untimed, then over n_windows timed.  Returns
+    the latency of each timed window, in seconds.
+    """
+    rng = np.random.default_rng(0)
+    window = (0.1 * rng.standard_normal((1, WINDOW_LEN, 1))).astype(np.float32)
+    for _ in range(n_warmup_windows):
+        inference_backend.predict(window)
+    latencies_sec = np.zeros(shape=(n_windows,))
+    for window_idx in range(n_windows):
+        start_time = time.perf_counter()
+        inference_backend.predict(window)
+        latencies_sec[window_idx] = time.perf_counter() - start_time
+    return latencies_sec
+
+
+def main(backends: list[InferenceBackend], n_windows: int, n_warmup_windows: int):
+    print(f"{'backend':<12} {'load ms':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for backend in backends:
+        try:
+            load_sec, latencies_sec = measure_backend_latency(
+                backend, n_windows, n_warmup_windows
+            )
+        except ImportError as e:
+            print(f"{backend.name.lower():<12} unavailable: {e}")
+            continue
+        print(
+            f"{backend.name.lower():<12} {1000 * load_sec:>9.1f} "
+            f"{1000 * np.mean(latencies_sec):>9.1f} "
+            f"{1000 * np.percentile(latencies_sec, 50):>9.1f} "
+            f"{1000 * np.percentile(latencies_sec, 95):>9.1f}"
+        )
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-b",
+        "--backends",
+        help="Which backends to measure.  Defaults to all of them",
+        required=False,
+        nargs="+",
+        choices=[backend.name.lower() for backend in InferenceBackend],
+        default=[backend.name.lower() for backend in InferenceBackend],
+    )
+    parser.add_argument(
+        "-n",
+        "--n_windows",
+        help="How many windows to time per backend",
+        required=False,
+        type=int,
+        default=50,
+    )
+    parser.add_argument(
+        "--n_warmup_windows",
+        help="How many windows to run, untimed, before timing",
+        required=False,
+        type=int,
+        default=5,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(
+        backends=[InferenceBackend[backend.upper()] for backend in args.backends],
+        n_windows=args.n_windows,
+        n_warmup_windows=args.n_warmup_windows,
+    )
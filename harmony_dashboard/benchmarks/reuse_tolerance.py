@@ -0,0 +1,170 @@
+"""
+Measures, for a range of reuse tolerances (see ResultReuseGate), how many windows
+would skip pitch detection and how often the reused pitches differ from the ones
+the model would have detected.
+
+    python -m harmony_dashboard.benchmarks.reuse_tolerance -i song.wav
+
+Audio is cut into hops as PitchDetectingAudioStreamer would when detection keeps
+up.  The model runs over every window once, so each tolerance is only a replay of
+the gate's decisions.  Without -i, a synthesized chord progression is used.
+"""
+
+from argparse import ArgumentParser
+
+import numpy as np
+
+from ..offline_analysis import (
+    add_analysis_arguments,
+    load_audio_file,
+    parse_inference_backend,
+)
+from ..pitch_detection.inference_backends import InferenceBackend
+from ..real_time_basic_pitch import PitchDetectingAudioStreamer
+from ..result_reuse_gate import ResultReuseGate
+
+SAMPLE_RATE = PitchDetectingAudioStreamer.SAMPLE_RATE
+
+
+def synthesize_chord_progression(chord_sec: float = 2.0) -> np.ndarray:
+    """
+    C, Am, F, G, with a few harmonics per note and some room noise
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(int(chord_sec * SAMPLE_RATE)) / SAMPLE_RATE
+    chords = []
+    for chord in ([60, 64, 67], [57, 60, 64], [53, 57, 60], [55, 59, 62]):
+        chords.append(
+            sum(
+                0.1
+                / harmonic
+                * np.exp(-t)
+                * np.sin(2 * np.pi * 440.0 * 2 ** ((pitch - 69) / 12) * harmonic * t)
+                for pitch in chord
+                for harmonic in range(1, 5)
+            )
+        )
+    audio = np.concatenate(chords)
+    return (audio + 0.001 * rng.standard_normal(audio.shape[0])).astype(np.float32)
+
+
+def windows_of(
+    audio: np.ndarray, hop_len: int, window_len: int | None
+) -> list[tuple[np.ndarray, int]]:
+    """
+    Returns each window handed to the detector, and its stream position
+    """
+    windows = []
+    for hop_end in range(hop_len, audio.shape[0] + 1, hop_len):
+        window_start = (
+            hop_end - hop_len if window_len is None else max(hop_end - window_len, 0)
+        )
+        windows.append((audio[window_start:hop_end], hop_end))
+    return windows
+
+
+def replay_gate(
+    windows: list[tuple[np.ndarray, int]],
+    detected_pitches: list[list[int]],
+    hop_len: int,
+    tolerance: float,
+    max_reuse_sec: float,
+) -> tuple[float, float]:
+    """
+    Returns the hit rate, and the fraction of reused windows whose pitches differ
+    from the ones detected in them
+    """
+    gate = ResultReuseGate(
+        sample_rate=SAMPLE_RATE, tolerance=tolerance, max_reuse_sec=max_reuse_sec
+    )
+    n_mismatched = 0
+    for (samples, _), pitches in zip(windows, detected_pitches):
+        reused_pitches = gate.reusable_pitches(samples, hop_len)
+        if reused_pitches is None:
+            gate.record_detected_pitches(pitches)
+        elif sorted(reused_pitches) != sorted(pitches):
+            n_mismatched += 1
+    stats = gate.get_stats()
+    return stats.hit_rate, n_mismatched / max(stats.windows_reused, 1)
+
+
+def main(
+    input_path: str | None,
+    inference_backend: InferenceBackend | None,
+    hop_sec: float,
+    analysis_window_sec: float | None,
+    tolerances: list[float],
+    max_reuse_sec: float,
+):
+    from ..pitch_detection.basic_pitch_detector import create_basic_pitch_detector
+
+    audio = (
+        synthesize_chord_progression()
+        if input_path is None
+        else load_audio_file(input_path, SAMPLE_RATE)
+    )
+    hop_len = int(hop_sec * SAMPLE_RATE)
+    windows = windows_of(
+        audio,
+        hop_len,
+        None if analysis_window_sec is None else int(analysis_window_sec * SAMPLE_RATE),
+    )
+    pitch_detector = create_basic_pitch_detector(
+        sliding_window=analysis_window_sec is not None,
+        min_freq_hz=PitchDetectingAudioStreamer.MIN_FREQ_HZ,
+        max_freq_hz=PitchDetectingAudioStreamer.MAX_FREQ_HZ,
+        inference_backend=inference_backend,
+    )
+    detected_pitches = [
+        pitch_detector.detect_pitches(samples, stream_position=stream_position)
+        for samples, stream_position in windows
+    ]
+    print(f"{'tolerance':>9} {'hit rate':>9} {'mismatched':>11}")
+    for tolerance in tolerances:
+        hit_rate, mismatch_rate = replay_gate(
+            windows, detected_pitches, hop_len, tolerance, max_reuse_sec
+        )
+        print(
+            f"{tolerance:>9.3f} {100 * hit_rate:>8.1f}% {100 * mismatch_rate:>10.1f}%"
+        )
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        help="Audio file to measure on.  Defaults to a synthesized chord progression",
+        required=False,
+        default=None,
+    )
+    add_analysis_arguments(parser)
+    parser.add_argument(
+        "-t",
+        "--tolerances",
+        help="Which reuse tolerances to measure",
+        required=False,
+        type=float,
+        nargs="+",
+        default=[0.01, 0.02, 0.05, 0.1, 0.2],
+    )
+    parser.add_argument(
+        "--max_reuse_sec",
+        help="Longest stretch of audio, in seconds, to reuse detected pitches for",
+        required=False,
+        type=float,
+        default=1.0,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(
+        input_path=args.input,
+        inference_backend=parse_inference_backend(args.inference_backend),
+        hop_sec=args.hop_sec,
+        analysis_window_sec=args.analysis_window_sec,
+        tolerances=args.tolerances,
+        max_reuse_sec=args.max_reuse_sec,
+    )
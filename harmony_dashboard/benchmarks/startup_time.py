@@ -0,0 +1,331 @@
+"""
+Measures how long the app takes, from launching python, to show its window and to
+report its first pitches.
+
+    python -m harmony_dashboard.benchmarks.startup_time --inference_backend onnx
+
+Each run launches a fresh interpreter, so every import is counted.  Unless an audio
+file is given with -i, a synthesized chord is streamed in real time in place of the
+mic.  --no_ui skips the window, for machines without a display, and only measures
+time to first pitch.
+
+Each run also reports which model runtimes the app imported.  Run it with
+TensorFlow installed and --inference_backend onnx (or tflite) to check that the
+lighter backend's startup doesn't pay for importing TensorFlow too.
+"""
+
+from argparse import ArgumentParser
+import json
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+
+# Imports nothing heavy, so the child's clock starts almost as soon as python does
+from ..app import I_HarmonyPresenter
+from ..harmony_domain import HarmonyState
+from ..pitch_detection.inference_backends import InferenceBackend
+from ..real_time_basic_pitch import I_AudioStreamer
+
+# Modules whose import means a model runtime was loaded
+MODEL_RUNTIME_MODULES = ("tensorflow", "tflite_runtime", "onnxruntime", "coremltools")
+
+
+class SynthesizedChordStreamer(I_AudioStreamer):
+    """
+    Streams a C major chord, paced like a mic, until stopped
+    """
+
+    def __init__(self, block_len: int = 1024):
+        self.block_len = block_len
+
+    def stream_audio(
+        self,
+        sample_rate: int,
+        num_audio_channels: int,
+        callback: Callable[[np.ndarray], None],
+        threading_event: threading.Event,
+    ):
+        t = np.arange(sample_rate) / sample_rate
+        chord = sum(
+            0.1 * np.sin(2 * np.pi * freq_hz * t) for freq_hz in (261.6, 329.6, 392.0)
+        ).astype(np.float32)[:, np.newaxis]
+        block_start = 0
+        next_block_time = time.perf_counter()
+        while not threading_event.is_set():
+            block = np.take(
+                chord,
+                range(block_start, block_start + self.block_len),
+                axis=0,
+                mode="wrap",
+            )
+            callback(block)
+            block_start = (block_start + self.block_len) % chord.shape[0]
+            next_block_time += self.block_len / sample_rate
+            threading_event.wait(max(next_block_time - time.perf_counter(), 0))
+
+
+class StartupTimingPresenterDecorator(I_HarmonyPresenter):
+    """
+    Records when the window first appears and when the first pitches are reported,
+    then closes the app.  Without an underlying presenter, only waits for the first
+    pitches.
+    """
+
+    def __init__(self, underlying_presenter, timeout_sec: float):
+        # A TkinterAdapter, or None
+        self.underlying_presenter = underlying_presenter
+        self.timeout_sec = timeout_sec
+        self.first_window_time = None
+        self.first_pitch_time = None
+        self.first_pitch_event = threading.Event()
+        self.poll_period_ms = 10
+
+    def update_harmony_state(self, state: HarmonyState):
+        if state.notes_detected and not self.first_pitch_event.is_set():
+            self.first_pitch_time = time.time()
+            self.first_pitch_event.set()
+        if self.underlying_presenter is not None:
+            self.underlying_presenter.update_harmony_state(state)
+
+    def run_ui_until_stopped_by_user(self):
+        if self.underlying_presenter is None:
+            self.first_pitch_event.wait(self.timeout_sec)
+            return
+        ui = self.underlying_presenter.ui
+        ui.after(0, self._record_first_window)
+        self.deadline = time.time() + self.timeout_sec
+        ui.after(self.poll_period_ms, self._close_once_pitches_reported)
+        self.underlying_presenter.run_ui_until_stopped_by_user()
+
+    def pitch_detection_loading(self):
+        if self.underlying_presenter is not None:
+            self.underlying_presenter.pitch_detection_loading()
+
+    def pitch_detection_ready(self):
+        if self.underlying_presenter is not None:
+            self.underlying_presenter.pitch_detection_ready()
+
+    def pitch_detection_failed(self, error: Exception):
+        # Stops waiting for pitches that will never come
+        self.first_pitch_event.set()
+        if self.underlying_presenter is not None:
+            self.underlying_presenter.pitch_detection_failed(error)
+
+    def _record_first_window(self):
+        # Make sure the window has actually been drawn
+        self.underlying_presenter.ui.update_idletasks()
+        self.first_window_time = time.time()
+
+    def _close_once_pitches_reported(self):
+        ui = self.underlying_presenter.ui
+        if self.first_pitch_event.is_set() or time.time() > self.deadline:
+            ui.quit()
+        else:
+            ui.after(self.poll_period_ms, self._close_once_pitches_reported)
+
+
+def measure_startup_once(
+    pitch_detector: str,
+    inference_backend: str | None,
+    inference_in_process: bool,
+    playback_input_path: str | None,
+    no_ui: bool,
+    timeout_sec: float,
+):
+    """
+    Runs in the child process.  Starts the app much like __main__ does, and prints
+    the wall clock times of the first window and the first pitches, and the model
+    runtimes imported, as json.
+    """
+    from ..app import App
+    from ..harmony import HarmonyModule
+    from ..note_tracking import NoteTrackingHarmonyAnalyzerDecorator
+
+    if playback_input_path is None:
+        audio_streamer = SynthesizedChordStreamer()
+    else:
+        from ..file_playback_integration import FilePlaybackIntegration
+
+        audio_streamer = FilePlaybackIntegration(playback_input_path)
+    if pitch_detector == "chroma":
+        from ..real_time_chroma import ChromaPitchStreamer
+
+        pitch_streamer = ChromaPitchStreamer(audio_streamer=audio_streamer)
+    else:
+        from ..real_time_basic_pitch import PitchDetectingAudioStreamer
+
+        pitch_streamer = PitchDetectingAudioStreamer(
+            audio_streamer=audio_streamer,
+            inference_in_process=inference_in_process,
+            inference_backend=(
+                None
+                if inference_backend is None
+                else InferenceBackend[inference_backend.upper()]
+            ),
+        )
+    if no_ui:
+        underlying_presenter = None
+    else:
+        from ..ui import TkinterAdapter
+
+        underlying_presenter = TkinterAdapter()
+    presenter = StartupTimingPresenterDecorator(
+        underlying_presenter=underlying_presenter, timeout_sec=timeout_sec
+    )
+    App(
+        pitch_streamer=pitch_streamer,
+        harmony_analyzer=NoteTrackingHarmonyAnalyzerDecorator(
+            underlying_analyzer=HarmonyModule()
+        ),
+        presenter=presenter,
+    ).run()
+    print(
+        json.dumps(
+            {
+                "first_window_time": presenter.first_window_time,
+                "first_pitch_time": presenter.first_pitch_time,
+                "imported_runtimes": [
+                    module_name
+                    for module_name in MODEL_RUNTIME_MODULES
+                    if module_name in sys.modules
+                ],
+            }
+        )
+    )
+
+
+def format_sec(times_sec: list[float | None]) -> str:
+    if any(time_sec is None for time_sec in times_sec):
+        return "n/a"
+    return f"{np.mean(times_sec):.2f}"
+
+
+def main(child_args: list[str], n_runs: int):
+    print(f"{'run':>4} {'first window s':>15} {'first pitch s':>14}  runtimes imported")
+    first_window_secs = []
+    first_pitch_secs = []
+    for run_idx in range(n_runs):
+        launch_time = time.time()
+        child = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "harmony_dashboard.benchmarks.startup_time",
+                *child_args,
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        # Anything the app printed along the way comes first
+        times = json.loads(child.stdout.strip().splitlines()[-1])
+        first_window_secs.append(
+            None
+            if times["first_window_time"] is None
+            else times["first_window_time"] - launch_time
+        )
+        first_pitch_secs.append(
+            None
+            if times["first_pitch_time"] is None
+            else times["first_pitch_time"] - launch_time
+        )
+        print(
+            f"{run_idx:>4} {format_sec(first_window_secs[-1:]):>15} "
+            f"{format_sec(first_pitch_secs[-1:]):>14}  "
+            f"{', '.join(times['imported_runtimes']) or 'none'}"
+        )
+    print(
+        f"{'mean':>4} {format_sec(first_window_secs):>15} "
+        f"{format_sec(first_pitch_secs):>14}"
+    )
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--pitch_detector",
+        help="Which pitch detector to start",
+        required=False,
+        choices=["basic_pitch", "chroma"],
+        default="basic_pitch",
+    )
+    parser.add_argument(
+        "--inference_backend",
+        help="Which serialization of the basic pitch model to load.  Defaults to whichever runtime basic pitch finds installed",
+        required=False,
+        choices=[backend.name.lower() for backend in InferenceBackend],
+        default=None,
+    )
+    parser.add_argument(
+        "--inference_in_process",
+        help="If set, basic pitch runs in a separate process",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-i",
+        "--playback_input",
+        help="If provided, this audio file is played back instead of a synthesized chord",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--no_ui",
+        help="If set, no window is shown, and only time to first pitch is measured",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--timeout_sec",
+        help="How long to wait for the first pitches before giving up on a run",
+        required=False,
+        type=float,
+        default=120.0,
+    )
+    parser.add_argument(
+        "-n",
+        "--n_runs",
+        help="How many times to start the app",
+        required=False,
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "--measure_once",
+        help="Internal: start the app once in this process and print the times as json",
+        action="store_true",
+    )
+    return parser.parse_args()
+
+
+def child_args(args) -> list[str]:
+    """
+    The arguments that tell a child process to start the app the same way
+    """
+    measure_args = ["--measure_once", "--pitch_detector", args.pitch_detector]
+    if args.inference_backend is not None:
+        measure_args += ["--inference_backend", args.inference_backend]
+    if args.inference_in_process:
+        measure_args.append("--inference_in_process")
+    if args.playback_input is not None:
+        measure_args += ["--playback_input", args.playback_input]
+    if args.no_ui:
+        measure_args.append("--no_ui")
+    return measure_args + ["--timeout_sec", str(args.timeout_sec)]
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.measure_once:
+        measure_startup_once(
+            pitch_detector=args.pitch_detector,
+            inference_backend=args.inference_backend,
+            inference_in_process=args.inference_in_process,
+            playback_input_path=args.playback_input,
+            no_ui=args.no_ui,
+            timeout_sec=args.timeout_sec,
+        )
+    else:
+        main(child_args=child_args(args), n_runs=args.n_runs)
@@ -0,0 +1,146 @@
+"""
+Sweeps model thread counts and CPU pinning, reporting the latency and jitter of
+running the model over one window with each setting.
+
+    python -m harmony_dashboard.benchmarks.thread_sweep --backend onnx
+
+Model runtimes only take thread settings before they start, so each setting is
+measured in a fresh process.
+"""
+
+from argparse import ArgumentParser
+import itertools
+import multiprocessing
+import os
+
+import numpy as np
+
+from ..cpu_affinity import pin_current_thread_to_cores
+from ..pitch_detection.inference_backends import (
+    InferenceBackend,
+    InferenceThreadConfig,
+    load_inference_backend,
+)
+from .backend_latency import time_model_windows
+
+
+def measure_latencies(
+    backend: InferenceBackend,
+    thread_config: InferenceThreadConfig,
+    cpu_cores: list[int] | None,
+    n_windows: int,
+    n_warmup_windows: int,
+) -> np.ndarray:
+    """
+    Runs in a child process.  Returns the latency of each window, in seconds.
+    """
+    if cpu_cores is not None:
+        pin_current_thread_to_cores(cpu_cores)
+    inference_backend = load_inference_backend(backend, thread_config)
+    return time_model_windows(inference_backend, n_windows, n_warmup_windows)
+
+
+def default_thread_counts() -> list[int]:
+    n_cores = os.cpu_count() or 1
+    return sorted({1, 2, max(n_cores // 2, 1), n_cores})
+
+
+def main(
+    backend: InferenceBackend,
+    intra_op_thread_counts: list[int],
+    inter_op_thread_counts: list[int],
+    core_sets: list[list[int] | None],
+    n_windows: int,
+    n_warmup_windows: int,
+):
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"{'intra':>5} {'inter':>5} {'cores':>10} {'mean ms':>9} {'p95 ms':>9} "
+        f"{'jitter ms':>10}"
+    )
+    for intra_op_threads, inter_op_threads, cpu_cores in itertools.product(
+        intra_op_thread_counts, inter_op_thread_counts, core_sets
+    ):
+        thread_config = InferenceThreadConfig(
+            intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads
+        )
+        with context.Pool(processes=1) as pool:
+            latencies_sec = pool.apply(
+                measure_latencies,
+                (backend, thread_config, cpu_cores, n_windows, n_warmup_windows),
+            )
+        cores_label = "all" if cpu_cores is None else ",".join(map(str, cpu_cores))
+        # Jitter is the spread of latencies around their mean
+        print(
+            f"{intra_op_threads:>5} {inter_op_threads:>5} {cores_label:>10} "
+            f"{1000 * np.mean(latencies_sec):>9.1f} "
+            f"{1000 * np.percentile(latencies_sec, 95):>9.1f} "
+            f"{1000 * np.std(latencies_sec):>10.1f}"
+        )
+
+
+def parse_core_set(core_set: str) -> list[int] | None:
+    return None if core_set == "all" else [int(core) for core in core_set.split(",")]
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-b",
+        "--backend",
+        help="Which inference backend to measure",
+        required=False,
+        choices=[backend.name.lower() for backend in InferenceBackend],
+        default=InferenceBackend.ONNX.name.lower(),
+    )
+    parser.add_argument(
+        "--intra_op_threads",
+        help="Intra-op thread counts to try.  Defaults to 1, 2, half and all of the cores",
+        required=False,
+        type=int,
+        nargs="+",
+        default=default_thread_counts(),
+    )
+    parser.add_argument(
+        "--inter_op_threads",
+        help="Inter-op thread counts to try",
+        required=False,
+        type=int,
+        nargs="+",
+        default=[1, 2],
+    )
+    parser.add_argument(
+        "--core_sets",
+        help="Sets of cores to pin inference to, each comma separated (e.g. '2,3'), or 'all' for no pinning",
+        required=False,
+        nargs="+",
+        default=["all"],
+    )
+    parser.add_argument(
+        "-n",
+        "--n_windows",
+        help="How many windows to time per setting",
+        required=False,
+        type=int,
+        default=50,
+    )
+    parser.add_argument(
+        "--n_warmup_windows",
+        help="How many windows to run, untimed, before timing",
+        required=False,
+        type=int,
+        default=5,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(
+        backend=InferenceBackend[args.backend.upper()],
+        intra_op_thread_counts=args.intra_op_threads,
+        inter_op_thread_counts=args.inter_op_threads,
+        core_sets=[parse_core_set(core_set) for core_set in args.core_sets],
+        n_windows=args.n_windows,
+        n_warmup_windows=args.n_warmup_windows,
+    )
@@ -0,0 +1,201 @@
+from abc import ABC, abstractmethod
+import queue
+import threading
+from typing import Iterator
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+
+class I_AudioReader(ABC):
+    """
+    Hands out an audio file's samples, mono and at a fixed sample rate, without ever
+    blocking, so it can feed a real-time audio callback.
+
+    is_finished: whether every sample has been handed out
+    n_underruns: how often read_into came back short without being finished
+    error: why the audio ended early, if it did
+    """
+
+    is_finished: bool
+    n_underruns: int
+    error: Exception | None
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def wait_until_ready(self, timeout_sec: float | None = None) -> bool:
+        """
+        Waits until read_into has samples to hand out (or the audio turns out to be
+        empty or unreadable).  Returns whether it does, within timeout_sec.
+        """
+        return True
+
+    @abstractmethod
+    def read_into(self, out: np.ndarray) -> int:
+        """
+        Fills out (1-D) with as many of the next samples as are ready, and returns how
+        many that was
+        """
+        pass
+
+
+class I_DecodedAudioSink(ABC):
+    """
+    Gets a copy of everything ChunkedAudioReader decodes, on its read-ahead thread
+    """
+
+    @abstractmethod
+    def write(self, samples: np.ndarray):
+        pass
+
+    @abstractmethod
+    def finish(self, is_complete: bool):
+        """
+        Called once the reader is done.  is_complete is whether the whole file was
+        written, rather than decoding failing or being stopped partway.
+        """
+        pass
+
+
+class ChunkedAudioReader(I_AudioReader):
+    """
+    Reads an audio file a block at a time, so that memory use doesn't grow with the
+    length of the file and audio is ready as soon as the first block is decoded.
+
+    A read-ahead thread decodes blocks of block_len frames, mixes each down to mono
+    and resamples it to sample_rate with a streaming resampler, keeping up to
+    read_ahead_blocks of them queued.  read_into takes samples off the queue without
+    ever waiting, so it can be called from a real-time audio callback.  If the
+    read-ahead thread falls behind, read_into returns short and counts an underrun.
+
+    If decoding fails partway, the audio ends there and the error is kept in error.
+
+    If given a sink, every block is also written to it as it is decoded.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: int,
+        block_len: int = 16384,
+        read_ahead_blocks: int = 8,
+        sink: I_DecodedAudioSink | None = None,
+    ):
+        self.path = path
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.block_len = block_len
+        # Resampled mono blocks, then None once the file is used up
+        self.blocks = queue.Queue(maxsize=read_ahead_blocks)
+        self.stop_event = threading.Event()
+        self.read_ahead_thread = threading.Thread(target=self._read_ahead, daemon=True)
+        self.current_block = np.zeros(shape=(0,), dtype=np.float32)
+        self.current_block_offset = 0
+        self.is_finished = False
+        self.n_underruns = 0
+        self.error = None
+
+    def start(self):
+        self.read_ahead_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.read_ahead_thread.join()
+
+    def wait_until_ready(self, timeout_sec: float | None = None) -> bool:
+        try:
+            self.current_block = self._next_block(timeout_sec)
+        except queue.Empty:
+            return False
+        self.current_block_offset = 0
+        return True
+
+    def read_into(self, out: np.ndarray) -> int:
+        n_written = 0
+        while n_written < out.shape[0] and not self.is_finished:
+            if self.current_block_offset == self.current_block.shape[0]:
+                try:
+                    self.current_block = self._next_block(timeout_sec=0)
+                except queue.Empty:
+                    self.n_underruns += 1
+                    break
+                self.current_block_offset = 0
+                continue
+            n_copied = min(
+                out.shape[0] - n_written,
+                self.current_block.shape[0] - self.current_block_offset,
+            )
+            out[n_written : n_written + n_copied] = self.current_block[
+                self.current_block_offset : self.current_block_offset + n_copied
+            ]
+            n_written += n_copied
+            self.current_block_offset += n_copied
+        return n_written
+
+    def _next_block(self, timeout_sec: float | None) -> np.ndarray:
+        if self.is_finished:
+            return np.zeros(shape=(0,), dtype=np.float32)
+        block = (
+            self.blocks.get_nowait()
+            if timeout_sec == 0
+            else self.blocks.get(timeout=timeout_sec)
+        )
+        if block is None:
+            self.is_finished = True
+            return np.zeros(shape=(0,), dtype=np.float32)
+        return block
+
+    def _read_ahead(self):
+        is_complete = False
+        try:
+            for mono_block in self._decode_blocks():
+                if self.sink is not None:
+                    self.sink.write(mono_block)
+                if not self._enqueue(mono_block):
+                    break
+            else:
+                is_complete = True
+        except Exception as e:
+            self.error = e
+        if self.sink is not None:
+            self.sink.finish(is_complete)
+        self._enqueue(None)
+
+    def _decode_blocks(self) -> Iterator[np.ndarray]:
+        with sf.SoundFile(self.path) as audio_file:
+            resampler = (
+                None
+                if audio_file.samplerate == self.sample_rate
+                else soxr.ResampleStream(
+                    audio_file.samplerate, self.sample_rate, 1, dtype="float32"
+                )
+            )
+            for block in audio_file.blocks(
+                blocksize=self.block_len, dtype="float32", always_2d=True
+            ):
+                mono_block = np.mean(block, axis=1, dtype=np.float32)
+                if resampler is not None:
+                    mono_block = resampler.resample_chunk(mono_block)
+                yield mono_block
+            if resampler is not None:
+                # Flushes out what the resampler held back to look ahead
+                yield resampler.resample_chunk(
+                    np.zeros(shape=(0,), dtype=np.float32), last=True
+                )
+
+    def _enqueue(self, block: np.ndarray | None) -> bool:
+        """
+        Waits for room in the queue, unless stopped.  Returns whether block was queued.
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.blocks.put(block, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
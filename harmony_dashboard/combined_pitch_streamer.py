@@ -0,0 +1,121 @@
+import threading
+from typing import Callable
+
+from .app import I_PitchStreamer, I_PitchStreamListener
+
+
+def combine_pitches(
+    pitches_per_stream: list[list[int]], bass_stream_idx: int | None = None
+) -> list[int]:
+    """
+    Returns every stream's pitches, in ascending order without repeats.
+
+    The bass stream's pitches are moved down by octaves (keeping their pitch
+    classes) until they are below every other stream's, so the bass is the lowest
+    note heard, which is what ChordAnalyzer breaks ties between chord roots by.
+    """
+    other_pitches = [
+        pitch
+        for stream_idx, pitches in enumerate(pitches_per_stream)
+        if stream_idx != bass_stream_idx
+        for pitch in pitches
+    ]
+    if bass_stream_idx is None or not pitches_per_stream[bass_stream_idx]:
+        return sorted(set(other_pitches))
+    bass_pitches = pitches_per_stream[bass_stream_idx]
+    n_octaves_down = 0
+    if other_pitches and max(bass_pitches) >= min(other_pitches):
+        n_octaves_down = (max(bass_pitches) - min(other_pitches)) // 12 + 1
+    return sorted(
+        set(other_pitches) | {pitch - 12 * n_octaves_down for pitch in bass_pitches}
+    )
+
+
+class CombinedPitchStreamer(I_PitchStreamer):
+    """
+    Streams the pitches of several pitch streamers (e.g. one per channel of a
+    multitrack interface, see MultiChannelCapture) as one: whenever any of them
+    detects pitches, the listener gets the newest pitches of every stream combined
+    (see combine_pitches).  So one harmony analysis hears the whole band, while each
+    stream detects pitches in its own audio.
+
+    Each stream detects pitches on its own thread, so streams run on separate cores
+    as far as the model allows.  Give them one shared BatchedInferenceService to
+    load the model only once, and run it once per hop for every stream.
+
+    If bass_stream_idx is given, that stream's pitches are placed below the others',
+    so the bass decides the chord's root when the other pitches leave it open.
+    """
+
+    def __init__(
+        self,
+        pitch_streamers: list[I_PitchStreamer],
+        bass_stream_idx: int | None = None,
+    ):
+        assert bass_stream_idx is None or 0 <= bass_stream_idx < len(
+            pitch_streamers
+        ), "No such bass stream"
+        self.pitch_streamers = pitch_streamers
+        self.bass_stream_idx = bass_stream_idx
+        self.listener = None
+        # The listener (e.g. a harmony analyzer) is only ever called by one stream's
+        # thread at a time
+        self.lock = threading.Lock()
+        self.latest_pitches: list[list[int]] = [[] for _ in pitch_streamers]
+        for stream_idx, pitch_streamer in enumerate(pitch_streamers):
+            pitch_streamer.register_listener(_StreamPitchListener(self, stream_idx))
+
+    def register_listener(self, stream_listener: I_PitchStreamListener):
+        self.listener = stream_listener
+
+    def start_streaming(
+        self,
+        on_ready: Callable[[], None] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+    ):
+        n_not_ready = len(self.pitch_streamers)
+        has_failed = False
+        ready_lock = threading.Lock()
+
+        def on_stream_ready():
+            nonlocal n_not_ready
+            with ready_lock:
+                n_not_ready -= 1
+                all_ready = n_not_ready == 0 and not has_failed
+            if all_ready and on_ready is not None:
+                on_ready()
+
+        def on_stream_error(error: Exception):
+            nonlocal has_failed
+            with ready_lock:
+                is_first_error = not has_failed
+                has_failed = True
+            if is_first_error and on_error is not None:
+                on_error(error)
+
+        for pitch_streamer in self.pitch_streamers:
+            pitch_streamer.start_streaming(
+                on_ready=on_stream_ready, on_error=on_stream_error
+            )
+
+    def stop_streaming(self):
+        for pitch_streamer in self.pitch_streamers:
+            pitch_streamer.stop_streaming()
+
+    def new_stream_pitches(self, stream_idx: int, pitches: list[int]):
+        with self.lock:
+            self.latest_pitches[stream_idx] = list(pitches)
+            combined_pitches = combine_pitches(
+                self.latest_pitches, self.bass_stream_idx
+            )
+            if self.listener is not None:
+                self.listener.new_pitches_detected(combined_pitches)
+
+
+class _StreamPitchListener(I_PitchStreamListener):
+    def __init__(self, combined_streamer: CombinedPitchStreamer, stream_idx: int):
+        self.combined_streamer = combined_streamer
+        self.stream_idx = stream_idx
+
+    def new_pitches_detected(self, pitches: list[int]):
+        self.combined_streamer.new_stream_pitches(self.stream_idx, pitches)
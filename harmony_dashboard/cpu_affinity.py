@@ -0,0 +1,20 @@
+import os
+import sys
+
+
+def pin_current_thread_to_cores(cpu_cores: list[int]):
+    """
+    Restricts the calling thread, and any threads it goes on to create, to the given
+    cores.  Threads created before the call keep running wherever they were allowed
+    to, so pin before loading a model if its thread pools should be pinned too.
+
+    Only supported on Linux.  Elsewhere, a warning is printed and nothing is pinned.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        print(
+            "Pinning to CPU cores is not supported on this platform, ignoring",
+            file=sys.stderr,
+        )
+        return
+    # On Linux, 0 means the calling thread rather than the whole process
+    os.sched_setaffinity(0, cpu_cores)
@@ -0,0 +1,128 @@
+"""
+Runs the analysis daemon until interrupted.  Submit jobs to it with
+harmony_dashboard.daemon.client.
+"""
+
+from argparse import ArgumentParser
+from functools import partial
+import signal
+import sys
+
+from ..harmony import HarmonyModule
+from ..note_tracking import NoteTrackingHarmonyAnalyzerDecorator
+from ..offline_analysis import add_analysis_arguments, parse_inference_backend
+from ..pitch_detection.basic_pitch_detector import (
+    FFT_HOP,
+    create_basic_pitch_detector,
+    load_basic_pitch_model,
+)
+from ..pitch_detection.batched_inference import BatchedInferenceService
+from ..pitch_detection.inference_backends import InferenceBackend
+from ..pitch_detection.pitch_detector import I_PitchDetector
+from ..pitch_detection.pitch_result_cache import (
+    CachingPitchDetector,
+    PitchResultCache,
+    basic_pitch_result_settings,
+    describe_pitch_result_cache_stats,
+)
+from ..real_time_basic_pitch import PitchDetectingAudioStreamer
+from .protocol import default_socket_path
+from .server import AnalysisDaemon
+
+
+def create_harmony_analyzer() -> NoteTrackingHarmonyAnalyzerDecorator:
+    return NoteTrackingHarmonyAnalyzerDecorator(underlying_analyzer=HarmonyModule())
+
+
+def main(
+    socket_path: str,
+    inference_backend: InferenceBackend | None,
+    hop_sec: float,
+    analysis_window_sec: float | None,
+    pitch_result_cache_path: str | None,
+):
+    inference_service = BatchedInferenceService(
+        load_basic_pitch_model(inference_backend)
+    )
+    inference_service.start()
+    create_basic_pitch_detector_for_job = partial(
+        create_basic_pitch_detector,
+        sliding_window=analysis_window_sec is not None,
+        min_freq_hz=PitchDetectingAudioStreamer.MIN_FREQ_HZ,
+        max_freq_hz=PitchDetectingAudioStreamer.MAX_FREQ_HZ,
+        model=inference_service,
+    )
+    # Shared by every job's detector
+    pitch_result_cache = (
+        None
+        if pitch_result_cache_path is None
+        else PitchResultCache(pitch_result_cache_path)
+    )
+
+    def create_pitch_detector() -> I_PitchDetector:
+        pitch_detector = create_basic_pitch_detector_for_job()
+        if pitch_result_cache is None:
+            return pitch_detector
+        return CachingPitchDetector(
+            underlying_detector=pitch_detector,
+            cache=pitch_result_cache,
+            settings=basic_pitch_result_settings(
+                analysis_window_sec is not None,
+                inference_backend,
+                PitchDetectingAudioStreamer.MIN_FREQ_HZ,
+                PitchDetectingAudioStreamer.MAX_FREQ_HZ,
+            ),
+            stream_frame_len=None if analysis_window_sec is None else FFT_HOP,
+        )
+
+    create_pitch_detector().warm_up()
+    daemon = AnalysisDaemon(
+        socket_path=socket_path,
+        create_pitch_detector=create_pitch_detector,
+        create_harmony_analyzer=create_harmony_analyzer,
+        sample_rate=PitchDetectingAudioStreamer.SAMPLE_RATE,
+        hop_sec=hop_sec,
+        analysis_window_sec=analysis_window_sec,
+    )
+    # Clean up when stopped by a service manager too, not just by Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Listening for analysis jobs at {socket_path}")
+    try:
+        daemon.serve_until_shut_down()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+        inference_service.stop()
+        if pitch_result_cache is not None:
+            print(describe_pitch_result_cache_stats(pitch_result_cache.get_stats()))
+            pitch_result_cache.close()
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--socket_path",
+        help="Where to listen for jobs",
+        required=False,
+        default=default_socket_path(),
+    )
+    add_analysis_arguments(parser)
+    parser.add_argument(
+        "--pitch_result_cache",
+        help="If a file path is provided, pitches detected in each window are stored in that database (created if need be) and looked up before running the model, so that analyzing the same audio again skips inference",
+        required=False,
+        default=None,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(
+        socket_path=args.socket_path,
+        inference_backend=parse_inference_backend(args.inference_backend),
+        hop_sec=args.hop_sec,
+        analysis_window_sec=args.analysis_window_sec,
+        pitch_result_cache_path=args.pitch_result_cache,
+    )
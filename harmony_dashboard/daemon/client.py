@@ -0,0 +1,174 @@
+"""
+Thin client for the analysis daemon.  Only uses the standard library, so it starts
+in a fraction of the time the app does.
+
+    python -m harmony_dashboard.daemon.client analyze song.wav
+    python -m harmony_dashboard.daemon.client csv song.wav -o song.csv
+    ffmpeg -i song.mp3 -f f32le -ac 1 - | \\
+        python -m harmony_dashboard.daemon.client stream --sample_rate 44100
+
+analyze and stream print one JSON line per hop analyzed.
+"""
+
+from argparse import ArgumentParser
+import csv
+import json
+import os
+import socket
+import sys
+import threading
+from typing import BinaryIO, Iterable, Iterator
+
+from .protocol import (
+    ANALYZE_FILE_JOB,
+    CSV_LOG_JOB,
+    STREAM_PCM_JOB,
+    default_socket_path,
+    read_message,
+    send_message,
+    send_pcm_chunk,
+)
+
+# Bytes of float32 samples read from stdin at a time
+PCM_CHUNK_BYTES = 4 * 4096
+
+
+class DaemonJobError(Exception):
+    pass
+
+
+class DaemonNotListeningError(Exception):
+    pass
+
+
+def submit_job(
+    job: dict,
+    socket_path: str | None = None,
+    pcm_chunks: Iterable[bytes] | None = None,
+) -> Iterator[dict]:
+    """
+    Sends the job to the daemon and yields its results as they arrive.  For a
+    stream_pcm job, pcm_chunks are the float32 samples to stream.
+    """
+    socket_path = socket_path or default_socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise DaemonNotListeningError(
+                f"No analysis daemon is listening at {socket_path}"
+            ) from e
+        request_stream = connection.makefile("wb")
+        response_stream = connection.makefile("rb")
+        send_message(request_stream, job)
+        if pcm_chunks is not None:
+            # Sent from another thread, so results can be read while audio is still
+            # being sent, without either end's socket buffer filling up
+            threading.Thread(
+                target=_send_pcm_chunks,
+                args=(request_stream, pcm_chunks),
+                daemon=True,
+            ).start()
+        while True:
+            message = read_message(response_stream)
+            if message is None:
+                raise DaemonJobError("Daemon hung up before finishing the job")
+            if "error" in message:
+                raise DaemonJobError(message["error"])
+            if message.get("done"):
+                return
+            yield message
+
+
+def _send_pcm_chunks(request_stream: BinaryIO, pcm_chunks: Iterable[bytes]):
+    try:
+        for chunk in pcm_chunks:
+            if chunk:
+                send_pcm_chunk(request_stream, chunk)
+        send_pcm_chunk(request_stream, b"")
+    except OSError:
+        # The daemon gave up on the job, and will say why
+        pass
+
+
+def _read_chunks(stream: BinaryIO) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(PCM_CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+def main(args):
+    if args.command == "analyze":
+        job = {"job": ANALYZE_FILE_JOB, "path": os.path.abspath(args.path)}
+        for message in submit_job(job, args.socket_path):
+            print(json.dumps(message), flush=True)
+    elif args.command == "csv":
+        job = {"job": CSV_LOG_JOB, "path": os.path.abspath(args.path)}
+        with (
+            open(args.output, "w", newline="")
+            if args.output is not None
+            else open(sys.stdout.fileno(), "w", newline="", closefd=False)
+        ) as f:
+            writer = csv.writer(f)
+            for message in submit_job(job, args.socket_path):
+                writer.writerow(message["csv_row"])
+    else:
+        job = {"job": STREAM_PCM_JOB, "sample_rate": args.sample_rate}
+        for message in submit_job(
+            job, args.socket_path, pcm_chunks=_read_chunks(sys.stdin.buffer)
+        ):
+            print(json.dumps(message), flush=True)
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--socket_path",
+        help="Where the daemon is listening.  Defaults to the daemon's default",
+        required=False,
+        default=None,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    analyze_parser = commands.add_parser(
+        "analyze", help="Print the pitches and harmony of each hop of an audio file"
+    )
+    analyze_parser.add_argument("path", help="Audio file to analyze")
+    csv_parser = commands.add_parser(
+        "csv", help="Write the harmony log the app would write for an audio file"
+    )
+    csv_parser.add_argument("path", help="Audio file to analyze")
+    csv_parser.add_argument(
+        "-o",
+        "--output",
+        help="Where to write the log.  Defaults to stdout",
+        required=False,
+        default=None,
+    )
+    stream_parser = commands.add_parser(
+        "stream",
+        help="Print the pitches and harmony of each hop of little-endian float32 mono audio read from stdin",
+    )
+    stream_parser.add_argument(
+        "--sample_rate",
+        help="Sample rate of the audio on stdin",
+        required=True,
+        type=int,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        main(args)
+    except DaemonNotListeningError as e:
+        print(
+            f"{e}.  Start one with 'python -m harmony_dashboard.daemon'",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    except DaemonJobError as e:
+        print(f"Job failed: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,74 @@
+"""
+What the analysis daemon and its clients say to each other over a Unix domain
+socket.  Only uses the standard library, so that clients start instantly.
+
+Each connection carries one job.  The client sends a single JSON line describing it:
+
+    {"job": "analyze_file", "path": "/abs/path/song.wav"}
+    {"job": "csv_log", "path": "/abs/path/song.wav"}
+    {"job": "stream_pcm", "sample_rate": 44100}
+
+A stream_pcm job is then followed by chunks of little-endian float32 mono samples,
+each preceded by its length in bytes (a little-endian uint32).  An empty chunk ends
+the stream.
+
+The daemon answers with JSON lines as results become available, and finishes with
+{"done": true}, or {"error": "..."} if the job failed.
+"""
+
+import json
+import os
+from pathlib import Path
+import struct
+from typing import BinaryIO
+
+ANALYZE_FILE_JOB = "analyze_file"
+CSV_LOG_JOB = "csv_log"
+STREAM_PCM_JOB = "stream_pcm"
+
+PCM_CHUNK_HEADER = struct.Struct("<I")
+
+
+def default_socket_path() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "harmony_dashboard.sock")
+    return str(Path.home() / ".cache" / "harmony_dashboard" / "daemon.sock")
+
+
+def send_message(stream: BinaryIO, message: dict):
+    stream.write(json.dumps(message).encode() + b"\n")
+    stream.flush()
+
+
+def read_message(stream: BinaryIO) -> dict | None:
+    """
+    Returns None if the other end hung up
+    """
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def send_pcm_chunk(stream: BinaryIO, samples: bytes):
+    """
+    Sending no samples ends the stream
+    """
+    stream.write(PCM_CHUNK_HEADER.pack(len(samples)))
+    stream.write(samples)
+    stream.flush()
+
+
+def read_pcm_chunk(stream: BinaryIO) -> bytes:
+    """
+    Returns no bytes once the stream has ended
+    """
+    header = stream.read(PCM_CHUNK_HEADER.size)
+    if len(header) < PCM_CHUNK_HEADER.size:
+        raise EOFError("Client hung up in the middle of a stream")
+    (n_bytes,) = PCM_CHUNK_HEADER.unpack(header)
+    samples = stream.read(n_bytes)
+    if len(samples) < n_bytes:
+        raise EOFError("Client hung up in the middle of a chunk")
+    return samples
@@ -0,0 +1,209 @@
+import os
+from pathlib import Path
+import socket
+import socketserver
+import sys
+from typing import BinaryIO, Callable, Iterator
+
+import numpy as np
+import soxr
+
+from ..app import I_HarmonyAnalyzer
+from ..harmony_state_logging import HarmonyLogFormatter
+from ..offline_analysis import (
+    AnalyzedHop,
+    OfflineHarmonyAnalysis,
+    harmony_log_rows,
+    load_audio_file,
+)
+from ..pitch_detection import I_PitchDetector
+from .protocol import (
+    ANALYZE_FILE_JOB,
+    CSV_LOG_JOB,
+    STREAM_PCM_JOB,
+    read_message,
+    read_pcm_chunk,
+    send_message,
+)
+
+
+class AnalysisDaemon:
+    """
+    Keeps pitch detection loaded and serves analysis jobs (see protocol) over a Unix
+    domain socket, so that analyzing a file doesn't mean importing TensorFlow and
+    loading the model every time.
+
+    Each connection is a job, handled on its own thread with its own pitch detector
+    and harmony analyzer (both are stateful), made by the given factories.  Give the
+    detectors a shared BatchedInferenceService and they'll share one loaded model,
+    batching together jobs that run at the same time.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        create_pitch_detector: Callable[[], I_PitchDetector],
+        create_harmony_analyzer: Callable[[], I_HarmonyAnalyzer],
+        sample_rate: int = 22050,
+        hop_sec: float = 0.2,
+        analysis_window_sec: float | None = None,
+    ):
+        self.socket_path = socket_path
+        self.create_pitch_detector = create_pitch_detector
+        self.create_harmony_analyzer = create_harmony_analyzer
+        self.sample_rate = sample_rate
+        self.hop_sec = hop_sec
+        self.analysis_window_sec = analysis_window_sec
+        self.log_formatter = HarmonyLogFormatter()
+        _remove_stale_socket(socket_path)
+        Path(socket_path).parent.mkdir(parents=True, exist_ok=True)
+        self.server = _JobServer(socket_path, self)
+
+    def serve_until_shut_down(self):
+        self.server.serve_forever()
+
+    def shut_down(self):
+        """
+        Stops serving, from any thread other than the serving one.  Jobs already
+        running are left to finish.
+        """
+        self.server.shutdown()
+
+    def close(self):
+        self.server.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def handle_job(self, request_stream: BinaryIO, response_stream: BinaryIO):
+        job = read_message(request_stream)
+        if job is None:
+            return
+        # Only stopped if it started
+        pitch_detector = None
+        try:
+            started_pitch_detector = self.create_pitch_detector()
+            started_pitch_detector.start()
+            pitch_detector = started_pitch_detector
+            analysis = OfflineHarmonyAnalysis(
+                pitch_detector=pitch_detector,
+                harmony_analyzer=self.create_harmony_analyzer(),
+                sample_rate=self.sample_rate,
+                hop_sec=self.hop_sec,
+                analysis_window_sec=self.analysis_window_sec,
+            )
+            job_type = job.get("job")
+            if job_type == ANALYZE_FILE_JOB:
+                for analyzed_hop in self._analyze_file(analysis, job["path"]):
+                    send_message(response_stream, self._hop_message(analyzed_hop))
+            elif job_type == CSV_LOG_JOB:
+                self._send_csv_log(analysis, job["path"], response_stream)
+            elif job_type == STREAM_PCM_JOB:
+                for analyzed_hop in self._analyze_pcm_stream(
+                    analysis, job["sample_rate"], request_stream
+                ):
+                    send_message(response_stream, self._hop_message(analyzed_hop))
+            else:
+                raise ValueError(f"Unknown job {job_type!r}")
+        except Exception as e:
+            self._send_last_message(
+                response_stream, {"error": f"{type(e).__name__}: {e}"}
+            )
+            return
+        finally:
+            if pitch_detector is not None:
+                pitch_detector.stop()
+        self._send_last_message(response_stream, {"done": True})
+
+    def _send_last_message(self, response_stream: BinaryIO, message: dict):
+        try:
+            send_message(response_stream, message)
+        except OSError as e:
+            # The client hung up, which is likely what failed the job to begin with
+            print(
+                f"Analysis client went away before the job ended: {e}", file=sys.stderr
+            )
+
+    def _analyze_file(
+        self, analysis: OfflineHarmonyAnalysis, path: str
+    ) -> Iterator[AnalyzedHop]:
+        audio = load_audio_file(path, self.sample_rate)
+        # A hop at a time, so results go out as soon as they're ready
+        for hop_start in range(0, audio.shape[0], analysis.hop_len):
+            yield from analysis.push(audio[hop_start : hop_start + analysis.hop_len])
+        yield from analysis.finish()
+
+    def _send_csv_log(
+        self, analysis: OfflineHarmonyAnalysis, path: str, response_stream: BinaryIO
+    ):
+        for row in harmony_log_rows(self._analyze_file(analysis, path)):
+            send_message(response_stream, {"csv_row": row})
+
+    def _analyze_pcm_stream(
+        self,
+        analysis: OfflineHarmonyAnalysis,
+        sample_rate: int,
+        request_stream: BinaryIO,
+    ) -> Iterator[AnalyzedHop]:
+        resampler = (
+            None
+            if sample_rate == self.sample_rate
+            else soxr.ResampleStream(sample_rate, self.sample_rate, 1, dtype="float32")
+        )
+        while True:
+            chunk = read_pcm_chunk(request_stream)
+            is_last_chunk = len(chunk) == 0
+            samples = np.frombuffer(chunk, dtype="<f4")
+            if resampler is not None:
+                samples = resampler.resample_chunk(samples, last=is_last_chunk)
+            yield from analysis.push(samples)
+            if is_last_chunk:
+                yield from analysis.finish()
+                return
+
+    def _hop_message(self, analyzed_hop: AnalyzedHop) -> dict:
+        state = analyzed_hop.harmony_state
+        return {
+            "end_sec": analyzed_hop.end_sec,
+            "pitches": analyzed_hop.pitches,
+            # Same fields as the harmony log, other than the time
+            "harmony": (
+                None
+                if state is None
+                else dict(
+                    zip(
+                        HarmonyLogFormatter.HEADER[1:],
+                        self.log_formatter.format_row(0, state)[1:],
+                    )
+                )
+            ),
+        }
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.analysis_daemon.handle_job(self.rfile, self.wfile)
+
+
+class _JobServer(socketserver.ThreadingUnixStreamServer):
+    # Don't let a job that is still running keep the daemon from exiting
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, analysis_daemon: AnalysisDaemon):
+        self.analysis_daemon = analysis_daemon
+        super().__init__(socket_path, _JobHandler)
+
+
+def _remove_stale_socket(socket_path: str):
+    """
+    Removes a socket file left behind by a daemon that didn't shut down cleanly, but
+    refuses to take over from one that is still listening
+    """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(socket_path)
+            return
+    raise RuntimeError(f"An analysis daemon is already listening at {socket_path}")
@@ -0,0 +1,175 @@
+import io
+import threading
+
+import pytest
+import numpy as np
+import soundfile as sf
+from unittest.mock import Mock
+
+from ...harmony import HarmonyModule
+from ...harmony_state_logging import HarmonyLogFormatter
+from ...pitch_detection import I_PitchDetector
+from ..client import DaemonJobError, DaemonNotListeningError, submit_job
+from ..protocol import ANALYZE_FILE_JOB, CSV_LOG_JOB, STREAM_PCM_JOB, send_message
+from ..server import AnalysisDaemon
+
+SAMPLE_RATE = 1000
+C_MAJOR = [60, 64, 67]
+
+
+class TestAnalysisDaemon:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self, tmp_path):
+        self.socket_path = str(tmp_path / "daemon.sock")
+        self.detectors_created = []
+        self.patient = AnalysisDaemon(
+            socket_path=self.socket_path,
+            create_pitch_detector=self.create_pitch_detector,
+            create_harmony_analyzer=HarmonyModule,
+            sample_rate=SAMPLE_RATE,
+            hop_sec=0.1,
+        )
+        serving_thread = threading.Thread(target=self.patient.serve_until_shut_down)
+        serving_thread.start()
+        self.audio_path = str(tmp_path / "silence.wav")
+        sf.write(self.audio_path, np.zeros(shape=(SAMPLE_RATE,)), SAMPLE_RATE)
+        yield
+        self.patient.shut_down()
+        serving_thread.join()
+        self.patient.close()
+
+    def create_pitch_detector(self):
+        pitch_detector = Mock(spec=I_PitchDetector)
+        pitch_detector.detect_pitches.return_value = C_MAJOR
+        self.detectors_created.append(pitch_detector)
+        return pitch_detector
+
+    def test_will_stream_back_each_hop_of_a_file(self):
+        results = list(
+            submit_job(
+                {"job": ANALYZE_FILE_JOB, "path": self.audio_path}, self.socket_path
+            )
+        )
+
+        assert [result["end_sec"] for result in results] == pytest.approx(
+            [0.1 * hop_idx for hop_idx in range(1, 11)]
+        )
+        assert results[-1]["pitches"] == C_MAJOR
+        assert results[-1]["harmony"]["chordRootNote"] == "C"
+        assert results[-1]["harmony"]["chordType"] == "MAJ"
+
+    def test_will_return_csv_log_rows_for_a_file(self):
+        rows = [
+            result["csv_row"]
+            for result in submit_job(
+                {"job": CSV_LOG_JOB, "path": self.audio_path}, self.socket_path
+            )
+        ]
+
+        assert rows[0] == HarmonyLogFormatter.HEADER
+        # The chord never changes, so is only logged once
+        assert len(rows) == 2
+        assert rows[1][0] == "100"
+        assert rows[1][3:] == ["C", "0", "MAJ"]
+
+    def test_will_analyze_streamed_pcm_frames(self):
+        samples = np.zeros(shape=(250,), dtype="<f4")
+        pcm_chunks = [samples[:130].tobytes(), samples[130:].tobytes()]
+
+        results = list(
+            submit_job(
+                {"job": STREAM_PCM_JOB, "sample_rate": SAMPLE_RATE},
+                self.socket_path,
+                pcm_chunks=pcm_chunks,
+            )
+        )
+
+        assert [result["end_sec"] for result in results] == pytest.approx(
+            [0.1, 0.2, 0.25]
+        )
+
+    def test_will_give_each_job_its_own_detector(self):
+        for _ in range(2):
+            list(
+                submit_job(
+                    {"job": ANALYZE_FILE_JOB, "path": self.audio_path},
+                    self.socket_path,
+                )
+            )
+
+        assert len(self.detectors_created) == 2
+        for pitch_detector in self.detectors_created:
+            pitch_detector.start.assert_called_once()
+            pitch_detector.stop.assert_called_once()
+
+    def test_will_report_failed_jobs(self):
+        with pytest.raises(DaemonJobError):
+            list(
+                submit_job(
+                    {"job": ANALYZE_FILE_JOB, "path": "/no/such/file.wav"},
+                    self.socket_path,
+                )
+            )
+
+    def test_will_report_detector_that_fails_to_start(self):
+        failing_detectors = []
+
+        def create_failing_pitch_detector():
+            pitch_detector = self.create_pitch_detector()
+            pitch_detector.start.side_effect = RuntimeError("model missing")
+            failing_detectors.append(pitch_detector)
+            return pitch_detector
+
+        self.patient.create_pitch_detector = create_failing_pitch_detector
+
+        with pytest.raises(DaemonJobError, match="model missing"):
+            list(
+                submit_job(
+                    {"job": ANALYZE_FILE_JOB, "path": self.audio_path},
+                    self.socket_path,
+                )
+            )
+        failing_detectors[0].stop.assert_not_called()
+
+    def test_will_report_detector_that_fails_to_load(self):
+        self.patient.create_pitch_detector = Mock(
+            side_effect=RuntimeError("model missing")
+        )
+
+        with pytest.raises(DaemonJobError, match="model missing"):
+            list(
+                submit_job(
+                    {"job": ANALYZE_FILE_JOB, "path": self.audio_path},
+                    self.socket_path,
+                )
+            )
+
+    def test_will_not_fail_when_client_hangs_up_mid_job(self, capsys):
+        request_stream = io.BytesIO()
+        send_message(request_stream, {"job": ANALYZE_FILE_JOB, "path": self.audio_path})
+        request_stream.seek(0)
+        response_stream = Mock(spec=io.BufferedIOBase)
+        response_stream.write.side_effect = BrokenPipeError("client hung up")
+
+        self.patient.handle_job(request_stream, response_stream)
+
+        assert "client hung up" in capsys.readouterr().err
+        self.detectors_created[0].stop.assert_called_once()
+
+    def test_will_refuse_to_take_over_a_listening_socket(self):
+        with pytest.raises(RuntimeError):
+            AnalysisDaemon(
+                socket_path=self.socket_path,
+                create_pitch_detector=self.create_pitch_detector,
+                create_harmony_analyzer=HarmonyModule,
+            )
+
+
+def test_will_report_when_no_daemon_is_listening(tmp_path):
+    with pytest.raises(DaemonNotListeningError):
+        list(
+            submit_job(
+                {"job": ANALYZE_FILE_JOB, "path": "song.wav"},
+                str(tmp_path / "daemon.sock"),
+            )
+        )
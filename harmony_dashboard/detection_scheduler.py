@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class DetectionSchedulerStats:
+    hop_sec: float
+    mean_inference_sec: float
+    stale_windows_skipped: int
+
+
+class DetectionScheduler:
+    """
+    Decides how much new audio to wait for before each pitch detection.
+
+    A sound that arrives just after a detection starts waits one hop to be picked up,
+    then waits for inference to finish, so the worst case latency is roughly
+    hop + inference time.  The hop therefore:
+    - defaults to the requested hop
+    - never drops below the (smoothed) inference time plus some headroom, since
+      detection could not keep up with the audio otherwise
+    - shrinks when needed to keep hop + inference time within the latency budget
+
+    When the budget can't be met, keeping up wins, and any backlog beyond the
+    current hop is treated as stale and skipped rather than analyzed late (unless the
+    audio waits for detection, see OverrunPolicy.BLOCK, in which case nothing is
+    stale).
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        target_hop_sec: float,
+        latency_budget_sec: float | None = None,
+    ):
+        self.sample_rate = sample_rate
+        self.target_hop_sec = target_hop_sec
+        self.latency_budget_sec = (
+            latency_budget_sec if latency_budget_sec is not None else 2 * target_hop_sec
+        )
+        # How much slack to leave between inference time and the hop
+        self.headroom_factor = 1.25
+        # Weight given to the newest inference time in the moving average
+        self.smoothing_factor = 0.2
+        self.mean_inference_sec = 0.0
+        self.stale_windows_skipped = 0
+
+    def next_hop_samples(self) -> int:
+        return max(int(self._next_hop_sec() * self.sample_rate), 1)
+
+    def record_inference_time(self, inference_sec: float):
+        if self.mean_inference_sec == 0.0:
+            self.mean_inference_sec = inference_sec
+        else:
+            self.mean_inference_sec += self.smoothing_factor * (
+                inference_sec - self.mean_inference_sec
+            )
+
+    def oldest_fresh_index(self, start_index: int, end_index: int) -> int:
+        """
+        Given the range of unread samples, returns where reading should start so that
+        at most one hop of backlog is analyzed.  Anything older is stale.
+        """
+        hop_samples = self.next_hop_samples()
+        # Allow some slack for audio callbacks not lining up with the hop
+        if end_index - start_index <= 2 * hop_samples:
+            return start_index
+        self.stale_windows_skipped += (end_index - start_index) // hop_samples - 1
+        return end_index - hop_samples
+
+    def get_stats(self) -> DetectionSchedulerStats:
+        return DetectionSchedulerStats(
+            hop_sec=self._next_hop_sec(),
+            mean_inference_sec=self.mean_inference_sec,
+            stale_windows_skipped=self.stale_windows_skipped,
+        )
+
+    def _next_hop_sec(self) -> float:
+        min_sustainable_hop_sec = self.mean_inference_sec * self.headroom_factor
+        max_hop_within_budget_sec = self.latency_budget_sec - self.mean_inference_sec
+        hop_sec = min(self.target_hop_sec, max_hop_within_budget_sec)
+        return max(hop_sec, min_sustainable_hop_sec)
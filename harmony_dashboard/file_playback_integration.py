@@ -1,17 +1,26 @@
-import soundfile as sf
 import sounddevice as sd
 from typing import Callable, Any
 import threading
 
 import numpy as np
 
+from .chunked_audio_reader import ChunkedAudioReader
+from .resampled_audio_cache import ResampledAudioCache
 from .real_time_basic_pitch import I_AudioStreamer
-import resampy
 
 
 class FilePlaybackIntegration(I_AudioStreamer):
-    def __init__(self, audio_file_path: str):
+    """
+    Plays an audio file back, streaming what is played.  Given an audio_cache, a
+    file played before starts from its cached, already resampled samples instead of
+    being decoded again.
+    """
+
+    def __init__(
+        self, audio_file_path: str, audio_cache: ResampledAudioCache | None = None
+    ):
         self.file_path = audio_file_path
+        self.audio_cache = audio_cache
 
     def stream_audio(
         self,
@@ -23,18 +32,22 @@ class FilePlaybackIntegration(I_AudioStreamer):
         MONO_CHANNELS = 1
         assert num_audio_channels == MONO_CHANNELS, "Only mono supported for playback!"
         try:
-            # This is fine for now but for larger audio files we will need to
-            # manage memory more responsibly
-            audio_data, original_sample_rate = sf.read(self.file_path)
-            resampled_audio = resampy.resample(
-                x=audio_data, sr_orig=original_sample_rate, sr_new=sample_rate
+            # Decoded and resampled a block at a time as playback goes, so a long
+            # recording starts playing straight away without being held in memory
+            # whole
+            audio_reader = (
+                ChunkedAudioReader(self.file_path, sample_rate)
+                if self.audio_cache is None
+                else self.audio_cache.open_reader(self.file_path, sample_rate)
             )
-            if resampled_audio.ndim != 1:
-                # downsample to mono if not already
-                resampled_audio = np.mean(resampled_audio, axis=1)
-            resampled_audio = resampled_audio[:, np.newaxis]
-
-            current_idx = 0
+        except OSError as e:
+            print(f"An error occurred: {e}")
+            return
+        audio_reader.start()
+        try:
+            audio_reader.wait_until_ready()
+            if audio_reader.error is not None:
+                raise audio_reader.error
 
             def forward_audio_chunk(
                 outdata: np.ndarray, frames: int, time: Any, status: sd.CallbackFlags
@@ -43,31 +56,31 @@ class FilePlaybackIntegration(I_AudioStreamer):
                 Feeds data to the outputstream and to our callback simultaneously
                 so that we can hear what the harmony analyzer is hearing
                 """
-                nonlocal current_idx
-                requested_end_idx = current_idx + frames
-                actual_end_idx = min(requested_end_idx, len(resampled_audio))
-                if actual_end_idx < requested_end_idx:
-                    available_block_size = actual_end_idx - current_idx
-                    outdata[:available_block_size] = resampled_audio[
-                        current_idx:actual_end_idx
-                    ]
-                    outdata[available_block_size:] = 0  # pad remainder with zeros
+                n_read = audio_reader.read_into(outdata[:, 0])
+                outdata[n_read:] = 0  # pad remainder with zeros
+                if n_read > 0:
+                    callback(outdata[:n_read])
+                if audio_reader.is_finished:
                     raise sd.CallbackStop()
-                else:
-                    outdata[:] = resampled_audio[current_idx:actual_end_idx]
-                current_idx = actual_end_idx
-                callback(outdata.copy())
 
             with sd.OutputStream(
                 samplerate=sample_rate,
                 channels=MONO_CHANNELS,
+                dtype="float32",
                 callback=forward_audio_chunk,
                 finished_callback=threading_event.set,
             ):
                 threading_event.wait()
+            if audio_reader.error is not None:
+                print(f"Playback stopped early: {audio_reader.error}")
+            if audio_reader.n_underruns > 0:
+                print(f"Decoding fell behind playback {audio_reader.n_underruns} times")
 
         except KeyboardInterrupt:
             print("\nStream killed by user.")
 
         except Exception as e:
             print(f"An error occurred: {e}")
+
+        finally:
+            audio_reader.stop()
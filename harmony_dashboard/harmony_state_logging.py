@@ -15,15 +15,22 @@ class TimestampedHarmonyState:
     harmony_state: HarmonyState
 
 
-class HarmonyStateLogger:
-    def __init__(self, log_output_path: str):
-        self.output_path = log_output_path
-        self.state_queue: deque[TimestampedHarmonyState] = deque([])
-        self.most_recent_state: HarmonyState | None = (
-            None  # Separately keep track of this because the queue gets emptied by the background thread regularly
-        )
-        self.start_time = self._current_time_ms()
-        self._initialize_log()
+class HarmonyLogFormatter:
+    """
+    Turns harmony states into the rows of a harmony log.  Only changes of scale or
+    chord are logged, not changes in the notes detected.
+    """
+
+    HEADER = [
+        "timeSinceStartMs",
+        "majScaleRootNote",
+        "majScaleRootAccidentalNum",
+        "chordRootNote",
+        "chordRootAccidentalNum",
+        "chordType",
+    ]
+
+    def __init__(self):
         self.note_name_to_str_map = {
             NoteName.A: "A",
             NoteName.B: "B",
@@ -42,6 +49,54 @@ class HarmonyStateLogger:
             ChordType.MAJ_SEVENTH: "MAJ_7",
             ChordType.DIM_SEVENTH: "DIM_7",
         }
+
+    def is_logged_change(
+        self, previous_state: HarmonyState | None, state: HarmonyState
+    ) -> bool:
+        if not previous_state:
+            return True
+        return (
+            state.current_major_scale != previous_state.current_major_scale
+            or state.current_chord != previous_state.current_chord
+        )
+
+    def format_row(self, time_since_start_ms: int, state: HarmonyState) -> list[str]:
+        maj_scale = state.current_major_scale
+        chord = state.current_chord
+        return [
+            str(time_since_start_ms),
+            self._convert_note_name_to_string(maj_scale.note_name) if maj_scale else "",
+            str(maj_scale.accidentals) if maj_scale else "",
+            self._convert_note_name_to_string(chord.root.note_name) if chord else "",
+            str(chord.root.accidentals) if chord else "",
+            self._convert_chord_type_to_string(chord.chord_type) if chord else "",
+        ]
+
+    def _convert_note_name_to_string(self, note_name: NoteName) -> str:
+        return (
+            self.note_name_to_str_map[note_name]
+            if note_name in self.note_name_to_str_map.keys()
+            else ""
+        )
+
+    def _convert_chord_type_to_string(self, chord_type: ChordType) -> str:
+        return (
+            self.chord_type_to_str_map[chord_type]
+            if chord_type in self.chord_type_to_str_map.keys()
+            else ""
+        )
+
+
+class HarmonyStateLogger:
+    def __init__(self, log_output_path: str):
+        self.output_path = log_output_path
+        self.state_queue: deque[TimestampedHarmonyState] = deque([])
+        self.most_recent_state: HarmonyState | None = (
+            None  # Separately keep track of this because the queue gets emptied by the background thread regularly
+        )
+        self.start_time = self._current_time_ms()
+        self.formatter = HarmonyLogFormatter()
+        self._initialize_log()
         self.threading_event = threading.Event()
         self.disk_writing_thread = threading.Thread(
             target=self._periodically_write_to_disk
@@ -49,14 +104,7 @@ class HarmonyStateLogger:
         self.disk_writing_thread.start()
 
     def log_harmony_state(self, state: HarmonyState):
-        # Don't care about note detection, only chord and scale changes
-        state_changed = True
-        if self.most_recent_state:
-            state_changed = (
-                state.current_major_scale != self.most_recent_state.current_major_scale
-                or state.current_chord != self.most_recent_state.current_chord
-            )
-        if state_changed:
+        if self.formatter.is_logged_change(self.most_recent_state, state):
             self.state_queue.append(
                 TimestampedHarmonyState(
                     time_since_start_ms=(self._current_time_ms() - self.start_time),
@@ -77,51 +125,16 @@ class HarmonyStateLogger:
                 time.sleep(LOG_UPDATE_PERIOD_S)
                 while len(self.state_queue) > 0:
                     state = self.state_queue.popleft()
-                    maj_scale = state.harmony_state.current_major_scale
-                    chord = state.harmony_state.current_chord
-                    row = [
-                        str(state.time_since_start_ms),
-                        self._convert_note_name_to_string(maj_scale.note_name)
-                        if maj_scale
-                        else "",
-                        str(maj_scale.accidentals) if maj_scale else "",
-                        self._convert_note_name_to_string(chord.root.note_name)
-                        if chord
-                        else "",
-                        str(chord.root.accidentals) if chord else "",
-                        self._convert_chord_type_to_string(chord.chord_type)
-                        if chord
-                        else "",
-                    ]
+                    row = self.formatter.format_row(
+                        state.time_since_start_ms, state.harmony_state
+                    )
                     writer.writerow(row)
 
-    def _convert_note_name_to_string(self, note_name: NoteName) -> str:
-        return (
-            self.note_name_to_str_map[note_name]
-            if note_name in self.note_name_to_str_map.keys()
-            else ""
-        )
-
-    def _convert_chord_type_to_string(self, chord_type: ChordType) -> str:
-        return (
-            self.chord_type_to_str_map[chord_type]
-            if chord_type in self.chord_type_to_str_map.keys()
-            else ""
-        )
-
     def _initialize_log(self):
         assert not Path(self.output_path).exists(), "ERROR: Log file already exists"
-        HEADER = [
-            "timeSinceStartMs",
-            "majScaleRootNote",
-            "majScaleRootAccidentalNum",
-            "chordRootNote",
-            "chordRootAccidentalNum",
-            "chordType",
-        ]
         with open(self.output_path, "a", newline="") as f:
             writer = csv.writer(f)
-            writer.writerow(HEADER)
+            writer.writerow(HarmonyLogFormatter.HEADER)
 
     def _current_time_ms(self) -> int:
         return int(time.time() * 1e3)
@@ -140,6 +153,15 @@ class LoggingHarmonyPresenterDecorator(I_HarmonyPresenter):
         self.underlying_presenter.run_ui_until_stopped_by_user()
         self.logger.stop_logging()
 
+    def pitch_detection_loading(self):
+        self.underlying_presenter.pitch_detection_loading()
+
+    def pitch_detection_ready(self):
+        self.underlying_presenter.pitch_detection_ready()
+
+    def pitch_detection_failed(self, error: Exception):
+        self.underlying_presenter.pitch_detection_failed(error)
+
 
 # TODO: We can make an implementation of I_HarmonyPresenter that will only log.  But this will require
 # something to tell it when to stop logging (e.g. a callback wired from the playback system?)
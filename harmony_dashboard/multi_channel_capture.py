@@ -0,0 +1,102 @@
+from abc import ABC, abstractmethod
+import threading
+from typing import Callable
+
+import numpy as np
+
+from .real_time_basic_pitch import I_AudioStreamer
+
+
+class MultiChannelCapture(ABC):
+    """
+    Captures n_channels at once from one device (e.g. a multitrack interface) and
+    hands them out one channel at a time (see channel), each as its own
+    I_AudioStreamer, so that each channel can feed its own PitchDetectingAudioStreamer
+    instead of being mixed down.
+
+    The device is captured while any of its channels are streaming: it is opened
+    when the first starts and closed when the last stops.  Each block is split into
+    one view per channel, so nothing is copied before the channels' callbacks (which
+    copy their channel into their own buffers).
+    """
+
+    def __init__(self, n_channels: int):
+        self.n_channels = n_channels
+        self.lock = threading.Lock()
+        # Replaced rather than changed, so the audio callback never sees it change
+        # midway
+        self.channel_callbacks: tuple[tuple[int, Callable[[np.ndarray], None]], ...] = (
+            ()
+        )
+        self.sample_rate = None
+
+    def channel(self, channel_idx: int) -> I_AudioStreamer:
+        assert 0 <= channel_idx < self.n_channels, "No such channel"
+        return _CapturedChannel(self, channel_idx)
+
+    def forward_block(self, block: np.ndarray):
+        """
+        Hands each channel of block, shape (n, n_channels), to that channel's
+        callback.  Meant to be called from the audio callback.
+        """
+        for channel_idx, callback in self.channel_callbacks:
+            callback(block[:, channel_idx])
+
+    @abstractmethod
+    def open_stream(self, sample_rate: int):
+        """
+        Starts capturing, calling forward_block with every block
+        """
+        pass
+
+    @abstractmethod
+    def close_stream(self):
+        pass
+
+    def attach(
+        self, channel_idx: int, sample_rate: int, callback: Callable[[np.ndarray], None]
+    ):
+        with self.lock:
+            assert self.sample_rate in (
+                None,
+                sample_rate,
+            ), "Channels of one capture must share a sample rate"
+            if not self.channel_callbacks:
+                self.sample_rate = sample_rate
+                self.open_stream(sample_rate)
+            self.channel_callbacks = (*self.channel_callbacks, (channel_idx, callback))
+
+    def detach(self, callback: Callable[[np.ndarray], None]):
+        with self.lock:
+            self.channel_callbacks = tuple(
+                channel_callback
+                for channel_callback in self.channel_callbacks
+                if channel_callback[1] is not callback
+            )
+            if not self.channel_callbacks:
+                self.sample_rate = None
+                self.close_stream()
+
+
+class _CapturedChannel(I_AudioStreamer):
+    def __init__(self, capture: MultiChannelCapture, channel_idx: int):
+        self.capture = capture
+        self.channel_idx = channel_idx
+
+    def stream_audio(
+        self,
+        sample_rate: int,
+        num_audio_channels: int,
+        callback: Callable[[np.ndarray], None],
+        threading_event: threading.Event,
+    ):
+        assert num_audio_channels == 1, "Each captured channel is mono"
+        try:
+            self.capture.attach(self.channel_idx, sample_rate, callback)
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            return
+        try:
+            threading_event.wait()
+        finally:
+            self.capture.detach(callback)
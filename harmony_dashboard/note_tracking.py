@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+
+from .app import I_HarmonyAnalyzer, I_HarmonyStateListener
+
+
+@dataclass
+class NoteChanges:
+    """
+    Pitches in midi numbers, each list in ascending order
+    """
+
+    note_ons: list[int]
+    note_offs: list[int]
+    active_pitches: list[int]
+
+
+class NoteTracker:
+    """
+    Keeps track of which notes are sounding across detection windows, turning the
+    pitches detected in each window into note-on and note-off events.
+
+    A note is turned off once it has been missing from release_windows windows in a
+    row, so a note that flickers out of a single window can be kept on.
+    """
+
+    def __init__(self, release_windows: int = 1):
+        assert release_windows >= 1, "Notes must be missing from at least one window"
+        self.release_windows = release_windows
+        self.window_index = 0
+        # Active pitch -> index of the window it was turned on in
+        self.onset_windows: dict[int, int] = {}
+        # Active pitch -> index of the last window it was detected in
+        self.last_seen_windows: dict[int, int] = {}
+
+    def update(self, pitches: list[int]) -> NoteChanges:
+        detected_pitches = set(pitches)
+        note_ons = sorted(detected_pitches - self.onset_windows.keys())
+        for pitch in note_ons:
+            self.onset_windows[pitch] = self.window_index
+        for pitch in detected_pitches:
+            self.last_seen_windows[pitch] = self.window_index
+        note_offs = sorted(
+            pitch
+            for pitch, last_seen_window in self.last_seen_windows.items()
+            if self.window_index - last_seen_window >= self.release_windows
+        )
+        for pitch in note_offs:
+            del self.onset_windows[pitch]
+            del self.last_seen_windows[pitch]
+        self.window_index += 1
+        return NoteChanges(
+            note_ons=note_ons,
+            note_offs=note_offs,
+            active_pitches=sorted(self.onset_windows.keys()),
+        )
+
+
+class NoteTrackingHarmonyAnalyzerDecorator(I_HarmonyAnalyzer):
+    """
+    Only passes pitches on to the underlying analyzer when a note turns on or off,
+    rather than analyzing the same notes over again every window.
+    """
+
+    def __init__(
+        self, underlying_analyzer: I_HarmonyAnalyzer, release_windows: int = 1
+    ):
+        self.underlying_analyzer = underlying_analyzer
+        self.note_tracker = NoteTracker(release_windows=release_windows)
+
+    def register_listener(self, listener: I_HarmonyStateListener):
+        self.underlying_analyzer.register_listener(listener)
+
+    def new_pitches_detected(self, pitches: list[int]):
+        note_changes = self.note_tracker.update(pitches)
+        if note_changes.note_ons or note_changes.note_offs:
+            self.underlying_analyzer.new_pitches_detected(note_changes.active_pitches)
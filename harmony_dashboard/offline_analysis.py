@@ -0,0 +1,191 @@
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+from .app import I_HarmonyAnalyzer, I_HarmonyStateListener
+from .harmony_domain import HarmonyState
+from .harmony_state_logging import HarmonyLogFormatter
+from .pitch_detection import I_PitchDetector
+from .pitch_detection.inference_backends import InferenceBackend
+
+
+@dataclass
+class AnalyzedHop:
+    # Position in the audio of the end of the hop
+    end_sec: float
+    # Midi numbers
+    pitches: list[int]
+    # Latest harmony state after the hop, None until the analyzer reports one
+    harmony_state: HarmonyState | None
+
+
+class OfflineHarmonyAnalysis(I_HarmonyStateListener):
+    """
+    Runs pitch detection and harmony analysis over audio as fast as the detector
+    allows, rather than as the audio plays.  Each hop is handed to the detector just
+    as PitchDetectingAudioStreamer would hand it over if detection always kept up:
+    the hop itself by default, or the newest analysis_window_sec of audio ending at
+    the hop if given.
+
+    Audio can be pushed in pieces of any size.  Every hop completed by a push is
+    analyzed straight away; finish() analyzes whatever is left over.
+    """
+
+    def __init__(
+        self,
+        pitch_detector: I_PitchDetector,
+        harmony_analyzer: I_HarmonyAnalyzer,
+        sample_rate: int,
+        hop_sec: float = 0.2,
+        analysis_window_sec: float | None = None,
+    ):
+        self.pitch_detector = pitch_detector
+        self.harmony_analyzer = harmony_analyzer
+        self.harmony_analyzer.register_listener(self)
+        self.sample_rate = sample_rate
+        self.hop_len = int(hop_sec * sample_rate)
+        self.window_len = (
+            None
+            if analysis_window_sec is None
+            else int(analysis_window_sec * sample_rate)
+        )
+        # Samples not yet analyzed, preceded by as much analyzed audio as the next
+        # window needs.  buffer_start is the stream position of the first one.
+        self.buffer = np.zeros(shape=(0,), dtype=np.float32)
+        self.buffer_start = 0
+        # Number of samples analyzed so far
+        self.stream_position = 0
+        self.harmony_state = None
+
+    def update_harmony_state(self, state: HarmonyState):
+        self.harmony_state = state
+
+    def push(self, samples: np.ndarray) -> list[AnalyzedHop]:
+        """
+        samples: mono, at sample_rate
+        """
+        self.buffer = np.concatenate(
+            [self.buffer, np.asarray(samples, dtype=np.float32).reshape(-1)]
+        )
+        analyzed_hops = []
+        while self._buffer_end() - self.stream_position >= self.hop_len:
+            analyzed_hops.append(
+                self._analyze_until(self.stream_position + self.hop_len)
+            )
+        self._drop_unneeded_audio()
+        return analyzed_hops
+
+    def finish(self) -> list[AnalyzedHop]:
+        """
+        Analyzes the final, partial hop, if there is one
+        """
+        if self._buffer_end() == self.stream_position:
+            return []
+        analyzed_hop = self._analyze_until(self._buffer_end())
+        self._drop_unneeded_audio()
+        return [analyzed_hop]
+
+    def _analyze_until(self, hop_end: int) -> AnalyzedHop:
+        window_start = (
+            self.stream_position
+            if self.window_len is None
+            else max(hop_end - self.window_len, self.buffer_start)
+        )
+        pitches = self.pitch_detector.detect_pitches(
+            self.buffer[window_start - self.buffer_start : hop_end - self.buffer_start],
+            stream_position=hop_end,
+        )
+        self.harmony_analyzer.new_pitches_detected(pitches)
+        self.stream_position = hop_end
+        return AnalyzedHop(
+            end_sec=hop_end / self.sample_rate,
+            pitches=list(pitches),
+            harmony_state=self.harmony_state,
+        )
+
+    def _buffer_end(self) -> int:
+        return self.buffer_start + self.buffer.shape[0]
+
+    def _drop_unneeded_audio(self):
+        keep_from = max(
+            self.stream_position - (self.window_len or 0), self.buffer_start
+        )
+        self.buffer = self.buffer[keep_from - self.buffer_start :]
+        self.buffer_start = keep_from
+
+
+def harmony_log_rows(analyzed_hops: Iterable[AnalyzedHop]) -> Iterator[list[str]]:
+    """
+    Yields the rows HarmonyStateLogger would have written had the audio been played
+    back, header first, timed by position in the audio rather than by the clock
+    """
+    log_formatter = HarmonyLogFormatter()
+    yield HarmonyLogFormatter.HEADER
+    previous_state = None
+    for analyzed_hop in analyzed_hops:
+        state = analyzed_hop.harmony_state
+        if state is None or not log_formatter.is_logged_change(previous_state, state):
+            continue
+        yield log_formatter.format_row(round(1000 * analyzed_hop.end_sec), state)
+        previous_state = state
+
+
+def load_audio_file(path: str, sample_rate: int) -> np.ndarray:
+    """
+    Returns the whole file as float32 mono samples at sample_rate
+    """
+    audio, original_sample_rate = sf.read(path, dtype="float32", always_2d=True)
+    mono_audio = np.mean(audio, axis=1)
+    if original_sample_rate == sample_rate:
+        return mono_audio
+    return soxr.resample(mono_audio, original_sample_rate, sample_rate).astype(
+        np.float32
+    )
+
+
+def add_inference_backend_argument(parser: ArgumentParser):
+    """
+    Read it back with parse_inference_backend
+    """
+    parser.add_argument(
+        "--inference_backend",
+        help="Which serialization of the pitch detection model to run.  Defaults to whichever runtime basic pitch finds installed",
+        required=False,
+        choices=[backend.name.lower() for backend in InferenceBackend],
+        default=None,
+    )
+
+
+def add_analysis_arguments(parser: ArgumentParser):
+    """
+    Adds the arguments the command line analysis tools share: --inference_backend,
+    --hop_sec and -w/--analysis_window_sec
+    """
+    add_inference_backend_argument(parser)
+    parser.add_argument(
+        "--hop_sec",
+        help="How much audio, in seconds, each pitch detection covers",
+        required=False,
+        type=float,
+        default=0.2,
+    )
+    parser.add_argument(
+        "-w",
+        "--analysis_window_sec",
+        help="If provided, pitches are detected over overlapping windows of this many seconds (advancing by --hop_sec each time), as in the app",
+        required=False,
+        type=float,
+        default=None,
+    )
+
+
+def parse_inference_backend(inference_backend: str | None) -> InferenceBackend | None:
+    return (
+        None
+        if inference_backend is None
+        else InferenceBackend[inference_backend.upper()]
+    )
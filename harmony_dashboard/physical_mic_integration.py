@@ -1,16 +1,115 @@
 import sounddevice as sd
+from dataclasses import dataclass
 from typing import Callable, Any
 import threading
 import sys
 
 import numpy as np
 
+from .multi_channel_capture import MultiChannelCapture
 from .real_time_basic_pitch import I_AudioStreamer
 
 
-class PhysicalMicIntegration(I_AudioStreamer):
+@dataclass
+class MicCaptureStats:
+    n_blocks: int
+    # Times the sound card had samples to hand over but nowhere to put them, and
+    # times it came up short
+    n_input_overflows: int
+    n_input_underflows: int
+    # What the host API says it set the input latency to
+    reported_latency_sec: float
+    # How long blocks had been captured for by the time the callback got them
+    mean_measured_latency_sec: float
+    max_measured_latency_sec: float
+
+
+class _CaptureMonitor:
+    """
+    Counts overflows and measures input latency from the audio callback, without
+    printing or allocating there
+    """
+
     def __init__(self):
-        pass
+        self.n_blocks = 0
+        self.n_input_overflows = 0
+        self.n_input_underflows = 0
+        self.n_latencies_measured = 0
+        self.total_latency_sec = 0.0
+        self.max_latency_sec = 0.0
+
+    def record_block(self, time: Any, status: sd.CallbackFlags):
+        self.n_blocks += 1
+        if status.input_overflow:
+            self.n_input_overflows += 1
+        if status.input_underflow:
+            self.n_input_underflows += 1
+        # Some host APIs don't report when the block was captured
+        if time.inputBufferAdcTime > 0:
+            latency_sec = time.currentTime - time.inputBufferAdcTime
+            self.n_latencies_measured += 1
+            self.total_latency_sec += latency_sec
+            self.max_latency_sec = max(self.max_latency_sec, latency_sec)
+
+    def get_stats(self, reported_latency_sec: float) -> MicCaptureStats:
+        return MicCaptureStats(
+            n_blocks=self.n_blocks,
+            n_input_overflows=self.n_input_overflows,
+            n_input_underflows=self.n_input_underflows,
+            reported_latency_sec=reported_latency_sec,
+            mean_measured_latency_sec=(
+                self.total_latency_sec / max(self.n_latencies_measured, 1)
+            ),
+            max_measured_latency_sec=self.max_latency_sec,
+        )
+
+
+def print_mic_capture_stats(stats: MicCaptureStats, device_name: str = "Mic"):
+    print(
+        f"{device_name} input latency: {1000 * stats.reported_latency_sec:.1f}ms "
+        f"reported, {1000 * stats.mean_measured_latency_sec:.1f}ms mean and "
+        f"{1000 * stats.max_measured_latency_sec:.1f}ms max measured, over "
+        f"{stats.n_blocks} blocks",
+        file=sys.stderr,
+    )
+    if stats.n_input_overflows or stats.n_input_underflows:
+        print(
+            f"{device_name} input overflowed {stats.n_input_overflows} times and "
+            f"underflowed {stats.n_input_underflows} times",
+            file=sys.stderr,
+        )
+
+
+class PhysicalMicIntegration(I_AudioStreamer):
+    """
+    Streams audio from a mic (or any other input device).
+
+    device: index or (part of the) name of the input device, as listed by
+        python -m sounddevice.  Defaults to the system's default input.
+    blocksize: frames per callback.  0 lets the host API pick, which usually gives
+        the lowest latency it can manage.
+    latency: 'low', 'high' or a number of seconds, as sounddevice takes it
+    dtype: 'float32', or 'int16' for cards that only capture that natively (scaled
+        to float when buffered, see AudioRingBuffer.write)
+
+    Each block goes straight to the callback, which copies it into its own
+    preallocated buffer, without any other copy or allocation in between.  Overflows
+    are counted rather than printed from the audio thread, and printed along with
+    the measured input latency once streaming stops (see get_stats).
+    """
+
+    def __init__(
+        self,
+        device: int | str | None = None,
+        blocksize: int = 0,
+        latency: str | float = "high",
+        dtype: str = "float32",
+    ):
+        self.device = device
+        self.blocksize = blocksize
+        self.latency = latency
+        self.dtype = dtype
+        self.stats = None
 
     def stream_audio(
         self,
@@ -19,23 +118,94 @@ class PhysicalMicIntegration(I_AudioStreamer):
         callback: Callable[[np.ndarray], None],
         threading_event: threading.Event,
     ):
+        capture_monitor = _CaptureMonitor()
+
         def forward_audio_chunk(
             indata: np.ndarray, frames: int, time: Any, status: sd.CallbackFlags
         ):
-            if status:
-                print(f"Status flags: {status}", file=sys.stderr)
-            callback(indata.copy())
+            capture_monitor.record_block(time, status)
+            callback(indata)
 
         try:
             with sd.InputStream(
                 samplerate=sample_rate,
                 channels=num_audio_channels,
+                device=self.device,
+                blocksize=self.blocksize,
+                latency=self.latency,
+                dtype=self.dtype,
                 callback=forward_audio_chunk,
-            ):
+            ) as stream:
                 threading_event.wait()
+            self.stats = capture_monitor.get_stats(stream.latency)
+            print_mic_capture_stats(self.stats)
 
         except KeyboardInterrupt:
             print("\nStream killed by user.")
 
         except Exception as e:
             print(f"An error occurred: {e}")
+
+    def get_stats(self) -> MicCaptureStats | None:
+        """
+        None until streaming stops
+        """
+        return self.stats
+
+
+class MultiChannelMicCapture(MultiChannelCapture):
+    """
+    Captures n_channels of one input device at once (see MultiChannelCapture), with
+    the same options as PhysicalMicIntegration.  Its stats are printed, and kept in
+    stats, each time capture stops.
+    """
+
+    def __init__(
+        self,
+        n_channels: int,
+        device: int | str | None = None,
+        blocksize: int = 0,
+        latency: str | float = "high",
+        dtype: str = "float32",
+    ):
+        super().__init__(n_channels)
+        self.device = device
+        self.blocksize = blocksize
+        self.latency = latency
+        self.dtype = dtype
+        self.stream = None
+        self.capture_monitor = None
+        self.stats = None
+
+    def open_stream(self, sample_rate: int):
+        capture_monitor = _CaptureMonitor()
+
+        def forward_audio_chunk(
+            indata: np.ndarray, frames: int, time: Any, status: sd.CallbackFlags
+        ):
+            capture_monitor.record_block(time, status)
+            self.forward_block(indata)
+
+        self.stream = sd.InputStream(
+            samplerate=sample_rate,
+            channels=self.n_channels,
+            device=self.device,
+            blocksize=self.blocksize,
+            latency=self.latency,
+            dtype=self.dtype,
+            callback=forward_audio_chunk,
+        )
+        self.capture_monitor = capture_monitor
+        self.stream.start()
+
+    def close_stream(self):
+        self.stream.stop()
+        self.stream.close()
+        self.stats = self.capture_monitor.get_stats(self.stream.latency)
+        print_mic_capture_stats(
+            self.stats,
+            device_name=(
+                "Default device" if self.device is None else f"Device {self.device}"
+            ),
+        )
+        self.stream = None
@@ -0,0 +1 @@
+from .pitch_detector import I_PitchDetector
@@ -0,0 +1,379 @@
+import importlib.util
+import math
+
+import numpy as np
+
+from .pitch_detector import I_PitchDetector
+from .posteriorgram_decoder import PosteriorgramDecoder
+from .inference_backends import (
+    I_InferenceBackend,
+    InferenceBackend,
+    InferenceThreadConfig,
+    configure_tensorflow_threads,
+    load_inference_backend,
+)
+
+MODEL_OUTPUT_KEYS = ("note", "onset", "contour")
+
+# Same as basic_pitch.constants, without importing basic_pitch, which imports every
+# model runtime it finds installed (TensorFlow included) whichever one is used
+FFT_HOP = 256
+AUDIO_SAMPLE_RATE = 22050
+ANNOTATIONS_FPS = AUDIO_SAMPLE_RATE // FFT_HOP
+# The model takes 2 second windows
+ANNOT_N_FRAMES = ANNOTATIONS_FPS * 2
+AUDIO_N_SAMPLES = AUDIO_SAMPLE_RATE * 2 - FFT_HOP
+
+
+class BasicPitchDetector(I_PitchDetector):
+    """
+    Runs the basic pitch model on audio held in memory.
+
+    This mirrors basic_pitch.inference.predict, except that predict() only accepts a
+    path to an audio file, which forced us to write every sample to disk and have
+    basic pitch decode (and resample) it again.
+    """
+
+    def __init__(
+        self,
+        model: I_InferenceBackend,
+        min_freq_hz: float | None = None,
+        max_freq_hz: float | None = None,
+    ):
+        self.model = model
+        self.sample_rate = AUDIO_SAMPLE_RATE
+        self.min_freq_hz = min_freq_hz
+        self.max_freq_hz = max_freq_hz
+        # Same windowing parameters that basic_pitch.inference.run_inference uses
+        self.n_overlapping_frames = 30
+        self.overlap_len = self.n_overlapping_frames * FFT_HOP
+        self.window_hop_size = AUDIO_N_SAMPLES - self.overlap_len
+        # Same note creation parameters that basic_pitch.inference.predict defaults to
+        self.onset_threshold = 0.5
+        self.frame_threshold = 0.3
+        minimum_note_length_ms = 127.70
+        self.min_note_len_frames = int(
+            np.round(minimum_note_length_ms / 1000 * (AUDIO_SAMPLE_RATE / FFT_HOP))
+        )
+        self.min_velocity = 50
+        self.note_decoder = PosteriorgramDecoder(
+            onset_threshold=self.onset_threshold,
+            frame_threshold=self.frame_threshold,
+            min_note_len_frames=self.min_note_len_frames,
+            min_freq_hz=self.min_freq_hz,
+            max_freq_hz=self.max_freq_hz,
+            min_velocity=self.min_velocity,
+        )
+
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        pitches, _ = self.detect_pitch_strengths(audio_samples, stream_position)
+        return pitches.tolist()
+
+    def warm_up(self):
+        # Bypasses any subclass's state, so nothing is remembered about this audio
+        BasicPitchDetector.detect_pitch_strengths(
+            self, np.zeros(shape=(AUDIO_N_SAMPLES,), dtype=np.float32)
+        )
+
+    def detect_pitch_strengths(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the distinct midi pitches detected, in ascending order, and the
+        strength (between 0 and 1) of each
+        """
+        model_output = self.infer_model_output(audio_samples)
+        notes = self.note_decoder.decode_notes(
+            model_output["note"], model_output["onset"]
+        )
+        return self.note_decoder.active_pitch_strengths(notes)
+
+    def infer_model_output(self, audio_samples: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        Returns the unwrapped 'note', 'onset' and 'contour' posteriorgrams,
+        each of shape (n_frames, n_freq_bins)
+        """
+        audio = np.asarray(audio_samples, dtype=np.float32).reshape(-1)
+        original_length = audio.shape[0]
+        windows = self._window_audio(audio)
+        output = {key: [] for key in MODEL_OUTPUT_KEYS}
+        for window_idx in range(windows.shape[0]):
+            window_output = self.model.predict(windows[window_idx : window_idx + 1])
+            for key, value in window_output.items():
+                output[key].append(value)
+        return {
+            key: self._unwrap_output(np.concatenate(value), original_length)
+            for key, value in output.items()
+        }
+
+    def _window_audio(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Pads the audio the same way basic pitch does, then slices it into
+        overlapping windows of shape (n_windows, AUDIO_N_SAMPLES, 1)
+        """
+        padded_length = audio.shape[0] + self.overlap_len // 2
+        window_starts = range(0, padded_length, self.window_hop_size)
+        windows = np.zeros(
+            shape=(len(window_starts), AUDIO_N_SAMPLES, 1), dtype=np.float32
+        )
+        for window_idx, window_start in enumerate(window_starts):
+            # Position of the window within the unpadded audio
+            audio_start = window_start - self.overlap_len // 2
+            _copy_audio_into_window(audio, audio_start, windows[window_idx, :, 0])
+        return windows
+
+    def _unwrap_output(self, output: np.ndarray, original_length: int) -> np.ndarray:
+        n_olap = self.n_overlapping_frames // 2
+        output = output[:, n_olap:-n_olap, :]
+        n_output_frames_original = int(
+            np.floor(original_length * (ANNOTATIONS_FPS / AUDIO_SAMPLE_RATE))
+        )
+        unwrapped_output = output.reshape(-1, output.shape[2])
+        return unwrapped_output[:n_output_frames_original, :]
+
+
+class SlidingWindowBasicPitchDetector(BasicPitchDetector):
+    """
+    Meant to be fed overlapping analysis windows, each ending one hop after the last.
+
+    Model frames are cached by their absolute position in the stream, so frames that
+    were already inferred for the overlapping part of the previous window are reused
+    and only the audio that is new since then goes through the model.  Notes are
+    decoded over the whole window (so a note crossing a hop boundary is still seen
+    whole), but only notes still sounding within the newest hop are reported.
+
+    Frames within half an overlap of the newest sample lack right hand context, so
+    they are treated as provisional and inferred again on the next hop.
+    """
+
+    def __init__(
+        self,
+        model: I_InferenceBackend,
+        min_freq_hz: float | None = None,
+        max_freq_hz: float | None = None,
+    ):
+        super().__init__(model, min_freq_hz, max_freq_hz)
+        self.n_edge_frames = self.n_overlapping_frames // 2
+        # Frames from the interior of a model window, which have context on both sides
+        self.n_interior_frames = ANNOT_N_FRAMES - 2 * self.n_edge_frames
+        # Final (non-provisional) frames, starting at absolute frame cache_start_frame
+        self.cached_frames: dict[str, np.ndarray] | None = None
+        self.cache_start_frame = 0
+        self.previous_stream_position = None
+        self.previous_newest_frame = None
+
+    def detect_pitch_strengths(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        audio = np.asarray(audio_samples, dtype=np.float32).reshape(-1)
+        stream_position = self._line_up_window(audio.shape[0], stream_position)
+        window_start_frame = math.ceil((stream_position - audio.shape[0]) / FFT_HOP)
+        # Model windows have to start on a frame boundary so their frames line up
+        # with the cache
+        newest_model_window_start = _newest_model_window_start(stream_position)
+        newest_frame = newest_model_window_start // FFT_HOP + ANNOT_N_FRAMES - 1
+        first_new_frame = (
+            window_start_frame
+            if self.previous_newest_frame is None
+            else self.previous_newest_frame + 1
+        )
+        model_output = self._infer_frames_for_window(
+            audio,
+            audio_start_sample=stream_position - audio.shape[0],
+            window_start_frame=window_start_frame,
+            newest_model_window_start=newest_model_window_start,
+        )
+        self.previous_stream_position = stream_position
+        self.previous_newest_frame = newest_frame
+        first_new_frame_in_window = max(first_new_frame - window_start_frame, 0)
+        notes = self.note_decoder.decode_notes(
+            model_output["note"], model_output["onset"]
+        )
+        return self.note_decoder.active_pitch_strengths(
+            notes, from_frame=first_new_frame_in_window
+        )
+
+    def skip_window(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ):
+        """
+        Moves on past the window without running the model, so the next window only
+        reports notes in the audio that is new since this one.  Cached frames are
+        kept, and only used if the next window still overlaps them.
+        """
+        stream_position = self._line_up_window(
+            np.asarray(audio_samples).reshape(-1).shape[0], stream_position
+        )
+        self.previous_stream_position = stream_position
+        self.previous_newest_frame = (
+            _newest_model_window_start(stream_position) // FFT_HOP + ANNOT_N_FRAMES - 1
+        )
+
+    def reset(self):
+        self._clear_cache()
+
+    def _line_up_window(self, n_samples: int, stream_position: int | None) -> int:
+        """
+        Returns the window's stream position, forgetting previous windows if it
+        can't be lined up with them
+        """
+        if stream_position is None or (
+            self.previous_stream_position is not None
+            and stream_position < self.previous_stream_position
+        ):
+            self._clear_cache()
+            return n_samples
+        return stream_position
+
+    def _infer_frames_for_window(
+        self,
+        audio: np.ndarray,
+        audio_start_sample: int,
+        window_start_frame: int,
+        newest_model_window_start: int,
+    ) -> dict[str, np.ndarray]:
+        """
+        Returns posteriorgrams covering every frame from window_start_frame up to the
+        newest frame the model can produce
+        """
+        newest_frame = newest_model_window_start // FFT_HOP + ANNOT_N_FRAMES - 1
+        n_cached_frames = self._n_cached_frames()
+        cached_end_frame = self.cache_start_frame + n_cached_frames
+        if not (window_start_frame <= cached_end_frame <= newest_frame):
+            self._clear_cache()
+            n_cached_frames = 0
+            self.cache_start_frame = cached_end_frame = window_start_frame
+        first_missing_frame = cached_end_frame
+
+        # Step back one window's interior at a time until the missing frames are covered
+        model_window_starts = [newest_model_window_start]
+        while (
+            model_window_starts[-1] // FFT_HOP + self.n_edge_frames
+            > first_missing_frame
+            and model_window_starts[-1] > audio_start_sample
+        ):
+            model_window_starts.append(
+                model_window_starts[-1] - self.n_interior_frames * FFT_HOP
+            )
+        batch = np.zeros(
+            shape=(len(model_window_starts), AUDIO_N_SAMPLES, 1), dtype=np.float32
+        )
+        for window_idx, model_window_start in enumerate(model_window_starts):
+            _copy_audio_into_window(
+                audio, model_window_start - audio_start_sample, batch[window_idx, :, 0]
+            )
+        batch_output = {key: [] for key in MODEL_OUTPUT_KEYS}
+        for window_idx in range(batch.shape[0]):
+            window_output = self.model.predict(batch[window_idx : window_idx + 1])
+            for key, value in window_output.items():
+                batch_output[key].append(value[0])
+
+        # Stitch the newly inferred frames together, oldest model window first
+        new_frames = {key: [] for key in MODEL_OUTPUT_KEYS}
+        oldest_window_idx = len(model_window_starts) - 1
+        for window_idx in reversed(range(len(model_window_starts))):
+            window_first_frame = model_window_starts[window_idx] // FFT_HOP
+            lo = 0 if window_idx == oldest_window_idx else self.n_edge_frames
+            lo = max(lo, first_missing_frame - window_first_frame)
+            hi = (
+                ANNOT_N_FRAMES
+                if window_idx == 0
+                else ANNOT_N_FRAMES - self.n_edge_frames
+            )
+            for key in MODEL_OUTPUT_KEYS:
+                new_frames[key].append(batch_output[key][window_idx][lo:hi])
+
+        # Provisional frames at the newest edge are not cached
+        final_end_frame = newest_frame - self.n_edge_frames + 1
+        n_frames_to_cache = n_cached_frames + max(
+            final_end_frame - first_missing_frame, 0
+        )
+        # Frames that have slid out of the analysis window are dropped
+        n_stale_frames = window_start_frame - self.cache_start_frame
+        model_output = {}
+        cached_frames = {}
+        for key in MODEL_OUTPUT_KEYS:
+            frames = np.concatenate(new_frames[key])
+            if self.cached_frames is not None:
+                frames = np.concatenate([self.cached_frames[key], frames])
+            model_output[key] = frames[n_stale_frames:]
+            cached_frames[key] = frames[n_stale_frames:n_frames_to_cache]
+        self.cached_frames = cached_frames
+        self.cache_start_frame = window_start_frame
+        return model_output
+
+    def _n_cached_frames(self) -> int:
+        if self.cached_frames is None:
+            return 0
+        return self.cached_frames["note"].shape[0]
+
+    def _clear_cache(self):
+        self.cached_frames = None
+        self.previous_stream_position = None
+        self.previous_newest_frame = None
+
+
+def _newest_model_window_start(stream_position: int) -> int:
+    return math.floor((stream_position - AUDIO_N_SAMPLES) / FFT_HOP) * FFT_HOP
+
+
+def _copy_audio_into_window(audio: np.ndarray, audio_start: int, window: np.ndarray):
+    """
+    Copies audio[audio_start : audio_start + len(window)] into the window, leaving
+    whatever falls outside of the audio as is (i.e. zero padded)
+    """
+    src_start = max(audio_start, 0)
+    src_end = min(audio_start + window.shape[0], audio.shape[0])
+    if src_end <= src_start:
+        return
+    dest_start = src_start - audio_start
+    window[dest_start : dest_start + src_end - src_start] = audio[src_start:src_end]
+
+
+def load_basic_pitch_model(
+    inference_backend: InferenceBackend | None = None,
+    thread_config: InferenceThreadConfig | None = None,
+) -> I_InferenceBackend:
+    """
+    Without an inference_backend, basic pitch picks whichever runtime is installed,
+    and only TensorFlow can be given a thread_config.
+    """
+    if inference_backend is not None:
+        return load_inference_backend(inference_backend, thread_config)
+    if thread_config is not None and importlib.util.find_spec("tensorflow") is not None:
+        configure_tensorflow_threads(thread_config)
+    # Imported here because it imports TensorFlow (if installed) and most of basic
+    # pitch's dependencies, which take seconds
+    from basic_pitch import ICASSP_2022_MODEL_PATH
+    from basic_pitch.inference import Model
+
+    return Model(ICASSP_2022_MODEL_PATH)
+
+
+def create_basic_pitch_detector(
+    sliding_window: bool,
+    min_freq_hz: float | None = None,
+    max_freq_hz: float | None = None,
+    inference_backend: InferenceBackend | None = None,
+    model: I_InferenceBackend | None = None,
+    thread_config: InferenceThreadConfig | None = None,
+) -> BasicPitchDetector:
+    """
+    Loads the basic pitch model (see load_basic_pitch_model) and wraps it in a
+    detector.  Being a module level function, it can be pickled and handed to a
+    worker process.
+
+    If a model is given (e.g. one shared with other detectors), none is loaded.
+    """
+    detector_class = (
+        SlidingWindowBasicPitchDetector if sliding_window else BasicPitchDetector
+    )
+    if model is None:
+        model = load_basic_pitch_model(inference_backend, thread_config)
+    return detector_class(
+        model=model,
+        min_freq_hz=min_freq_hz,
+        max_freq_hz=max_freq_hz,
+    )
@@ -0,0 +1,185 @@
+from dataclasses import dataclass, field
+import threading
+from typing import Callable
+
+import numpy as np
+
+from .inference_backends import I_InferenceBackend
+
+
+@dataclass
+class BatchedInferenceStats:
+    n_batches: int
+    n_windows: int
+    mean_windows_per_batch: float
+
+
+@dataclass
+class _InferenceRequest:
+    windows: np.ndarray
+    done_event: threading.Event = field(default_factory=threading.Event)
+    output: dict[str, np.ndarray] | None = None
+    error: Exception | None = None
+
+
+class BatchedInferenceService(I_InferenceBackend):
+    """
+    Lets several pitch detectors, each on its own streaming thread, share one loaded
+    model.  Hand the service to each detector in place of a model.
+
+    predict() queues the caller's windows and blocks.  A single inference thread
+    waits up to batch_collection_sec for other callers to queue theirs, then runs
+    everything queued (up to max_batch_windows) through the model as one batch and
+    hands each caller back its own slice of the output.  So N streams cost one model
+    in memory, and one model call per hop rather than N.
+
+    start() and stop() are reference counted, so every streamer using the service can
+    start and stop it along with itself; the inference thread runs while any do.
+
+    Given load_inference_backend rather than a model, the service loads the model
+    when load() is first called, e.g. from the first streamer's detection thread to
+    get going, so that nothing waits on it before then.
+    """
+
+    def __init__(
+        self,
+        inference_backend: I_InferenceBackend | None = None,
+        max_batch_windows: int = 32,
+        batch_collection_sec: float = 0.005,
+        load_inference_backend: Callable[[], I_InferenceBackend] | None = None,
+    ):
+        assert (inference_backend is None) != (
+            load_inference_backend is None
+        ), "Give either a model or a way to load one"
+        self.inference_backend = inference_backend
+        self.load_inference_backend = load_inference_backend
+        self.load_lock = threading.Lock()
+        self.load_error = None
+        self.max_batch_windows = max_batch_windows
+        self.batch_collection_sec = batch_collection_sec
+        self.condition = threading.Condition()
+        self.start_stop_lock = threading.Lock()
+        self.pending_requests: list[_InferenceRequest] = []
+        self.n_users = 0
+        self.inference_thread = None
+        self.n_batches = 0
+        self.n_windows = 0
+
+    def start(self):
+        with self.start_stop_lock:
+            with self.condition:
+                self.n_users += 1
+                if self.inference_thread is not None:
+                    return
+                self.inference_thread = threading.Thread(
+                    target=self._run_batches_as_requests_arrive
+                )
+            self.inference_thread.start()
+
+    def stop(self):
+        # Held until the inference thread is gone, so that a start() meanwhile
+        # starts another rather than counting on the one exiting
+        with self.start_stop_lock:
+            with self.condition:
+                self.n_users -= 1
+                if self.n_users > 0 or self.inference_thread is None:
+                    return
+                self.condition.notify_all()
+            self.inference_thread.join()
+            self.inference_thread = None
+
+    def load(self):
+        """
+        Loads the model, if the service was given load_inference_backend and it isn't
+        loaded yet.  Callers after the first wait for it to load, and if it failed to,
+        get the same error.
+        """
+        with self.load_lock:
+            if self.load_error is not None:
+                raise self.load_error
+            if self.inference_backend is not None:
+                return
+            try:
+                self.inference_backend = self.load_inference_backend()
+            except Exception as e:
+                self.load_error = e
+                raise
+
+    def predict(self, windows: np.ndarray) -> dict[str, np.ndarray]:
+        assert self.inference_thread is not None, "Inference service is not running"
+        assert self.inference_backend is not None, "Model is not loaded"
+        request = _InferenceRequest(windows=windows)
+        with self.condition:
+            self.pending_requests.append(request)
+            self.condition.notify_all()
+        request.done_event.wait()
+        if request.error is not None:
+            raise request.error
+        return request.output
+
+    def get_stats(self) -> BatchedInferenceStats:
+        return BatchedInferenceStats(
+            n_batches=self.n_batches,
+            n_windows=self.n_windows,
+            mean_windows_per_batch=(
+                self.n_windows / self.n_batches if self.n_batches > 0 else 0.0
+            ),
+        )
+
+    def _run_batches_as_requests_arrive(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.pending_requests or self.n_users == 0
+                )
+                if not self.pending_requests:
+                    # Stopped, with nothing left to answer
+                    return
+                # Give the other streams a moment to catch up
+                self.condition.wait_for(
+                    lambda: self._n_pending_windows() >= self.max_batch_windows
+                    or self.n_users == 0,
+                    timeout=self.batch_collection_sec,
+                )
+                batch_requests = self._take_batch()
+            self._run_batch(batch_requests)
+
+    def _n_pending_windows(self) -> int:
+        return sum(request.windows.shape[0] for request in self.pending_requests)
+
+    def _take_batch(self) -> list[_InferenceRequest]:
+        """
+        Takes queued requests, oldest first, until the batch is full.  Always takes at
+        least one, however large.
+        """
+        n_requests = 1
+        n_windows = self.pending_requests[0].windows.shape[0]
+        for request in self.pending_requests[1:]:
+            if n_windows + request.windows.shape[0] > self.max_batch_windows:
+                break
+            n_windows += request.windows.shape[0]
+            n_requests += 1
+        batch_requests = self.pending_requests[:n_requests]
+        del self.pending_requests[:n_requests]
+        return batch_requests
+
+    def _run_batch(self, batch_requests: list[_InferenceRequest]):
+        batch = np.concatenate([request.windows for request in batch_requests])
+        try:
+            batch_output = self.inference_backend.predict(batch)
+        except Exception as e:
+            for request in batch_requests:
+                request.error = e
+                request.done_event.set()
+            return
+        self.n_batches += 1
+        self.n_windows += batch.shape[0]
+        window_start = 0
+        for request in batch_requests:
+            window_end = window_start + request.windows.shape[0]
+            request.output = {
+                key: value[window_start:window_end]
+                for key, value in batch_output.items()
+            }
+            window_start = window_end
+            request.done_event.set()
@@ -0,0 +1,114 @@
+import numpy as np
+
+from .pitch_detector import I_PitchDetector
+
+
+class ChromaPitchDetector(I_PitchDetector):
+    """
+    Cheap, non-neural pitch detection from a single FFT of the newest audio.
+
+    The power spectrum is summed into one bin per semitone, then each semitone's
+    salience is the weighted sum of its first few harmonics (each capped at the
+    fundamental's own magnitude), which favours the fundamental over its overtones.  Saliences are folded into a 12 bin chroma, and
+    every pitch class within relative_threshold of the strongest one is reported, at
+    the octave where that pitch class is most salient.  Audio quieter than
+    silence_threshold_dbfs has no pitches.
+
+    Far less accurate than basic pitch (octaves and overtones get confused), but good
+    enough to recognize chords, and takes well under a millisecond per hop.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        window_len: int = 8192,
+        min_pitch: int = 36,
+        max_pitch: int = 96,
+        silence_threshold_dbfs: float = -50.0,
+        relative_threshold: float = 0.5,
+        max_pitches: int = 4,
+    ):
+        self.sample_rate = sample_rate
+        self.window_len = window_len
+        self.min_pitch = min_pitch
+        self.max_pitch = max_pitch
+        self.silence_threshold_dbfs = silence_threshold_dbfs
+        self.relative_threshold = relative_threshold
+        self.max_pitches = max_pitches
+        self.spectrum_window = np.hanning(window_len).astype(np.float32)
+        self.n_harmonics = 4
+        self.harmonic_decay = 0.8
+        # Spectrum only needs to reach the highest harmonic considered
+        self.n_semitones = max_pitch - min_pitch + 1
+        self.harmonic_offsets = np.round(
+            12 * np.log2(np.arange(1, self.n_harmonics + 1))
+        ).astype(int)
+        self.n_spectrum_semitones = self.n_semitones + self.harmonic_offsets[-1]
+        fft_bin_freqs = np.fft.rfftfreq(window_len, d=1.0 / sample_rate)
+        with np.errstate(divide="ignore"):
+            fft_bin_pitches = 12 * np.log2(fft_bin_freqs / 440.0) + 69
+        fft_bin_semitones = np.round(fft_bin_pitches) - min_pitch
+        # Only bins that fall on a semitone we keep
+        self.fft_bins_in_range = np.nonzero(
+            (fft_bin_semitones >= 0) & (fft_bin_semitones < self.n_spectrum_semitones)
+        )[0]
+        self.fft_bin_semitones = fft_bin_semitones[self.fft_bins_in_range].astype(int)
+        self.pitch_classes = (np.arange(min_pitch, max_pitch + 1)) % 12
+
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        audio = np.asarray(audio_samples, dtype=np.float32).reshape(-1)
+        if audio.shape[0] == 0:
+            return []
+        newest_audio = np.zeros(shape=(self.window_len,), dtype=np.float32)
+        n_samples = min(audio.shape[0], self.window_len)
+        newest_audio[-n_samples:] = audio[-n_samples:]
+        loudness_dbfs = 10 * np.log10(np.mean(np.square(newest_audio)) + 1e-12)
+        if loudness_dbfs < self.silence_threshold_dbfs:
+            return []
+
+        salience = self._semitone_salience(newest_audio)
+        # A pitch class is as strong as its strongest octave, so that doubling a note
+        # in octaves doesn't drown out the rest of the chord
+        chroma = np.zeros(shape=(12,))
+        np.maximum.at(chroma, self.pitch_classes, salience)
+        strongest = np.max(chroma)
+        if strongest <= 0:
+            return []
+        is_candidate = chroma >= self.relative_threshold * strongest
+        candidate_classes = np.nonzero(is_candidate)[0]
+        pitch_classes = candidate_classes[
+            np.argsort(chroma[candidate_classes])[::-1][: self.max_pitches]
+        ]
+        pitches = []
+        for pitch_class in pitch_classes:
+            semitones_of_class = np.nonzero(self.pitch_classes == pitch_class)[0]
+            strongest_semitone = semitones_of_class[
+                np.argmax(salience[semitones_of_class])
+            ]
+            pitches.append(int(strongest_semitone) + self.min_pitch)
+        return sorted(pitches)
+
+    def _semitone_salience(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Returns the harmonic-summed salience of each pitch from min_pitch to max_pitch
+        """
+        power_spectrum = np.square(np.abs(np.fft.rfft(audio * self.spectrum_window)))
+        semitone_power = np.bincount(
+            self.fft_bin_semitones,
+            weights=power_spectrum[self.fft_bins_in_range],
+            minlength=self.n_spectrum_semitones,
+        )
+        # Compress so one loud note doesn't drown out the rest of the chord
+        semitone_magnitude = np.sqrt(semitone_power)
+        fundamental_magnitude = semitone_magnitude[: self.n_semitones]
+        salience = np.zeros(shape=(self.n_semitones,))
+        for harmonic_idx, offset in enumerate(self.harmonic_offsets):
+            # A harmonic can only add as much as the fundamental itself has, so that
+            # the overtones of higher notes don't add up to a phantom bass note
+            salience += self.harmonic_decay**harmonic_idx * np.minimum(
+                semitone_magnitude[offset : offset + self.n_semitones],
+                fundamental_magnitude,
+            )
+        return salience
@@ -0,0 +1,181 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from enum import Enum, auto
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+
+
+class I_InferenceBackend(ABC):
+    """
+    Runs the basic pitch model.  Same contract as basic_pitch.inference.Model, which
+    also satisfies this interface.
+    """
+
+    @abstractmethod
+    def predict(self, windows: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        windows: float32, shape (n_windows, AUDIO_N_SAMPLES, 1)
+        returns the 'note', 'onset' and 'contour' posteriorgrams, each of shape
+            (n_windows, ANNOT_N_FRAMES, n_freq_bins)
+        """
+        pass
+
+
+class InferenceBackend(Enum):
+    """
+    The serializations of the basic pitch model we know how to run
+    """
+
+    # Full TensorFlow SavedModel.  Heaviest to import and load.
+    TENSORFLOW = auto()
+    TFLITE = auto()
+    # TFLite with weights quantized to int8.  Converted from the SavedModel on first
+    # use (which needs TensorFlow), then cached.
+    TFLITE_INT8 = auto()
+    ONNX = auto()
+
+
+@dataclass
+class InferenceThreadConfig:
+    """
+    How many threads the model runtime may use.  None leaves it up to the runtime,
+    which usually means one per core.
+    """
+
+    # Threads used within a single operation (e.g. one convolution)
+    intra_op_threads: int | None = None
+    # Independent operations run at once.  Ignored by TFLite.
+    inter_op_threads: int | None = None
+
+
+def configure_tensorflow_threads(thread_config: InferenceThreadConfig):
+    """
+    TensorFlow's thread pools are process wide, and can only be configured before
+    TensorFlow first runs anything
+    """
+    import tensorflow as tf
+
+    if thread_config.intra_op_threads is not None:
+        tf.config.threading.set_intra_op_parallelism_threads(
+            thread_config.intra_op_threads
+        )
+    if thread_config.inter_op_threads is not None:
+        tf.config.threading.set_inter_op_parallelism_threads(
+            thread_config.inter_op_threads
+        )
+
+
+def basic_pitch_model_dir() -> Path:
+    """
+    Where basic pitch keeps its serialized models.  Found without importing
+    basic_pitch, which eagerly tries to import every runtime it supports.
+    """
+    basic_pitch_spec = importlib.util.find_spec("basic_pitch")
+    assert basic_pitch_spec is not None, "basic_pitch is not installed"
+    package_dir = Path(next(iter(basic_pitch_spec.submodule_search_locations)))
+    return package_dir / "saved_models" / "icassp_2022"
+
+
+def int8_tflite_model_path() -> Path:
+    return Path.home() / ".cache" / "harmony_dashboard" / "nmp_int8.tflite"
+
+
+def load_inference_backend(
+    backend: InferenceBackend, thread_config: InferenceThreadConfig | None = None
+) -> I_InferenceBackend:
+    """
+    Imports only the runtime the chosen backend needs
+    """
+    thread_config = thread_config or InferenceThreadConfig()
+    model_dir = basic_pitch_model_dir()
+    if backend == InferenceBackend.TENSORFLOW:
+        return TensorFlowBackend(model_dir / "nmp", thread_config)
+    if backend == InferenceBackend.TFLITE:
+        return TfLiteBackend(model_dir / "nmp.tflite", thread_config)
+    if backend == InferenceBackend.TFLITE_INT8:
+        model_path = int8_tflite_model_path()
+        if not model_path.exists():
+            quantize_to_int8_tflite(model_dir / "nmp", model_path)
+        return TfLiteBackend(model_path, thread_config)
+    if backend == InferenceBackend.ONNX:
+        return OnnxBackend(model_dir / "nmp.onnx", thread_config)
+    raise ValueError(f"Unknown inference backend {backend}")
+
+
+class TensorFlowBackend(I_InferenceBackend):
+    def __init__(self, model_path: Path, thread_config: InferenceThreadConfig):
+        import tensorflow as tf
+
+        configure_tensorflow_threads(thread_config)
+        self.model = tf.saved_model.load(str(model_path))
+
+    def predict(self, windows: np.ndarray) -> dict[str, np.ndarray]:
+        return {key: value.numpy() for key, value in self.model(windows).items()}
+
+
+class TfLiteBackend(I_InferenceBackend):
+    def __init__(self, model_path: Path, thread_config: InferenceThreadConfig):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(
+            model_path=str(model_path), num_threads=thread_config.intra_op_threads
+        )
+        self.signature_runner = self.interpreter.get_signature_runner()
+
+    def predict(self, windows: np.ndarray) -> dict[str, np.ndarray]:
+        return self.signature_runner(input_2=windows)
+
+
+class OnnxBackend(I_InferenceBackend):
+    # The exported graph kept TensorFlow's tensor names
+    INPUT_NAME = "serving_default_input_2:0"
+    OUTPUT_NAMES = {
+        "note": "StatefulPartitionedCall:1",
+        "onset": "StatefulPartitionedCall:2",
+        "contour": "StatefulPartitionedCall:0",
+    }
+
+    def __init__(self, model_path: Path, thread_config: InferenceThreadConfig):
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        if thread_config.intra_op_threads is not None:
+            session_options.intra_op_num_threads = thread_config.intra_op_threads
+        if thread_config.inter_op_threads is not None:
+            # Only used when independent operations are allowed to run in parallel
+            session_options.inter_op_num_threads = thread_config.inter_op_threads
+            if thread_config.inter_op_threads > 1:
+                session_options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+        self.session = onnxruntime.InferenceSession(
+            str(model_path),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"],
+        )
+
+    def predict(self, windows: np.ndarray) -> dict[str, np.ndarray]:
+        outputs = self.session.run(
+            list(self.OUTPUT_NAMES.values()), {self.INPUT_NAME: windows}
+        )
+        return dict(zip(self.OUTPUT_NAMES.keys(), outputs))
+
+
+def quantize_to_int8_tflite(saved_model_path: Path, output_path: Path):
+    """
+    Post-training dynamic range quantization: weights are stored as int8 and
+    activations are quantized on the fly, so no calibration audio is needed.
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_saved_model(str(saved_model_path))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    quantized_model = converter.convert()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so an interrupted conversion never leaves a broken cache
+    partial_output_path = output_path.with_suffix(".partial")
+    partial_output_path.write_bytes(quantized_model)
+    partial_output_path.replace(output_path)
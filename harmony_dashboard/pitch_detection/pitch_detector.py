@@ -0,0 +1,60 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class I_PitchDetector(ABC):
+    """
+    Detects the pitches sounding in a block of mono audio.
+    """
+
+    @abstractmethod
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        """
+        audio_samples: float32 samples, shape (n,) or (n, 1)
+        stream_position: number of samples streamed up to the end of audio_samples,
+            if the block is part of a continuous stream.  Lets detectors that are fed
+            overlapping windows reuse work done for the previous window.
+        returns pitches in midi numbers
+        """
+        pass
+
+    def skip_window(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ):
+        """
+        Called instead of detect_pitches for a window whose pitches are already known
+        (e.g. from a cache), so that detectors that keep state between windows stay
+        in step with the stream.
+        """
+        pass
+
+    def reset(self):
+        """
+        Forgets whatever the detector kept from previous windows, so that the next
+        window is treated as the start of a new stream.
+        """
+        pass
+
+    def start(self):
+        """
+        Acquires whatever the detector needs to run, e.g. a worker process.  Called
+        once before the first detect_pitches.
+        """
+        pass
+
+    def warm_up(self):
+        """
+        Runs whatever one-off work (e.g. compiling, allocating) would otherwise slow
+        down the first detect_pitches, without affecting later detections.  Called
+        once, after start.
+        """
+        pass
+
+    def stop(self):
+        """
+        Releases whatever start acquired.  Called once after the last detect_pitches.
+        """
+        pass
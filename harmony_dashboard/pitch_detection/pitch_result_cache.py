@@ -0,0 +1,275 @@
+from dataclasses import dataclass
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .inference_backends import InferenceBackend
+from .pitch_detector import I_PitchDetector
+
+# Bumped whenever the pitches a detector returns for the same audio and settings
+# change (e.g. new note creation parameters), so old results stop matching
+RESULT_VERSION = 1
+
+
+def basic_pitch_result_settings(
+    sliding_window: bool,
+    inference_backend: InferenceBackend | str | None,
+    min_freq_hz: float | None,
+    max_freq_hz: float | None,
+) -> str:
+    """
+    Describes everything besides the audio that basic pitch's results depend on.
+    inference_backend may also be a name for where inference runs (e.g. "remote").
+    """
+    backend_name = (
+        "default"
+        if inference_backend is None
+        else (
+            inference_backend.name.lower()
+            if isinstance(inference_backend, InferenceBackend)
+            else inference_backend
+        )
+    )
+    return (
+        f"basic_pitch-v{RESULT_VERSION}"
+        f"-{'sliding' if sliding_window else 'hop'}-{backend_name}"
+        f"-{min_freq_hz}-{max_freq_hz}"
+    )
+
+
+def window_key(audio_samples: np.ndarray, settings: str) -> bytes:
+    """
+    Hash of the window's float32 PCM and the settings it was detected with
+    """
+    window_hash = hashlib.blake2b(settings.encode(), digest_size=16)
+    window_hash.update(b"\0")
+    window_hash.update(
+        np.ascontiguousarray(audio_samples, dtype="<f4").reshape(-1).data
+    )
+    return window_hash.digest()
+
+
+@dataclass
+class PitchResultCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def __sub__(self, other: "PitchResultCacheStats") -> "PitchResultCacheStats":
+        return PitchResultCacheStats(
+            hits=self.hits - other.hits,
+            misses=self.misses - other.misses,
+            evictions=self.evictions - other.evictions,
+        )
+
+
+def describe_pitch_result_cache_stats(cache_stats: PitchResultCacheStats) -> str:
+    return (
+        f"Found {cache_stats.hits} of {cache_stats.hits + cache_stats.misses} "
+        f"windows in the pitch result cache ({100 * cache_stats.hit_rate:.0f}%)"
+        + (f", evicting {cache_stats.evictions}" if cache_stats.evictions else "")
+    )
+
+
+class PitchResultCache:
+    """
+    Pitches already detected, keyed by window_key, in a SQLite database that any
+    number of threads and processes can share.
+
+    Results are stamped whenever they are used, and once there are more than
+    max_entries, the least recently used are removed (a tenth of max_entries at a
+    time, so eviction doesn't run on every store).
+
+    get_stats counts this instance's lookups.  The database also keeps running totals
+    over every instance that ever used it (see get_stored_stats), so that a process
+    pool's workers can be counted together.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        # Waits for other processes' writes rather than failing
+        self.connection = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        with self.lock, self.connection:
+            # Readers don't wait on writers, and commits don't wait for the disk
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key BLOB PRIMARY KEY, pitches TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_by_last_used "
+                "ON results (last_used)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS stats "
+                "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO stats VALUES (?, 0)",
+                [("hits",), ("misses",), ("evictions",)],
+            )
+            # Other processes add entries too, so this is recounted before evicting
+            (self.n_entries_estimate,) = self.connection.execute(
+                "SELECT COUNT(*) FROM results"
+            ).fetchone()
+        self.stats = PitchResultCacheStats()
+
+    def get(self, key: bytes) -> list[int] | None:
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT pitches FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                self._add_to_stored_stat("misses", 1)
+                return None
+            self.stats.hits += 1
+            self._add_to_stored_stat("hits", 1)
+            self.connection.execute(
+                "UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+        return json.loads(row[0])
+
+    def put(self, key: bytes, pitches: list[int]):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                (key, json.dumps([int(pitch) for pitch in pitches]), time.time()),
+            )
+            self.n_entries_estimate += 1
+            if self.n_entries_estimate > self.max_entries:
+                self._evict()
+
+    def get_stats(self) -> PitchResultCacheStats:
+        with self.lock:
+            return PitchResultCacheStats(
+                hits=self.stats.hits,
+                misses=self.stats.misses,
+                evictions=self.stats.evictions,
+            )
+
+    def get_stored_stats(self) -> PitchResultCacheStats:
+        with self.lock:
+            return PitchResultCacheStats(
+                **dict(self.connection.execute("SELECT name, value FROM stats"))
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def _evict(self):
+        (n_entries,) = self.connection.execute(
+            "SELECT COUNT(*) FROM results"
+        ).fetchone()
+        n_evicted = 0
+        if n_entries > self.max_entries:
+            n_evicted = n_entries - self.max_entries + self.max_entries // 10
+            self.connection.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                (n_evicted,),
+            )
+            self.stats.evictions += n_evicted
+            self._add_to_stored_stat("evictions", n_evicted)
+        self.n_entries_estimate = n_entries - n_evicted
+
+    def _add_to_stored_stat(self, name: str, amount: int):
+        self.connection.execute(
+            "UPDATE stats SET value = value + ? WHERE name = ?", (amount, name)
+        )
+
+
+class CachingPitchDetector(I_PitchDetector):
+    """
+    Looks each window up in a PitchResultCache before handing it to the underlying
+    detector, and stores what the underlying detector detects.  Windows found in the
+    cache are still passed on to the underlying detector's skip_window.
+
+    settings must describe everything besides the audio that the underlying
+    detector's results depend on (see basic_pitch_result_settings).
+
+    stream_frame_len: for detectors that only report what is new since the previous
+        window, in frames of this many samples (like SlidingWindowBasicPitchDetector,
+        with FFT_HOP), how many samples are new and how the window lines up with the
+        frames are made part of the key too
+    """
+
+    def __init__(
+        self,
+        underlying_detector: I_PitchDetector,
+        cache: PitchResultCache,
+        settings: str,
+        stream_frame_len: int | None = None,
+    ):
+        self.underlying_detector = underlying_detector
+        self.cache = cache
+        self.settings = settings
+        self.stream_frame_len = stream_frame_len
+        self.previous_stream_position = None
+
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        key = window_key(audio_samples, self._window_settings(stream_position))
+        pitches = self.cache.get(key)
+        if pitches is None:
+            pitches = list(
+                self.underlying_detector.detect_pitches(audio_samples, stream_position)
+            )
+            self.cache.put(key, pitches)
+        else:
+            self.underlying_detector.skip_window(audio_samples, stream_position)
+        self.previous_stream_position = stream_position
+        return pitches
+
+    def skip_window(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ):
+        self.underlying_detector.skip_window(audio_samples, stream_position)
+        self.previous_stream_position = stream_position
+
+    def reset(self):
+        self.underlying_detector.reset()
+        self.previous_stream_position = None
+
+    def start(self):
+        self.underlying_detector.start()
+
+    def warm_up(self):
+        self.underlying_detector.warm_up()
+
+    def stop(self):
+        self.underlying_detector.stop()
+
+    def get_stats(self) -> PitchResultCacheStats:
+        return self.cache.get_stats()
+
+    def _window_settings(self, stream_position: int | None) -> str:
+        if self.stream_frame_len is None:
+            return self.settings
+        if stream_position is None:
+            return f"{self.settings}-unaligned"
+        n_new_samples = (
+            "all"
+            if self.previous_stream_position is None
+            or stream_position < self.previous_stream_position
+            else stream_position - self.previous_stream_position
+        )
+        return (
+            f"{self.settings}-{n_new_samples}-new"
+            f"-{stream_position % self.stream_frame_len}-aligned"
+        )
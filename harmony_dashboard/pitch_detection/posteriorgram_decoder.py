@@ -0,0 +1,275 @@
+from dataclasses import dataclass
+
+import numba
+import numpy as np
+
+# Midi pitch of the lowest note bin in the model output (A0)
+LOWEST_NOTE_BIN_PITCH = 21
+
+
+@dataclass
+class DecodedNotes:
+    """
+    Parallel arrays, one entry per note, sorted by start frame
+    """
+
+    start_frames: np.ndarray
+    # Exclusive
+    end_frames: np.ndarray
+    # Midi numbers
+    pitches: np.ndarray
+    # Mean note activation over the note, between 0 and 1
+    amplitudes: np.ndarray
+
+
+class PosteriorgramDecoder:
+    """
+    Turns the model's 'note' and 'onset' posteriorgrams into notes.
+
+    Finds the same notes that basic_pitch.note_creation.output_to_notes_polyphonic
+    would, followed by the velocity filter of note_events_to_midi, but works on
+    arrays throughout: the pre-processing is vectorized, and the note tracking (an
+    inherently sequential walk through the activations) is compiled with numba.
+
+    The one deliberate difference: when the note activations never rise, basic pitch
+    divides by zero while inferring extra onsets, which silently discards the onsets
+    the model did predict.  Here, no onsets are inferred in that case instead.
+    """
+
+    def __init__(
+        self,
+        onset_threshold: float = 0.5,
+        frame_threshold: float = 0.3,
+        min_note_len_frames: int = 11,
+        min_freq_hz: float | None = None,
+        max_freq_hz: float | None = None,
+        min_velocity: int = 50,
+    ):
+        self.onset_threshold = onset_threshold
+        self.frame_threshold = frame_threshold
+        self.min_note_len_frames = min_note_len_frames
+        self.min_freq_hz = min_freq_hz
+        self.max_freq_hz = max_freq_hz
+        self.min_velocity = min_velocity
+        # Frames a note may dip below frame_threshold before it is considered over
+        self.energy_tolerance = 11
+        # How many frames back to look for a rise in note activation
+        self.n_onset_diff_frames = 2
+
+    def decode_notes(self, note: np.ndarray, onset: np.ndarray) -> DecodedNotes:
+        """
+        note, onset: posteriorgrams of shape (n_frames, n_note_bins)
+        returns every note loud enough to report
+        """
+        frames = np.array(note, dtype=np.float32)
+        onsets = np.array(onset, dtype=np.float32)
+        if frames.shape[0] == 0:
+            return _no_notes()
+        self._constrain_frequency(frames)
+        self._constrain_frequency(onsets)
+        onsets = self._with_inferred_onsets(onsets, frames)
+        onset_frames, onset_bins = self._find_onset_peaks(onsets)
+        start_frames, end_frames, note_bins, amplitudes = _track_notes(
+            frames,
+            onset_frames,
+            onset_bins,
+            self.frame_threshold,
+            self.min_note_len_frames,
+            self.energy_tolerance,
+        )
+        # Same amplitude -> midi velocity conversion as note_creation.note_events_to_midi
+        loud_enough = np.round(127 * amplitudes) > self.min_velocity
+        pitches = note_bins[loud_enough] + LOWEST_NOTE_BIN_PITCH
+        start_frames = start_frames[loud_enough]
+        end_frames = end_frames[loud_enough]
+        amplitudes = amplitudes[loud_enough]
+        order = np.lexsort((amplitudes, pitches, end_frames, start_frames))
+        return DecodedNotes(
+            start_frames=start_frames[order],
+            end_frames=end_frames[order],
+            pitches=pitches[order],
+            amplitudes=amplitudes[order],
+        )
+
+    def active_pitch_strengths(
+        self, notes: DecodedNotes, from_frame: int = 0
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the distinct pitches of the notes still sounding at or after
+        from_frame, in ascending order, along with the amplitude of the strongest
+        such note at each pitch
+        """
+        still_sounding = notes.end_frames >= from_frame
+        pitches = notes.pitches[still_sounding]
+        amplitudes = notes.amplitudes[still_sounding]
+        active_pitches, pitch_indices = np.unique(pitches, return_inverse=True)
+        strengths = np.zeros(shape=active_pitches.shape, dtype=np.float32)
+        np.maximum.at(strengths, pitch_indices, amplitudes)
+        return active_pitches, strengths
+
+    def _constrain_frequency(self, activations: np.ndarray):
+        """
+        Zeroes out, in place, activations outside the min and max frequencies
+        """
+        if self.max_freq_hz is not None:
+            activations[:, _hz_to_note_bin(self.max_freq_hz) :] = 0
+        if self.min_freq_hz is not None:
+            activations[:, : _hz_to_note_bin(self.min_freq_hz)] = 0
+
+    def _with_inferred_onsets(
+        self, onsets: np.ndarray, frames: np.ndarray
+    ) -> np.ndarray:
+        """
+        Treats a large enough rise in note activation as an onset, even if the model
+        didn't predict one there
+        """
+        n_diff = self.n_onset_diff_frames
+        padded_frames = np.concatenate(
+            [np.zeros(shape=(n_diff, frames.shape[1]), dtype=np.float32), frames]
+        )
+        # Smallest rise over each of the last n_diff frames
+        frame_rise = np.min(
+            [
+                padded_frames[n_diff:] - padded_frames[n_diff - n : -n]
+                for n in range(1, n_diff + 1)
+            ],
+            axis=0,
+        )
+        np.maximum(frame_rise, 0, out=frame_rise)
+        frame_rise[:n_diff] = 0
+        max_frame_rise = np.max(frame_rise)
+        if max_frame_rise == 0:
+            return onsets
+        # Rescale to have the same max as the predicted onsets
+        frame_rise *= np.max(onsets) / max_frame_rise
+        return np.maximum(onsets, frame_rise)
+
+    def _find_onset_peaks(self, onsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (frame, note bin) of every onset activation that peaks above the
+        threshold, latest frame first
+        """
+        is_peak = np.zeros(shape=onsets.shape, dtype=bool)
+        is_peak[1:-1] = (onsets[1:-1] > onsets[:-2]) & (onsets[1:-1] > onsets[2:])
+        is_peak &= onsets >= self.onset_threshold
+        onset_frames, onset_bins = np.nonzero(is_peak)
+        return onset_frames[::-1].copy(), onset_bins[::-1].copy()
+
+
+def _hz_to_note_bin(freq_hz: float) -> int:
+    midi_pitch = 12 * (np.log2(freq_hz) - np.log2(440.0)) + 69
+    return int(np.round(midi_pitch - LOWEST_NOTE_BIN_PITCH))
+
+
+def _no_notes() -> DecodedNotes:
+    return DecodedNotes(
+        start_frames=np.zeros(shape=(0,), dtype=np.int64),
+        end_frames=np.zeros(shape=(0,), dtype=np.int64),
+        pitches=np.zeros(shape=(0,), dtype=np.int64),
+        amplitudes=np.zeros(shape=(0,), dtype=np.float32),
+    )
+
+
+@numba.njit(cache=True)
+def _track_notes(
+    frames: np.ndarray,
+    onset_frames: np.ndarray,
+    onset_bins: np.ndarray,
+    frame_threshold: float,
+    min_note_len: int,
+    energy_tolerance: int,
+):
+    """
+    First follows each onset forward until the note activation dies away.  Then
+    repeatedly takes the strongest activation not yet claimed by a note and follows
+    it both ways (basic pitch's "melodia trick"), to catch notes without a clear
+    onset.  Claimed activations, and their neighbouring bins, are zeroed out as it
+    goes.
+
+    returns (start_frames, end_frames, note_bins, amplitudes)
+    """
+    n_frames, n_bins = frames.shape
+    max_bin = n_bins - 1
+    remaining_energy = frames.astype(np.float64)
+    start_frames = []
+    end_frames = []
+    note_bins = []
+    amplitudes = []
+
+    for onset_idx in range(onset_frames.shape[0]):
+        note_start = onset_frames[onset_idx]
+        note_bin = onset_bins[onset_idx]
+        if note_start >= n_frames - 1:
+            continue
+        i = note_start + 1
+        # Number of frames since the activation dropped below the threshold
+        k = 0
+        while i < n_frames - 1 and k < energy_tolerance:
+            if remaining_energy[i, note_bin] < frame_threshold:
+                k += 1
+            else:
+                k = 0
+            i += 1
+        note_end = i - k
+        if note_end - note_start <= min_note_len:
+            continue
+        remaining_energy[
+            note_start:note_end, max(note_bin - 1, 0) : min(note_bin + 1, max_bin) + 1
+        ] = 0
+        start_frames.append(note_start)
+        end_frames.append(note_end)
+        note_bins.append(note_bin)
+        amplitudes.append(np.mean(frames[note_start:note_end, note_bin]))
+
+    while True:
+        strongest_idx = np.argmax(remaining_energy)
+        i_mid = strongest_idx // n_bins
+        note_bin = strongest_idx % n_bins
+        if remaining_energy[i_mid, note_bin] <= frame_threshold:
+            break
+        remaining_energy[i_mid, note_bin] = 0
+        low_bin = max(note_bin - 1, 0)
+        high_bin = min(note_bin + 1, max_bin) + 1
+
+        # Forward
+        i = i_mid + 1
+        k = 0
+        while i < n_frames - 1 and k < energy_tolerance:
+            if remaining_energy[i, note_bin] < frame_threshold:
+                k += 1
+            else:
+                k = 0
+            remaining_energy[i, low_bin:high_bin] = 0
+            i += 1
+        note_end = i - 1 - k
+
+        # Backward
+        i = i_mid - 1
+        k = 0
+        while i > 0 and k < energy_tolerance:
+            if remaining_energy[i, note_bin] < frame_threshold:
+                k += 1
+            else:
+                k = 0
+            remaining_energy[i, low_bin:high_bin] = 0
+            i -= 1
+        note_start = i + 1 + k
+
+        if note_end - note_start <= min_note_len:
+            continue
+        start_frames.append(note_start)
+        end_frames.append(note_end)
+        note_bins.append(note_bin)
+        amplitudes.append(np.mean(frames[note_start:note_end, note_bin]))
+
+    n_notes = len(start_frames)
+    start_frames_array = np.empty(n_notes, dtype=np.int64)
+    end_frames_array = np.empty(n_notes, dtype=np.int64)
+    note_bins_array = np.empty(n_notes, dtype=np.int64)
+    amplitudes_array = np.empty(n_notes, dtype=np.float32)
+    for note_idx in range(n_notes):
+        start_frames_array[note_idx] = start_frames[note_idx]
+        end_frames_array[note_idx] = end_frames[note_idx]
+        note_bins_array[note_idx] = note_bins[note_idx]
+        amplitudes_array[note_idx] = amplitudes[note_idx]
+    return start_frames_array, end_frames_array, note_bins_array, amplitudes_array
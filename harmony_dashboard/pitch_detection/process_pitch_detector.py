@@ -0,0 +1,232 @@
+from dataclasses import dataclass
+import multiprocessing
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+import numpy as np
+
+from ..cpu_affinity import pin_current_thread_to_cores
+from .pitch_detector import I_PitchDetector
+
+
+@dataclass
+class _ChildError:
+    """
+    Sent back in place of a result when the child's detector raises.  Only the
+    message crosses the pipe, since not every exception can be pickled.
+    """
+
+    message: str
+
+
+class ProcessPitchDetector(I_PitchDetector):
+    """
+    Hosts another pitch detector in a child process, so that inference doesn't
+    compete with the audio callback and the UI for the GIL.
+
+    Each window of audio is copied into a block of shared memory, and only its length
+    and stream position are sent over a pipe.  The child sends the detected pitches
+    back over the same pipe.  One window is in flight at a time, so the shared memory
+    never needs more than one window's worth of room.
+
+    detector_factory builds the real detector inside the child.  It is pickled, so it
+    must be a module level function (or a functools.partial of one).
+
+    If cpu_cores are given, the child pins itself to them before building the
+    detector, so every thread the model runtime starts stays on those cores.
+
+    The child warms its detector up before start() returns, so warm_up() has nothing
+    left to do.
+
+    If the detector fails in the child, or the child dies, start() and
+    detect_pitches() raise a RuntimeError saying so.  If the child is gone, it is
+    cleaned up (as by stop()) first.
+    """
+
+    def __init__(
+        self,
+        detector_factory: Callable[[], I_PitchDetector],
+        max_window_len: int,
+        startup_timeout_sec: float = 120.0,
+        cpu_cores: list[int] | None = None,
+    ):
+        self.detector_factory = detector_factory
+        self.max_window_len = max_window_len
+        # Loading a model can take a while on a slow machine
+        self.startup_timeout_sec = startup_timeout_sec
+        self.cpu_cores = cpu_cores
+        self.shared_memory = None
+        self.shared_samples = None
+        self.connection = None
+        self.process = None
+
+    def start(self):
+        # Forking a process that has (or may later have) TensorFlow threads is unsafe
+        context = multiprocessing.get_context("spawn")
+        self.shared_memory = SharedMemory(
+            create=True, size=self.max_window_len * np.dtype(np.float32).itemsize
+        )
+        self.shared_samples = np.ndarray(
+            shape=(self.max_window_len,),
+            dtype=np.float32,
+            buffer=self.shared_memory.buf,
+        )
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_serve_pitch_detection,
+            args=(
+                self.detector_factory,
+                self.shared_memory.name,
+                child_connection,
+                self.cpu_cores,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        if not self.connection.poll(self.startup_timeout_sec):
+            self.stop()
+            raise RuntimeError("Pitch detection process did not start in time")
+        response = self._receive("starting")
+        if isinstance(response, _ChildError):
+            self.stop()
+            raise RuntimeError(
+                f"Pitch detection process failed to start: {response.message}"
+            )
+
+    def stop(self):
+        if self.process is not None:
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=5.0)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+            self.connection.close()
+            self.process = None
+        if self.shared_memory is not None:
+            # Drop our view first, shared memory can't be closed while it is exported
+            self.shared_samples = None
+            self.shared_memory.close()
+            self.shared_memory.unlink()
+            self.shared_memory = None
+
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        return self._send_window(audio_samples, stream_position, is_skipped=False)
+
+    def skip_window(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ):
+        self._send_window(audio_samples, stream_position, is_skipped=True)
+
+    def reset(self):
+        assert self.process is not None, "Pitch detection process is not running"
+        try:
+            self.connection.send("reset")
+        except (BrokenPipeError, OSError):
+            self._fail("resetting")
+        response = self._receive("resetting")
+        if isinstance(response, _ChildError):
+            raise RuntimeError(f"Pitch detection process failed: {response.message}")
+
+    def _send_window(
+        self,
+        audio_samples: np.ndarray,
+        stream_position: int | None,
+        is_skipped: bool,
+    ) -> list[int] | None:
+        assert self.process is not None, "Pitch detection process is not running"
+        audio = np.asarray(audio_samples).reshape(-1)
+        n_samples = audio.shape[0]
+        assert (
+            n_samples <= self.max_window_len
+        ), "Window is larger than the shared memory"
+        self.shared_samples[:n_samples] = audio
+        try:
+            self.connection.send((n_samples, stream_position, is_skipped))
+        except (BrokenPipeError, OSError):
+            self._fail("detecting pitches")
+        # Skipped windows are answered too, so the shared memory is free again
+        response = self._receive("detecting pitches")
+        if isinstance(response, _ChildError):
+            raise RuntimeError(f"Pitch detection process failed: {response.message}")
+        return response
+
+    def _receive(self, activity: str):
+        try:
+            return self.connection.recv()
+        except (EOFError, OSError):
+            self._fail(activity)
+
+    def _fail(self, activity: str):
+        exit_code = self.process.exitcode
+        self.stop()
+        raise RuntimeError(
+            f"Pitch detection process exited while {activity} (exit code {exit_code})"
+        )
+
+
+def _serve_pitch_detection(
+    detector_factory: Callable[[], I_PitchDetector],
+    shared_memory_name: str,
+    connection: Connection,
+    cpu_cores: list[int] | None,
+):
+    """
+    Entry point of the child process
+    """
+    if cpu_cores is not None:
+        pin_current_thread_to_cores(cpu_cores)
+    shared_memory = SharedMemory(name=shared_memory_name)
+    try:
+        pitch_detector = detector_factory()
+        pitch_detector.start()
+        pitch_detector.warm_up()
+    except Exception as e:
+        connection.send(_ChildError(f"{type(e).__name__}: {e}"))
+        shared_memory.close()
+        return
+    connection.send("ready")
+    try:
+        while True:
+            try:
+                request = connection.recv()
+            except EOFError:
+                # The parent went away without saying goodbye
+                break
+            if request is None:
+                break
+            if request == "reset":
+                try:
+                    pitch_detector.reset()
+                    response = None
+                except Exception as e:
+                    response = _ChildError(f"{type(e).__name__}: {e}")
+                connection.send(response)
+                continue
+            n_samples, stream_position, is_skipped = request
+            samples = np.ndarray(
+                shape=(n_samples,), dtype=np.float32, buffer=shared_memory.buf
+            )
+            try:
+                if is_skipped:
+                    pitch_detector.skip_window(samples, stream_position=stream_position)
+                    response = None
+                else:
+                    response = list(
+                        pitch_detector.detect_pitches(
+                            samples, stream_position=stream_position
+                        )
+                    )
+            except Exception as e:
+                response = _ChildError(f"{type(e).__name__}: {e}")
+            del samples
+            connection.send(response)
+    finally:
+        pitch_detector.stop()
+        shared_memory.close()
@@ -0,0 +1,108 @@
+"""
+Runs a remote pitch worker until interrupted.  Point the app at it with
+--remote_inference_workers.
+
+    python -m harmony_dashboard.pitch_detection.remote --host 0.0.0.0 --port 50051
+
+Give it the app's -w/--analysis_window_sec too, if the app uses one, so that it
+accepts the app's longest windows.
+"""
+
+from argparse import ArgumentParser
+from functools import partial
+import signal
+import sys
+
+from ..basic_pitch_detector import create_basic_pitch_detector, load_basic_pitch_model
+from ..batched_inference import BatchedInferenceService
+from ..inference_backends import InferenceBackend
+from ...offline_analysis import (
+    add_inference_backend_argument,
+    parse_inference_backend,
+)
+from ...real_time_basic_pitch import PitchDetectingAudioStreamer
+from .worker import RemotePitchWorker
+
+
+def main(
+    host: str,
+    port: int,
+    inference_backend: InferenceBackend | None,
+    max_window_sec: float,
+):
+    inference_service = BatchedInferenceService(
+        load_basic_pitch_model(inference_backend)
+    )
+    inference_service.start()
+    create_pitch_detector = partial(
+        create_basic_pitch_detector,
+        min_freq_hz=PitchDetectingAudioStreamer.MIN_FREQ_HZ,
+        max_freq_hz=PitchDetectingAudioStreamer.MAX_FREQ_HZ,
+        model=inference_service,
+    )
+    create_pitch_detector(sliding_window=False).warm_up()
+    worker = RemotePitchWorker(
+        address=(host, port),
+        create_pitch_detector=lambda sliding_window: create_pitch_detector(
+            sliding_window=sliding_window
+        ),
+        max_window_sec=max_window_sec,
+    )
+    # Clean up when stopped by a service manager too, not just by Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Serving pitch detection at {worker.address[0]}:{worker.address[1]}")
+    try:
+        worker.serve_until_shut_down()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.close()
+        inference_service.stop()
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--host",
+        help="Interface to listen on.  Use 0.0.0.0 to accept windows from other machines",
+        required=False,
+        default="127.0.0.1",
+    )
+    parser.add_argument(
+        "--port",
+        help="Port to listen on",
+        required=False,
+        type=int,
+        default=50051,
+    )
+    add_inference_backend_argument(parser)
+    parser.add_argument(
+        "-w",
+        "--analysis_window_sec",
+        help="Longest analysis window, in seconds, of the apps using this worker (their -w/--analysis_window_sec)",
+        required=False,
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--max_window_sec",
+        help="Longest window, in seconds, a client may send.  Longer ones are refused without reading them.  Defaults to the longest an app with --analysis_window_sec sends",
+        required=False,
+        type=float,
+        default=None,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(
+        host=args.host,
+        port=args.port,
+        inference_backend=parse_inference_backend(args.inference_backend),
+        max_window_sec=(
+            PitchDetectingAudioStreamer.longest_window_sec(args.analysis_window_sec)
+            if args.max_window_sec is None
+            else args.max_window_sec
+        ),
+    )
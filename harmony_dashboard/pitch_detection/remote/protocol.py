@@ -0,0 +1,198 @@
+"""
+Binary protocol between RemotePitchWorkerPool and remote pitch workers, over TCP.
+
+The client sends one request at a time on a connection and waits for its response.
+A request is a header followed by the window's samples:
+
+    magic         4 bytes   b"HDPW"
+    version       uint8
+    flags         uint8     SLIDING_WINDOW_FLAG if the stream is analyzed in
+                            overlapping windows, STREAM_MOVED_FLAG if the stream's
+                            previous window went to another worker (so whatever
+                            state this worker kept for it is stale), and
+                            SKIPPED_WINDOW_FLAG if the window's pitches are already
+                            known and it is only sent to keep that state in step
+    stream id     uint64    identifies the stream, so a worker can keep per-stream
+                            detector state (e.g. cached model frames)
+    position      int64     stream position at the end of the window, or -1
+    n samples     uint32
+    samples       n samples * float32, mono at basic pitch's sample rate (22050)
+
+A worker answers requests with more samples than it accepts (see read_request)
+with an error response, discarding their samples as they arrive.
+
+A response is a header followed by its payload:
+
+    magic         4 bytes   b"HDPW"
+    version       uint8
+    status        uint8     STATUS_OK or STATUS_ERROR
+    n bytes       uint32
+    payload       STATUS_OK: one uint8 midi number per pitch (none for a skipped
+                  window)
+                  STATUS_ERROR: utf-8 error message
+
+All integers and floats are little-endian.
+"""
+
+from dataclasses import dataclass
+import socket
+import struct
+
+import numpy as np
+
+MAGIC = b"HDPW"
+VERSION = 2
+SLIDING_WINDOW_FLAG = 0x01
+STREAM_MOVED_FLAG = 0x02
+SKIPPED_WINDOW_FLAG = 0x04
+STATUS_OK = 0
+STATUS_ERROR = 1
+SAMPLE_RATE = 22050
+# The longest window a streamer sends is its whole buffer, i.e. its backlog plus its
+# analysis window, so this covers analysis windows of up to 5 seconds (see
+# PitchDetectingAudioStreamer.longest_window_sec for others)
+DEFAULT_MAX_WINDOW_SEC = 10.0
+
+REQUEST_HEADER = struct.Struct("<4sBBQqI")
+RESPONSE_HEADER = struct.Struct("<4sBBI")
+
+
+class RemoteInferenceError(Exception):
+    pass
+
+
+class RequestTooLargeError(Exception):
+    pass
+
+
+@dataclass
+class WindowRequest:
+    stream_id: int
+    sliding_window: bool
+    samples: np.ndarray
+    stream_position: int | None
+    stream_moved: bool
+    is_skipped: bool
+
+
+def send_request(
+    connection: socket.socket,
+    stream_id: int,
+    sliding_window: bool,
+    audio_samples: np.ndarray,
+    stream_position: int | None,
+    stream_moved: bool = False,
+    is_skipped: bool = False,
+):
+    samples = np.asarray(audio_samples, dtype="<f4").reshape(-1)
+    header = REQUEST_HEADER.pack(
+        MAGIC,
+        VERSION,
+        (SLIDING_WINDOW_FLAG if sliding_window else 0)
+        | (STREAM_MOVED_FLAG if stream_moved else 0)
+        | (SKIPPED_WINDOW_FLAG if is_skipped else 0),
+        stream_id,
+        -1 if stream_position is None else stream_position,
+        samples.shape[0],
+    )
+    connection.sendall(header + samples.tobytes())
+
+
+def read_request(connection: socket.socket, max_n_samples: int) -> WindowRequest | None:
+    """
+    Returns the request, or None if the client hung up between requests.
+
+    Raises RequestTooLargeError if the request has more than max_n_samples samples,
+    having read past them a chunk at a time rather than allocating room for them,
+    so the connection can carry on with the next request.
+    """
+    header = _recv_exactly(connection, REQUEST_HEADER.size, eof_ok=True)
+    if header is None:
+        return None
+    magic, version, flags, stream_id, stream_position, n_samples = (
+        REQUEST_HEADER.unpack(header)
+    )
+    _check_magic_and_version(magic, version)
+    if n_samples > max_n_samples:
+        _discard_exactly(connection, 4 * n_samples)
+        raise RequestTooLargeError(
+            f"Window of {n_samples} samples is longer than the {max_n_samples} "
+            "this worker accepts"
+        )
+    samples = np.frombuffer(
+        _recv_exactly(connection, 4 * n_samples), dtype="<f4"
+    ).astype(np.float32)
+    return WindowRequest(
+        stream_id=stream_id,
+        sliding_window=bool(flags & SLIDING_WINDOW_FLAG),
+        samples=samples,
+        stream_position=None if stream_position < 0 else stream_position,
+        stream_moved=bool(flags & STREAM_MOVED_FLAG),
+        is_skipped=bool(flags & SKIPPED_WINDOW_FLAG),
+    )
+
+
+def send_pitches(connection: socket.socket, pitches: list[int]):
+    payload = bytes(pitches)
+    connection.sendall(
+        RESPONSE_HEADER.pack(MAGIC, VERSION, STATUS_OK, len(payload)) + payload
+    )
+
+
+def send_error(connection: socket.socket, message: str):
+    payload = message.encode()
+    connection.sendall(
+        RESPONSE_HEADER.pack(MAGIC, VERSION, STATUS_ERROR, len(payload)) + payload
+    )
+
+
+def read_response(connection: socket.socket) -> list[int]:
+    """
+    Returns the pitches detected.  Raises RemoteInferenceError if the worker failed
+    to detect them, or an OSError if the connection did.
+    """
+    magic, version, status, n_bytes = RESPONSE_HEADER.unpack(
+        _recv_exactly(connection, RESPONSE_HEADER.size)
+    )
+    _check_magic_and_version(magic, version)
+    payload = _recv_exactly(connection, n_bytes)
+    if status != STATUS_OK:
+        raise RemoteInferenceError(payload.decode(errors="replace"))
+    return list(payload)
+
+
+def _check_magic_and_version(magic: bytes, version: int):
+    if magic != MAGIC:
+        raise ConnectionError("Not speaking the remote pitch worker protocol")
+    if version != VERSION:
+        raise ConnectionError(f"Unsupported protocol version {version}")
+
+
+def _discard_exactly(connection: socket.socket, n_bytes: int):
+    chunk = bytearray(min(n_bytes, 1 << 16))
+    n_left = n_bytes
+    while n_left > 0:
+        n_new = connection.recv_into(chunk, min(n_left, len(chunk)))
+        if n_new == 0:
+            raise ConnectionError("Connection closed mid-message")
+        n_left -= n_new
+
+
+def _recv_exactly(
+    connection: socket.socket, n_bytes: int, eof_ok: bool = False
+) -> bytes | None:
+    """
+    eof_ok: return None rather than raise if the connection closes before anything
+        is received
+    """
+    received = bytearray(n_bytes)
+    view = memoryview(received)
+    n_received = 0
+    while n_received < n_bytes:
+        n_new = connection.recv_into(view[n_received:])
+        if n_new == 0:
+            if eof_ok and n_received == 0:
+                return None
+            raise ConnectionError("Connection closed mid-message")
+        n_received += n_new
+    return bytes(received)
@@ -0,0 +1,366 @@
+import socket
+import threading
+import time
+
+import pytest
+import numpy as np
+from unittest.mock import Mock
+
+from ....real_time_basic_pitch import PitchDetectingAudioStreamer
+from ...pitch_detector import I_PitchDetector
+from ..protocol import SAMPLE_RATE, RemoteInferenceError
+from ..worker import RemotePitchWorker
+from ..worker_pool import RemotePitchDetector, RemotePitchWorkerPool
+
+C_MAJOR = [60, 64, 67]
+
+
+class LocalWorker:
+    """
+    A RemotePitchWorker serving on localhost from a background thread
+    """
+
+    def __init__(
+        self, detect_pitches=lambda audio, stream_position: C_MAJOR, **worker_kwargs
+    ):
+        self.detect_pitches = detect_pitches
+        self.detectors_created = []
+        self.worker = RemotePitchWorker(
+            address=("127.0.0.1", 0),
+            create_pitch_detector=self.create_pitch_detector,
+            **worker_kwargs,
+        )
+        self.serving_thread = threading.Thread(target=self.worker.serve_until_shut_down)
+        self.serving_thread.start()
+
+    @property
+    def address(self):
+        return self.worker.address
+
+    def create_pitch_detector(self, sliding_window: bool):
+        pitch_detector = Mock(spec=I_PitchDetector)
+        pitch_detector.detect_pitches.side_effect = self.detect_pitches
+        self.detectors_created.append((sliding_window, pitch_detector))
+        return pitch_detector
+
+    def close(self):
+        self.worker.shut_down()
+        self.serving_thread.join()
+        self.worker.close()
+
+
+def unused_address():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()
+
+
+class TestRemotePitchWorkerPool:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.workers = []
+        yield
+        for worker in self.workers:
+            worker.close()
+
+    def start_worker(self, **kwargs) -> LocalWorker:
+        worker = LocalWorker(**kwargs)
+        self.workers.append(worker)
+        return worker
+
+    def create_patient(self, worker_addresses, **kwargs) -> RemotePitchWorkerPool:
+        patient = RemotePitchWorkerPool(worker_addresses=worker_addresses, **kwargs)
+        patient.start()
+        return patient
+
+    def test_will_return_pitches_detected_by_worker(self):
+        received_windows = []
+        worker = self.start_worker(
+            detect_pitches=lambda audio, stream_position: received_windows.append(
+                (audio.copy(), stream_position)
+            )
+            or C_MAJOR
+        )
+        patient = self.create_patient([worker.address])
+        audio = np.arange(1000, dtype=np.float32)
+
+        pitches, _ = patient.detect_pitches(
+            stream_id=1, sliding_window=True, audio_samples=audio, stream_position=5000
+        )
+
+        assert pitches == C_MAJOR
+        assert np.array_equal(received_windows[0][0], audio)
+        assert received_windows[0][1] == 5000
+        assert worker.detectors_created[0][0] is True
+
+    def test_will_keep_a_detector_per_stream_on_each_worker(self):
+        worker = self.start_worker()
+        patient = self.create_patient([worker.address])
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+
+        for stream_id in (1, 2, 1, 2):
+            patient.detect_pitches(stream_id, False, audio, None)
+
+        assert len(worker.detectors_created) == 2
+
+    def test_will_spread_streams_over_idle_workers(self):
+        workers = [self.start_worker(), self.start_worker()]
+        patient = self.create_patient([worker.address for worker in workers])
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+
+        for stream_id in range(4):
+            patient.detect_pitches(stream_id, False, audio, None)
+
+        assert patient.get_stats().requests_per_worker == [2, 2]
+
+    def test_will_keep_a_stream_on_its_previous_worker_when_idle(self):
+        workers = [self.start_worker(), self.start_worker()]
+        patient = self.create_patient([worker.address for worker in workers])
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+
+        _, worker_idx = patient.detect_pitches(1, True, audio, 100)
+        for stream_position in range(200, 1000, 100):
+            _, worker_idx = patient.detect_pitches(
+                1, True, audio, stream_position, preferred_worker_idx=worker_idx
+            )
+
+        assert sorted(patient.get_stats().requests_per_worker) == [0, 9]
+
+    def test_will_keep_a_sliding_stream_on_its_worker_however_busy(self):
+        busy_worker_may_answer = threading.Event()
+        busy_worker = self.start_worker(
+            detect_pitches=lambda audio, stream_position: (
+                stream_position is not None or busy_worker_may_answer.wait()
+            )
+            and C_MAJOR
+        )
+        idle_worker = self.start_worker()
+        patient = self.create_patient(
+            [busy_worker.address, idle_worker.address], timeout_sec=5.0
+        )
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+        busy_request = threading.Thread(
+            target=patient.detect_pitches,
+            args=(1, False, audio, None),
+            kwargs={"preferred_worker_idx": 0},
+        )
+        busy_request.start()
+        while not busy_worker.detectors_created:
+            time.sleep(0.01)
+
+        for stream_position in range(100, 600, 100):
+            patient.detect_pitches(
+                2, True, audio, stream_position, preferred_worker_idx=0
+            )
+        busy_worker_may_answer.set()
+        busy_request.join()
+
+        assert patient.get_stats().requests_per_worker == [6, 0]
+
+    def test_will_reset_a_stream_on_the_worker_it_moves_to(self):
+        healthy_worker = self.start_worker()
+        patient = self.create_patient([unused_address(), healthy_worker.address])
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+
+        _, worker_idx = patient.detect_pitches(
+            1, True, audio, 100, preferred_worker_idx=0
+        )
+        patient.detect_pitches(1, True, audio, 200, preferred_worker_idx=worker_idx)
+
+        pitch_detector = healthy_worker.detectors_created[0][1]
+        pitch_detector.reset.assert_called_once()
+        assert pitch_detector.detect_pitches.call_count == 2
+
+    def test_will_pass_skipped_windows_to_the_stream_detector(self):
+        worker = self.start_worker()
+        patient = self.create_patient([worker.address])
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+
+        pitches, _ = patient.detect_pitches(1, True, audio, 100, is_skipped=True)
+
+        pitch_detector = worker.detectors_created[0][1]
+        assert pitches == []
+        assert pitch_detector.skip_window.call_args.kwargs == {"stream_position": 100}
+        pitch_detector.detect_pitches.assert_not_called()
+
+    def test_will_send_windows_to_least_busy_worker(self):
+        slow_worker_may_answer = threading.Event()
+        slow_worker = self.start_worker(
+            detect_pitches=lambda audio, stream_position: slow_worker_may_answer.wait()
+            and C_MAJOR
+        )
+        fast_worker = self.start_worker()
+        patient = self.create_patient(
+            [slow_worker.address, fast_worker.address], timeout_sec=5.0
+        )
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+        slow_request = threading.Thread(
+            target=patient.detect_pitches,
+            args=(1, False, audio, None),
+            kwargs={"preferred_worker_idx": 0},
+        )
+        slow_request.start()
+        while not slow_worker.detectors_created:
+            time.sleep(0.01)
+
+        for stream_id in range(2, 5):
+            patient.detect_pitches(
+                stream_id, False, audio, None, preferred_worker_idx=0
+            )
+        slow_worker_may_answer.set()
+        slow_request.join()
+
+        assert patient.get_stats().requests_per_worker == [1, 3]
+
+    def test_will_fail_over_when_a_worker_times_out(self):
+        hung_worker_may_answer = threading.Event()
+        hung_worker = self.start_worker(
+            detect_pitches=lambda audio, stream_position: hung_worker_may_answer.wait()
+            and C_MAJOR
+        )
+        healthy_worker = self.start_worker()
+        patient = self.create_patient(
+            [hung_worker.address, healthy_worker.address], timeout_sec=0.2
+        )
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+
+        pitches, worker_idx = patient.detect_pitches(
+            1, False, audio, None, preferred_worker_idx=0
+        )
+        hung_worker_may_answer.set()
+
+        assert pitches == C_MAJOR
+        assert worker_idx == 1
+        assert patient.get_stats().n_failovers == 1
+
+    def test_will_leave_a_worker_that_is_down_out_of_rotation(self):
+        healthy_worker = self.start_worker()
+        patient = self.create_patient([unused_address(), healthy_worker.address])
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+
+        for stream_id in range(3):
+            pitches, _ = patient.detect_pitches(
+                stream_id, False, audio, None, preferred_worker_idx=0
+            )
+
+        assert pitches == C_MAJOR
+        assert patient.get_stats().n_failovers == 1
+        assert patient.get_stats().requests_per_worker == [0, 3]
+
+    def test_will_raise_when_no_worker_can_answer(self):
+        patient = self.create_patient([unused_address()])
+
+        with pytest.raises(RemoteInferenceError):
+            patient.detect_pitches(1, False, np.zeros(shape=(100,)), None)
+
+    def test_will_pass_on_detection_errors_without_failing_over(self):
+        def fail(audio, stream_position):
+            raise ValueError("bad window")
+
+        failing_worker = self.start_worker(detect_pitches=fail)
+        healthy_worker = self.start_worker()
+        patient = self.create_patient([failing_worker.address, healthy_worker.address])
+
+        with pytest.raises(RemoteInferenceError, match="bad window"):
+            patient.detect_pitches(
+                1, False, np.zeros(shape=(100,)), None, preferred_worker_idx=0
+            )
+        assert patient.get_stats().n_failovers == 0
+
+    def test_will_refuse_windows_longer_than_the_worker_accepts(self):
+        # 220 samples
+        worker = self.start_worker(max_window_sec=0.01)
+        patient = self.create_patient([worker.address])
+
+        with pytest.raises(RemoteInferenceError, match="RequestTooLargeError"):
+            patient.detect_pitches(1, False, np.zeros(shape=(1000,)), None)
+        # Carrying on over the same connection
+        pitches, _ = patient.detect_pitches(1, False, np.zeros(shape=(200,)), None)
+
+        assert pitches == C_MAJOR
+        assert len(worker.detectors_created) == 1
+        assert worker.detectors_created[0][1].detect_pitches.call_count == 1
+        assert patient.get_stats().n_failovers == 0
+
+    def test_will_accept_a_streamers_whole_buffer_if_given_its_analysis_window(self):
+        analysis_window_sec = 8.0
+        worker = self.start_worker(
+            max_window_sec=PitchDetectingAudioStreamer.longest_window_sec(
+                analysis_window_sec
+            )
+        )
+        patient = self.create_patient([worker.address])
+        streamer = PitchDetectingAudioStreamer(
+            audio_streamer=Mock(), analysis_window_sec=analysis_window_sec
+        )
+        audio = np.zeros(shape=(streamer.audio_ring_buffer.capacity,), dtype=np.float32)
+
+        pitches, _ = patient.detect_pitches(1, True, audio, audio.shape[0])
+
+        assert streamer.sample_rate == SAMPLE_RATE
+        assert pitches == C_MAJOR
+
+
+class TestRemotePitchDetector:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.worker_pool = Mock(spec=RemotePitchWorkerPool)
+        self.worker_pool.detect_pitches.return_value = (C_MAJOR, 1)
+        self.patient = RemotePitchDetector(
+            worker_pool=self.worker_pool, sliding_window=True
+        )
+
+    def test_will_ask_previous_worker_first(self):
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+        self.patient.detect_pitches(audio, stream_position=100)
+
+        self.patient.detect_pitches(audio, stream_position=200)
+
+        assert self.worker_pool.detect_pitches.call_args.kwargs == {
+            "stream_id": self.patient.stream_id,
+            "sliding_window": True,
+            "audio_samples": audio,
+            "stream_position": 200,
+            "preferred_worker_idx": 1,
+            "is_skipped": False,
+        }
+
+    def test_will_send_skipped_windows_of_sliding_streams(self):
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+
+        self.patient.skip_window(audio, stream_position=100)
+
+        assert self.worker_pool.detect_pitches.call_args.kwargs["is_skipped"] is True
+
+    def test_will_not_send_skipped_windows_of_other_streams(self):
+        patient = RemotePitchDetector(
+            worker_pool=self.worker_pool, sliding_window=False
+        )
+
+        patient.skip_window(np.zeros(shape=(100,), dtype=np.float32))
+
+        self.worker_pool.detect_pitches.assert_not_called()
+
+    def test_will_start_the_stream_afresh_after_reset(self):
+        audio = np.zeros(shape=(100,), dtype=np.float32)
+        self.patient.detect_pitches(audio, stream_position=100)
+
+        self.patient.reset()
+        self.patient.detect_pitches(audio, stream_position=200)
+
+        assert (
+            self.worker_pool.detect_pitches.call_args.kwargs["preferred_worker_idx"]
+            is None
+        )
+
+    def test_will_report_no_pitches_while_no_worker_can_answer(self):
+        self.worker_pool.detect_pitches.side_effect = RemoteInferenceError("down")
+
+        assert self.patient.detect_pitches(np.zeros(shape=(100,))) == []
+
+    def test_will_start_and_stop_the_shared_pool(self):
+        self.patient.start()
+        self.patient.stop()
+
+        self.worker_pool.start.assert_called_once()
+        self.worker_pool.stop.assert_called_once()
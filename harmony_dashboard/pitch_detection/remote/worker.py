@@ -0,0 +1,161 @@
+from collections import OrderedDict
+import socket
+import socketserver
+import threading
+from typing import Callable
+
+from ..pitch_detector import I_PitchDetector
+from .protocol import (
+    DEFAULT_MAX_WINDOW_SEC,
+    SAMPLE_RATE,
+    RequestTooLargeError,
+    read_request,
+    send_error,
+    send_pitches,
+)
+
+
+class RemotePitchWorker:
+    """
+    Serves pitch detection over TCP (see protocol), so streams can be spread over
+    several machines' CPUs.
+
+    Each stream gets its own detector, made by create_pitch_detector(sliding_window),
+    so that detectors that keep state between windows (like the sliding window
+    detector's frame cache) see every window of their stream that this worker is
+    sent.  A stream that comes back after its windows went to another worker has
+    its detector reset first.  Only the max_streams most recently seen streams keep
+    their detectors.
+    Give the detectors a shared BatchedInferenceService and they'll share one loaded
+    model.
+
+    Windows longer than max_window_sec are answered with an error, without holding
+    on to their samples.
+    """
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        create_pitch_detector: Callable[[bool], I_PitchDetector],
+        max_streams: int = 64,
+        max_window_sec: float = DEFAULT_MAX_WINDOW_SEC,
+    ):
+        self.create_pitch_detector = create_pitch_detector
+        self.max_streams = max_streams
+        self.max_n_samples = int(max_window_sec * SAMPLE_RATE)
+        # (stream id, sliding window) -> (detector, lock held while it detects)
+        self.stream_detectors: OrderedDict[
+            tuple[int, bool], tuple[I_PitchDetector, threading.Lock]
+        ] = OrderedDict()
+        self.stream_detectors_lock = threading.Lock()
+        self.server = _WorkerServer(address, self)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """
+        Where the worker is listening (handy if it was asked for port 0)
+        """
+        return self.server.server_address[:2]
+
+    def serve_until_shut_down(self):
+        self.server.serve_forever()
+
+    def shut_down(self):
+        """
+        Stops serving, from any thread other than the serving one
+        """
+        self.server.shutdown()
+
+    def close(self):
+        self.server.server_close()
+        with self.stream_detectors_lock:
+            for pitch_detector, _ in self.stream_detectors.values():
+                pitch_detector.stop()
+            self.stream_detectors.clear()
+
+    def handle_connection(self, connection: socket.socket):
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            try:
+                request = read_request(connection, self.max_n_samples)
+            except RequestTooLargeError as e:
+                if not self._respond(connection, None, f"{type(e).__name__}: {e}"):
+                    return
+                continue
+            except ConnectionError:
+                return
+            if request is None:
+                return
+            pitch_detector, detector_lock = self._stream_detector(
+                request.stream_id, request.sliding_window
+            )
+            try:
+                with detector_lock:
+                    if request.stream_moved:
+                        pitch_detector.reset()
+                    if request.is_skipped:
+                        pitch_detector.skip_window(
+                            request.samples, stream_position=request.stream_position
+                        )
+                        pitches = []
+                    else:
+                        pitches = pitch_detector.detect_pitches(
+                            request.samples, stream_position=request.stream_position
+                        )
+                error_message = None
+            except Exception as e:
+                pitches = None
+                error_message = f"{type(e).__name__}: {e}"
+            if not self._respond(connection, pitches, error_message):
+                return
+
+    def _respond(
+        self,
+        connection: socket.socket,
+        pitches: list[int] | None,
+        error_message: str | None,
+    ) -> bool:
+        """
+        Returns whether the client is still there to send the next request
+        """
+        try:
+            if pitches is None:
+                send_error(connection, error_message)
+            else:
+                send_pitches(connection, pitches)
+        except OSError:
+            # The client gave up waiting
+            return False
+        return True
+
+    def _stream_detector(
+        self, stream_id: int, sliding_window: bool
+    ) -> tuple[I_PitchDetector, threading.Lock]:
+        key = (stream_id, sliding_window)
+        with self.stream_detectors_lock:
+            if key in self.stream_detectors:
+                self.stream_detectors.move_to_end(key)
+                return self.stream_detectors[key]
+            pitch_detector = self.create_pitch_detector(sliding_window)
+            pitch_detector.start()
+            self.stream_detectors[key] = (pitch_detector, threading.Lock())
+            if len(self.stream_detectors) > self.max_streams:
+                _, (evicted_detector, _) = self.stream_detectors.popitem(last=False)
+                evicted_detector.stop()
+            return self.stream_detectors[key]
+
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.server.remote_pitch_worker.handle_connection(self.request)
+
+
+class _WorkerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self, address: tuple[str, int], remote_pitch_worker: RemotePitchWorker
+    ):
+        self.remote_pitch_worker = remote_pitch_worker
+        super().__init__(address, _ConnectionHandler)
@@ -0,0 +1,267 @@
+from dataclasses import dataclass, field
+import random
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+from ..pitch_detector import I_PitchDetector
+from .protocol import RemoteInferenceError, read_response, send_request
+
+
+@dataclass
+class RemoteWorkerPoolStats:
+    n_requests: int
+    # Requests that had to be retried on another worker
+    n_failovers: int
+    # Requests answered by each worker, in the order the workers were given
+    requests_per_worker: list[int]
+
+
+@dataclass
+class _Worker:
+    address: tuple[str, int]
+    idle_connections: list[socket.socket] = field(default_factory=list)
+    n_in_flight: int = 0
+    # Left out of rotation until then (time.monotonic)
+    down_until: float = 0.0
+    n_answered: int = 0
+
+
+class RemotePitchWorkerPool:
+    """
+    Spreads pitch detection over a pool of remote pitch workers (see worker).  Can be
+    shared by the RemotePitchDetectors of several streams.
+
+    Each window goes to the worker with the fewest windows in flight.  Among equally
+    busy workers, the one that handled the stream's previous window is preferred
+    (it may have cached work for the overlap), and otherwise they take turns.
+    Sliding window streams stay with the worker that handled their previous window
+    however busy it is, since its detector reports only what is new since the
+    window before, and only move if that worker can't answer.  The worker a stream
+    moves to is told so, and starts the stream afresh.
+
+    A worker that fails, or hasn't answered within timeout_sec, is left out of
+    rotation for retry_after_sec and the window is retried on another.  If no worker
+    can answer, RemoteInferenceError is raised straight away rather than waiting.
+
+    start() and stop() are reference counted, like BatchedInferenceService's.
+    """
+
+    def __init__(
+        self,
+        worker_addresses: list[tuple[str, int]],
+        timeout_sec: float = 1.0,
+        retry_after_sec: float = 5.0,
+    ):
+        assert worker_addresses, "A pool needs at least one worker"
+        self.workers = [_Worker(address=address) for address in worker_addresses]
+        self.timeout_sec = timeout_sec
+        self.retry_after_sec = retry_after_sec
+        self.lock = threading.Lock()
+        self.n_users = 0
+        self.next_worker_idx = 0
+        self.n_requests = 0
+        self.n_failovers = 0
+
+    def start(self):
+        with self.lock:
+            self.n_users += 1
+
+    def stop(self):
+        with self.lock:
+            self.n_users -= 1
+            if self.n_users > 0:
+                return
+            for worker in self.workers:
+                self._close_idle_connections(worker)
+
+    def detect_pitches(
+        self,
+        stream_id: int,
+        sliding_window: bool,
+        audio_samples: np.ndarray,
+        stream_position: int | None,
+        preferred_worker_idx: int | None = None,
+        is_skipped: bool = False,
+    ) -> tuple[list[int], int]:
+        """
+        Returns the pitches detected, and the index of the worker that detected them
+
+        is_skipped: the window's pitches are already known, and it is only sent so
+            the worker's detector for the stream stays in step (see skip_window).
+            No pitches are returned.
+        """
+        tried_worker_indices = set()
+        last_error = None
+        with self.lock:
+            self.n_requests += 1
+        while True:
+            with self.lock:
+                worker_idx = self._choose_worker(
+                    sliding_window, preferred_worker_idx, tried_worker_indices
+                )
+                if worker_idx is None:
+                    raise RemoteInferenceError(
+                        f"No pitch worker could answer (last error: {last_error})"
+                    )
+                if tried_worker_indices:
+                    self.n_failovers += 1
+                tried_worker_indices.add(worker_idx)
+                worker = self.workers[worker_idx]
+                worker.n_in_flight += 1
+                connection = (
+                    worker.idle_connections.pop() if worker.idle_connections else None
+                )
+            try:
+                if connection is None:
+                    connection = socket.create_connection(
+                        worker.address, timeout=self.timeout_sec
+                    )
+                    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                send_request(
+                    connection,
+                    stream_id,
+                    sliding_window,
+                    audio_samples,
+                    stream_position,
+                    stream_moved=worker_idx != preferred_worker_idx,
+                    is_skipped=is_skipped,
+                )
+                pitches = read_response(connection)
+            except OSError as e:
+                # Includes timeouts
+                last_error = e
+                if connection is not None:
+                    connection.close()
+                with self.lock:
+                    worker.n_in_flight -= 1
+                    worker.down_until = time.monotonic() + self.retry_after_sec
+                    # Probably just as broken
+                    self._close_idle_connections(worker)
+                continue
+            except RemoteInferenceError:
+                # The worker is fine, it was the detection that failed
+                with self.lock:
+                    worker.n_in_flight -= 1
+                    worker.idle_connections.append(connection)
+                raise
+            with self.lock:
+                worker.n_in_flight -= 1
+                worker.n_answered += 1
+                worker.idle_connections.append(connection)
+            return pitches, worker_idx
+
+    def get_stats(self) -> RemoteWorkerPoolStats:
+        with self.lock:
+            return RemoteWorkerPoolStats(
+                n_requests=self.n_requests,
+                n_failovers=self.n_failovers,
+                requests_per_worker=[worker.n_answered for worker in self.workers],
+            )
+
+    def _choose_worker(
+        self,
+        sliding_window: bool,
+        preferred_worker_idx: int | None,
+        tried_worker_indices: set[int],
+    ) -> int | None:
+        now = time.monotonic()
+        candidates = [
+            worker_idx
+            for worker_idx, worker in enumerate(self.workers)
+            if worker_idx not in tried_worker_indices and worker.down_until <= now
+        ]
+        if not candidates:
+            return None
+        if sliding_window and preferred_worker_idx in candidates:
+            return preferred_worker_idx
+        fewest_in_flight = min(
+            self.workers[worker_idx].n_in_flight for worker_idx in candidates
+        )
+        least_busy = [
+            worker_idx
+            for worker_idx in candidates
+            if self.workers[worker_idx].n_in_flight == fewest_in_flight
+        ]
+        if preferred_worker_idx in least_busy:
+            return preferred_worker_idx
+        self.next_worker_idx += 1
+        return least_busy[self.next_worker_idx % len(least_busy)]
+
+    def _close_idle_connections(self, worker: _Worker):
+        for connection in worker.idle_connections:
+            connection.close()
+        worker.idle_connections.clear()
+
+
+class RemotePitchDetector(I_PitchDetector):
+    """
+    Detects pitches on a RemotePitchWorkerPool, as one stream.
+
+    If no worker can answer, reports no pitches (and says so on stderr, once) rather
+    than stopping pitch detection altogether, and carries on once a worker is back.
+
+    Skipped windows are only sent on for sliding window streams, the only ones whose
+    detectors keep state for skip_window to update.
+    """
+
+    def __init__(self, worker_pool: RemotePitchWorkerPool, sliding_window: bool):
+        self.worker_pool = worker_pool
+        self.sliding_window = sliding_window
+        self.stream_id = random.getrandbits(64)
+        self.previous_worker_idx = None
+        self.is_failing = False
+
+    def start(self):
+        self.worker_pool.start()
+
+    def stop(self):
+        self.worker_pool.stop()
+
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        return self._send_window(audio_samples, stream_position, is_skipped=False)
+
+    def skip_window(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ):
+        if self.sliding_window:
+            self._send_window(audio_samples, stream_position, is_skipped=True)
+
+    def reset(self):
+        # The next window goes out as if the stream had moved, so whichever worker
+        # gets it starts the stream afresh
+        self.previous_worker_idx = None
+
+    def _send_window(
+        self,
+        audio_samples: np.ndarray,
+        stream_position: int | None,
+        is_skipped: bool,
+    ) -> list[int]:
+        try:
+            pitches, self.previous_worker_idx = self.worker_pool.detect_pitches(
+                stream_id=self.stream_id,
+                sliding_window=self.sliding_window,
+                audio_samples=audio_samples,
+                stream_position=stream_position,
+                preferred_worker_idx=self.previous_worker_idx,
+                is_skipped=is_skipped,
+            )
+        except RemoteInferenceError as e:
+            if not self.is_failing:
+                print(
+                    f"Remote pitch detection failed, reporting no pitches until it "
+                    f"recovers: {e}",
+                    file=sys.stderr,
+                )
+                self.is_failing = True
+            return []
+        if self.is_failing:
+            print("Remote pitch detection recovered", file=sys.stderr)
+            self.is_failing = False
+        return pitches
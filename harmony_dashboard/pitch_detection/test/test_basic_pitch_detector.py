@@ -0,0 +1,231 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+import numpy as np
+from unittest.mock import Mock
+from basic_pitch.inference import Model
+from basic_pitch.constants import AUDIO_N_SAMPLES, ANNOT_N_FRAMES
+
+from ..basic_pitch_detector import BasicPitchDetector, SlidingWindowBasicPitchDetector
+
+MIDDLE_C = 60
+LOWEST_PIANO_KEY = 21
+
+
+def model_output_with_sustained_pitch(batch: np.ndarray, pitch: int | None):
+    n_windows = batch.shape[0]
+    note = np.zeros(shape=(n_windows, ANNOT_N_FRAMES, 88), dtype=np.float32)
+    onset = np.zeros_like(note)
+    contour = np.zeros(shape=(n_windows, ANNOT_N_FRAMES, 264), dtype=np.float32)
+    if pitch is not None:
+        note[:, :, pitch - LOWEST_PIANO_KEY] = 0.9
+        onset[:, 20, pitch - LOWEST_PIANO_KEY] = 0.9
+    return {"note": note, "onset": onset, "contour": contour}
+
+
+class TestBasicPitchDetector:
+
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.model = Mock(spec=Model)
+        self.model.predict.side_effect = lambda batch: (
+            model_output_with_sustained_pitch(batch, MIDDLE_C)
+        )
+        self.patient = BasicPitchDetector(model=self.model)
+
+    def test_will_feed_model_fixed_size_float32_windows(self):
+        audio = np.zeros(shape=(4410, 1), dtype=np.float64)
+
+        self.patient.detect_pitches(audio)
+
+        batch = self.model.predict.call_args.args[0]
+        assert batch.shape == (1, AUDIO_N_SAMPLES, 1)
+        assert batch.dtype == np.float32
+
+    def test_will_place_audio_after_half_the_overlap_padding(self):
+        audio = np.arange(1, 101, dtype=np.float32)
+
+        self.patient.detect_pitches(audio)
+
+        batch = self.model.predict.call_args.args[0]
+        padding = self.patient.overlap_len // 2
+        assert np.all(batch[0, :padding, 0] == 0)
+        assert np.array_equal(batch[0, padding : padding + 100, 0], audio)
+
+    def test_will_split_long_audio_into_several_windows(self):
+        audio = np.zeros(shape=(3 * AUDIO_N_SAMPLES,), dtype=np.float32)
+
+        self.patient.detect_pitches(audio)
+
+        assert self.model.predict.call_count == 4
+
+    def test_will_trim_model_output_to_length_of_audio(self):
+        audio = np.zeros(shape=(22050,), dtype=np.float32)
+
+        model_output = self.patient.infer_model_output(audio)
+
+        assert model_output["note"].shape == (86, 88)
+        assert model_output["contour"].shape == (86, 264)
+
+    def test_will_return_pitches_found_by_model(self):
+        audio = np.zeros(shape=(22050,), dtype=np.float32)
+
+        actual_pitches = self.patient.detect_pitches(audio)
+
+        assert actual_pitches == [MIDDLE_C]
+
+    def test_will_return_no_pitches_if_model_finds_none(self):
+        self.model.predict.side_effect = lambda batch: (
+            model_output_with_sustained_pitch(batch, None)
+        )
+        audio = np.zeros(shape=(22050,), dtype=np.float32)
+
+        actual_pitches = self.patient.detect_pitches(audio)
+
+        assert actual_pitches == []
+
+    def test_will_not_write_to_working_directory(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        audio = np.zeros(shape=(4410,), dtype=np.float32)
+
+        self.patient.detect_pitches(audio)
+
+        assert os.listdir(tmp_path) == []
+
+
+class TestSlidingWindowBasicPitchDetector:
+    SAMPLE_RATE = 22050
+    HOP = 4410
+
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.model = Mock(spec=Model)
+        self.model.predict.side_effect = lambda batch: (
+            model_output_with_sustained_pitch(batch, MIDDLE_C)
+        )
+        self.patient = SlidingWindowBasicPitchDetector(model=self.model)
+
+    def feed_window(self, stream_position: int, window_len: int):
+        window = np.zeros(shape=(window_len,), dtype=np.float32)
+        return self.patient.detect_pitches(window, stream_position=stream_position)
+
+    def test_will_only_run_model_once_per_hop_after_first_window(self):
+        window_len = 2 * self.SAMPLE_RATE
+        self.feed_window(window_len, window_len)
+        self.model.predict.reset_mock()
+
+        for hop_idx in range(1, 6):
+            self.feed_window(window_len + hop_idx * self.HOP, window_len)
+
+        assert self.model.predict.call_count == 5
+
+    def test_will_not_reuse_warm_up_frames_for_the_stream(self):
+        window_len = 4 * self.SAMPLE_RATE
+        self.patient.warm_up()
+        self.model.predict.reset_mock()
+
+        self.feed_window(window_len, window_len)
+
+        assert self.model.predict.call_count == 3
+
+    def test_will_run_model_over_whole_window_when_first_fed(self):
+        window_len = 4 * self.SAMPLE_RATE
+
+        self.feed_window(window_len, window_len)
+
+        assert self.model.predict.call_count == 3
+
+    def test_will_run_model_over_whole_window_again_if_stream_jumps_back(self):
+        window_len = 4 * self.SAMPLE_RATE
+        self.feed_window(10 * window_len, window_len)
+        self.model.predict.reset_mock()
+
+        self.feed_window(window_len, window_len)
+
+        assert self.model.predict.call_count == 3
+
+    def test_will_run_model_over_whole_window_if_stream_position_unknown(self):
+        window_len = 4 * self.SAMPLE_RATE
+        self.feed_window(window_len, window_len)
+        self.model.predict.reset_mock()
+
+        self.patient.detect_pitches(np.zeros(shape=(window_len,), dtype=np.float32))
+
+        assert self.model.predict.call_count == 3
+
+    def test_will_run_model_over_whole_window_again_after_reset(self):
+        window_len = 4 * self.SAMPLE_RATE
+        self.feed_window(window_len, window_len)
+        self.model.predict.reset_mock()
+
+        self.patient.reset()
+        self.feed_window(window_len + self.HOP, window_len)
+
+        assert self.model.predict.call_count == 3
+
+    def test_will_report_note_sustained_across_hops(self):
+        window_len = 2 * self.SAMPLE_RATE
+        self.feed_window(window_len, window_len)
+
+        actual_pitches = self.feed_window(window_len + self.HOP, window_len)
+
+        assert actual_pitches == [MIDDLE_C]
+
+    def test_will_not_report_notes_that_ended_before_newest_hop(self):
+        window_len = 2 * self.SAMPLE_RATE
+        self.feed_window(window_len, window_len)
+        self.model.predict.side_effect = lambda batch: (
+            model_output_with_sustained_pitch(batch, None)
+        )
+
+        actual_pitches = self.feed_window(window_len + 4 * self.HOP, window_len)
+
+        assert actual_pitches == []
+
+
+def test_will_use_same_constants_as_basic_pitch():
+    from basic_pitch import constants
+    from .. import basic_pitch_detector
+
+    for name in (
+        "FFT_HOP",
+        "AUDIO_SAMPLE_RATE",
+        "ANNOTATIONS_FPS",
+        "ANNOT_N_FRAMES",
+        "AUDIO_N_SAMPLES",
+    ):
+        assert getattr(basic_pitch_detector, name) == getattr(constants, name)
+
+
+def test_will_not_import_tensorflow_for_onnx_backend(tmp_path):
+    pytest.importorskip("onnxruntime")
+    # Stands in for TensorFlow being installed, which basic_pitch would import
+    (tmp_path / "tensorflow").mkdir()
+    (tmp_path / "tensorflow" / "__init__.py").write_text("")
+    package_root = Path(__file__).parents[3]
+    check = (
+        "import sys\n"
+        "from harmony_dashboard.pitch_detection.basic_pitch_detector import "
+        "create_basic_pitch_detector\n"
+        "from harmony_dashboard.pitch_detection.inference_backends import "
+        "InferenceBackend\n"
+        "create_basic_pitch_detector(\n"
+        "    sliding_window=True, inference_backend=InferenceBackend.ONNX\n"
+        ").warm_up()\n"
+        "assert 'tensorflow' not in sys.modules, 'TensorFlow was imported'\n"
+    )
+
+    child = subprocess.run(
+        [sys.executable, "-c", check],
+        env={
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join([str(tmp_path), str(package_root)]),
+        },
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+    assert child.returncode == 0, child.stderr
@@ -0,0 +1,142 @@
+import threading
+
+import pytest
+import numpy as np
+from unittest.mock import Mock
+
+from ..batched_inference import BatchedInferenceService
+from ..inference_backends import I_InferenceBackend
+
+N_STREAMS = 4
+WINDOW_LEN = 16
+
+
+def output_tagged_with_input(windows: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Each window's output is filled with that window's first sample
+    """
+    tags = windows[:, :1, :]
+    return {
+        "note": np.broadcast_to(tags, (windows.shape[0], 3, 1)).copy(),
+        "onset": np.broadcast_to(tags, (windows.shape[0], 3, 1)).copy(),
+    }
+
+
+def windows_tagged_with(tag: float, n_windows: int = 1) -> np.ndarray:
+    return np.full((n_windows, WINDOW_LEN, 1), tag, dtype=np.float32)
+
+
+class TestBatchedInferenceService:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.backend = Mock(spec=I_InferenceBackend)
+        self.backend.predict.side_effect = output_tagged_with_input
+        self.patient = BatchedInferenceService(
+            self.backend, max_batch_windows=N_STREAMS, batch_collection_sec=1.0
+        )
+        self.patient.start()
+        yield
+        self.patient.stop()
+
+    def predict_from_every_stream(self) -> list[dict[str, np.ndarray]]:
+        outputs = [None] * N_STREAMS
+
+        def predict_from_stream(stream_idx: int):
+            outputs[stream_idx] = self.patient.predict(windows_tagged_with(stream_idx))
+
+        threads = [
+            threading.Thread(target=predict_from_stream, args=(stream_idx,))
+            for stream_idx in range(N_STREAMS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outputs
+
+    def test_will_run_windows_from_all_streams_as_one_batch(self):
+        self.predict_from_every_stream()
+
+        self.backend.predict.assert_called_once()
+        assert self.backend.predict.call_args.args[0].shape[0] == N_STREAMS
+
+    def test_will_route_each_stream_its_own_output(self):
+        outputs = self.predict_from_every_stream()
+
+        for stream_idx, output in enumerate(outputs):
+            assert np.all(output["note"] == stream_idx)
+            assert output["note"].shape == (1, 3, 1)
+
+    def test_will_not_wait_for_more_windows_once_batch_is_full(self):
+        output = self.patient.predict(windows_tagged_with(7, n_windows=N_STREAMS))
+
+        assert output["note"].shape[0] == N_STREAMS
+        assert self.patient.get_stats().mean_windows_per_batch == N_STREAMS
+
+    def test_will_raise_model_errors_in_caller(self):
+        self.backend.predict.side_effect = RuntimeError("model failed")
+
+        with pytest.raises(RuntimeError):
+            self.patient.predict(windows_tagged_with(0, n_windows=N_STREAMS))
+
+    def test_will_keep_running_until_last_user_stops(self):
+        self.patient.start()
+
+        self.patient.stop()
+
+        output = self.patient.predict(windows_tagged_with(3, n_windows=N_STREAMS))
+        assert np.all(output["note"] == 3)
+
+    def test_will_load_model_once_on_first_load(self):
+        load_inference_backend = Mock(return_value=self.backend)
+        patient = BatchedInferenceService(
+            max_batch_windows=N_STREAMS, load_inference_backend=load_inference_backend
+        )
+        patient.start()
+        try:
+            load_inference_backend.assert_not_called()
+
+            for _ in range(N_STREAMS):
+                patient.load()
+            output = patient.predict(windows_tagged_with(5, n_windows=N_STREAMS))
+        finally:
+            patient.stop()
+
+        load_inference_backend.assert_called_once()
+        assert np.all(output["note"] == 5)
+
+    def test_will_raise_load_error_to_every_caller_without_loading_again(self):
+        load_inference_backend = Mock(side_effect=RuntimeError("model missing"))
+        patient = BatchedInferenceService(load_inference_backend=load_inference_backend)
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match="model missing"):
+                patient.load()
+
+        load_inference_backend.assert_called_once()
+
+    def test_will_run_again_when_started_while_stopping(self):
+        is_predicting = threading.Event()
+        may_predict = threading.Event()
+        self.backend.predict.side_effect = lambda windows: (
+            is_predicting.set() or may_predict.wait()
+        ) and output_tagged_with_input(windows)
+        predictor = threading.Thread(
+            target=self.patient.predict, args=(windows_tagged_with(1, N_STREAMS),)
+        )
+        predictor.start()
+        is_predicting.wait(timeout=5.0)
+        # Waits for the batch in progress to finish
+        stopper = threading.Thread(target=self.patient.stop)
+        stopper.start()
+        stopper.join(timeout=0.1)
+        starter = threading.Thread(target=self.patient.start)
+        starter.start()
+
+        may_predict.set()
+        for thread in (predictor, stopper, starter):
+            thread.join(timeout=5.0)
+        output = self.patient.predict(windows_tagged_with(2, n_windows=N_STREAMS))
+
+        assert not stopper.is_alive()
+        assert np.all(output["note"] == 2)
@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+
+from ..chroma_pitch_detector import ChromaPitchDetector
+
+SAMPLE_RATE = 22050
+C_MAJOR = [60, 64, 67]
+
+
+def piano_like_chord(pitches: list[int], n_samples: int = 8192) -> np.ndarray:
+    """
+    Each note with a few decaying overtones, over a little background noise
+    """
+    t = np.arange(n_samples) / SAMPLE_RATE
+    audio = 0.003 * np.random.default_rng(0).standard_normal(n_samples)
+    for pitch in pitches:
+        freq_hz = 440.0 * 2 ** ((pitch - 69) / 12)
+        for harmonic in range(1, 7):
+            audio += (
+                0.1 * 0.6 ** (harmonic - 1) * np.sin(2 * np.pi * freq_hz * harmonic * t)
+            )
+    return audio.astype(np.float32)
+
+
+class TestChromaPitchDetector:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = ChromaPitchDetector(sample_rate=SAMPLE_RATE)
+
+    @pytest.mark.parametrize("pitches", [C_MAJOR, [57, 60, 64], [55, 59, 62, 65], [69]])
+    def test_will_detect_notes_of_chord(self, pitches):
+        actual_pitches = self.patient.detect_pitches(piano_like_chord(pitches))
+
+        assert actual_pitches == pitches
+
+    def test_will_report_bass_note_at_its_own_octave(self):
+        actual_pitches = self.patient.detect_pitches(piano_like_chord([43, 59, 62]))
+
+        assert actual_pitches == [43, 59, 62]
+
+    def test_will_detect_nothing_in_quiet_audio(self):
+        audio = 0.001 * np.random.default_rng(0).standard_normal(8192)
+
+        assert self.patient.detect_pitches(audio) == []
+
+    def test_will_analyze_only_newest_window(self):
+        audio = np.concatenate(
+            [piano_like_chord([57, 60, 64]), piano_like_chord(C_MAJOR)]
+        )
+
+        assert self.patient.detect_pitches(audio) == C_MAJOR
@@ -0,0 +1,44 @@
+import pytest
+import numpy as np
+from basic_pitch.constants import AUDIO_N_SAMPLES, ANNOT_N_FRAMES
+
+from ..inference_backends import (
+    InferenceBackend,
+    InferenceThreadConfig,
+    basic_pitch_model_dir,
+    load_inference_backend,
+)
+
+
+def test_will_find_models_shipped_with_basic_pitch():
+    model_dir = basic_pitch_model_dir()
+
+    assert (model_dir / "nmp.onnx").exists()
+    assert (model_dir / "nmp.tflite").exists()
+
+
+class TestOnnxBackend:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        pytest.importorskip("onnxruntime")
+        self.patient = load_inference_backend(InferenceBackend.ONNX)
+
+    def test_will_return_posteriorgrams_under_basic_pitch_names(self):
+        windows = np.zeros(shape=(2, AUDIO_N_SAMPLES, 1), dtype=np.float32)
+
+        model_output = self.patient.predict(windows)
+
+        assert model_output["note"].shape == (2, ANNOT_N_FRAMES, 88)
+        assert model_output["onset"].shape == (2, ANNOT_N_FRAMES, 88)
+        assert model_output["contour"].shape == (2, ANNOT_N_FRAMES, 264)
+
+    def test_will_still_predict_with_limited_threads(self):
+        patient = load_inference_backend(
+            InferenceBackend.ONNX,
+            InferenceThreadConfig(intra_op_threads=1, inter_op_threads=2),
+        )
+        windows = np.zeros(shape=(1, AUDIO_N_SAMPLES, 1), dtype=np.float32)
+
+        model_output = patient.predict(windows)
+
+        assert model_output["note"].shape == (1, ANNOT_N_FRAMES, 88)
@@ -0,0 +1,226 @@
+from unittest.mock import Mock
+
+import pytest
+import numpy as np
+from basic_pitch.inference import Model
+from basic_pitch.constants import AUDIO_N_SAMPLES, ANNOT_N_FRAMES, FFT_HOP
+
+from ..basic_pitch_detector import SlidingWindowBasicPitchDetector
+from ..pitch_detector import I_PitchDetector
+from ..pitch_result_cache import (
+    CachingPitchDetector,
+    PitchResultCache,
+    PitchResultCacheStats,
+    basic_pitch_result_settings,
+    window_key,
+)
+
+SETTINGS = basic_pitch_result_settings(
+    sliding_window=False,
+    inference_backend=None,
+    min_freq_hz=27.5,
+    max_freq_hz=2093.0,
+)
+
+
+SLIDING_SETTINGS = basic_pitch_result_settings(
+    sliding_window=True,
+    inference_backend=None,
+    min_freq_hz=27.5,
+    max_freq_hz=2093.0,
+)
+LOWEST_PIANO_KEY = 21
+
+
+def window(value: float) -> np.ndarray:
+    return np.full(shape=(4410,), fill_value=value, dtype=np.float32)
+
+
+def model_output_following_audio(batch: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Sounds midi pitch 100 * sample wherever the audio is positive, so the model's
+    output depends on the audio like the real one's does
+    """
+    n_windows = batch.shape[0]
+    note = np.zeros(shape=(n_windows, ANNOT_N_FRAMES, 88), dtype=np.float32)
+    onset = np.zeros_like(note)
+    contour = np.zeros(shape=(n_windows, ANNOT_N_FRAMES, 264), dtype=np.float32)
+    frame_samples = batch[
+        :, np.minimum(np.arange(ANNOT_N_FRAMES) * FFT_HOP, AUDIO_N_SAMPLES - 1), 0
+    ]
+    for window_idx, frame_idx in zip(*np.nonzero(frame_samples > 0)):
+        pitch_idx = round(100 * frame_samples[window_idx, frame_idx]) - LOWEST_PIANO_KEY
+        note[window_idx, frame_idx, pitch_idx] = 0.9
+        if (
+            frame_idx == 0
+            or frame_samples[window_idx, frame_idx - 1]
+            != frame_samples[window_idx, frame_idx]
+        ):
+            onset[window_idx, frame_idx, pitch_idx] = 0.9
+    return {"note": note, "onset": onset, "contour": contour}
+
+
+class TestPitchResultCache:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self, tmp_path):
+        self.cache_path = str(tmp_path / "pitch_results.sqlite3")
+        self.patient = PitchResultCache(self.cache_path, max_entries=10)
+        yield
+        self.patient.close()
+
+    def test_will_return_stored_pitches(self):
+        self.patient.put(window_key(window(0.1), SETTINGS), [60, 64, 67])
+
+        assert self.patient.get(window_key(window(0.1), SETTINGS)) == [60, 64, 67]
+        assert self.patient.get(window_key(window(0.2), SETTINGS)) is None
+        assert self.patient.get_stats() == PitchResultCacheStats(hits=1, misses=1)
+
+    def test_will_key_by_settings(self):
+        other_settings = basic_pitch_result_settings(
+            sliding_window=False,
+            inference_backend=None,
+            min_freq_hz=27.5,
+            max_freq_hz=4186.0,
+        )
+
+        assert window_key(window(0.1), SETTINGS) != window_key(
+            window(0.1), other_settings
+        )
+
+    def test_will_keep_results_for_other_instances(self):
+        self.patient.put(window_key(window(0.1), SETTINGS), [60])
+        other_cache = PitchResultCache(self.cache_path)
+        try:
+            actual_pitches = other_cache.get(window_key(window(0.1), SETTINGS))
+            other_cache.get(window_key(window(0.2), SETTINGS))
+        finally:
+            other_cache.close()
+
+        assert actual_pitches == [60]
+        assert self.patient.get_stored_stats() == PitchResultCacheStats(
+            hits=1, misses=1
+        )
+
+    def test_will_evict_least_recently_used_once_full(self):
+        keys = [window_key(window(idx), SETTINGS) for idx in range(11)]
+        for key in keys[:10]:
+            self.patient.put(key, [60])
+        # Used again, so now the most recently used
+        self.patient.get(keys[0])
+
+        self.patient.put(keys[10], [60])
+
+        assert self.patient.get(keys[0]) == [60]
+        assert self.patient.get(keys[1]) is None
+        assert self.patient.get(keys[10]) == [60]
+        # Down to 9 entries, plus a tenth of the maximum for headroom
+        assert self.patient.get_stats().evictions == 2
+
+
+class TestCachingPitchDetector:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self, tmp_path):
+        self.underlying_detector = Mock(spec=I_PitchDetector)
+        self.underlying_detector.detect_pitches.return_value = [60, 64]
+        self.cache = PitchResultCache(str(tmp_path / "pitch_results.sqlite3"))
+        self.patient = CachingPitchDetector(
+            underlying_detector=self.underlying_detector,
+            cache=self.cache,
+            settings=SETTINGS,
+        )
+        yield
+        self.cache.close()
+
+    def test_will_only_detect_pitches_in_window_once(self):
+        first_pitches = self.patient.detect_pitches(window(0.1), stream_position=4410)
+        second_pitches = self.patient.detect_pitches(window(0.1), stream_position=8820)
+
+        assert first_pitches == second_pitches == [60, 64]
+        self.underlying_detector.detect_pitches.assert_called_once()
+        assert self.patient.get_stats() == PitchResultCacheStats(hits=1, misses=1)
+
+    def test_will_detect_pitches_in_new_window(self):
+        self.patient.detect_pitches(window(0.1), stream_position=4410)
+
+        self.patient.detect_pitches(window(0.2), stream_position=8820)
+
+        assert self.underlying_detector.detect_pitches.call_count == 2
+
+    def test_will_start_and_stop_underlying_detector(self):
+        self.patient.start()
+        self.patient.warm_up()
+        self.patient.stop()
+
+        self.underlying_detector.start.assert_called_once()
+        self.underlying_detector.warm_up.assert_called_once()
+        self.underlying_detector.stop.assert_called_once()
+
+
+class TestCachingSlidingWindowDetector:
+    SAMPLE_RATE = 22050
+    HOP = 4410
+
+    @pytest.fixture(autouse=True)
+    def before_each_test(self, tmp_path):
+        self.cache = PitchResultCache(str(tmp_path / "pitch_results.sqlite3"))
+        yield
+        self.cache.close()
+
+    def create_detector(self) -> SlidingWindowBasicPitchDetector:
+        model = Mock(spec=Model)
+        model.predict.side_effect = model_output_following_audio
+        return SlidingWindowBasicPitchDetector(model=model)
+
+    def create_patient(self) -> CachingPitchDetector:
+        return CachingPitchDetector(
+            underlying_detector=self.create_detector(),
+            cache=self.cache,
+            settings=SLIDING_SETTINGS,
+            stream_frame_len=FFT_HOP,
+        )
+
+    def audio(self, with_second_note: bool) -> np.ndarray:
+        audio = np.zeros(shape=(40 * self.HOP,), dtype=np.float32)
+        audio[12 * self.HOP : 15 * self.HOP] = 0.60
+        if with_second_note:
+            audio[18 * self.HOP : 24 * self.HOP] = 0.67
+        return audio
+
+    def detect_every_hop(
+        self, pitch_detector: I_PitchDetector, audio: np.ndarray, hop_len: int
+    ) -> list[list[int]]:
+        window_len = 2 * self.SAMPLE_RATE
+        return [
+            pitch_detector.detect_pitches(
+                audio[hop_end - window_len : hop_end], stream_position=hop_end
+            )
+            for hop_end in range(window_len, audio.shape[0] + 1, hop_len)
+        ]
+
+    def test_will_detect_same_pitches_as_without_cache(self):
+        expected_pitches = self.detect_every_hop(
+            self.create_detector(), self.audio(with_second_note=True), self.HOP
+        )
+        # Caches the windows before the second note, so they are found next time
+        self.detect_every_hop(
+            self.create_patient(), self.audio(with_second_note=False), self.HOP
+        )
+        stats_before = self.cache.get_stats()
+
+        actual_pitches = self.detect_every_hop(
+            self.create_patient(), self.audio(with_second_note=True), self.HOP
+        )
+
+        assert actual_pitches == expected_pitches
+        stats = self.cache.get_stats() - stats_before
+        assert stats.hits > 0 and stats.misses > 0
+
+    def test_will_key_by_hop_length(self):
+        audio = self.audio(with_second_note=True)
+        self.detect_every_hop(self.create_patient(), audio, self.HOP)
+        stats_before = self.cache.get_stats()
+
+        self.detect_every_hop(self.create_patient(), audio, 2 * self.HOP)
+
+        # Only the first window is the same
+        assert (self.cache.get_stats() - stats_before).hits == 1
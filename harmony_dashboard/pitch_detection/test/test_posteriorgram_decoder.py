@@ -0,0 +1,102 @@
+import pytest
+import numpy as np
+import basic_pitch.note_creation as note_creation
+
+from ..posteriorgram_decoder import PosteriorgramDecoder
+
+N_FRAMES = 200
+N_NOTE_BINS = 88
+MIDDLE_C = 60
+LOWEST_PIANO_KEY = 21
+
+
+def posteriorgrams_with_notes(notes: list[tuple[int, int, int, float]]):
+    """
+    notes: (start_frame, end_frame, midi_pitch, activation)
+    """
+    note = np.zeros(shape=(N_FRAMES, N_NOTE_BINS), dtype=np.float32)
+    onset = np.zeros_like(note)
+    for start_frame, end_frame, pitch, activation in notes:
+        note[start_frame:end_frame, pitch - LOWEST_PIANO_KEY] = activation
+        onset[start_frame, pitch - LOWEST_PIANO_KEY] = activation
+    return note, onset
+
+
+class TestPosteriorgramDecoder:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = PosteriorgramDecoder(min_freq_hz=27.5, max_freq_hz=2093.0)
+
+    def test_will_find_same_notes_as_basic_pitch(self):
+        rng = np.random.default_rng(0)
+        note, onset = posteriorgrams_with_notes(
+            [(10, 60, 60, 0.8), (30, 90, 64, 0.6), (100, 180, 67, 0.9)]
+        )
+        note += 0.35 * rng.random(note.shape, dtype=np.float32)
+        onset += 0.2 * rng.random(onset.shape, dtype=np.float32)
+
+        notes = self.patient.decode_notes(note, onset)
+
+        expected_notes = sorted(
+            (start_frame, end_frame, pitch)
+            for start_frame, end_frame, pitch, amplitude in (
+                note_creation.output_to_notes_polyphonic(
+                    note.copy(),
+                    onset.copy(),
+                    onset_thresh=0.5,
+                    frame_thresh=0.3,
+                    min_note_len=11,
+                    infer_onsets=True,
+                    max_freq=2093.0,
+                    min_freq=27.5,
+                    melodia_trick=True,
+                )
+            )
+            if int(np.round(127 * amplitude)) > 50
+        )
+        actual_notes = list(
+            zip(
+                notes.start_frames.tolist(),
+                notes.end_frames.tolist(),
+                notes.pitches.tolist(),
+            )
+        )
+        assert len(expected_notes) > 0
+        assert actual_notes == expected_notes
+
+    def test_will_report_strength_of_each_active_pitch(self):
+        note, onset = posteriorgrams_with_notes(
+            [(10, 60, MIDDLE_C, 0.8), (10, 60, MIDDLE_C + 7, 0.6)]
+        )
+
+        pitches, strengths = self.patient.active_pitch_strengths(
+            self.patient.decode_notes(note, onset)
+        )
+
+        assert pitches.tolist() == [MIDDLE_C, MIDDLE_C + 7]
+        assert strengths == pytest.approx([0.8, 0.6])
+
+    def test_will_drop_notes_too_quiet_to_report(self):
+        note, onset = posteriorgrams_with_notes([(10, 60, MIDDLE_C, 0.35)])
+
+        notes = self.patient.decode_notes(note, onset)
+
+        assert notes.pitches.tolist() == []
+
+    def test_will_only_report_pitches_still_sounding_from_given_frame(self):
+        note, onset = posteriorgrams_with_notes(
+            [(10, 60, MIDDLE_C, 0.8), (100, 180, MIDDLE_C + 4, 0.8)]
+        )
+
+        pitches, _ = self.patient.active_pitch_strengths(
+            self.patient.decode_notes(note, onset), from_frame=150
+        )
+
+        assert pitches.tolist() == [MIDDLE_C + 4]
+
+    def test_will_find_no_notes_in_empty_output(self):
+        note = np.zeros(shape=(0, N_NOTE_BINS), dtype=np.float32)
+
+        notes = self.patient.decode_notes(note, note)
+
+        assert notes.pitches.shape == (0,)
@@ -0,0 +1,181 @@
+import os
+
+import pytest
+import numpy as np
+
+from ..pitch_detector import I_PitchDetector
+from ..process_pitch_detector import ProcessPitchDetector
+
+MAX_WINDOW_LEN = 4410
+
+
+class EchoingPitchDetector(I_PitchDetector):
+    """
+    Reports the first and last samples, and the stream position, as pitches
+    """
+
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        return [int(audio_samples[0]), int(audio_samples[-1]), stream_position]
+
+
+class ProcessIdPitchDetector(I_PitchDetector):
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        return [os.getpid()]
+
+
+class SkipCountingPitchDetector(I_PitchDetector):
+    """
+    Reports the stream positions of the windows it was told to skip
+    """
+
+    def __init__(self):
+        self.skipped_positions = []
+
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        return self.skipped_positions
+
+    def skip_window(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ):
+        self.skipped_positions.append(stream_position)
+
+    def reset(self):
+        self.skipped_positions = []
+
+
+class FailingPitchDetector(I_PitchDetector):
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        if stream_position is None:
+            raise ValueError("Window can't be lined up")
+        return [stream_position]
+
+
+class CrashingPitchDetector(I_PitchDetector):
+    def detect_pitches(
+        self, audio_samples: np.ndarray, stream_position: int | None = None
+    ) -> list[int]:
+        os._exit(1)
+
+
+def fail_to_load_detector() -> I_PitchDetector:
+    raise FileNotFoundError("No model here")
+
+
+class TestProcessPitchDetector:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = ProcessPitchDetector(
+            detector_factory=EchoingPitchDetector, max_window_len=MAX_WINDOW_LEN
+        )
+        self.patient.start()
+        yield
+        self.patient.stop()
+
+    def test_will_pass_audio_to_detector_in_child_process(self):
+        audio = np.arange(1, 101, dtype=np.float32)
+
+        actual_pitches = self.patient.detect_pitches(audio, stream_position=500)
+
+        assert actual_pitches == [1, 100, 500]
+
+    def test_will_handle_windows_of_varying_length(self):
+        self.patient.detect_pitches(np.full(MAX_WINDOW_LEN, 7, dtype=np.float32))
+
+        actual_pitches = self.patient.detect_pitches(np.arange(3, dtype=np.float32))
+
+        assert actual_pitches == [0, 2, None]
+
+    def test_will_run_detector_in_another_process(self):
+        patient = ProcessPitchDetector(
+            detector_factory=ProcessIdPitchDetector, max_window_len=MAX_WINDOW_LEN
+        )
+        patient.start()
+        try:
+            actual_pitches = patient.detect_pitches(np.zeros(10, dtype=np.float32))
+        finally:
+            patient.stop()
+
+        assert actual_pitches != [os.getpid()]
+
+    def test_will_pass_skipped_windows_to_detector(self):
+        patient = ProcessPitchDetector(
+            detector_factory=SkipCountingPitchDetector, max_window_len=MAX_WINDOW_LEN
+        )
+        patient.start()
+        try:
+            patient.skip_window(np.zeros(10, dtype=np.float32), stream_position=10)
+            patient.skip_window(np.zeros(10, dtype=np.float32), stream_position=20)
+            actual_pitches = patient.detect_pitches(np.zeros(10, dtype=np.float32))
+        finally:
+            patient.stop()
+
+        assert actual_pitches == [10, 20]
+
+    def test_will_pass_reset_to_detector(self):
+        patient = ProcessPitchDetector(
+            detector_factory=SkipCountingPitchDetector, max_window_len=MAX_WINDOW_LEN
+        )
+        patient.start()
+        try:
+            patient.skip_window(np.zeros(10, dtype=np.float32), stream_position=10)
+            patient.reset()
+            patient.skip_window(np.zeros(10, dtype=np.float32), stream_position=20)
+            actual_pitches = patient.detect_pitches(np.zeros(10, dtype=np.float32))
+        finally:
+            patient.stop()
+
+        assert actual_pitches == [20]
+
+    def test_will_shut_down_child_process_when_stopped(self):
+        process = self.patient.process
+
+        self.patient.stop()
+
+        assert not process.is_alive()
+
+    def test_will_raise_and_clean_up_if_detector_fails_to_load(self):
+        patient = ProcessPitchDetector(
+            detector_factory=fail_to_load_detector, max_window_len=MAX_WINDOW_LEN
+        )
+
+        with pytest.raises(RuntimeError, match="No model here"):
+            patient.start()
+
+        assert patient.process is None
+        assert patient.shared_memory is None
+
+    def test_will_raise_if_detector_fails_and_keep_detecting(self):
+        patient = ProcessPitchDetector(
+            detector_factory=FailingPitchDetector, max_window_len=MAX_WINDOW_LEN
+        )
+        patient.start()
+        try:
+            with pytest.raises(RuntimeError, match="Window can't be lined up"):
+                patient.detect_pitches(np.zeros(10, dtype=np.float32))
+            actual_pitches = patient.detect_pitches(
+                np.zeros(10, dtype=np.float32), stream_position=10
+            )
+        finally:
+            patient.stop()
+
+        assert actual_pitches == [10]
+
+    def test_will_raise_and_clean_up_if_child_process_dies(self):
+        patient = ProcessPitchDetector(
+            detector_factory=CrashingPitchDetector, max_window_len=MAX_WINDOW_LEN
+        )
+        patient.start()
+
+        with pytest.raises(RuntimeError, match="exited while detecting pitches"):
+            patient.detect_pitches(np.zeros(10, dtype=np.float32))
+
+        assert patient.process is None
+        assert patient.shared_memory is None
@@ -1,15 +1,36 @@
-import queue
 from abc import ABC, abstractmethod
+from functools import partial
+import sys
 import threading
 import time
 from typing import Callable
 
-from basic_pitch.inference import predict, Model
-from basic_pitch import ICASSP_2022_MODEL_PATH
 import numpy as np
-import soundfile as sf
 
 from .app import I_PitchStreamer, I_PitchStreamListener
+from .audio_ring_buffer import AudioRingBuffer, AudioBufferStats, OverrunPolicy
+from .detection_scheduler import DetectionScheduler, DetectionSchedulerStats
+from .silence_gate import SilenceGate
+from .result_reuse_gate import ResultReuseGate, ResultReuseStats
+from .pitch_detection import I_PitchDetector
+from .pitch_detection.inference_backends import (
+    InferenceBackend,
+    InferenceThreadConfig,
+)
+from .cpu_affinity import pin_current_thread_to_cores
+from .pitch_detection.batched_inference import BatchedInferenceService
+from .pitch_detection.process_pitch_detector import ProcessPitchDetector
+from .pitch_detection.pitch_result_cache import (
+    CachingPitchDetector,
+    PitchResultCache,
+    PitchResultCacheStats,
+    basic_pitch_result_settings,
+    describe_pitch_result_cache_stats,
+)
+from .pitch_detection.remote.worker_pool import (
+    RemotePitchDetector,
+    RemotePitchWorkerPool,
+)
 
 
 class DummyListener(I_PitchStreamListener):
@@ -18,6 +39,12 @@ class DummyListener(I_PitchStreamListener):
 
 
 class I_AudioStreamer(ABC):
+    """
+    Streams audio to the callback one block at a time, from a real-time audio thread.
+    The block handed to the callback is only valid for the duration of the call, so
+    the callback must copy out whatever it needs to keep.
+    """
+
     @abstractmethod
     def stream_audio(
         self,
@@ -30,77 +57,417 @@ class I_AudioStreamer(ABC):
 
 
 class PitchDetectingAudioStreamer(I_PitchStreamer):
-    def __init__(self, audio_streamer: I_AudioStreamer):
+    """
+    By default, each detection tick hands the pitch detector whatever audio arrived
+    since the previous tick.
+
+    If analysis_window_sec is given, the streamer instead runs in sliding analysis
+    mode: every hop_sec it hands the detector the most recent analysis_window_sec of
+    audio, so consecutive windows overlap and notes crossing a hop boundary are
+    still seen whole.
+
+    Audio is held in a bounded buffer of max_backlog_sec (plus the analysis window).
+    overrun_policy decides what happens to audio that detection can't keep up with.
+
+    Rather than polling, the detection thread sleeps until a hop's worth of new audio
+    has arrived.  The hop adapts to the measured inference time to stay within
+    latency_budget_sec (see DetectionScheduler).
+
+    If silence_threshold_dbfs is given, audio that SilenceGate considers silent is
+    reported as having no pitches without running the detector, and once the audio
+    has been silent for longer than silence_hangover_sec the detection thread idles,
+    only waking up every SilenceGate.idle_wakeup_sec.
+
+    If reuse_tolerance is given, a window that ResultReuseGate finds sounds like the
+    one pitches were last detected in (e.g. while a chord is held) is reported as
+    having the same pitches, without running the detector, for up to max_reuse_sec
+    in a row.  get_result_reuse_stats reports how often that happens, to tune the
+    tolerance against accuracy.
+
+    If inference_in_process is set, the default basic pitch detector runs in a child
+    process (see ProcessPitchDetector), started and stopped along with streaming.
+    inference_backend picks which serialization of the model it runs, and
+    inference_thread_config how many threads it may use.
+
+    inference_cpu_cores pins pitch detection to those cores, keeping it off the cores
+    the audio callback and UI run on.  In a child process, the whole process is
+    pinned before the model loads.  Otherwise the detection thread is pinned before
+    it builds the detector (see below), so on Linux the thread pools the model
+    runtime starts while loading inherit the pinning.  A given model's thread pools,
+    or a shared one's loaded before streaming, stay unpinned, so pair those with a
+    single intra-op thread (which runs on the calling thread).
+
+    The default detector is built, started and warmed up on the detection thread, so
+    start_streaming returns straight away (and the UI can show itself) while the
+    model loads.  Audio streaming only starts once the detector is ready.  If it
+    fails to load, the error is reported to on_error and no audio is ever streamed.
+
+    To analyze several streams with one model, give each streamer the same
+    shared_inference_service instead (see BatchedInferenceService).  It runs while
+    any of its streamers are streaming, and if not loaded yet, the first streamer's
+    detection thread to get there loads it.
+
+    To detect pitches on other machines (or other processes on this one), give
+    each streamer a remote_worker_pool instead (see RemotePitchWorkerPool).
+
+    If a pitch_result_cache is given, the default detector looks each window up in
+    it before running the model, and stores what the model detects, so that audio
+    heard before (e.g. a file played back again) skips inference.  A given
+    pitch_detector is used as is, since the streamer can't tell what its results
+    depend on.
+    """
+
+    SAMPLE_RATE = 22050  # Sample rate used by basic pitch
+    # Frequency range the app lets basic pitch look in
+    MIN_FREQ_HZ = 27.5
+    MAX_FREQ_HZ = 2093.0
+    DEFAULT_MAX_BACKLOG_SEC = 5.0
+
+    def __init__(
+        self,
+        audio_streamer: I_AudioStreamer,
+        pitch_detector: I_PitchDetector | None = None,
+        analysis_window_sec: float | None = None,
+        hop_sec: float = 0.2,
+        overrun_policy: OverrunPolicy = OverrunPolicy.DROP_OLDEST,
+        max_backlog_sec: float = DEFAULT_MAX_BACKLOG_SEC,
+        latency_budget_sec: float | None = None,
+        silence_threshold_dbfs: float | None = None,
+        silence_hangover_sec: float = 0.5,
+        reuse_tolerance: float | None = None,
+        max_reuse_sec: float = 1.0,
+        inference_in_process: bool = False,
+        inference_backend: InferenceBackend | None = None,
+        shared_inference_service: BatchedInferenceService | None = None,
+        inference_thread_config: InferenceThreadConfig | None = None,
+        inference_cpu_cores: list[int] | None = None,
+        remote_worker_pool: RemotePitchWorkerPool | None = None,
+        pitch_result_cache: PitchResultCache | None = None,
+    ):
         self.audio_streamer = audio_streamer
         self.listener = DummyListener()
-        self.audio_block_queue = queue.Queue()
         self.thread_event = threading.Event()
         self.pitch_detection_thread = threading.Thread(
-            target=self._periodically_detect_pitches
+            target=self._detect_pitches_as_audio_arrives
         )
         self.audio_streaming_thread = threading.Thread(target=self._stream_audio)
+        # Makes sure audio streaming never starts after being stopped
+        self.audio_streaming_lock = threading.Lock()
+        self.on_ready = None
+        self.on_error = None
 
-        self.pitch_detection_sample_period_sec = 0.2
-        self.sample_rate = 22050  # Sample rate used by basic pitch
+        self.sample_rate = self.SAMPLE_RATE
         self.audio_channels = 1  # basic pitch samples down to mono anyways
-        self.audio_sample_subtype = "PCM_16"
-        self.audio_sample_file_path = "./temp.wav"
-        self.basic_pitch_model = Model(ICASSP_2022_MODEL_PATH)
         # Min and max frequencies to allow basic pitch to look for:
-        self.min_freq_hz = 27.5
-        self.max_freq_hz = 2093.0
+        self.min_freq_hz = self.MIN_FREQ_HZ
+        self.max_freq_hz = self.MAX_FREQ_HZ
+        self.detection_scheduler = DetectionScheduler(
+            sample_rate=self.sample_rate,
+            target_hop_sec=hop_sec,
+            latency_budget_sec=latency_budget_sec,
+        )
+        self.silence_gate = (
+            None
+            if silence_threshold_dbfs is None
+            else SilenceGate(
+                sample_rate=self.sample_rate,
+                threshold_dbfs=silence_threshold_dbfs,
+                hangover_sec=silence_hangover_sec,
+            )
+        )
+        self.result_reuse_gate = (
+            None
+            if reuse_tolerance is None
+            else ResultReuseGate(
+                sample_rate=self.sample_rate,
+                tolerance=reuse_tolerance,
+                max_reuse_sec=max_reuse_sec,
+            )
+        )
+        # Wake up now and then even without audio, to notice being stopped
+        self.max_idle_wait_sec = 1.0
+        self.analysis_window_len = (
+            None
+            if analysis_window_sec is None
+            else int(analysis_window_sec * self.sample_rate)
+        )
+        # How far detection may fall behind the audio before the overrun policy kicks in
+        self.max_backlog_sec = max_backlog_sec
+        self.audio_ring_buffer = AudioRingBuffer(
+            capacity=int(self.max_backlog_sec * self.sample_rate)
+            + (self.analysis_window_len or 0),
+            overrun_policy=overrun_policy,
+            window_len=(self.analysis_window_len or int(hop_sec * self.sample_rate)),
+        )
+        self.shared_inference_service = shared_inference_service
+        self.inference_cpu_cores = inference_cpu_cores
+        self.pitch_result_cache = pitch_result_cache
+        self.pitch_result_settings = basic_pitch_result_settings(
+            sliding_window=self.analysis_window_len is not None,
+            inference_backend=(
+                "remote" if remote_worker_pool is not None else inference_backend
+            ),
+            min_freq_hz=self.min_freq_hz,
+            max_freq_hz=self.max_freq_hz,
+        )
+        # Built on the detection thread if not given
+        self.pitch_detector = pitch_detector
+        self.pitch_detector_factory = None
+        self.pitch_result_frame_len = None
+        if pitch_detector is None and remote_worker_pool is not None:
+            if self.analysis_window_len is not None and pitch_result_cache is not None:
+                # Workers keep each stream's sliding window state, so a window found
+                # in the cache would still have to be sent to its worker as skipped
+                print(
+                    "The pitch result cache can't be used with remote sliding window "
+                    "detection, so it is off",
+                    file=sys.stderr,
+                )
+                self.pitch_result_cache = None
+            self.pitch_detector_factory = partial(
+                RemotePitchDetector,
+                worker_pool=remote_worker_pool,
+                sliding_window=self.analysis_window_len is not None,
+            )
+        elif pitch_detector is None:
+            # Imported here so that streamers given another detector never load the
+            # decoder (and with it, numba)
+            from .pitch_detection.basic_pitch_detector import (
+                FFT_HOP,
+                create_basic_pitch_detector,
+            )
+
+            if self.analysis_window_len is not None:
+                self.pitch_result_frame_len = FFT_HOP
+
+            detector_factory = partial(
+                create_basic_pitch_detector,
+                sliding_window=self.analysis_window_len is not None,
+                min_freq_hz=self.min_freq_hz,
+                max_freq_hz=self.max_freq_hz,
+                inference_backend=inference_backend,
+                thread_config=inference_thread_config,
+            )
+            if shared_inference_service is not None:
+                self.pitch_detector_factory = partial(
+                    detector_factory, model=shared_inference_service
+                )
+            elif inference_in_process:
+                self.pitch_detector_factory = partial(
+                    ProcessPitchDetector,
+                    detector_factory=detector_factory,
+                    max_window_len=self.audio_ring_buffer.capacity,
+                    cpu_cores=inference_cpu_cores,
+                )
+            else:
+                self.pitch_detector_factory = detector_factory
+
+    @classmethod
+    def longest_window_sec(
+        cls,
+        analysis_window_sec: float | None,
+        max_backlog_sec: float = DEFAULT_MAX_BACKLOG_SEC,
+    ) -> float:
+        """
+        The longest window a streamer with these settings may hand its pitch
+        detector, i.e. its whole buffer
+        """
+        return max_backlog_sec + (analysis_window_sec or 0.0)
 
     def register_listener(self, stream_listener: I_PitchStreamListener):
         self.listener = stream_listener
 
-    def start_streaming(self):
+    def start_streaming(
+        self,
+        on_ready: Callable[[], None] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+    ):
+        if self.shared_inference_service is not None:
+            self.shared_inference_service.start()
+        self.on_ready = on_ready
+        self.on_error = on_error
         self.pitch_detection_thread.start()
-        self.audio_streaming_thread.start()
 
     def stop_streaming(self):
         self.thread_event.set()
-        self.audio_streaming_thread.join()
+        self.audio_ring_buffer.wake_consumer()
+        with self.audio_streaming_lock:
+            audio_streaming_started = self.audio_streaming_thread.ident is not None
+        if audio_streaming_started:
+            self.audio_streaming_thread.join()
+        # Waits for the model to finish loading, if it still is
         self.pitch_detection_thread.join()
+        if self.pitch_detector is not None:
+            self.pitch_detector.stop()
+        if self.shared_inference_service is not None:
+            self.shared_inference_service.stop()
+        stats = self.get_audio_buffer_stats()
+        if stats.overrun_count > 0:
+            print(
+                f"Pitch detection fell behind the audio {stats.overrun_count} times, "
+                f"dropping {stats.dropped_samples / self.sample_rate:.1f}s of audio"
+            )
+        if self.result_reuse_gate is not None:
+            reuse_stats = self.get_result_reuse_stats()
+            print(
+                f"Reused the previous pitches for {reuse_stats.windows_reused} of "
+                f"{reuse_stats.windows_checked} windows "
+                f"({100 * reuse_stats.hit_rate:.0f}%)"
+            )
+        cache_stats = self.get_pitch_result_cache_stats()
+        if cache_stats is not None:
+            print(describe_pitch_result_cache_stats(cache_stats))
+
+    def get_audio_buffer_stats(self) -> AudioBufferStats:
+        return self.audio_ring_buffer.get_stats()
+
+    def get_detection_scheduler_stats(self) -> DetectionSchedulerStats:
+        return self.detection_scheduler.get_stats()
+
+    def get_result_reuse_stats(self) -> ResultReuseStats | None:
+        """
+        None unless reuse_tolerance was given
+        """
+        if self.result_reuse_gate is None:
+            return None
+        return self.result_reuse_gate.get_stats()
 
-    def _periodically_detect_pitches(self):
+    def get_pitch_result_cache_stats(self) -> PitchResultCacheStats | None:
+        """
+        None unless the default detector is looking windows up in pitch_result_cache
+        """
+        if not isinstance(self.pitch_detector, CachingPitchDetector):
+            return None
+        return self.pitch_detector.get_stats()
+
+    def _detect_pitches_as_audio_arrives(self):
+        if self.inference_cpu_cores is not None:
+            pin_current_thread_to_cores(self.inference_cpu_cores)
+        try:
+            self._prepare_pitch_detector()
+        except Exception as e:
+            print(f"Pitch detection failed to start: {e}", file=sys.stderr)
+            # Never starts streaming audio
+            self.thread_event.set()
+            if self.on_error is not None:
+                self.on_error(e)
+            return
+        with self.audio_streaming_lock:
+            if self.thread_event.is_set():
+                return
+            self.audio_streaming_thread.start()
+        if self.on_ready is not None:
+            self.on_ready()
         while not self.thread_event.is_set():
-            audio_blocks = []
-            while not self.audio_block_queue.empty():
-                audio_blocks.append(self.audio_block_queue.get())
-            if audio_blocks:
-                combined_sample = np.concatenate(audio_blocks, axis=0)
-                # Write the block of of sound to disk
-                with sf.SoundFile(
-                    self.audio_sample_file_path,
-                    mode="w",
-                    samplerate=self.sample_rate,
-                    channels=self.audio_channels,
-                    subtype=self.audio_sample_subtype,
-                ) as file:
-                    file.write(combined_sample)
-                # Make basic pitch read it back out of disk (sigh)
-                model_output, midi_data, note_events = predict(
-                    audio_path=self.audio_sample_file_path,
-                    model_or_model_path=self.basic_pitch_model,
-                    minimum_frequency=self.min_freq_hz,
-                    maximum_frequency=self.max_freq_hz,
+            is_idle = self.silence_gate is not None and self.silence_gate.is_idle()
+            if is_idle:
+                hop_samples = int(self.silence_gate.idle_wakeup_sec * self.sample_rate)
+            else:
+                hop_samples = self.detection_scheduler.next_hop_samples()
+            if not self.audio_ring_buffer.wait_for_unread_samples(
+                hop_samples, timeout_sec=self.max_idle_wait_sec
+            ):
+                continue
+            # Audio that piled up while idle is all looked at, so that the start of a
+            # sound that ends the silence isn't lost
+            start_index, stream_position = self.audio_ring_buffer.next_read_range(
+                apply_overrun_policy=not is_idle
+            )
+            if self.audio_ring_buffer.overrun_policy == OverrunPolicy.BLOCK:
+                # The audio waits for detection instead, so every hop is analyzed in
+                # turn rather than skipped as stale
+                stream_position = min(stream_position, start_index + hop_samples)
+            n_new_samples = stream_position - start_index
+            if self.silence_gate is not None and self.silence_gate.is_silent(
+                self.audio_ring_buffer.view(start_index, stream_position)
+            ):
+                # A sliding detector still has to move on past the window, or its next
+                # detection would report whatever sounded since its last one
+                self.pitch_detector.skip_window(
+                    self.audio_ring_buffer.view(
+                        (
+                            start_index
+                            if self.analysis_window_len is None
+                            else stream_position - self.analysis_window_len
+                        ),
+                        stream_position,
+                    ),
+                    stream_position=stream_position,
+                )
+                self.audio_ring_buffer.advance_read_index(stream_position)
+                self.listener.new_pitches_detected([])
+                continue
+            fresh_start_index = (
+                start_index
+                if is_idle
+                else self.detection_scheduler.oldest_fresh_index(
+                    start_index, stream_position
+                )
+            )
+            if self.analysis_window_len is None:
+                self.audio_ring_buffer.count_skipped_samples(
+                    fresh_start_index - start_index
                 )
-                # Print out detected notes
-                if len(midi_data.instruments) > 0:
-                    instrument = midi_data.instruments[0]
-                    pitches = [
-                        note.pitch for note in instrument.notes if note.velocity > 50
-                    ]
-                    self.listener.new_pitches_detected(pitches)
-            time.sleep(self.pitch_detection_sample_period_sec)
+                start_index = fresh_start_index
+            else:
+                # Stale hops are skipped over implicitly, and only lost if they fall
+                # out of the window altogether
+                self.audio_ring_buffer.count_skipped_samples(
+                    stream_position - self.analysis_window_len - start_index
+                )
+                start_index = stream_position - self.analysis_window_len
+            samples = self.audio_ring_buffer.view(start_index, stream_position)
+            pitches = self._detect_or_reuse_pitches(
+                samples, n_new_samples, stream_position
+            )
+            # Only once detection is done with the view, so that under BLOCK the
+            # audio waits rather than overwriting it mid-detection
+            self.audio_ring_buffer.advance_read_index(stream_position)
+            self.listener.new_pitches_detected(pitches)
+
+    def _detect_or_reuse_pitches(
+        self, samples: np.ndarray, n_new_samples: int, stream_position: int
+    ) -> list[int]:
+        if self.result_reuse_gate is not None:
+            reused_pitches = self.result_reuse_gate.reusable_pitches(
+                samples, n_new_samples
+            )
+            if reused_pitches is not None:
+                # Keeps a sliding detector in step with the stream, as for silence
+                self.pitch_detector.skip_window(
+                    samples, stream_position=stream_position
+                )
+                return reused_pitches
+        inference_start_time = time.perf_counter()
+        pitches = self.pitch_detector.detect_pitches(
+            samples, stream_position=stream_position
+        )
+        self.detection_scheduler.record_inference_time(
+            time.perf_counter() - inference_start_time
+        )
+        if self.result_reuse_gate is not None:
+            self.result_reuse_gate.record_detected_pitches(pitches)
+        return pitches
+
+    def _prepare_pitch_detector(self):
+        if self.shared_inference_service is not None:
+            self.shared_inference_service.load()
+        if self.pitch_detector is None:
+            self.pitch_detector = self.pitch_detector_factory()
+            if self.pitch_result_cache is not None:
+                self.pitch_detector = CachingPitchDetector(
+                    underlying_detector=self.pitch_detector,
+                    cache=self.pitch_result_cache,
+                    settings=self.pitch_result_settings,
+                    stream_frame_len=self.pitch_result_frame_len,
+                )
+        self.pitch_detector.start()
+        self.pitch_detector.warm_up()
 
     def _stream_audio(self):
         self.audio_streamer.stream_audio(
             sample_rate=self.sample_rate,
             num_audio_channels=self.audio_channels,
-            callback=self._enqueue_audio_block,
+            callback=self.audio_ring_buffer.write,
             threading_event=self.thread_event,
         )
-
-    def _enqueue_audio_block(self, audio_data: np.ndarray):
-        self.audio_block_queue.put(audio_data)
@@ -0,0 +1,35 @@
+from .audio_ring_buffer import OverrunPolicy
+from .pitch_detection.chroma_pitch_detector import ChromaPitchDetector
+from .real_time_basic_pitch import I_AudioStreamer, PitchDetectingAudioStreamer
+
+
+class ChromaPitchStreamer(PitchDetectingAudioStreamer):
+    """
+    Streams pitches detected by ChromaPitchDetector instead of basic pitch, for
+    machines that can't afford a neural network.  Never imports basic pitch or
+    TensorFlow.
+
+    Each hop, the detector looks at the newest ChromaPitchDetector.window_len samples
+    (a sliding analysis window), so hops can be much shorter than the window.
+    """
+
+    def __init__(
+        self,
+        audio_streamer: I_AudioStreamer,
+        hop_sec: float = 0.1,
+        overrun_policy: OverrunPolicy = OverrunPolicy.DROP_OLDEST,
+        latency_budget_sec: float | None = None,
+        silence_threshold_dbfs: float | None = None,
+        silence_hangover_sec: float = 0.5,
+    ):
+        pitch_detector = ChromaPitchDetector(sample_rate=self.SAMPLE_RATE)
+        super().__init__(
+            audio_streamer=audio_streamer,
+            pitch_detector=pitch_detector,
+            analysis_window_sec=pitch_detector.window_len / self.SAMPLE_RATE,
+            hop_sec=hop_sec,
+            overrun_policy=overrun_policy,
+            latency_budget_sec=latency_budget_sec,
+            silence_threshold_dbfs=silence_threshold_dbfs,
+            silence_hangover_sec=silence_hangover_sec,
+        )
@@ -0,0 +1,321 @@
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
+import threading
+import time
+
+import numpy as np
+
+from .chunked_audio_reader import (
+    ChunkedAudioReader,
+    I_AudioReader,
+    I_DecodedAudioSink,
+)
+
+
+def default_cache_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "harmony_dashboard", "resampled_audio")
+
+
+class MemoryMappedAudioReader(I_AudioReader):
+    """
+    Hands out samples that were already decoded and resampled, straight from memory
+    """
+
+    def __init__(self, samples: np.ndarray):
+        self.samples = samples
+        self.position = 0
+        self.is_finished = samples.shape[0] == 0
+        self.n_underruns = 0
+        self.error = None
+
+    def read_into(self, out: np.ndarray) -> int:
+        n_read = min(out.shape[0], self.samples.shape[0] - self.position)
+        out[:n_read] = self.samples[self.position : self.position + n_read]
+        self.position += n_read
+        self.is_finished = self.position == self.samples.shape[0]
+        return n_read
+
+
+class ResampledAudioCache:
+    """
+    A directory of audio files already decoded, mixed down to mono and resampled, as
+    raw float32 samples, keyed by a hash of the file's content and the sample rate.
+
+    The first time a file is played, it is decoded as usual (see ChunkedAudioReader)
+    and written to the cache as it goes; the entry only counts once the whole file
+    was written.  After that, it is memory mapped rather than decoded, so playback
+    starts straight away and the OS shares the pages between runs.
+
+    Entries are stamped whenever they are used, and once the cache holds more than
+    max_size_bytes, the least recently used are removed.  Content hashes are
+    remembered by path, size and modification time, so a file is only hashed again
+    once it changes.
+
+    A file whose hash isn't remembered starts decoding straight away, and is hashed
+    on the read-ahead thread as it decodes; the entry is named once both are done.
+    So a copy of a cached file is decoded once more before it's found in the cache.
+    """
+
+    ENTRY_SUFFIX = ".f32"
+    CONTENT_HASHES_FILE_NAME = "content_hashes.json"
+    # Content hashes remembered, most recently hashed first
+    max_content_hashes = 1000
+    # Partly written entries left behind by a run that didn't finish
+    stale_partial_entry_sec = 3600
+    # Of the file, hashed along with each block decoded.  Enough to keep up with
+    # decoding uncompressed audio, so that little is left to hash at the end.
+    hash_bytes_per_block = 1 << 20
+
+    def __init__(self, cache_dir: str, max_size_bytes: int = 2 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+
+    def open_reader(self, path: str, sample_rate: int) -> I_AudioReader:
+        """
+        Returns a reader over the cached samples if there are any, otherwise one that
+        decodes the file and caches it along the way
+        """
+        real_path = os.path.realpath(path)
+        stat = os.stat(real_path)
+        content_hash = self._remembered_content_hash(real_path, stat)
+        if content_hash is not None:
+            samples = self._load_entry(self._entry_path(content_hash, sample_rate))
+            if samples is not None:
+                return MemoryMappedAudioReader(samples)
+        return ChunkedAudioReader(
+            path,
+            sample_rate,
+            sink=_CacheEntryWriter(self, real_path, stat, sample_rate),
+        )
+
+    def load_samples(self, path: str, sample_rate: int) -> np.ndarray:
+        """
+        Returns all of the file's samples at once: mapped from the cache if there,
+        otherwise decoded (and cached along the way)
+        """
+        audio_reader = self.open_reader(path, sample_rate)
+        if isinstance(audio_reader, MemoryMappedAudioReader):
+            return audio_reader.samples
+        audio_reader.start()
+        try:
+            audio_reader.wait_until_ready()
+            blocks = []
+            while not audio_reader.is_finished:
+                block = np.empty(shape=(audio_reader.block_len,), dtype=np.float32)
+                n_read = audio_reader.read_into(block)
+                blocks.append(block[:n_read])
+                if n_read == 0 and not audio_reader.is_finished:
+                    # Decoding fell behind
+                    time.sleep(0.001)
+        finally:
+            audio_reader.stop()
+        if audio_reader.error is not None:
+            raise audio_reader.error
+        return np.concatenate([np.zeros(shape=(0,), dtype=np.float32), *blocks])
+
+    def content_hash(self, path: str) -> str:
+        real_path = os.path.realpath(path)
+        stat = os.stat(real_path)
+        content_hash = self._remembered_content_hash(real_path, stat)
+        if content_hash is None:
+            content_hash = _hash_file(real_path)
+            self._remember_content_hash(real_path, stat, content_hash)
+        return content_hash
+
+    def _remembered_content_hash(
+        self, real_path: str, stat: os.stat_result
+    ) -> str | None:
+        with self.lock:
+            remembered = self._read_content_hashes().get(real_path)
+        if remembered is not None and remembered[:2] == [
+            stat.st_size,
+            stat.st_mtime_ns,
+        ]:
+            return remembered[2]
+        return None
+
+    def _remember_content_hash(
+        self, real_path: str, stat: os.stat_result, content_hash: str
+    ):
+        with self.lock:
+            content_hashes = self._read_content_hashes()
+            content_hashes.pop(real_path, None)
+            content_hashes = {
+                real_path: [stat.st_size, stat.st_mtime_ns, content_hash],
+                **dict(list(content_hashes.items())[: self.max_content_hashes - 1]),
+            }
+            _write_atomically(
+                os.path.join(self.cache_dir, self.CONTENT_HASHES_FILE_NAME),
+                json.dumps(content_hashes).encode(),
+            )
+
+    def _entry_path(self, content_hash: str, sample_rate: int) -> str:
+        return os.path.join(
+            self.cache_dir, f"{content_hash}-{sample_rate}{self.ENTRY_SUFFIX}"
+        )
+
+    def evict(self, keep_entry_path: str | None = None):
+        """
+        Removes least recently used entries until the cache fits in max_size_bytes
+        """
+        entries = []
+        now = time.time()
+        for entry in os.scandir(self.cache_dir):
+            stat = entry.stat()
+            if ".partial-" in entry.name:
+                if now - stat.st_mtime > self.stale_partial_entry_sec:
+                    _remove_if_present(entry.path)
+            elif entry.name.endswith(self.ENTRY_SUFFIX):
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        size_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if size_bytes <= self.max_size_bytes:
+                break
+            if entry_path == keep_entry_path:
+                continue
+            _remove_if_present(entry_path)
+            size_bytes -= size
+
+    def _load_entry(self, entry_path: str) -> np.ndarray | None:
+        try:
+            f = open(entry_path, "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                samples = np.zeros(shape=(0,), dtype=np.float32)
+            else:
+                # Stays mapped after the file is closed
+                mapped_file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(mmap, "MADV_WILLNEED"):
+                    # Starts paging it in now, rather than in the audio callback
+                    mapped_file.madvise(mmap.MADV_WILLNEED)
+                samples = np.frombuffer(mapped_file, dtype="<f4")
+        # Most recently used
+        os.utime(entry_path)
+        return samples
+
+    def _read_content_hashes(self) -> dict[str, list]:
+        try:
+            with open(os.path.join(self.cache_dir, self.CONTENT_HASHES_FILE_NAME)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+
+class _CacheEntryWriter(I_DecodedAudioSink):
+    """
+    Writes decoded samples to a partial entry, while hashing the file a little with
+    each block, and names the entry after the hash once the whole file was written.
+    Failing to write (e.g. a full disk) or to hash only means not caching, as does
+    the file changing while it was decoded.
+    """
+
+    def __init__(
+        self,
+        cache: ResampledAudioCache,
+        real_path: str,
+        stat: os.stat_result,
+        sample_rate: int,
+    ):
+        self.cache = cache
+        self.real_path = real_path
+        self.stat = stat
+        self.sample_rate = sample_rate
+        # Unique, as its name isn't known yet and other files may be cached at the
+        # same time
+        self.partial_entry_path = os.path.join(
+            cache.cache_dir,
+            f"{sample_rate}{cache.ENTRY_SUFFIX}"
+            f".partial-{os.getpid()}-{threading.get_ident()}-{id(self)}",
+        )
+        self.partial_entry = None
+        self.file_hash = hashlib.sha256()
+        self.hashed_file = None
+        self.failed = False
+
+    def write(self, samples: np.ndarray):
+        if self.failed:
+            return
+        try:
+            if self.partial_entry is None:
+                self.partial_entry = open(self.partial_entry_path, "wb")
+            self.partial_entry.write(samples.astype("<f4", copy=False).tobytes())
+            self._hash_more(self.cache.hash_bytes_per_block)
+        except OSError:
+            self.failed = True
+
+    def finish(self, is_complete: bool):
+        try:
+            if self.partial_entry is None and is_complete and not self.failed:
+                # Nothing was decoded, which is worth remembering too
+                self.partial_entry = open(self.partial_entry_path, "wb")
+            if self.partial_entry is not None:
+                self.partial_entry.close()
+            if is_complete and not self.failed:
+                self._hash_more(None)
+                stat = os.stat(self.real_path)
+                if (stat.st_size, stat.st_mtime_ns) == (
+                    self.stat.st_size,
+                    self.stat.st_mtime_ns,
+                ):
+                    content_hash = self.file_hash.hexdigest()
+                    self.cache._remember_content_hash(
+                        self.real_path, self.stat, content_hash
+                    )
+                    entry_path = self.cache._entry_path(content_hash, self.sample_rate)
+                    os.replace(self.partial_entry_path, entry_path)
+                    self.cache.evict(keep_entry_path=entry_path)
+                    return
+        except OSError:
+            pass
+        finally:
+            if self.hashed_file is not None:
+                self.hashed_file.close()
+        _remove_if_present(self.partial_entry_path)
+
+    def _hash_more(self, n_bytes: int | None):
+        """
+        Hashes up to n_bytes more of the file, or all the rest if None
+        """
+        if self.hashed_file is None:
+            self.hashed_file = open(self.real_path, "rb")
+        while n_bytes is None or n_bytes > 0:
+            block = self.hashed_file.read(
+                1 << 20 if n_bytes is None else min(n_bytes, 1 << 20)
+            )
+            if not block:
+                return
+            self.file_hash.update(block)
+            if n_bytes is not None:
+                n_bytes -= len(block)
+
+
+def _hash_file(path: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def _write_atomically(path: str, content: bytes):
+    partial_path = f"{path}.partial-{os.getpid()}-{threading.get_ident()}"
+    with open(partial_path, "wb") as f:
+        f.write(content)
+    os.replace(partial_path, path)
+
+
+def _remove_if_present(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,144 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class ResultReuseStats:
+    windows_checked: int
+    windows_reused: int
+
+    @property
+    def hit_rate(self) -> float:
+        if self.windows_checked == 0:
+            return 0.0
+        return self.windows_reused / self.windows_checked
+
+
+@dataclass
+class _Fingerprint:
+    # Chroma of the whole window, and of its newest frame alone, so that a note
+    # starting at the end of a long window isn't averaged away
+    window_chroma: np.ndarray
+    newest_chroma: np.ndarray
+    loudness_dbfs: float
+
+
+class ResultReuseGate:
+    """
+    Cheap check for whether a window sounds like the one pitches were last detected
+    in, so that a held chord doesn't go through the model every hop.
+
+    Each window is summed into a coarse spectral fingerprint: a 12 bin chroma (from
+    frames of frame_len samples, normalized so only the balance between pitch
+    classes counts) plus its loudness.  Pitches may be reused if the chroma is within
+    tolerance (the largest difference in any pitch class's share) of the window they
+    were detected in, and the loudness within loudness_tolerance_db.
+
+    Windows are compared with the one that was actually detected on, rather than
+    with the previous window, so that a slow change can't creep past the tolerance
+    a hop at a time.  Even so, pitches are never reused for more than max_reuse_sec
+    of audio in a row.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        tolerance: float = 0.05,
+        loudness_tolerance_db: float = 3.0,
+        max_reuse_sec: float = 1.0,
+        frame_len: int = 2048,
+        max_frames: int = 16,
+    ):
+        self.tolerance = tolerance
+        self.loudness_tolerance_db = loudness_tolerance_db
+        self.max_reuse_samples = int(max_reuse_sec * sample_rate)
+        self.frame_len = frame_len
+        # Longer windows are only fingerprinted from their newest frames, to stay cheap
+        self.max_frames = max_frames
+        self.spectrum_window = np.hanning(frame_len).astype(np.float32)
+        # FFT bins between C1 and C8
+        fft_bin_freqs = np.fft.rfftfreq(frame_len, d=1.0 / sample_rate)
+        with np.errstate(divide="ignore"):
+            fft_bin_pitches = np.round(12 * np.log2(fft_bin_freqs / 440.0) + 69)
+        self.fft_bins_in_range = np.nonzero(
+            (fft_bin_pitches >= 24) & (fft_bin_pitches <= 108)
+        )[0]
+        # Sums the power of those bins into pitch classes
+        self.pitch_class_matrix = np.eye(12)[
+            fft_bin_pitches[self.fft_bins_in_range].astype(int) % 12
+        ]
+        self.detected_fingerprint = None
+        self.detected_pitches = None
+        self.samples_since_detection = 0
+        self.checked_fingerprint = None
+        self.windows_checked = 0
+        self.windows_reused = 0
+
+    def reusable_pitches(
+        self, samples: np.ndarray, n_new_samples: int
+    ) -> list[int] | None:
+        """
+        samples: the window about to be detected on
+        n_new_samples: how much of it arrived since the previous check
+        returns the pitches last detected if they can stand in for detecting pitches
+        in samples, otherwise None, in which case record_detected_pitches should be
+        called with the pitches detected in samples
+        """
+        self.windows_checked += 1
+        self.checked_fingerprint = self._fingerprint(samples)
+        if self.detected_fingerprint is None or (
+            self.samples_since_detection + n_new_samples > self.max_reuse_samples
+        ):
+            return None
+        if not self._is_similar(self.detected_fingerprint, self.checked_fingerprint):
+            return None
+        self.samples_since_detection += n_new_samples
+        self.windows_reused += 1
+        return self.detected_pitches
+
+    def record_detected_pitches(self, pitches: list[int]):
+        self.detected_fingerprint = self.checked_fingerprint
+        self.detected_pitches = pitches
+        self.samples_since_detection = 0
+
+    def get_stats(self) -> ResultReuseStats:
+        return ResultReuseStats(
+            windows_checked=self.windows_checked,
+            windows_reused=self.windows_reused,
+        )
+
+    def _is_similar(self, fingerprint: _Fingerprint, other: _Fingerprint) -> bool:
+        return (
+            abs(fingerprint.loudness_dbfs - other.loudness_dbfs)
+            <= self.loudness_tolerance_db
+            and np.max(np.abs(fingerprint.window_chroma - other.window_chroma))
+            <= self.tolerance
+            and np.max(np.abs(fingerprint.newest_chroma - other.newest_chroma))
+            <= self.tolerance
+        )
+
+    def _fingerprint(self, samples: np.ndarray) -> _Fingerprint:
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        n_frames = min(max(samples.shape[0] // self.frame_len, 1), self.max_frames)
+        frames = np.zeros(shape=(n_frames * self.frame_len,), dtype=np.float32)
+        n_samples = min(samples.shape[0], frames.shape[0])
+        if n_samples > 0:
+            frames[-n_samples:] = samples[-n_samples:]
+        frames = frames.reshape(n_frames, self.frame_len)
+        power_spectra = np.square(
+            np.abs(np.fft.rfft(frames * self.spectrum_window, axis=1))
+        )
+        # Compressed, like the chroma detector, so one loud note doesn't swamp the rest
+        frame_chroma = np.sqrt(
+            power_spectra[:, self.fft_bins_in_range] @ self.pitch_class_matrix
+        )
+        return _Fingerprint(
+            window_chroma=_normalized(np.sum(frame_chroma, axis=0)),
+            newest_chroma=_normalized(frame_chroma[-1]),
+            loudness_dbfs=float(10 * np.log10(np.mean(np.square(frames)) + 1e-12)),
+        )
+
+
+def _normalized(chroma: np.ndarray) -> np.ndarray:
+    return chroma / (np.sum(chroma) + 1e-12)
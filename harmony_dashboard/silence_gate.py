@@ -0,0 +1,93 @@
+import numpy as np
+
+
+class SilenceGate:
+    """
+    Cheap check for whether audio is worth running pitch detection on at all.
+
+    The gate opens when either:
+    - the loudest block of the audio is above threshold_dbfs, or
+    - the spectrum jumps up sharply since the previous check (spectral flux above
+      flux_threshold_db), which catches soft onsets over a noisy room.
+
+    Once open, the gate stays open for hangover_sec, so that quietly decaying notes
+    are not cut off.  After that the audio counts as silent, and the caller may drop
+    into an idle state that only checks again every idle_wakeup_sec.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        threshold_dbfs: float = -50.0,
+        flux_threshold_db: float = 6.0,
+        hangover_sec: float = 0.5,
+        idle_wakeup_sec: float = 0.5,
+    ):
+        self.sample_rate = sample_rate
+        self.threshold_dbfs = threshold_dbfs
+        self.flux_threshold_db = flux_threshold_db
+        self.hangover_samples = int(hangover_sec * sample_rate)
+        self.idle_wakeup_sec = idle_wakeup_sec
+        # Loudness is measured per block so a short onset isn't averaged away
+        self.loudness_block_len = 1024
+        self.spectrum_len = 2048
+        self.spectrum_window = np.hanning(self.spectrum_len).astype(np.float32)
+        # Log spaced bands over the range where musical energy lives
+        band_edges_hz = np.geomspace(60.0, 6000.0, num=25)
+        fft_bin_freqs = np.fft.rfftfreq(self.spectrum_len, d=1.0 / sample_rate)
+        self.band_edge_bins = np.searchsorted(fft_bin_freqs, band_edges_hz)
+        self.band_widths = np.maximum(np.diff(self.band_edge_bins), 1)
+        self.previous_band_energies_db = None
+        # Start out silent
+        self.samples_since_open = self.hangover_samples + 1
+
+    def is_silent(self, samples: np.ndarray) -> bool:
+        """
+        samples: the audio that arrived since the previous check
+        """
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        is_open = (
+            self._peak_block_loudness_dbfs(samples) >= self.threshold_dbfs
+            or self._spectral_flux_db(samples) >= self.flux_threshold_db
+        )
+        if is_open:
+            self.samples_since_open = 0
+        else:
+            self.samples_since_open += samples.shape[0]
+        return self.samples_since_open > self.hangover_samples
+
+    def is_idle(self) -> bool:
+        return self.samples_since_open > self.hangover_samples
+
+    def _peak_block_loudness_dbfs(self, samples: np.ndarray) -> float:
+        if samples.shape[0] == 0:
+            return -np.inf
+        n_blocks = max(samples.shape[0] // self.loudness_block_len, 1)
+        block_len = min(self.loudness_block_len, samples.shape[0])
+        blocks = samples[-n_blocks * block_len :].reshape(n_blocks, block_len)
+        peak_mean_square = np.max(np.mean(np.square(blocks), axis=1))
+        return 10 * np.log10(peak_mean_square + 1e-12)
+
+    def _spectral_flux_db(self, samples: np.ndarray) -> float:
+        """
+        Mean rise in per-band energy since the previous check, ignoring bands that fell
+        """
+        if samples.shape[0] < self.spectrum_len:
+            newest_samples = np.zeros(shape=(self.spectrum_len,), dtype=np.float32)
+            newest_samples[-samples.shape[0] :] = samples
+        else:
+            newest_samples = samples[-self.spectrum_len :]
+        power_spectrum = np.square(
+            np.abs(np.fft.rfft(newest_samples * self.spectrum_window))
+        )
+        band_energies = (
+            np.add.reduceat(power_spectrum, self.band_edge_bins)[:-1] / self.band_widths
+        )
+        band_energies_db = 10 * np.log10(band_energies + 1e-12)
+        previous_band_energies_db = self.previous_band_energies_db
+        self.previous_band_energies_db = band_energies_db
+        if previous_band_energies_db is None:
+            return 0.0
+        return float(
+            np.mean(np.maximum(band_energies_db - previous_band_energies_db, 0.0))
+        )
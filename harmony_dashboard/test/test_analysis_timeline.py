@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+import numpy as np
+
+from ..analysis_timeline import AnalysisTimeline, Playhead
+from ..offline_analysis import AnalyzedHop
+
+SAMPLE_RATE = 10
+
+
+def analyzed_hops(n_hops: int) -> list[AnalyzedHop]:
+    return [
+        AnalyzedHop(end_sec=0.5 * (idx + 1), pitches=[60 + idx], harmony_state=None)
+        for idx in range(n_hops)
+    ]
+
+
+def failing_analysis():
+    yield from analyzed_hops(2)
+    raise RuntimeError("Decoding failed")
+
+
+class TestAnalysisTimeline:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = AnalysisTimeline()
+
+    def test_will_look_up_hop_being_heard(self):
+        self.patient.extend(analyzed_hops(4), threading.Event())
+
+        assert self.patient.hop_at(0.0).pitches == [60]
+        assert self.patient.hop_at(0.7).pitches == [61]
+        assert self.patient.hop_at(1.5).pitches == [63]
+        # The very end of the file
+        assert self.patient.hop_at(2.0).pitches == [63]
+
+    def test_will_not_look_past_what_was_analyzed(self):
+        self.patient.extend(analyzed_hops(2), threading.Event())
+        self.patient.is_complete = False
+
+        assert self.patient.hop_at(1.2) is None
+        assert self.patient.analyzed_until_sec() == 1.0
+
+    def test_will_keep_error_that_stopped_analysis(self):
+        self.patient.extend(failing_analysis(), threading.Event())
+
+        assert not self.patient.is_complete
+        assert str(self.patient.error) == "Decoding failed"
+        assert len(self.patient.hops) == 2
+
+    def test_will_stop_once_asked_to(self):
+        stop_event = threading.Event()
+        stop_event.set()
+
+        self.patient.extend(analyzed_hops(4), stop_event)
+
+        assert len(self.patient.hops) == 1
+        assert not self.patient.is_complete
+
+
+class TestPlayhead:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.samples = np.arange(1, 31, dtype=np.float32)
+        self.patient = Playhead(self.samples, SAMPLE_RATE)
+        self.out = np.zeros(shape=(8,), dtype=np.float32)
+
+    def test_will_play_samples_then_silence(self):
+        played = []
+        for block_idx in range(5):
+            self.patient.read_into(self.out, output_time=0.8 * block_idx)
+            played.append(self.out.copy())
+
+        assert np.array_equal(
+            np.concatenate(played), np.concatenate([self.samples, np.zeros(10)])
+        )
+
+    def test_will_play_silence_while_paused(self):
+        self.patient.read_into(self.out, output_time=0.0)
+        self.patient.toggle_pause()
+        self.patient.read_into(self.out, output_time=0.8)
+        paused_out = self.out.copy()
+        self.patient.toggle_pause()
+
+        self.patient.read_into(self.out, output_time=1.6)
+
+        assert np.array_equal(paused_out, np.zeros(8))
+        assert np.array_equal(self.out, self.samples[8:16])
+
+    def test_will_seek(self):
+        self.patient.read_into(self.out, output_time=0.0)
+
+        self.patient.seek_by(1.0)
+        self.patient.read_into(self.out, output_time=0.8)
+
+        assert np.array_equal(self.out, self.samples[18:26])
+
+    def test_will_loop(self):
+        self.patient.set_loop(start_sec=0.5, end_sec=1.0)
+        self.patient.seek(0.7)
+
+        self.patient.read_into(self.out, output_time=0.0)
+
+        assert np.array_equal(self.out, [8, 9, 10, 6, 7, 8, 9, 10])
+
+    def test_will_not_loop_backwards(self):
+        with pytest.raises(ValueError):
+            self.patient.set_loop(start_sec=1.0, end_sec=0.5)
+
+    def test_will_tell_what_is_heard_when(self):
+        self.patient.set_loop(start_sec=0.0, end_sec=0.5)
+
+        self.patient.read_into(self.out, output_time=10.0)
+
+        assert self.patient.heard_position_sec(now=9.0) is None
+        assert self.patient.heard_position_sec(now=10.2) == pytest.approx(0.2)
+        # Back to the start of the loop, 0.5s after the block started being heard
+        assert self.patient.heard_position_sec(now=10.6) == pytest.approx(0.1)
+
+    def test_will_hold_position_while_paused(self):
+        self.patient.read_into(self.out, output_time=0.0)
+        self.patient.toggle_pause()
+
+        self.patient.read_into(self.out, output_time=0.8)
+
+        assert self.patient.heard_position_sec(now=5.0) == pytest.approx(0.8)
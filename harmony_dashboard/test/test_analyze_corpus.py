@@ -0,0 +1,189 @@
+import os
+
+import pytest
+import numpy as np
+import soundfile as sf
+from unittest.mock import Mock
+
+from .. import analyze_file
+from ..analyze_corpus import (
+    CorpusFileResult,
+    CorpusManifest,
+    analyze_corpus_file,
+    corpus_analysis_settings,
+    find_pending_files,
+    log_path_for,
+)
+from ..harmony_state_logging import HarmonyLogFormatter
+from ..pitch_detection import I_PitchDetector
+
+SAMPLE_RATE = 22050
+SETTINGS = corpus_analysis_settings(None, hop_sec=0.2, analysis_window_sec=None)
+
+
+class TestCorpusManifest:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self, tmp_path):
+        self.manifest_path = str(tmp_path / "manifest.jsonl")
+        self.patient = CorpusManifest(self.manifest_path)
+
+    def result(self, path: str = "take.wav", **kwargs) -> CorpusFileResult:
+        return CorpusFileResult(
+            **{
+                "path": path,
+                "size": 100,
+                "mtime_ns": 5,
+                "audio_sec": 1.0,
+                "elapsed_sec": 0.1,
+                "settings": SETTINGS,
+                **kwargs,
+            }
+        )
+
+    def test_will_remember_finished_files_across_runs(self):
+        self.patient.record(self.result())
+
+        assert CorpusManifest(self.manifest_path).is_done("take.wav", 100, 5, SETTINGS)
+
+    def test_will_not_count_changed_files_as_done(self):
+        self.patient.record(self.result())
+
+        assert not self.patient.is_done("take.wav", 200, 5, SETTINGS)
+        assert not self.patient.is_done("take.wav", 100, 6, SETTINGS)
+
+    def test_will_not_count_files_analyzed_with_other_settings_as_done(self):
+        self.patient.record(self.result())
+
+        assert not self.patient.is_done(
+            "take.wav",
+            100,
+            5,
+            corpus_analysis_settings(None, hop_sec=0.2, analysis_window_sec=2.0),
+        )
+        assert not self.patient.is_done(
+            "take.wav",
+            100,
+            5,
+            corpus_analysis_settings(None, hop_sec=0.1, analysis_window_sec=None),
+        )
+
+    def test_will_not_count_files_from_before_settings_were_recorded_as_done(self):
+        self.patient.record(self.result(settings=None))
+
+        assert not CorpusManifest(self.manifest_path).is_done(
+            "take.wav", 100, 5, SETTINGS
+        )
+
+    def test_will_not_count_failed_files_as_done(self):
+        self.patient.record(self.result(error="LibsndfileError: bad file"))
+
+        assert not self.patient.is_done("take.wav", 100, 5, SETTINGS)
+
+    def test_will_go_by_latest_result_for_a_file(self):
+        self.patient.record(self.result(error="LibsndfileError: bad file"))
+        self.patient.record(self.result())
+
+        assert CorpusManifest(self.manifest_path).is_done("take.wav", 100, 5, SETTINGS)
+
+    def test_will_ignore_line_cut_short_by_interruption(self):
+        self.patient.record(self.result())
+        with open(self.manifest_path, "a") as f:
+            f.write('{"path": "other.wav", "si')
+
+        manifest = CorpusManifest(self.manifest_path)
+
+        assert manifest.is_done("take.wav", 100, 5, SETTINGS)
+        assert "other.wav" not in manifest.results
+
+
+class TestCorpusAnalysis:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self, tmp_path, monkeypatch):
+        self.corpus_dir = str(tmp_path / "corpus")
+        self.output_dir = str(tmp_path / "logs")
+        os.makedirs(os.path.join(self.corpus_dir, "monday"))
+        self.manifest = CorpusManifest(str(tmp_path / "manifest.jsonl"))
+        pitch_detector = Mock(spec=I_PitchDetector)
+        # C major throughout
+        pitch_detector.detect_pitches.return_value = [60, 64, 67]
+        # Stands in for the detector a worker process would build
+        monkeypatch.setattr(analyze_file, "_pitch_detector", pitch_detector)
+
+    def write_recording(self, path: str, n_samples: int = SAMPLE_RATE):
+        sf.write(
+            os.path.join(self.corpus_dir, path),
+            np.zeros(shape=(n_samples,), dtype=np.float32),
+            SAMPLE_RATE,
+        )
+
+    def analyze(self, path: str) -> CorpusFileResult:
+        result = analyze_corpus_file(
+            self.corpus_dir,
+            self.output_dir,
+            path,
+            hop_sec=0.2,
+            analysis_window_sec=None,
+            settings=SETTINGS,
+        )
+        self.manifest.record(result)
+        return result
+
+    def test_will_find_recordings_largest_first(self):
+        self.write_recording("short.wav", n_samples=SAMPLE_RATE)
+        self.write_recording(os.path.join("monday", "long.wav"), 3 * SAMPLE_RATE)
+        with open(os.path.join(self.corpus_dir, "notes.txt"), "w") as f:
+            f.write("not audio")
+
+        pending_files = find_pending_files(
+            self.corpus_dir, self.output_dir, self.manifest, SETTINGS
+        )
+
+        assert pending_files == [os.path.join("monday", "long.wav"), "short.wav"]
+
+    def test_will_write_harmony_log_next_to_where_recording_would_be(self):
+        self.write_recording(os.path.join("monday", "take.wav"))
+
+        result = self.analyze(os.path.join("monday", "take.wav"))
+
+        assert result.error is None
+        assert result.audio_sec == pytest.approx(1.0)
+        with open(
+            log_path_for(self.output_dir, os.path.join("monday", "take.wav"))
+        ) as f:
+            lines = f.read().splitlines()
+        assert lines[0] == ",".join(HarmonyLogFormatter.HEADER)
+        assert lines[1].endswith("C,0,MAJ")
+
+    def test_will_skip_finished_recordings_when_resuming(self):
+        self.write_recording("done.wav")
+        self.write_recording("interrupted.wav")
+        self.analyze("done.wav")
+
+        pending_files = find_pending_files(
+            self.corpus_dir, self.output_dir, self.manifest, SETTINGS
+        )
+
+        assert pending_files == ["interrupted.wav"]
+
+    def test_will_analyze_again_if_log_went_missing(self):
+        self.write_recording("take.wav")
+        self.analyze("take.wav")
+        os.unlink(log_path_for(self.output_dir, "take.wav"))
+
+        pending_files = find_pending_files(
+            self.corpus_dir, self.output_dir, self.manifest, SETTINGS
+        )
+
+        assert pending_files == ["take.wav"]
+
+    def test_will_report_unreadable_recording_without_leaving_a_log(self):
+        with open(os.path.join(self.corpus_dir, "broken.wav"), "w") as f:
+            f.write("not really audio")
+
+        result = self.analyze("broken.wav")
+
+        assert result.error is not None
+        assert not os.path.exists(log_path_for(self.output_dir, "broken.wav"))
+        assert find_pending_files(
+            self.corpus_dir, self.output_dir, self.manifest, SETTINGS
+        ) == ["broken.wav"]
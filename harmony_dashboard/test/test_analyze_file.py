@@ -0,0 +1,164 @@
+import pytest
+import numpy as np
+import soundfile as sf
+from unittest.mock import Mock
+from basic_pitch.inference import Model
+
+from .. import analyze_file
+from ..analyze_file import SAMPLE_RATE, detect_chunk_pitches, read_file_chunks
+from ..app import I_HarmonyAnalyzer
+from ..offline_analysis import OfflineHarmonyAnalysis
+from ..pitch_detection import I_PitchDetector
+from ..pitch_detection.basic_pitch_detector import (
+    ANNOT_N_FRAMES,
+    AUDIO_N_SAMPLES,
+    FFT_HOP,
+    SlidingWindowBasicPitchDetector,
+)
+
+HOP = 2205
+LOWEST_PIANO_KEY = 21
+
+
+def model_output_following_audio(batch: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Sounds midi pitch 100 * sample wherever the audio is positive
+    """
+    n_windows = batch.shape[0]
+    note = np.zeros(shape=(n_windows, ANNOT_N_FRAMES, 88), dtype=np.float32)
+    onset = np.zeros_like(note)
+    contour = np.zeros(shape=(n_windows, ANNOT_N_FRAMES, 264), dtype=np.float32)
+    frame_samples = batch[
+        :, np.minimum(np.arange(ANNOT_N_FRAMES) * FFT_HOP, AUDIO_N_SAMPLES - 1), 0
+    ]
+    for window_idx, frame_idx in zip(*np.nonzero(frame_samples > 0)):
+        pitch_idx = round(100 * frame_samples[window_idx, frame_idx]) - LOWEST_PIANO_KEY
+        note[window_idx, frame_idx, pitch_idx] = 0.9
+        if (
+            frame_idx == 0
+            or frame_samples[window_idx, frame_idx - 1]
+            != frame_samples[window_idx, frame_idx]
+        ):
+            onset[window_idx, frame_idx, pitch_idx] = 0.9
+    return {"note": note, "onset": onset, "contour": contour}
+
+
+class TestChunkedPitchDetection:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self, tmp_path, monkeypatch):
+        self.tmp_path = tmp_path
+        self.pitch_detector = Mock(spec=I_PitchDetector)
+        self.detector_inputs = []
+        self.pitch_detector.detect_pitches.side_effect = (
+            lambda audio, stream_position: self.detector_inputs.append(
+                (audio.copy(), stream_position)
+            )
+            or [60]
+        )
+        # Stands in for the detector a worker process would build
+        monkeypatch.setattr(analyze_file, "_pitch_detector", self.pitch_detector)
+
+    def detect_in_chunks(
+        self, audio: np.ndarray, chunk_len: int, window_len: int | None
+    ) -> list[tuple[np.ndarray, int]]:
+        path = str(self.tmp_path / "audio.wav")
+        sf.write(path, audio, SAMPLE_RATE, subtype="FLOAT")
+        for chunk in read_file_chunks(
+            path, HOP, window_len, chunk_sec=chunk_len / SAMPLE_RATE
+        ):
+            detect_chunk_pitches(*chunk, HOP, window_len)
+        detector_inputs = self.detector_inputs
+        self.detector_inputs = []
+        return detector_inputs
+
+    def detect_in_one_go(
+        self, audio: np.ndarray, window_len: int | None
+    ) -> list[tuple[np.ndarray, int]]:
+        analysis = OfflineHarmonyAnalysis(
+            pitch_detector=self.pitch_detector,
+            harmony_analyzer=Mock(spec=I_HarmonyAnalyzer),
+            sample_rate=SAMPLE_RATE,
+            hop_sec=HOP / SAMPLE_RATE,
+            analysis_window_sec=(
+                None if window_len is None else window_len / SAMPLE_RATE
+            ),
+        )
+        analysis.push(audio)
+        analysis.finish()
+        detector_inputs = self.detector_inputs
+        self.detector_inputs = []
+        return detector_inputs
+
+    def assert_same_windows(self, windows, expected_windows):
+        assert [position for _, position in windows] == [
+            position for _, position in expected_windows
+        ]
+        for (window, _), (expected_window, _) in zip(windows, expected_windows):
+            assert np.array_equal(window, expected_window)
+
+    @pytest.mark.parametrize("n_samples", [20 * HOP, 20 * HOP + 1000, 3 * HOP + 7])
+    def test_will_cut_same_hops_as_offline_analysis(self, n_samples):
+        audio = (np.arange(n_samples) / n_samples).astype(np.float32)
+
+        self.assert_same_windows(
+            self.detect_in_chunks(audio, chunk_len=5 * HOP, window_len=None),
+            self.detect_in_one_go(audio, window_len=None),
+        )
+
+    @pytest.mark.parametrize("n_samples", [20 * HOP, 20 * HOP + 1000, 3 * HOP + 7])
+    def test_will_cut_same_sliding_windows_as_offline_analysis(self, n_samples):
+        audio = (np.arange(n_samples) / n_samples).astype(np.float32)
+
+        self.assert_same_windows(
+            self.detect_in_chunks(audio, chunk_len=5 * HOP, window_len=4 * HOP),
+            self.detect_in_one_go(audio, window_len=4 * HOP),
+        )
+
+
+class TestSlidingChunkedPitchDetection:
+    WINDOW_LEN = 20 * HOP
+
+    @pytest.fixture(autouse=True)
+    def before_each_test(self, tmp_path, monkeypatch):
+        self.tmp_path = tmp_path
+        self.monkeypatch = monkeypatch
+
+    def create_detector(self) -> SlidingWindowBasicPitchDetector:
+        model = Mock(spec=Model)
+        model.predict.side_effect = model_output_following_audio
+        return SlidingWindowBasicPitchDetector(model=model)
+
+    def detect_in_chunks(
+        self, audio: np.ndarray, pitch_detectors: list[I_PitchDetector]
+    ) -> list[tuple[int, list[int]]]:
+        """
+        Hands the chunks out to the detectors in turn, as a pool's workers would
+        """
+        path = str(self.tmp_path / "audio.wav")
+        sf.write(path, audio, SAMPLE_RATE, subtype="FLOAT")
+        detected_pitches = []
+        for chunk_idx, chunk in enumerate(
+            read_file_chunks(
+                path, HOP, self.WINDOW_LEN, chunk_sec=3 * HOP / SAMPLE_RATE
+            )
+        ):
+            self.monkeypatch.setattr(
+                analyze_file,
+                "_pitch_detector",
+                pitch_detectors[chunk_idx % len(pitch_detectors)],
+            )
+            detected_pitches += detect_chunk_pitches(*chunk, HOP, self.WINDOW_LEN)
+        return detected_pitches
+
+    def test_will_detect_same_pitches_whichever_worker_gets_each_chunk(self):
+        audio = np.zeros(shape=(60 * HOP,), dtype=np.float32)
+        audio[10 * HOP : 14 * HOP] = 0.60
+        audio[25 * HOP : 40 * HOP] = 0.67
+
+        in_one_worker = self.detect_in_chunks(audio, [self.create_detector()])
+        in_two_workers = self.detect_in_chunks(
+            audio, [self.create_detector(), self.create_detector()]
+        )
+
+        assert any(pitches for _, pitches in in_one_worker)
+        assert in_two_workers == in_one_worker
@@ -0,0 +1,148 @@
+import threading
+
+import pytest
+import numpy as np
+
+from ..audio_ring_buffer import AudioRingBuffer, AudioBufferStats, OverrunPolicy
+
+CAPACITY = 10
+
+
+class TestAudioRingBuffer:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = AudioRingBuffer(capacity=CAPACITY)
+
+    def test_will_return_written_samples(self):
+        samples = np.arange(1, 5, dtype=np.float32)
+
+        self.patient.write(samples)
+
+        assert np.array_equal(self.patient.view(0, 4), samples)
+
+    def test_will_only_keep_first_channel_of_multichannel_blocks(self):
+        samples = np.array([[1, 10], [2, 20], [3, 30]], dtype=np.float32)
+
+        self.patient.write(samples)
+
+        assert np.array_equal(self.patient.view(0, 3), [1, 2, 3])
+
+    def test_will_scale_integer_samples(self):
+        samples = np.array([[-32768, 7], [0, 7], [16384, 7]], dtype=np.int16)
+
+        self.patient.write(samples)
+
+        assert np.array_equal(self.patient.view(0, 3), [-1.0, 0.0, 0.5])
+
+    def test_will_return_contiguous_view_across_the_wrap_around(self):
+        self.patient.write(np.arange(0, 8, dtype=np.float32))
+        self.patient.write(np.arange(8, 14, dtype=np.float32))
+
+        actual_view = self.patient.view(5, 14)
+
+        assert np.array_equal(actual_view, np.arange(5, 14))
+        assert np.shares_memory(actual_view, self.patient.buffer)
+
+    def test_will_read_samples_before_start_of_stream_as_silence(self):
+        self.patient.write(np.ones(shape=(3,), dtype=np.float32))
+
+        actual_view = self.patient.view(-5, 3)
+
+        assert np.array_equal(actual_view, [0, 0, 0, 0, 0, 1, 1, 1])
+
+    def test_will_keep_only_newest_samples_of_oversized_block(self):
+        self.patient.write(np.arange(0, 25, dtype=np.float32))
+
+        assert self.patient.write_index == 25
+        assert np.array_equal(self.patient.view(15, 25), np.arange(15, 25))
+
+    def test_will_not_allow_viewing_overwritten_samples(self):
+        self.patient.write(np.arange(0, 15, dtype=np.float32))
+
+        with pytest.raises(AssertionError):
+            self.patient.view(4, 8)
+
+    def test_will_read_all_unread_samples_when_keeping_up(self):
+        self.patient.write(np.arange(0, 4, dtype=np.float32))
+        self.patient.advance_read_index(2)
+        self.patient.write(np.arange(4, 8, dtype=np.float32))
+
+        actual_read_range = self.patient.next_read_range()
+
+        assert actual_read_range == (2, 8)
+        assert self.patient.get_stats() == AudioBufferStats(
+            overrun_count=0, dropped_samples=0
+        )
+
+    def test_will_skip_and_count_overwritten_samples_when_dropping_oldest(self):
+        self.patient.write(np.arange(0, 4, dtype=np.float32))
+        self.patient.advance_read_index(2)
+
+        self.patient.write(np.arange(4, 15, dtype=np.float32))
+
+        assert self.patient.next_read_range() == (5, 15)
+        assert self.patient.get_stats() == AudioBufferStats(
+            overrun_count=1, dropped_samples=3
+        )
+
+    def test_will_only_read_latest_window_when_keeping_latest_window(self):
+        patient = AudioRingBuffer(
+            capacity=CAPACITY,
+            overrun_policy=OverrunPolicy.KEEP_LATEST_WINDOW,
+            window_len=3,
+        )
+        patient.write(np.arange(0, 8, dtype=np.float32))
+
+        assert patient.next_read_range() == (5, 8)
+        assert patient.get_stats() == AudioBufferStats(
+            overrun_count=1, dropped_samples=5
+        )
+
+    def test_will_read_everything_unread_when_not_applying_overrun_policy(self):
+        patient = AudioRingBuffer(
+            capacity=CAPACITY,
+            overrun_policy=OverrunPolicy.KEEP_LATEST_WINDOW,
+            window_len=3,
+        )
+        patient.write(np.arange(0, 8, dtype=np.float32))
+
+        assert patient.next_read_range(apply_overrun_policy=False) == (0, 8)
+        assert patient.get_stats() == AudioBufferStats(
+            overrun_count=0, dropped_samples=0
+        )
+
+    def test_will_make_producer_wait_for_consumer_when_blocking(self):
+        patient = AudioRingBuffer(
+            capacity=CAPACITY, overrun_policy=OverrunPolicy.BLOCK, block_timeout_sec=5
+        )
+        patient.write(np.arange(0, 8, dtype=np.float32))
+        producer = threading.Thread(
+            target=patient.write, args=(np.arange(8, 12, dtype=np.float32),)
+        )
+
+        producer.start()
+        producer.join(timeout=0.1)
+        assert producer.is_alive()
+        patient.advance_read_index(2)
+        producer.join(timeout=5)
+
+        assert not producer.is_alive()
+        assert np.array_equal(patient.view(2, 12), np.arange(2, 12))
+        assert patient.get_stats() == AudioBufferStats(
+            overrun_count=1, dropped_samples=0
+        )
+
+    def test_will_stop_blocking_producer_after_timeout(self):
+        patient = AudioRingBuffer(
+            capacity=CAPACITY,
+            overrun_policy=OverrunPolicy.BLOCK,
+            block_timeout_sec=0.01,
+        )
+        patient.write(np.arange(0, 8, dtype=np.float32))
+
+        patient.write(np.arange(8, 12, dtype=np.float32))
+
+        assert patient.next_read_range() == (2, 12)
+        assert patient.get_stats() == AudioBufferStats(
+            overrun_count=2, dropped_samples=2
+        )
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+import numpy as np
+import soundfile as sf
+
+from ..chunked_audio_reader import ChunkedAudioReader
+
+SAMPLE_RATE = 22050
+
+
+def read_all(patient: ChunkedAudioReader, read_len: int = 1000) -> np.ndarray:
+    reads = []
+    out = np.zeros(shape=(read_len,), dtype=np.float32)
+    for _ in range(10000):
+        n_read = patient.read_into(out)
+        reads.append(out[:n_read].copy())
+        if patient.is_finished:
+            break
+        if n_read < read_len:
+            # The read-ahead thread hasn't caught up
+            threading.Event().wait(0.001)
+    return np.concatenate(reads)
+
+
+class TestChunkedAudioReader:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.patients = []
+        yield
+        for patient in self.patients:
+            patient.stop()
+
+    def write_audio_file(self, audio: np.ndarray, sample_rate: int) -> str:
+        path = str(self.tmp_path / "audio.wav")
+        sf.write(path, audio, sample_rate, subtype="FLOAT")
+        return path
+
+    def create_patient(self, path: str, **kwargs) -> ChunkedAudioReader:
+        patient = ChunkedAudioReader(path, SAMPLE_RATE, **kwargs)
+        self.patients.append(patient)
+        patient.start()
+        assert patient.wait_until_ready(timeout_sec=5.0)
+        return patient
+
+    def test_will_mix_each_block_down_to_mono(self):
+        rng = np.random.default_rng(0)
+        stereo_audio = (0.1 * rng.standard_normal((10000, 2))).astype(np.float32)
+        patient = self.create_patient(
+            self.write_audio_file(stereo_audio, SAMPLE_RATE), block_len=1024
+        )
+
+        audio = read_all(patient, read_len=700)
+
+        assert np.allclose(audio, np.mean(stereo_audio, axis=1), atol=1e-6)
+
+    def test_will_resample_to_requested_rate(self):
+        t = np.arange(44100) / 44100
+        original_audio = (0.5 * np.sin(2 * np.pi * 440.0 * t)).astype(np.float32)
+        patient = self.create_patient(
+            self.write_audio_file(original_audio, 44100), block_len=4096
+        )
+
+        audio = read_all(patient)
+
+        assert abs(audio.shape[0] - SAMPLE_RATE) <= 1
+        expected_audio = 0.5 * np.sin(
+            2 * np.pi * 440.0 * np.arange(audio.shape[0]) / SAMPLE_RATE
+        )
+        # Away from the edges, where the resampler has nothing to look at
+        assert np.allclose(audio[1000:-1000], expected_audio[1000:-1000], atol=1e-2)
+
+    def test_will_only_read_ahead_so_far(self):
+        audio = np.zeros(shape=(100 * 1024,), dtype=np.float32)
+        patient = self.create_patient(
+            self.write_audio_file(audio, SAMPLE_RATE),
+            block_len=1024,
+            read_ahead_blocks=4,
+        )
+        threading.Event().wait(0.2)
+
+        assert patient.blocks.qsize() <= 4
+        assert patient.read_ahead_thread.is_alive()
+
+    def test_will_stop_while_waiting_to_read_ahead(self):
+        audio = np.zeros(shape=(100 * 1024,), dtype=np.float32)
+        patient = self.create_patient(
+            self.write_audio_file(audio, SAMPLE_RATE),
+            block_len=1024,
+            read_ahead_blocks=2,
+        )
+
+        patient.stop()
+
+        assert not patient.read_ahead_thread.is_alive()
+
+    def test_will_count_underruns_instead_of_waiting(self):
+        # Not started, so blocks only arrive when the test queues them
+        patient = ChunkedAudioReader(str(self.tmp_path / "unused.wav"), SAMPLE_RATE)
+        patient.blocks.put(np.ones(shape=(1024,), dtype=np.float32))
+
+        n_read = patient.read_into(np.zeros(shape=(2048,), dtype=np.float32))
+
+        assert n_read == 1024
+        assert patient.n_underruns == 1
+        assert not patient.is_finished
+
+    def test_will_finish_with_error_if_file_cannot_be_read(self):
+        patient = self.create_patient(str(self.tmp_path / "missing.wav"))
+
+        assert patient.read_into(np.zeros(shape=(100,), dtype=np.float32)) == 0
+        assert patient.is_finished
+        assert patient.error is not None
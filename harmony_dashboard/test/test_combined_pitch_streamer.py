@@ -0,0 +1,94 @@
+from unittest.mock import Mock
+
+import pytest
+
+from ..app import I_PitchStreamer, I_PitchStreamListener
+from ..combined_pitch_streamer import CombinedPitchStreamer, combine_pitches
+
+
+class TestCombinePitches:
+    def test_will_join_streams_without_repeats(self):
+        assert combine_pitches([[64, 60], [67, 60], []]) == [60, 64, 67]
+
+    def test_will_move_bass_below_other_streams(self):
+        # An E in the bass under a C major triad
+        assert combine_pitches([[60, 64, 67], [64]], bass_stream_idx=1) == [
+            52,
+            60,
+            64,
+            67,
+        ]
+
+    def test_will_leave_bass_already_below(self):
+        assert combine_pitches([[60, 64, 67], [40, 47]], bass_stream_idx=1) == [
+            40,
+            47,
+            60,
+            64,
+            67,
+        ]
+
+    def test_will_keep_bass_alone(self):
+        assert combine_pitches([[], [43]], bass_stream_idx=1) == [43]
+
+
+class TestCombinedPitchStreamer:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.pitch_streamers = [Mock(spec=I_PitchStreamer) for _ in range(2)]
+        self.listener = Mock(spec=I_PitchStreamListener)
+        self.patient = CombinedPitchStreamer(self.pitch_streamers, bass_stream_idx=1)
+        self.patient.register_listener(self.listener)
+        self.stream_listeners = [
+            pitch_streamer.register_listener.call_args.args[0]
+            for pitch_streamer in self.pitch_streamers
+        ]
+
+    def test_will_report_latest_pitches_of_every_stream(self):
+        self.stream_listeners[0].new_pitches_detected([60, 64])
+        self.stream_listeners[1].new_pitches_detected([72])
+        self.stream_listeners[0].new_pitches_detected([62, 65])
+
+        assert [
+            call.args[0] for call in self.listener.new_pitches_detected.mock_calls
+        ] == [
+            [60, 64],
+            [48, 60, 64],
+            [60, 62, 65],
+        ]
+
+    def test_will_be_ready_once_every_stream_is(self):
+        on_ready = Mock()
+        self.patient.start_streaming(on_ready=on_ready)
+        stream_on_readies = [
+            pitch_streamer.start_streaming.call_args.kwargs["on_ready"]
+            for pitch_streamer in self.pitch_streamers
+        ]
+
+        stream_on_readies[1]()
+        on_ready.assert_not_called()
+        stream_on_readies[0]()
+        on_ready.assert_called_once()
+
+    def test_will_report_first_error_and_never_be_ready(self):
+        on_ready = Mock()
+        on_error = Mock()
+        self.patient.start_streaming(on_ready=on_ready, on_error=on_error)
+        stream_callbacks = [
+            pitch_streamer.start_streaming.call_args.kwargs
+            for pitch_streamer in self.pitch_streamers
+        ]
+        error = RuntimeError("Model not found")
+
+        stream_callbacks[0]["on_ready"]()
+        stream_callbacks[1]["on_error"](error)
+        stream_callbacks[0]["on_error"](RuntimeError("Model not found"))
+
+        on_error.assert_called_once_with(error)
+        on_ready.assert_not_called()
+
+    def test_will_stop_every_stream(self):
+        self.patient.stop_streaming()
+
+        for pitch_streamer in self.pitch_streamers:
+            pitch_streamer.stop_streaming.assert_called_once()
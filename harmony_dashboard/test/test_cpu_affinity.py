@@ -0,0 +1,26 @@
+import os
+import threading
+
+import pytest
+
+from ..cpu_affinity import pin_current_thread_to_cores
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "sched_getaffinity"), reason="CPU affinity is Linux only"
+)
+def test_will_only_pin_the_calling_thread():
+    original_cores = os.sched_getaffinity(0)
+    core = min(original_cores)
+    pinned_cores = []
+
+    def pin_and_record():
+        pin_current_thread_to_cores([core])
+        pinned_cores.append(os.sched_getaffinity(0))
+
+    pinning_thread = threading.Thread(target=pin_and_record)
+    pinning_thread.start()
+    pinning_thread.join()
+
+    assert pinned_cores == [{core}]
+    assert os.sched_getaffinity(0) == original_cores
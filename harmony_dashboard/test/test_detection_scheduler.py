@@ -0,0 +1,51 @@
+import pytest
+
+from ..detection_scheduler import DetectionScheduler
+
+SAMPLE_RATE = 1000
+
+
+class TestDetectionScheduler:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = DetectionScheduler(
+            sample_rate=SAMPLE_RATE, target_hop_sec=0.2, latency_budget_sec=0.5
+        )
+
+    def test_will_use_target_hop_when_inference_is_fast(self):
+        self.patient.record_inference_time(0.05)
+
+        assert self.patient.next_hop_samples() == 200
+
+    def test_will_shrink_hop_to_stay_within_latency_budget(self):
+        patient = DetectionScheduler(
+            sample_rate=SAMPLE_RATE, target_hop_sec=0.4, latency_budget_sec=0.5
+        )
+
+        patient.record_inference_time(0.15)
+
+        assert patient.next_hop_samples() == 350
+
+    def test_will_grow_hop_to_keep_up_when_budget_cannot_be_met(self):
+        self.patient.record_inference_time(0.4)
+
+        assert self.patient.next_hop_samples() == 500
+
+    def test_will_smooth_inference_times(self):
+        self.patient.record_inference_time(0.1)
+
+        self.patient.record_inference_time(0.6)
+
+        assert self.patient.get_stats().mean_inference_sec == pytest.approx(0.2)
+
+    def test_will_read_whole_backlog_when_keeping_up(self):
+        actual_start_index = self.patient.oldest_fresh_index(1000, 1300)
+
+        assert actual_start_index == 1000
+        assert self.patient.get_stats().stale_windows_skipped == 0
+
+    def test_will_skip_stale_hops_when_falling_behind(self):
+        actual_start_index = self.patient.oldest_fresh_index(1000, 2000)
+
+        assert actual_start_index == 1800
+        assert self.patient.get_stats().stale_windows_skipped == 4
@@ -0,0 +1,84 @@
+import threading
+from unittest.mock import Mock
+
+import pytest
+import numpy as np
+
+from ..multi_channel_capture import MultiChannelCapture
+
+SAMPLE_RATE = 22050
+
+
+class FakeCapture(MultiChannelCapture):
+    def __init__(self, n_channels: int):
+        super().__init__(n_channels)
+        self.open_sample_rates = []
+        self.n_closes = 0
+
+    def open_stream(self, sample_rate: int):
+        self.open_sample_rates.append(sample_rate)
+
+    def close_stream(self):
+        self.n_closes += 1
+
+
+class TestMultiChannelCapture:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = FakeCapture(n_channels=3)
+
+    def test_will_open_on_first_channel_and_close_after_last(self):
+        first_callback = Mock()
+        second_callback = Mock()
+
+        self.patient.attach(0, SAMPLE_RATE, first_callback)
+        self.patient.attach(2, SAMPLE_RATE, second_callback)
+        self.patient.detach(first_callback)
+
+        assert self.patient.open_sample_rates == [SAMPLE_RATE]
+        assert self.patient.n_closes == 0
+
+        self.patient.detach(second_callback)
+
+        assert self.patient.n_closes == 1
+
+    def test_will_hand_each_callback_its_channel(self):
+        first_callback = Mock()
+        second_callback = Mock()
+        self.patient.attach(2, SAMPLE_RATE, first_callback)
+        self.patient.attach(0, SAMPLE_RATE, second_callback)
+        block = np.arange(12, dtype=np.float32).reshape(4, 3)
+
+        self.patient.forward_block(block)
+
+        np.testing.assert_array_equal(
+            first_callback.call_args.args[0], [2.0, 5.0, 8.0, 11.0]
+        )
+        np.testing.assert_array_equal(
+            second_callback.call_args.args[0], [0.0, 3.0, 6.0, 9.0]
+        )
+
+    def test_will_not_mix_sample_rates(self):
+        self.patient.attach(0, SAMPLE_RATE, Mock())
+
+        with pytest.raises(AssertionError):
+            self.patient.attach(1, 16000, Mock())
+
+    def test_will_stream_channel_until_stopped(self):
+        callback = Mock()
+        stop_event = threading.Event()
+        streaming_thread = threading.Thread(
+            target=self.patient.channel(1).stream_audio,
+            args=(SAMPLE_RATE, 1, callback, stop_event),
+        )
+        streaming_thread.start()
+        while not self.patient.channel_callbacks:
+            stop_event.wait(0.001)
+
+        self.patient.forward_block(np.ones((4, 3), dtype=np.float32))
+        stop_event.set()
+        streaming_thread.join()
+
+        assert callback.call_count == 1
+        assert self.patient.n_closes == 1
+        assert self.patient.channel_callbacks == ()
@@ -0,0 +1,88 @@
+import pytest
+from unittest.mock import Mock
+
+from ..app import I_HarmonyAnalyzer, I_HarmonyStateListener
+from ..note_tracking import NoteTracker, NoteTrackingHarmonyAnalyzerDecorator
+
+C_MAJOR = [60, 64, 67]
+C_MAJOR_7 = [60, 64, 67, 71]
+
+
+class TestNoteTracker:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = NoteTracker()
+
+    def test_will_turn_on_newly_detected_notes(self):
+        note_changes = self.patient.update(C_MAJOR)
+
+        assert note_changes.note_ons == C_MAJOR
+        assert note_changes.note_offs == []
+        assert note_changes.active_pitches == C_MAJOR
+
+    def test_will_report_no_changes_for_same_notes(self):
+        self.patient.update(C_MAJOR)
+
+        note_changes = self.patient.update(list(reversed(C_MAJOR)))
+
+        assert note_changes.note_ons == []
+        assert note_changes.note_offs == []
+        assert note_changes.active_pitches == C_MAJOR
+
+    def test_will_only_report_notes_that_changed(self):
+        self.patient.update(C_MAJOR)
+
+        note_changes = self.patient.update([60, 64, 71])
+
+        assert note_changes.note_ons == [71]
+        assert note_changes.note_offs == [67]
+        assert note_changes.active_pitches == [60, 64, 71]
+
+    def test_will_keep_flickering_note_on_within_release_windows(self):
+        patient = NoteTracker(release_windows=2)
+        patient.update(C_MAJOR)
+
+        flickered = patient.update([60, 64])
+        returned = patient.update(C_MAJOR)
+
+        assert flickered.note_offs == []
+        assert returned.note_ons == []
+        assert returned.active_pitches == C_MAJOR
+
+    def test_will_turn_off_note_missing_for_release_windows(self):
+        patient = NoteTracker(release_windows=2)
+        patient.update(C_MAJOR)
+
+        patient.update([60, 64])
+        note_changes = patient.update([60, 64])
+
+        assert note_changes.note_offs == [67]
+        assert note_changes.active_pitches == [60, 64]
+
+
+class TestNoteTrackingHarmonyAnalyzerDecorator:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.underlying_analyzer = Mock(spec=I_HarmonyAnalyzer)
+        self.patient = NoteTrackingHarmonyAnalyzerDecorator(self.underlying_analyzer)
+
+    def test_will_not_reanalyze_unchanged_notes(self):
+        self.patient.new_pitches_detected(C_MAJOR)
+        self.patient.new_pitches_detected(C_MAJOR)
+        self.patient.new_pitches_detected(C_MAJOR)
+
+        self.underlying_analyzer.new_pitches_detected.assert_called_once_with(C_MAJOR)
+
+    def test_will_analyze_active_notes_when_notes_change(self):
+        self.patient.new_pitches_detected(C_MAJOR)
+
+        self.patient.new_pitches_detected(C_MAJOR_7)
+
+        self.underlying_analyzer.new_pitches_detected.assert_called_with(C_MAJOR_7)
+
+    def test_will_forward_listener_to_underlying_analyzer(self):
+        listener = Mock(spec=I_HarmonyStateListener)
+
+        self.patient.register_listener(listener)
+
+        self.underlying_analyzer.register_listener.assert_called_once_with(listener)
@@ -0,0 +1,115 @@
+from argparse import ArgumentParser
+
+import pytest
+import numpy as np
+import soundfile as sf
+from unittest.mock import Mock
+
+from ..app import I_HarmonyAnalyzer
+from ..harmony_domain import HarmonyState
+from ..offline_analysis import (
+    OfflineHarmonyAnalysis,
+    add_analysis_arguments,
+    load_audio_file,
+    parse_inference_backend,
+)
+from ..pitch_detection import I_PitchDetector
+from ..pitch_detection.inference_backends import InferenceBackend
+
+SAMPLE_RATE = 1000
+HOP = 100
+
+
+class TestOfflineHarmonyAnalysis:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.pitch_detector = Mock(spec=I_PitchDetector)
+        self.detector_inputs = []
+        self.pitch_detector.detect_pitches.side_effect = (
+            lambda audio, stream_position: self.detector_inputs.append(
+                (audio.copy(), stream_position)
+            )
+            or [60]
+        )
+        self.harmony_analyzer = Mock(spec=I_HarmonyAnalyzer)
+
+    def create_patient(self, analysis_window_sec: float | None = None):
+        return OfflineHarmonyAnalysis(
+            pitch_detector=self.pitch_detector,
+            harmony_analyzer=self.harmony_analyzer,
+            sample_rate=SAMPLE_RATE,
+            hop_sec=HOP / SAMPLE_RATE,
+            analysis_window_sec=analysis_window_sec,
+        )
+
+    def test_will_feed_detector_each_sample_exactly_once_by_default(self):
+        audio = np.arange(1050, dtype=np.float32)
+        patient = self.create_patient()
+
+        for piece_start in range(0, audio.shape[0], 37):
+            patient.push(audio[piece_start : piece_start + 37])
+        patient.finish()
+
+        audio_received = np.concatenate([block for block, _ in self.detector_inputs])
+        assert np.array_equal(audio_received, audio)
+        assert [position for _, position in self.detector_inputs][-2:] == [1000, 1050]
+
+    def test_will_feed_detector_most_recent_window_in_sliding_analysis_mode(self):
+        audio = np.arange(1000, dtype=np.float32)
+        patient = self.create_patient(analysis_window_sec=0.3)
+
+        for piece_start in range(0, audio.shape[0], HOP):
+            patient.push(audio[piece_start : piece_start + HOP])
+
+        first_window, _ = self.detector_inputs[0]
+        last_window, last_stream_position = self.detector_inputs[-1]
+        assert np.array_equal(first_window, audio[:HOP])
+        assert last_stream_position == audio.shape[0]
+        assert np.array_equal(last_window, audio[-300:])
+
+    def test_will_report_latest_harmony_state_with_each_hop(self):
+        state = Mock(spec=HarmonyState)
+        self.harmony_analyzer.new_pitches_detected.side_effect = (
+            lambda pitches: patient.update_harmony_state(state)
+        )
+        patient = self.create_patient()
+
+        analyzed_hops = patient.push(np.zeros(shape=(2 * HOP,), dtype=np.float32))
+
+        assert [hop.end_sec for hop in analyzed_hops] == [0.1, 0.2]
+        assert [hop.pitches for hop in analyzed_hops] == [[60], [60]]
+        assert analyzed_hops[-1].harmony_state is state
+
+    def test_will_not_analyze_anything_more_if_nothing_is_left_over(self):
+        patient = self.create_patient()
+        patient.push(np.zeros(shape=(HOP,), dtype=np.float32))
+
+        assert patient.finish() == []
+
+
+def test_will_load_audio_files_as_mono_at_requested_rate(tmp_path):
+    path = tmp_path / "stereo.wav"
+    sf.write(path, np.full(shape=(44100, 2), fill_value=0.5), 44100)
+
+    audio = load_audio_file(str(path), 22050)
+
+    assert audio.dtype == np.float32
+    assert audio.shape == (22050,)
+    assert np.allclose(audio[1000:-1000], 0.5, atol=1e-3)
+
+
+def test_will_parse_the_shared_analysis_arguments():
+    parser = ArgumentParser()
+    add_analysis_arguments(parser)
+
+    defaults = parser.parse_args([])
+    args = parser.parse_args(
+        ["--inference_backend", "onnx", "--hop_sec", "0.1", "-w", "2"]
+    )
+
+    assert parse_inference_backend(defaults.inference_backend) is None
+    assert defaults.hop_sec == 0.2
+    assert defaults.analysis_window_sec is None
+    assert parse_inference_backend(args.inference_backend) is InferenceBackend.ONNX
+    assert args.hop_sec == 0.1
+    assert args.analysis_window_sec == 2.0
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+# The module imports sounddevice, though the monitor never touches a device
+pytest.importorskip("sounddevice")
+
+from ..physical_mic_integration import _CaptureMonitor
+
+
+def callback_time(current_time: float, input_buffer_adc_time: float):
+    return SimpleNamespace(
+        currentTime=current_time, inputBufferAdcTime=input_buffer_adc_time
+    )
+
+
+def callback_status(input_overflow: bool = False, input_underflow: bool = False):
+    return SimpleNamespace(
+        input_overflow=input_overflow, input_underflow=input_underflow
+    )
+
+
+class TestCaptureMonitor:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = _CaptureMonitor()
+
+    def test_will_count_overflows_and_underflows(self):
+        self.patient.record_block(callback_time(1.0, 0.99), callback_status())
+        self.patient.record_block(
+            callback_time(1.1, 1.09), callback_status(input_overflow=True)
+        )
+        self.patient.record_block(
+            callback_time(1.2, 1.19), callback_status(input_overflow=True)
+        )
+        self.patient.record_block(
+            callback_time(1.3, 1.29), callback_status(input_underflow=True)
+        )
+
+        stats = self.patient.get_stats(reported_latency_sec=0.01)
+
+        assert stats.n_blocks == 4
+        assert stats.n_input_overflows == 2
+        assert stats.n_input_underflows == 1
+        assert stats.reported_latency_sec == 0.01
+
+    def test_will_measure_mean_and_max_latency(self):
+        self.patient.record_block(callback_time(1.0, 0.99), callback_status())
+        self.patient.record_block(callback_time(2.0, 1.97), callback_status())
+        self.patient.record_block(callback_time(3.0, 2.98), callback_status())
+
+        stats = self.patient.get_stats(reported_latency_sec=0.01)
+
+        assert stats.mean_measured_latency_sec == pytest.approx(0.02)
+        assert stats.max_measured_latency_sec == pytest.approx(0.03)
+
+    def test_will_ignore_blocks_without_capture_time(self):
+        self.patient.record_block(callback_time(1.0, 0.98), callback_status())
+        # Host API didn't say when the block was captured
+        self.patient.record_block(callback_time(2.0, 0.0), callback_status())
+
+        stats = self.patient.get_stats(reported_latency_sec=0.01)
+
+        assert stats.n_blocks == 2
+        assert stats.mean_measured_latency_sec == pytest.approx(0.02)
+        assert stats.max_measured_latency_sec == pytest.approx(0.02)
+
+    def test_will_report_no_latency_before_any_is_measured(self):
+        self.patient.record_block(callback_time(1.0, 0.0), callback_status())
+
+        stats = self.patient.get_stats(reported_latency_sec=0.01)
+
+        assert stats.mean_measured_latency_sec == 0.0
+        assert stats.max_measured_latency_sec == 0.0
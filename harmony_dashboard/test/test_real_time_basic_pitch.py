@@ -0,0 +1,433 @@
+import threading
+from typing import Callable
+
+import pytest
+import numpy as np
+from unittest.mock import Mock
+
+from ..app import I_PitchStreamListener
+from ..audio_ring_buffer import OverrunPolicy
+from ..pitch_detection import I_PitchDetector
+from ..pitch_detection.batched_inference import BatchedInferenceService
+from ..real_time_basic_pitch import I_AudioStreamer, PitchDetectingAudioStreamer
+
+BLOCK_SIZE = 441
+
+
+class FakeAudioStreamer(I_AudioStreamer):
+    """
+    Streams the given audio in fixed size blocks, as fast as possible unless
+    block_interval_sec is given
+    """
+
+    def __init__(self, audio: np.ndarray, block_interval_sec: float = 0.0):
+        self.audio = audio
+        self.block_interval_sec = block_interval_sec
+
+    def stream_audio(
+        self,
+        sample_rate: int,
+        num_audio_channels: int,
+        callback: Callable[[np.ndarray], None],
+        threading_event: threading.Event,
+    ):
+        for block_start in range(0, self.audio.shape[0], BLOCK_SIZE):
+            callback(self.audio[block_start : block_start + BLOCK_SIZE, np.newaxis])
+            if self.block_interval_sec > 0:
+                threading_event.wait(self.block_interval_sec)
+        threading_event.wait()
+
+
+class TestPitchDetectingAudioStreamer:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.listener = Mock(spec=I_PitchStreamListener)
+        self.pitch_detector = Mock(spec=I_PitchDetector)
+        self.detector_inputs = []
+        self.pitch_detector.detect_pitches.side_effect = (
+            lambda audio, stream_position: self.detector_inputs.append(
+                (audio.copy(), stream_position)
+            )
+            or [60, 64, 67]
+        )
+
+    def run_patient_until_audio_consumed(self, patient, audio: np.ndarray):
+        patient.register_listener(self.listener)
+        patient.start_streaming()
+        try:
+            for _ in range(100):
+                if (
+                    self.detector_inputs
+                    and self.detector_inputs[-1][1] == audio.shape[0]
+                ):
+                    break
+                threading.Event().wait(0.05)
+        finally:
+            patient.stop_streaming()
+
+    def test_will_forward_detected_pitches_to_listener(self):
+        audio = np.ones(shape=(10 * BLOCK_SIZE,), dtype=np.float32)
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            hop_sec=0.01,
+        )
+
+        self.run_patient_until_audio_consumed(patient, audio)
+
+        self.listener.new_pitches_detected.assert_called_with([60, 64, 67])
+
+    def test_will_feed_detector_each_sample_exactly_once_by_default(self):
+        audio = np.arange(10 * BLOCK_SIZE, dtype=np.float32)
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            hop_sec=0.2,
+        )
+
+        self.run_patient_until_audio_consumed(patient, audio)
+
+        audio_received = np.concatenate([block for block, _ in self.detector_inputs])
+        assert np.array_equal(audio_received, audio)
+
+    def test_will_feed_detector_most_recent_window_in_sliding_analysis_mode(self):
+        audio = np.arange(10 * BLOCK_SIZE, dtype=np.float32)
+        window_sec = 0.1
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            analysis_window_sec=window_sec,
+            hop_sec=0.01,
+        )
+
+        self.run_patient_until_audio_consumed(patient, audio)
+
+        last_window, last_stream_position = self.detector_inputs[-1]
+        window_len = int(window_sec * patient.sample_rate)
+        assert last_stream_position == audio.shape[0]
+        assert np.array_equal(last_window, audio[-window_len:])
+
+    def test_will_skip_stale_audio_when_detection_falls_behind(self):
+        audio = np.arange(10 * BLOCK_SIZE, dtype=np.float32)
+        hop_sec = 0.02
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            hop_sec=hop_sec,
+        )
+
+        self.run_patient_until_audio_consumed(patient, audio)
+
+        audio_received = np.concatenate([block for block, _ in self.detector_inputs])
+        assert audio_received.shape[0] < audio.shape[0]
+        assert patient.get_detection_scheduler_stats().stale_windows_skipped > 0
+
+    def test_will_count_stale_audio_as_dropped(self):
+        audio = np.arange(10 * BLOCK_SIZE, dtype=np.float32)
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            hop_sec=0.02,
+        )
+
+        self.run_patient_until_audio_consumed(patient, audio)
+
+        audio_received = np.concatenate([block for block, _ in self.detector_inputs])
+        stats = patient.get_audio_buffer_stats()
+        assert stats.dropped_samples == audio.shape[0] - audio_received.shape[0]
+        assert stats.overrun_count > 0
+
+    def test_will_feed_detector_every_hop_when_blocking(self):
+        audio = np.arange(10 * BLOCK_SIZE, dtype=np.float32)
+        hop_sec = 0.02
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            hop_sec=hop_sec,
+            overrun_policy=OverrunPolicy.BLOCK,
+        )
+
+        self.run_patient_until_audio_consumed(patient, audio)
+
+        audio_received = np.concatenate([block for block, _ in self.detector_inputs])
+        assert np.array_equal(audio_received, audio)
+        assert max(block.shape[0] for block, _ in self.detector_inputs) == int(
+            hop_sec * patient.sample_rate
+        )
+        assert patient.get_audio_buffer_stats().dropped_samples == 0
+
+    def test_will_not_overwrite_audio_being_detected_when_blocking(self):
+        audio = np.arange(15000, dtype=np.float32)
+        overwritten_windows = []
+
+        def slowly_detect_pitches(samples: np.ndarray, stream_position: int):
+            samples_before = samples.copy()
+            # Long enough for the hop to grow past the nominal one
+            threading.Event().wait(0.05)
+            if not np.array_equal(samples, samples_before):
+                overwritten_windows.append(stream_position)
+            self.detector_inputs.append((samples_before, stream_position))
+            return []
+
+        self.pitch_detector.detect_pitches.side_effect = slowly_detect_pitches
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            hop_sec=0.01,
+            max_backlog_sec=0.2,
+            overrun_policy=OverrunPolicy.BLOCK,
+        )
+
+        patient.start_streaming()
+        threading.Event().wait(1.0)
+        patient.stop_streaming()
+
+        assert len(self.detector_inputs) > 3
+        assert max(block.shape[0] for block, _ in self.detector_inputs) > int(
+            0.01 * patient.sample_rate
+        )
+        assert overwritten_windows == []
+
+    def test_will_skip_detection_on_silence_when_gated(self):
+        # Long enough to cover the gate's idle wakeup period
+        audio = np.zeros(shape=(30 * BLOCK_SIZE,), dtype=np.float32)
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            hop_sec=0.01,
+            silence_threshold_dbfs=-50.0,
+        )
+        patient.register_listener(self.listener)
+
+        patient.start_streaming()
+        for _ in range(100):
+            if self.listener.new_pitches_detected.called:
+                break
+            threading.Event().wait(0.05)
+        patient.stop_streaming()
+
+        self.pitch_detector.detect_pitches.assert_not_called()
+        self.listener.new_pitches_detected.assert_called_with([])
+
+    def test_will_keep_sliding_detector_in_step_through_silence(self):
+        # Long enough to go idle, and then wake up
+        audio = np.zeros(shape=(60 * BLOCK_SIZE,), dtype=np.float32)
+        window_sec = 0.1
+        skipped_windows = []
+        self.pitch_detector.skip_window.side_effect = (
+            lambda audio, stream_position: skipped_windows.append(
+                (audio.shape[0], stream_position)
+            )
+        )
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            analysis_window_sec=window_sec,
+            hop_sec=0.01,
+            silence_threshold_dbfs=-50.0,
+        )
+        patient.register_listener(self.listener)
+
+        patient.start_streaming()
+        for _ in range(100):
+            if len(skipped_windows) >= 2:
+                break
+            threading.Event().wait(0.05)
+        patient.stop_streaming()
+
+        window_len = int(window_sec * patient.sample_rate)
+        assert len(skipped_windows) == self.listener.new_pitches_detected.call_count
+        assert all(n_samples == window_len for n_samples, _ in skipped_windows)
+
+    def test_will_not_drop_audio_that_ends_idling(self):
+        sample_rate = PitchDetectingAudioStreamer.SAMPLE_RATE
+        # Silent long enough to go idle, then a sound starting midway through the
+        # gate's idle wakeup period
+        audio = np.zeros(shape=(95 * BLOCK_SIZE,), dtype=np.float32)
+        sound_start = 65 * BLOCK_SIZE
+        audio[sound_start:] = 0.5
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(
+                audio, block_interval_sec=BLOCK_SIZE / sample_rate
+            ),
+            pitch_detector=self.pitch_detector,
+            hop_sec=0.2,
+            overrun_policy=OverrunPolicy.KEEP_LATEST_WINDOW,
+            silence_threshold_dbfs=-50.0,
+        )
+
+        self.run_patient_until_audio_consumed(patient, audio)
+
+        audio_received = np.concatenate([block for block, _ in self.detector_inputs])
+        assert np.array_equal(
+            audio_received[-(audio.shape[0] - sound_start) :], audio[sound_start:]
+        )
+        assert patient.get_audio_buffer_stats().dropped_samples == 0
+
+    def test_will_reuse_pitches_while_a_chord_is_held(self):
+        t = np.arange(50 * BLOCK_SIZE) / PitchDetectingAudioStreamer.SAMPLE_RATE
+        audio = (0.1 * np.sin(2 * np.pi * 440.0 * t)).astype(np.float32)
+        patient = PitchDetectingAudioStreamer(
+            # Paced, so that hops arrive one at a time
+            audio_streamer=FakeAudioStreamer(audio, block_interval_sec=0.01),
+            pitch_detector=self.pitch_detector,
+            hop_sec=0.1,
+            reuse_tolerance=0.05,
+            max_reuse_sec=10.0,
+        )
+        patient.register_listener(self.listener)
+
+        patient.start_streaming()
+        for _ in range(100):
+            if self.listener.new_pitches_detected.call_count >= 5:
+                break
+            threading.Event().wait(0.05)
+        patient.stop_streaming()
+
+        stats = patient.get_result_reuse_stats()
+        assert stats.windows_reused > 0
+        assert (
+            self.pitch_detector.detect_pitches.call_count
+            == stats.windows_checked - stats.windows_reused
+        )
+        for call in self.listener.new_pitches_detected.call_args_list:
+            assert call.args == ([60, 64, 67],)
+
+    def test_will_keep_sliding_detector_in_step_while_reusing_pitches(self):
+        t = np.arange(50 * BLOCK_SIZE) / PitchDetectingAudioStreamer.SAMPLE_RATE
+        audio = (0.1 * np.sin(2 * np.pi * 440.0 * t)).astype(np.float32)
+        window_positions = []
+        self.pitch_detector.skip_window.side_effect = (
+            lambda audio, stream_position: window_positions.append(stream_position)
+        )
+        self.pitch_detector.detect_pitches.side_effect = (
+            lambda audio, stream_position: window_positions.append(stream_position)
+            or [69]
+        )
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio, block_interval_sec=0.01),
+            pitch_detector=self.pitch_detector,
+            analysis_window_sec=0.2,
+            hop_sec=0.1,
+            reuse_tolerance=0.05,
+            max_reuse_sec=10.0,
+        )
+        patient.register_listener(self.listener)
+
+        patient.start_streaming()
+        for _ in range(100):
+            if self.listener.new_pitches_detected.call_count >= 5:
+                break
+            threading.Event().wait(0.05)
+        patient.stop_streaming()
+
+        assert self.pitch_detector.skip_window.call_count == (
+            patient.get_result_reuse_stats().windows_reused
+        )
+        # Every window, reused or not, went past the detector in order
+        assert window_positions == sorted(window_positions)
+        assert len(window_positions) == self.listener.new_pitches_detected.call_count
+
+    def test_will_report_no_reuse_stats_unless_reusing(self):
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(np.zeros(shape=(0,))),
+            pitch_detector=self.pitch_detector,
+        )
+
+        assert patient.get_result_reuse_stats() is None
+
+    def test_will_warm_detector_up_before_streaming_audio(self):
+        audio = np.ones(shape=(10 * BLOCK_SIZE,), dtype=np.float32)
+        self.pitch_detector.warm_up.side_effect = lambda: self.detector_inputs.append(
+            "warm up"
+        )
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            hop_sec=0.01,
+        )
+
+        self.run_patient_until_audio_consumed(patient, audio)
+
+        assert self.detector_inputs[0] == "warm up"
+
+    def test_will_report_ready_once_detector_is_warmed_up(self):
+        audio = np.ones(shape=(10 * BLOCK_SIZE,), dtype=np.float32)
+        ready_event = threading.Event()
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=FakeAudioStreamer(audio),
+            pitch_detector=self.pitch_detector,
+            hop_sec=0.01,
+        )
+
+        patient.start_streaming(on_ready=ready_event.set)
+        is_ready = ready_event.wait(timeout=5.0)
+        patient.stop_streaming()
+
+        assert is_ready
+        self.pitch_detector.warm_up.assert_called_once()
+
+    def test_will_stop_cleanly_before_detector_is_ready(self):
+        detector_may_start = threading.Event()
+        self.pitch_detector.start.side_effect = lambda: detector_may_start.wait()
+        audio_streamer = Mock(spec=I_AudioStreamer)
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=audio_streamer, pitch_detector=self.pitch_detector
+        )
+
+        patient.start_streaming()
+        stopper = threading.Thread(target=patient.stop_streaming)
+        stopper.start()
+        patient.thread_event.wait(timeout=5.0)
+        detector_may_start.set()
+        stopper.join(timeout=5.0)
+
+        assert not stopper.is_alive()
+        audio_streamer.stream_audio.assert_not_called()
+        self.pitch_detector.stop.assert_called_once()
+
+    def test_will_report_error_if_detector_fails_to_load(self):
+        audio_streamer = Mock(spec=I_AudioStreamer)
+        patient = PitchDetectingAudioStreamer(audio_streamer=audio_streamer)
+        error = RuntimeError("Model not found")
+        patient.pitch_detector_factory = Mock(side_effect=error)
+        on_ready = Mock()
+        error_reported = threading.Event()
+        reported_errors = []
+
+        patient.start_streaming(
+            on_ready=on_ready,
+            on_error=lambda e: reported_errors.append(e) or error_reported.set(),
+        )
+        error_reported.wait(timeout=5.0)
+        patient.stop_streaming()
+
+        assert reported_errors == [error]
+        on_ready.assert_not_called()
+        audio_streamer.stream_audio.assert_not_called()
+
+    def test_will_load_shared_model_on_detection_thread(self):
+        loading_threads = []
+        error = RuntimeError("Model not found")
+
+        def load_inference_backend():
+            loading_threads.append(threading.current_thread())
+            raise error
+
+        patient = PitchDetectingAudioStreamer(
+            audio_streamer=Mock(spec=I_AudioStreamer),
+            shared_inference_service=BatchedInferenceService(
+                load_inference_backend=load_inference_backend
+            ),
+        )
+        error_reported = threading.Event()
+        reported_errors = []
+
+        patient.start_streaming(
+            on_error=lambda e: reported_errors.append(e) or error_reported.set()
+        )
+        error_reported.wait(timeout=5.0)
+        patient.stop_streaming()
+
+        assert loading_threads == [patient.pitch_detection_thread]
+        assert reported_errors == [error]
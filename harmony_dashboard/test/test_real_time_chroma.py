@@ -0,0 +1,29 @@
+import threading
+
+import numpy as np
+from unittest.mock import Mock
+
+from ..app import I_PitchStreamListener
+from ..real_time_chroma import ChromaPitchStreamer
+from .test_real_time_basic_pitch import FakeAudioStreamer
+
+
+def test_will_stream_pitches_of_chord():
+    sample_rate = ChromaPitchStreamer.SAMPLE_RATE
+    t = np.arange(sample_rate) / sample_rate
+    audio = sum(
+        0.1 * np.sin(2 * np.pi * 440.0 * 2 ** ((pitch - 69) / 12) * t)
+        for pitch in [60, 64, 67]
+    ).astype(np.float32)
+    listener = Mock(spec=I_PitchStreamListener)
+    patient = ChromaPitchStreamer(audio_streamer=FakeAudioStreamer(audio), hop_sec=0.1)
+    patient.register_listener(listener)
+
+    patient.start_streaming()
+    for _ in range(100):
+        if listener.new_pitches_detected.called:
+            break
+        threading.Event().wait(0.05)
+    patient.stop_streaming()
+
+    listener.new_pitches_detected.assert_called_with([60, 64, 67])
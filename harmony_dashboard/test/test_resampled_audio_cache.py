@@ -0,0 +1,175 @@
+import hashlib
+import os
+import shutil
+import threading
+
+import pytest
+import numpy as np
+import soundfile as sf
+
+from ..chunked_audio_reader import ChunkedAudioReader, I_AudioReader
+from ..resampled_audio_cache import MemoryMappedAudioReader, ResampledAudioCache
+
+SAMPLE_RATE = 22050
+
+
+def read_all(audio_reader: I_AudioReader) -> np.ndarray:
+    audio_reader.start()
+    try:
+        assert audio_reader.wait_until_ready(timeout_sec=5.0)
+        reads = [np.zeros(shape=(0,), dtype=np.float32)]
+        out = np.zeros(shape=(1000,), dtype=np.float32)
+        while not audio_reader.is_finished:
+            n_read = audio_reader.read_into(out)
+            reads.append(out[:n_read].copy())
+            if n_read == 0:
+                threading.Event().wait(0.001)
+        return np.concatenate(reads)
+    finally:
+        audio_reader.stop()
+
+
+class TestResampledAudioCache:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.cache_dir = str(tmp_path / "cache")
+        self.patient = ResampledAudioCache(self.cache_dir)
+
+    def write_audio_file(
+        self, name: str = "track.wav", n_samples: int = 44100, seed: int = 0
+    ) -> str:
+        rng = np.random.default_rng(seed)
+        path = str(self.tmp_path / name)
+        sf.write(
+            path,
+            (0.1 * rng.standard_normal((n_samples, 2))).astype(np.float32),
+            44100,
+            subtype="FLOAT",
+        )
+        return path
+
+    def cache_entries(self) -> list[str]:
+        return sorted(
+            name
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(ResampledAudioCache.ENTRY_SUFFIX)
+        )
+
+    def test_will_decode_file_on_first_play_and_map_cached_samples_after(self):
+        path = self.write_audio_file()
+
+        first_reader = self.patient.open_reader(path, SAMPLE_RATE)
+        decoded_audio = read_all(first_reader)
+        second_reader = self.patient.open_reader(path, SAMPLE_RATE)
+
+        assert isinstance(first_reader, ChunkedAudioReader)
+        assert isinstance(second_reader, MemoryMappedAudioReader)
+        assert np.array_equal(read_all(second_reader), decoded_audio)
+
+    def test_will_not_cache_file_that_was_not_played_to_the_end(self):
+        path = self.write_audio_file(n_samples=10 * 44100)
+        audio_reader = self.patient.open_reader(path, SAMPLE_RATE)
+        audio_reader.start()
+        audio_reader.wait_until_ready(timeout_sec=5.0)
+        audio_reader.read_into(np.zeros(shape=(100,), dtype=np.float32))
+
+        audio_reader.stop()
+
+        assert os.listdir(self.cache_dir) == []
+
+    def test_will_not_cache_unreadable_file(self):
+        path = str(self.tmp_path / "broken.wav")
+        with open(path, "w") as f:
+            f.write("not really audio")
+
+        read_all(self.patient.open_reader(path, SAMPLE_RATE))
+
+        assert self.cache_entries() == []
+
+    def test_will_find_same_content_under_another_name(self):
+        path = self.write_audio_file()
+        read_all(self.patient.open_reader(path, SAMPLE_RATE))
+        copied_path = str(self.tmp_path / "copy.wav")
+        shutil.copy(path, copied_path)
+
+        # Not hashed until it's decoded
+        read_all(self.patient.open_reader(copied_path, SAMPLE_RATE))
+
+        assert isinstance(
+            self.patient.open_reader(copied_path, SAMPLE_RATE), MemoryMappedAudioReader
+        )
+        assert len(self.cache_entries()) == 1
+
+    def test_will_hash_file_while_decoding_it(self):
+        self.patient.hash_bytes_per_block = 1000
+        path = self.write_audio_file()
+
+        read_all(self.patient.open_reader(path, SAMPLE_RATE))
+
+        with open(path, "rb") as f:
+            content_hash = hashlib.sha256(f.read()).hexdigest()
+        assert self.cache_entries() == [
+            f"{content_hash}-{SAMPLE_RATE}{ResampledAudioCache.ENTRY_SUFFIX}"
+        ]
+        assert self.patient.content_hash(path) == content_hash
+
+    def test_will_not_cache_file_that_changed_while_decoding(self):
+        path = self.write_audio_file()
+        audio_reader = self.patient.open_reader(path, SAMPLE_RATE)
+
+        self.write_audio_file(n_samples=2 * 44100, seed=1)
+        read_all(audio_reader)
+
+        assert self.cache_entries() == []
+
+    def test_will_keep_separate_entries_per_sample_rate(self):
+        path = self.write_audio_file()
+        read_all(self.patient.open_reader(path, SAMPLE_RATE))
+
+        assert isinstance(self.patient.open_reader(path, 16000), ChunkedAudioReader)
+
+    def test_will_decode_again_once_file_changes(self):
+        path = self.write_audio_file(seed=0)
+        read_all(self.patient.open_reader(path, SAMPLE_RATE))
+
+        self.write_audio_file(seed=1)
+
+        assert isinstance(
+            self.patient.open_reader(path, SAMPLE_RATE), ChunkedAudioReader
+        )
+
+    def test_will_evict_least_recently_played_once_too_big(self):
+        # 1s at 22050 Hz of float32 is about 86 KiB, so two entries fit
+        self.patient.max_size_bytes = 200 * 1024
+        paths = [self.write_audio_file(f"{idx}.wav", seed=idx) for idx in range(3)]
+        read_all(self.patient.open_reader(paths[0], SAMPLE_RATE))
+        read_all(self.patient.open_reader(paths[1], SAMPLE_RATE))
+        # Played again, so now more recently played than the second
+        os.utime(
+            os.path.join(self.cache_dir, self.cache_entries()[0]),
+            ns=(0, 0),
+        )
+        read_all(self.patient.open_reader(paths[0], SAMPLE_RATE))
+
+        read_all(self.patient.open_reader(paths[2], SAMPLE_RATE))
+
+        assert isinstance(
+            self.patient.open_reader(paths[0], SAMPLE_RATE), MemoryMappedAudioReader
+        )
+        assert isinstance(
+            self.patient.open_reader(paths[1], SAMPLE_RATE), ChunkedAudioReader
+        )
+        assert isinstance(
+            self.patient.open_reader(paths[2], SAMPLE_RATE), MemoryMappedAudioReader
+        )
+
+    def test_will_load_all_samples_whether_cached_or_not(self):
+        path = self.write_audio_file()
+
+        decoded_samples = self.patient.load_samples(path, SAMPLE_RATE)
+        cached_samples = self.patient.load_samples(path, SAMPLE_RATE)
+
+        assert decoded_samples.shape[0] == SAMPLE_RATE
+        assert np.array_equal(cached_samples, decoded_samples)
+        assert len(self.cache_entries()) == 1
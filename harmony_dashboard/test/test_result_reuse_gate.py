@@ -0,0 +1,107 @@
+import pytest
+import numpy as np
+
+from ..result_reuse_gate import ResultReuseGate
+
+SAMPLE_RATE = 22050
+HOP = 4410
+C_MAJOR = [60, 64, 67]
+C_MINOR = [60, 63, 67]
+
+
+def chord(pitches: list[int], amplitude: float = 0.1, seed: int = 0):
+    """
+    A few harmonics per note, starting at a random phase, over some room noise
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(HOP) / SAMPLE_RATE
+    audio = sum(
+        amplitude
+        / harmonic
+        * np.sin(
+            2 * np.pi * 440.0 * 2 ** ((pitch - 69) / 12) * harmonic * t
+            + rng.uniform(0, 2 * np.pi)
+        )
+        for pitch in pitches
+        for harmonic in range(1, 5)
+    )
+    return (audio + 0.001 * rng.standard_normal(HOP)).astype(np.float32)
+
+
+class TestResultReuseGate:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = ResultReuseGate(
+            sample_rate=SAMPLE_RATE, tolerance=0.05, max_reuse_sec=1.0
+        )
+
+    def detect(self, samples: np.ndarray, pitches: list[int]) -> list[int]:
+        """
+        What the streamer does: reuse if possible, otherwise detect and record
+        """
+        reused_pitches = self.patient.reusable_pitches(samples, HOP)
+        if reused_pitches is not None:
+            return reused_pitches
+        self.patient.record_detected_pitches(pitches)
+        return pitches
+
+    def test_will_not_reuse_before_anything_is_detected(self):
+        assert self.patient.reusable_pitches(chord(C_MAJOR), HOP) is None
+
+    def test_will_reuse_pitches_while_chord_is_held(self):
+        self.detect(chord(C_MAJOR), C_MAJOR)
+
+        for seed in range(1, 4):
+            assert self.patient.reusable_pitches(chord(C_MAJOR, seed=seed), HOP) == (
+                C_MAJOR
+            )
+
+    def test_will_detect_again_when_chord_changes(self):
+        self.detect(chord(C_MAJOR), C_MAJOR)
+
+        assert self.patient.reusable_pitches(chord(C_MINOR, seed=1), HOP) is None
+
+    def test_will_detect_again_when_loudness_changes(self):
+        self.detect(chord(C_MAJOR), C_MAJOR)
+
+        assert (
+            self.patient.reusable_pitches(chord(C_MAJOR, amplitude=0.02, seed=1), HOP)
+            is None
+        )
+
+    def test_will_compare_with_window_pitches_were_detected_in(self):
+        self.detect(chord(C_MAJOR), C_MAJOR)
+        self.detect(chord(C_MINOR, seed=1), C_MINOR)
+
+        assert self.patient.reusable_pitches(chord(C_MINOR, seed=2), HOP) == C_MINOR
+
+    def test_will_not_reuse_for_longer_than_max_reuse_sec(self):
+        self.detect(chord(C_MAJOR), C_MAJOR)
+
+        # Each hop is 0.2s, so only the next 5 may reuse
+        reused = [
+            self.patient.reusable_pitches(chord(C_MAJOR, seed=seed), HOP) is not None
+            for seed in range(1, 7)
+        ]
+
+        assert reused == [True] * 5 + [False]
+
+    def test_will_notice_a_note_starting_at_the_end_of_a_long_window(self):
+        long_window = np.concatenate([chord(C_MAJOR, seed=seed) for seed in range(5)])
+        self.detect(long_window, C_MAJOR)
+        changed_window = np.concatenate(
+            [long_window[HOP:], chord(C_MAJOR + [70], seed=5)]
+        )
+
+        assert self.patient.reusable_pitches(changed_window, HOP) is None
+
+    def test_will_count_hit_rate(self):
+        self.detect(chord(C_MAJOR), C_MAJOR)
+        self.detect(chord(C_MAJOR, seed=1), C_MAJOR)
+        self.detect(chord(C_MAJOR, seed=2), C_MAJOR)
+        self.detect(chord(C_MINOR, seed=3), C_MINOR)
+
+        stats = self.patient.get_stats()
+        assert stats.windows_checked == 4
+        assert stats.windows_reused == 2
+        assert stats.hit_rate == 0.5
@@ -0,0 +1,73 @@
+import pytest
+import numpy as np
+
+from ..silence_gate import SilenceGate
+
+SAMPLE_RATE = 22050
+HOP = 4410
+
+
+def sine(amplitude: float, n_samples: int = HOP, freq_hz: float = 440.0):
+    t = np.arange(n_samples) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * freq_hz * t)).astype(np.float32)
+
+
+def soft_chord(amplitude: float = 0.003, n_samples: int = HOP):
+    """
+    C major triad with a few harmonics per note, peaking around -46 dBFS
+    """
+    return sum(
+        sine(amplitude / harmonic, n_samples, freq_hz * harmonic)
+        for freq_hz in (261.6, 329.6, 392.0)
+        for harmonic in range(1, 9)
+    )
+
+
+def room_noise(n_samples: int = HOP, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return (0.001 * rng.standard_normal(n_samples)).astype(np.float32)
+
+
+class TestSilenceGate:
+    @pytest.fixture(autouse=True)
+    def before_each_test(self):
+        self.patient = SilenceGate(
+            sample_rate=SAMPLE_RATE, threshold_dbfs=-50.0, hangover_sec=0.5
+        )
+
+    def test_will_start_out_idle(self):
+        assert self.patient.is_idle()
+
+    def test_will_treat_room_noise_as_silent(self):
+        for hop_idx in range(10):
+            assert self.patient.is_silent(room_noise(seed=hop_idx))
+
+    def test_will_open_for_loud_audio(self):
+        assert not self.patient.is_silent(sine(0.1))
+        assert not self.patient.is_idle()
+
+    def test_will_open_for_soft_onset_below_threshold(self):
+        patient = SilenceGate(sample_rate=SAMPLE_RATE, threshold_dbfs=-40.0)
+        patient.is_silent(room_noise())
+
+        assert not patient.is_silent(room_noise(seed=1) + soft_chord())
+
+    def test_will_stay_open_for_hangover_after_audio_falls_silent(self):
+        self.patient.is_silent(sine(0.1))
+
+        # 0.4s of silence is within the 0.5s hangover
+        silent_results = [
+            self.patient.is_silent(np.zeros(HOP, dtype=np.float32)) for _ in range(2)
+        ]
+
+        assert silent_results == [False, False]
+
+    def test_will_close_once_hangover_expires(self):
+        self.patient.is_silent(sine(0.1))
+
+        silent_results = [
+            self.patient.is_silent(np.zeros(HOP, dtype=np.float32)) for _ in range(3)
+        ]
+
+        assert silent_results == [False, False, True]
+        assert self.patient.is_idle()
@@ -0,0 +1,132 @@
+import threading
+from typing import Any, Callable, Iterable
+
+import numpy as np
+import sounddevice as sd
+
+from .analysis_timeline import AnalysisTimeline, Playhead
+from .app import I_HarmonyPresenter, I_PlaybackControls
+from .offline_analysis import AnalyzedHop, load_audio_file
+from .resampled_audio_cache import ResampledAudioCache
+
+
+class TimelinePlayback(I_PlaybackControls):
+    """
+    Plays an audio file back while showing an analysis of it made in advance, rather
+    than detecting pitches in it as it plays.
+
+    analyze returns the file's hops, analyzed (e.g. by analyze_file, as fast as the
+    CPUs allow), which are gathered into an AnalysisTimeline on a background thread
+    alongside playback.  Every refresh_sec, the presenter is shown the hop being
+    heard, going by the audio device's clock.  So the display matches what is heard
+    exactly, and pausing, seeking and looping (see Playhead) cost nothing.  If
+    playback gets ahead of the analysis, the display waits for it to catch up.
+
+    Playback starts once the file is loaded and the first hop is analyzed (i.e. the
+    model has loaded), and carries on, silent, after the end of the file until the
+    UI is closed, so it can still be sought back into.
+    """
+
+    def __init__(
+        self,
+        audio_file_path: str,
+        analyze: Callable[[], Iterable[AnalyzedHop]],
+        sample_rate: int,
+        audio_cache: ResampledAudioCache | None = None,
+        loop_start_sec: float | None = None,
+        loop_end_sec: float | None = None,
+        refresh_sec: float = 0.02,
+    ):
+        self.file_path = audio_file_path
+        self.analyze = analyze
+        self.sample_rate = sample_rate
+        self.audio_cache = audio_cache
+        self.loop_start_sec = loop_start_sec
+        self.loop_end_sec = loop_end_sec
+        self.refresh_sec = refresh_sec
+        self.timeline = AnalysisTimeline()
+        # Made once the file is loaded
+        self.playhead = None
+        self.presenter = None
+        self.stop_event = threading.Event()
+        self.analysis_thread = threading.Thread(target=self._analyze, daemon=True)
+        self.playback_thread = threading.Thread(target=self._play)
+
+    def run(self, presenter: I_HarmonyPresenter):
+        self.presenter = presenter
+        presenter.pitch_detection_loading()
+        self.analysis_thread.start()
+        self.playback_thread.start()
+        presenter.run_ui_until_stopped_by_user()
+        self.stop_event.set()
+        self.playback_thread.join()
+        self.analysis_thread.join()
+        if self.timeline.error is not None:
+            print(f"Analysis stopped early: {self.timeline.error}")
+
+    def toggle_pause(self):
+        if self.playhead is not None:
+            self.playhead.toggle_pause()
+
+    def seek_by(self, offset_sec: float):
+        if self.playhead is not None:
+            self.playhead.seek_by(offset_sec)
+
+    def _analyze(self):
+        self.timeline.extend(self.analyze(), self.stop_event)
+
+    def _play(self):
+        try:
+            samples = (
+                load_audio_file(self.file_path, self.sample_rate)
+                if self.audio_cache is None
+                else self.audio_cache.load_samples(self.file_path, self.sample_rate)
+            )
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            return
+        self.playhead = Playhead(
+            samples,
+            self.sample_rate,
+            loop_start_sec=self.loop_start_sec,
+            loop_end_sec=self.loop_end_sec,
+        )
+        while not self.timeline.hops and self.timeline.error is None:
+            if self.stop_event.wait(self.refresh_sec):
+                return
+        self.presenter.pitch_detection_ready()
+
+        def play_audio_chunk(
+            outdata: np.ndarray, frames: int, time: Any, status: sd.CallbackFlags
+        ):
+            # Some host APIs don't report when the output will be heard
+            output_time = time.outputBufferDacTime or (
+                time.currentTime + stream.latency
+            )
+            self.playhead.read_into(outdata[:, 0], output_time)
+
+        try:
+            # Made before being started, so the callback can always see it
+            stream = sd.OutputStream(
+                samplerate=self.sample_rate,
+                channels=1,
+                dtype="float32",
+                callback=play_audio_chunk,
+            )
+            with stream:
+                self._present_heard_hops(stream)
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+    def _present_heard_hops(self, stream: sd.OutputStream):
+        presented_state = None
+        while not self.stop_event.wait(self.refresh_sec):
+            position_sec = self.playhead.heard_position_sec(stream.time)
+            if position_sec is None:
+                continue
+            analyzed_hop = self.timeline.hop_at(position_sec)
+            if analyzed_hop is None or analyzed_hop.harmony_state is None:
+                continue
+            if analyzed_hop.harmony_state is not presented_state:
+                presented_state = analyzed_hop.harmony_state
+                self.presenter.update_harmony_state(presented_state)
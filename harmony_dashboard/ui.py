@@ -9,7 +9,7 @@ import math
 import customtkinter as ctk
 
 from .harmony_domain import HarmonyState, Note, NoteName, Chord, ChordType
-from .app import I_HarmonyPresenter
+from .app import I_HarmonyPresenter, I_PlaybackControls
 
 # Global settings for the app appearance
 ctk.set_appearance_mode("system")  # Automatically matches OS theme
@@ -19,9 +19,13 @@ FONT = "Nunito"
 
 
 class TkinterAdapter(I_HarmonyPresenter):
-    def __init__(self):
+    """
+    Given playback_controls, the space bar pauses and the arrow keys seek
+    """
+
+    def __init__(self, playback_controls: I_PlaybackControls | None = None):
         self.state_update_queue = Queue()
-        self.ui = TkinterUi(self.state_update_queue)
+        self.ui = TkinterUi(self.state_update_queue, playback_controls)
 
     def update_harmony_state(self, state: HarmonyState):
         self.state_update_queue.put(state)
@@ -30,6 +34,16 @@ class TkinterAdapter(I_HarmonyPresenter):
     def run_ui_until_stopped_by_user(self):
         self.ui.mainloop()
 
+    def pitch_detection_loading(self):
+        self.ui.show_loading()
+
+    def pitch_detection_ready(self):
+        # Tkinter isn't thread safe, so let the UI thread hide the loading message
+        self.ui.event_generate("<<PitchDetectionReady>>", when="tail")
+
+    def pitch_detection_failed(self, error: Exception):
+        self.ui.event_generate("<<PitchDetectionFailed>>", when="tail")
+
 
 class CircleDisplay(ctk.CTkFrame):
     """A reusable frame that draws 12 circles in a ring."""
@@ -179,7 +193,13 @@ class Formatter:
 
 
 class TkinterUi(ctk.CTk):
-    def __init__(self, state_update_queue: Queue[HarmonyState]):
+    SEEK_STEP_SEC = 5.0
+
+    def __init__(
+        self,
+        state_update_queue: Queue[HarmonyState],
+        playback_controls: I_PlaybackControls | None = None,
+    ):
         super().__init__()
 
         self.formatter = Formatter()
@@ -187,6 +207,16 @@ class TkinterUi(ctk.CTk):
         self.state_update_queue = state_update_queue
         self.harmony_state = None
         self.bind("<<StateUpdate>>", self.update_state)
+        self.bind("<<PitchDetectionReady>>", self.hide_loading)
+        self.bind("<<PitchDetectionFailed>>", lambda event: self.quit())
+        if playback_controls is not None:
+            self.bind("<space>", lambda event: playback_controls.toggle_pause())
+            self.bind(
+                "<Left>", lambda event: playback_controls.seek_by(-self.SEEK_STEP_SEC)
+            )
+            self.bind(
+                "<Right>", lambda event: playback_controls.seek_by(self.SEEK_STEP_SEC)
+            )
 
         # Configure window
         self.title("Harmony Dashboard")
@@ -211,6 +241,23 @@ class TkinterUi(ctk.CTk):
         self.notes_view = CircleDisplay(self, title="Notes")
         self.notes_view.grid(row=1, column=1, sticky="nsew", padx=10, pady=10)
 
+        # Shown over everything else while the pitch detection model loads
+        self.loading_label = ctk.CTkLabel(
+            self,
+            text="Loading pitch detection...",
+            font=(FONT, 24, "bold"),
+            corner_radius=10,
+            padx=20,
+            pady=10,
+        )
+
+    def show_loading(self):
+        self.loading_label.place(relx=0.5, rely=0.5, anchor="center")
+        self.loading_label.lift()
+
+    def hide_loading(self, event=None):
+        self.loading_label.place_forget()
+
     def update_state(self, event):
         new_harmony_state = self.state_update_queue.get()
         if new_harmony_state: